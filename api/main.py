@@ -8,9 +8,13 @@ import os
 import sys
 import io
 import base64
+import shutil
+import re
+import time
+import uuid
+import contextlib
 from pathlib import Path
 from datetime import datetime
-from collections import Counter
 from typing import Dict, Any, Optional, List
 import pandas as pd
 
@@ -30,17 +34,27 @@ from src.report_generator import GeradorRelatorio
 from src.models import TipoCampo, Layout
 from src.printcenter_parser import parse_printcenter_layout
 from src.scenario_identifier import identificar_cenarios, buscar_faturas_por_campo
+from src.file_reader import LeitorArquivo, ler_linhas, ENCODINGS_WINDOWS
+from src.line_index import LineIndex
+from src.sampling_validator import TAMANHO_AMOSTRA_BLOCOS
+from src.rule_loader import carregar_regras_conteudo
+from src.validation_cache import CacheBlocosNF
+from src.uniqueness_index import IndiceUnicidadeNF
+from src.fatura_index import IndiceFaturasLote, arquivo_inalterado, assinatura_arquivo
+from src.sefaz_reconciliation import conciliar_retorno, conferir_envio
 
 from .models import (
     LayoutResponse, CampoLayoutResponse, TipoCampoAPI,
     ResultadoValidacaoResponse, ErroValidacaoResponse,
-    EstatisticasResponse, ValidacaoCompleta,
+    EstatisticasResponse, ValidacaoCompleta, VerificacaoRapidaResponse,
     StatusResponse, ErrorResponse, RegistroPreviewResponse,
     DiferencaEstruturalCampoResponse, DiferencaEstruturalLinhaResponse,
     ResultadoComparacaoEstruturalResponse, ComparacaoEstruturalCompleta,
-    FaturaComparadaResponse,
+    FaturaComparadaResponse, ParLinhasRequest, LinhasRenderizadasResponse,
     ResultadoCalculosResponse, TotaisCalculadosResponse, EstatisticasFaturasResponse,
-    FaturaCenarioResponse, CenarioIdentificadoResponse,
+    FaturaCenarioResponse, CenarioIdentificadoResponse, EstatisticaRegraResponse,
+    NFConciliadaResponse, ResultadoConciliacaoResponse,
+    DiferencaEnvioResponse, ResultadoConferenciaEnvioResponse,
     CampoLayoutPrintCenterResponse, LayoutPrintCenterResponse,
 )
 
@@ -71,8 +85,20 @@ if frontend_path.exists():
 UPLOAD_DIR = Path("temp_uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Cache dos blocos de NF já validados (revalidação incremental de arquivos reenviados)
+CACHE_BLOCOS_NF = UPLOAD_DIR / "cache_blocos_nf.sqlite3"
+
+# Arquivos das comparações estruturais, guardados para a visualização das linhas sob demanda
+COMPARACOES_DIR = UPLOAD_DIR / "comparacoes"
+COMPARACOES_VALIDADE_HORAS = 24
+MAX_PARES_RENDERIZACAO = 2000
+
 # Diretório PrintCenter
 PRINTCENTER_DIR = Path(__file__).parent.parent / "printcenter"
+# Combinações fatura + NF dos lotes (unicidade entre lotes)
+INDICE_UNICIDADE_NF = PRINTCENTER_DIR / "indice_unicidade.sqlite3"
+# Índices Conta do Cliente -> faixas de bytes de cada lote (um JSON por lote)
+INDICES_FATURAS_DIR = PRINTCENTER_DIR / "indices"
 import json
 
 
@@ -98,10 +124,10 @@ def converter_layout_para_response(layout) -> LayoutResponse:
     )
 
 
-def converter_resultado_para_response(resultado) -> ResultadoValidacaoResponse:
-    """Converte resultado interno para response da API"""
+def converter_erros_para_response(erros) -> List[ErroValidacaoResponse]:
+    """Converte erros internos para response da API"""
     erros_response = []
-    for erro in resultado.erros:
+    for erro in erros:
         erros_response.append(ErroValidacaoResponse(
             linha=erro.linha,
             campo=erro.campo,
@@ -110,28 +136,36 @@ def converter_resultado_para_response(resultado) -> ResultadoValidacaoResponse:
             descricao=erro.descricao,
             valor_esperado=erro.valor_esperado
         ))
+    return erros_response
 
+
+def converter_resultado_para_response(resultado) -> ResultadoValidacaoResponse:
+    """Converte resultado interno para response da API"""
     return ResultadoValidacaoResponse(
         total_linhas=resultado.total_linhas,
         linhas_validas=resultado.linhas_validas,
         linhas_com_erro=resultado.linhas_com_erro,
-        erros=erros_response,
+        erros=converter_erros_para_response(resultado.erros),
         taxa_sucesso=resultado.taxa_sucesso
     )
 
 
-def _extrair_linhas_completas(caminho: str) -> Dict[int, str]:
-    """Lê arquivo e mapeia numero_linha -> conteúdo bruto (com padding original)."""
-    linhas: Dict[int, str] = {}
-    try:
-        with open(caminho, 'r', encoding='utf-8') as f:
-            for i, linha in enumerate(f, 1):
-                linhas[i] = linha.rstrip('\n\r')
-    except UnicodeDecodeError:
-        with open(caminho, 'r', encoding='latin-1') as f:
-            for i, linha in enumerate(f, 1):
-                linhas[i] = linha.rstrip('\n\r')
-    return linhas
+def converter_amostragem_para_response(resultado, timestamp: str) -> VerificacaoRapidaResponse:
+    """Converte ResultadoAmostragem para response da API"""
+    return VerificacaoRapidaResponse(
+        total_linhas=resultado.total_linhas,
+        linhas_verificadas=resultado.linhas_verificadas,
+        linhas_com_erro=resultado.linhas_com_erro,
+        total_blocos=resultado.total_blocos,
+        blocos_verificados=resultado.blocos_verificados,
+        taxa_sucesso_estimada=resultado.taxa_sucesso_estimada,
+        intervalo_confianca=list(resultado.intervalo_confianca),
+        nivel_confianca=resultado.nivel_confianca,
+        completo=resultado.completo,
+        tipos_erro=resultado.tipos_erro,
+        erros=converter_erros_para_response(resultado.erros),
+        timestamp=timestamp
+    )
 
 
 def _gerar_estatisticas_faturas_do_enhanced(ev: EnhancedValidator) -> EstatisticasFaturasResponse:
@@ -176,16 +210,40 @@ def _gerar_estatisticas_faturas_do_enhanced(ev: EnhancedValidator) -> Estatistic
 async def validar_calculos(
     layout_file: UploadFile = File(...),
     data_file: UploadFile = File(...),
-    sheet_name: Optional[int] = Form(None)
+    sheet_name: Optional[int] = Form(None),
+    regras_file: Optional[UploadFile] = File(None),
+    processos: Optional[int] = Form(None),
+    usar_cache: bool = Form(False),
+    verificar_lotes: bool = Form(False),
+    medir_regras: bool = Form(False),
+    retorno_file: Optional[UploadFile] = File(None)
 ):
-    """Valida cálculos e totalizadores (sem arquivo base), retornando erros e a linha completa de cada ocorrência."""
+    """Valida cálculos e totalizadores (sem arquivo base), retornando erros e a linha completa de cada ocorrência.
+
+    `regras_file` (opcional): arquivo de regras JSON/YAML de impostos e totalizadores; sem ele
+    valem as regras NFCOM padrão.
+    `processos` (opcional): > 1 valida os blocos de NF em paralelo, com o mesmo resultado.
+    `usar_cache` (opcional): revalida só as NFs que mudaram desde o último envio (cache em disco,
+    compartilhado por todos os envios).
+    `verificar_lotes` (opcional): aponta fatura + NF já usada nos lotes do índice de unicidade
+    (o lote com o mesmo nome do arquivo enviado não conta; um lote corrigido enviado com outro
+    nome aponta todas as NFs da versão anterior).
+    `medir_regras` (opcional): inclui tempo, chamadas e erros de cada verificação na resposta.
+    `retorno_file` (opcional): retorno da SEFAZ (JSON lines, como `sefaz/retorno_*.txt`) conciliado
+    com as NFs do lote pelo TRANSACTION_ID_CLARO dos registros 90.
+    """
     if not layout_file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="Layout deve ser Excel (.xlsx ou .xls)")
     if not data_file.filename.endswith('.txt'):
         raise HTTPException(status_code=400, detail="Arquivo de dados deve ser TXT")
+    if regras_file is not None and regras_file.filename and not regras_file.filename.endswith(('.json', '.yaml', '.yml')):
+        raise HTTPException(status_code=400, detail="Arquivo de regras deve ser JSON ou YAML")
 
     temp_layout = None
     temp_data = None
+    temp_retorno = None
+    indice_linhas = None
+    indice_unicidade = None
     try:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         # Salvar uploads
@@ -197,14 +255,41 @@ async def validar_calculos(
         with open(temp_data, "wb") as buffer:
             buffer.write(await data_file.read())
 
+        if retorno_file is not None and retorno_file.filename:
+            # Copiado em partes: o retorno de um dia pode ser grande
+            temp_retorno = UPLOAD_DIR / f"retorno_{timestamp}_{Path(retorno_file.filename).name}"
+            with open(temp_retorno, "wb") as buffer:
+                shutil.copyfileobj(retorno_file.file, buffer)
+
         # Carregar layout (aba definida ou 0)
         parser = LayoutParser()
         sheet_index = sheet_name if sheet_name is not None else 0
         layout = parser.parse_excel(str(temp_layout), sheet_name=sheet_index)
 
+        # Regras enviadas: validadas e reaproveitadas do cache pelo hash do conteúdo
+        regras = None
+        if regras_file is not None and regras_file.filename:
+            regras = carregar_regras_conteudo(
+                await regras_file.read(), Path(regras_file.filename).suffix.lstrip('.').lower(), regras_file.filename
+            )
+
+        # Índice de linhas (mmap) compartilhado entre a validação e a montagem da resposta
+        indice_linhas = LineIndex(str(temp_data), ENCODINGS_WINDOWS)
+
+        # Índice dos lotes já registrados (upload de lote / indexar-lotes); o próprio arquivo não conta
+        if verificar_lotes and INDICE_UNICIDADE_NF.exists():
+            indice_unicidade = IndiceUnicidadeNF(INDICE_UNICIDADE_NF)
+
         # Rodar EnhancedValidator sem limite de erros
-        ev = EnhancedValidator(layout)
-        resultado = ev.validar_arquivo(str(temp_data))
+        ev = EnhancedValidator(layout, regras, indice_unicidade, medir_regras=medir_regras)
+        ev.nome_lote = data_file.filename
+        if processos and processos > 1:
+            resultado = ev.validar_arquivo_paralelo(str(temp_data), processos, indice_linhas=indice_linhas)
+        elif usar_cache:
+            with CacheBlocosNF(CACHE_BLOCOS_NF) as cache:
+                resultado = ev.validar_arquivo_incremental(str(temp_data), cache, indice_linhas=indice_linhas)
+        else:
+            resultado = ev.validar_arquivo(str(temp_data), indice_linhas=indice_linhas)
 
         # Converter resultados básicos
         resultado_response = converter_resultado_para_response(resultado)
@@ -215,23 +300,22 @@ async def validar_calculos(
         arquivo_grande = resultado.total_linhas > 10000 or len(resultado.erros) > MAX_ERROS_DETALHES
         
         # Linhas completas: capturar apenas as com erro (limitado para arquivos grandes)
-        linhas_raw = _extrair_linhas_completas(str(temp_data))
         linhas_com_erro: Dict[int, str] = {}
         
         if arquivo_grande:
             # Para arquivos grandes, retornar apenas primeiros N erros com detalhes
             erros_limitados = resultado.erros[:MAX_ERROS_DETALHES]
             for erro in erros_limitados:
-                if erro.linha not in linhas_com_erro and erro.linha in linhas_raw:
-                    linha = linhas_raw[erro.linha]
+                if erro.linha not in linhas_com_erro and erro.linha in indice_linhas:
+                    linha = indice_linhas.get_line(erro.linha)
                     if len(linha) < layout.tamanho_linha:
                         linha = linha.ljust(layout.tamanho_linha)
                     linhas_com_erro[erro.linha] = linha
         else:
             # Para arquivos normais, retornar todos
             for erro in resultado.erros:
-                if erro.linha not in linhas_com_erro and erro.linha in linhas_raw:
-                    linha = linhas_raw[erro.linha]
+                if erro.linha not in linhas_com_erro and erro.linha in indice_linhas:
+                    linha = indice_linhas.get_line(erro.linha)
                     if len(linha) < layout.tamanho_linha:
                         linha = linha.ljust(layout.tamanho_linha)
                     linhas_com_erro[erro.linha] = linha
@@ -239,35 +323,51 @@ async def validar_calculos(
         # Preparar extras: totais
         totais_resp = TotaisCalculadosResponse(valores=dict(ev.totais_acumulados))
 
+        conciliacao_resp = None
+        if temp_retorno is not None:
+            conciliacao = conciliar_retorno(str(temp_retorno), ev.grupos_nf, resultado.erros.linhas_e_tipos())
+            conciliacao_resp = ResultadoConciliacaoResponse(
+                total_registros=conciliacao.total_registros,
+                registros_fora_do_lote=conciliacao.registros_fora_do_lote,
+                nfs_sem_retorno=conciliacao.nfs_sem_retorno,
+                rejeitadas_com_erro_local=[NFConciliadaResponse(**vars(nf)) for nf in conciliacao.rejeitadas_com_erro_local],
+                rejeitadas_sem_erro_local=[NFConciliadaResponse(**vars(nf)) for nf in conciliacao.rejeitadas_sem_erro_local],
+                autorizadas_com_erro_local=[NFConciliadaResponse(**vars(nf)) for nf in conciliacao.autorizadas_com_erro_local],
+                autorizadas_sem_erro_local=conciliacao.autorizadas_sem_erro_local,
+                pendentes=conciliacao.pendentes,
+                linhas_invalidas=conciliacao.linhas_invalidas
+            )
+
         # Converter grupos por NF para resposta serializável (inclui conteúdo das linhas do grupo)
         grupos_resp: Dict[str, Any] = {}
         
         if arquivo_grande:
             # Para arquivos grandes, limitar grupos retornados
-            grupos_limitados = dict(list(ev.grupos_nf.items())[:100])  # Primeiros 100 grupos
-            for (fatura, nf), dados in grupos_limitados.items():
+            grupos_limitados = list(ev.grupos_nf)[:100]  # Primeiros 100 grupos
+            for fatura, nf in grupos_limitados:
                 key = f"{fatura}|{nf}"
                 # Não incluir conteúdo das linhas para economizar memória
                 grupos_resp[key] = {
-                    'linhas': dados.get('linhas', []),
-                    'contribuintes_por_total': dados.get('contribuintes_por_total', {}),
+                    'linhas': ev.linhas_do_grupo((fatura, nf)),
+                    'contribuintes_por_total': ev.contribuintes_do_grupo((fatura, nf), indice_linhas),
                     'linhas_conteudo': {}  # Vazio para arquivos grandes
                 }
         else:
             # Para arquivos normais, retornar tudo
-            for (fatura, nf), dados in ev.grupos_nf.items():
+            for fatura, nf in ev.grupos_nf:
                 key = f"{fatura}|{nf}"
+                linhas_grupo = ev.linhas_do_grupo((fatura, nf))
                 # Mapear conteúdo bruto das linhas do grupo (com padding)
                 linhas_conteudo: Dict[int, str] = {}
-                for ln in dados.get('linhas', []):
-                    if ln in linhas_raw:
-                        linha = linhas_raw[ln]
+                for ln in linhas_grupo:
+                    if ln in indice_linhas:
+                        linha = indice_linhas.get_line(ln)
                         if len(linha) < layout.tamanho_linha:
                             linha = linha.ljust(layout.tamanho_linha)
                         linhas_conteudo[ln] = linha
                 grupos_resp[key] = {
-                    'linhas': dados.get('linhas', []),
-                    'contribuintes_por_total': dados.get('contribuintes_por_total', {}),
+                    'linhas': linhas_grupo,
+                    'contribuintes_por_total': ev.contribuintes_do_grupo((fatura, nf), indice_linhas),
                     'linhas_conteudo': linhas_conteudo
                 }
 
@@ -327,22 +427,98 @@ async def validar_calculos(
             estatisticas_faturas=stats_resp,
             linhas_completas_com_erro=linhas_com_erro,
             grupos_por_nf=grupos_resp,
-            layout=converter_layout_para_response(layout)
+            layout=converter_layout_para_response(layout),
+            estatisticas_regras=[
+                EstatisticaRegraResponse(
+                    nome=e.nome, chamadas=e.chamadas, erros=e.erros, tempo_segundos=round(e.tempo_segundos, 6)
+                )
+                for e in resultado.estatisticas_regras
+            ] if resultado.estatisticas_regras is not None else None,
+            conciliacao_sefaz=conciliacao_resp
         )
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro durante validação de cálculos: {str(e)}")
     finally:
+        if indice_linhas is not None:
+            indice_linhas.close()
+        if indice_unicidade is not None:
+            indice_unicidade.close()
         if temp_layout and temp_layout.exists():
             os.remove(temp_layout)
         if temp_data and temp_data.exists():
             os.remove(temp_data)
+        if temp_retorno and temp_retorno.exists():
+            os.remove(temp_retorno)
+
+
+@app.post("/api/sefaz/conferir-envio")
+async def conferir_envio_sefaz(
+    layout_file: UploadFile = File(...),
+    data_file: UploadFile = File(...),
+    envio_file: UploadFile = File(...),
+    sheet_name: Optional[int] = Form(None)
+):
+    """Compara o envio à SEFAZ (JSON lines, como `sefaz/envio_*.txt`) com os registros 01/56 do lote TXT.
+
+    Cada NF do envio é achada pelo número (NUM_NFCOM) no lote; número, série, modelo e totais
+    diferentes são listados campo a campo.
+    """
+    if not layout_file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Layout deve ser Excel (.xlsx ou .xls)")
+    if not data_file.filename.endswith('.txt'):
+        raise HTTPException(status_code=400, detail="Arquivo de dados deve ser TXT")
+
+    temp_layout = None
+    temp_data = None
+    temp_envio = None
+    indice_linhas = None
+    try:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        temp_layout = UPLOAD_DIR / f"layout_{timestamp}_{layout_file.filename}"
+        with open(temp_layout, "wb") as buffer:
+            buffer.write(await layout_file.read())
+
+        # Lote e envio copiados em partes (podem ser de um dia inteiro)
+        temp_data = UPLOAD_DIR / f"data_{timestamp}_{Path(data_file.filename).name}"
+        with open(temp_data, "wb") as buffer:
+            shutil.copyfileobj(data_file.file, buffer)
+        temp_envio = UPLOAD_DIR / f"envio_{timestamp}_{Path(envio_file.filename).name}"
+        with open(temp_envio, "wb") as buffer:
+            shutil.copyfileobj(envio_file.file, buffer)
+
+        sheet_index = sheet_name if sheet_name is not None else 0
+        layout = LayoutParser().parse_excel(str(temp_layout), sheet_name=sheet_index)
+
+        indice_linhas = LineIndex(str(temp_data), ENCODINGS_WINDOWS)
+        conferencia = conferir_envio(str(temp_envio), indice_linhas, layout)
+
+        return ResultadoConferenciaEnvioResponse(
+            total_registros=conferencia.total_registros,
+            nfs_conferidas=conferencia.nfs_conferidas,
+            nfs_com_diferenca=conferencia.nfs_com_diferenca,
+            registros_fora_do_lote=conferencia.registros_fora_do_lote,
+            nfs_sem_56=conferencia.nfs_sem_56,
+            nfs_repetidas_no_lote=conferencia.nfs_repetidas_no_lote,
+            diferencas=[DiferencaEnvioResponse(**vars(d)) for d in conferencia.diferencas],
+            campos_sem_layout=conferencia.campos_sem_layout,
+            linhas_invalidas=conferencia.linhas_invalidas
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao conferir envio: {str(e)}")
+    finally:
+        if indice_linhas is not None:
+            indice_linhas.close()
+        for temp in (temp_layout, temp_data, temp_envio):
+            if temp and temp.exists():
+                os.remove(temp)
 
 
 def gerar_estatisticas(resultado) -> EstatisticasResponse:
     """Gera estatísticas detalhadas"""
-    tipos_erro = Counter(erro.erro_tipo for erro in resultado.erros)
-    campos_com_erro = Counter(erro.campo for erro in resultado.erros)
+    tipos_erro = resultado.erros.contar_tipos()
+    campos_com_erro = resultado.erros.contar_campos()
 
     return EstatisticasResponse(
         total_linhas=resultado.total_linhas,
@@ -377,7 +553,9 @@ def _converter_linhas_para_response(linhas) -> List[DiferencaEstruturalLinhaResp
             arquivo_base_linha=diferenca_linha.arquivo_base_linha,
             arquivo_validado_linha=diferenca_linha.arquivo_validado_linha,
             diferencas_campos=campos_response,
-            total_diferencas=diferenca_linha.total_diferencas
+            total_diferencas=diferenca_linha.total_diferencas,
+            numero_linha_base=diferenca_linha.numero_linha_base,
+            numero_linha_validado=diferenca_linha.numero_linha_validado
         ))
     return response
 
@@ -408,7 +586,137 @@ def converter_resultado_comparacao_para_response(resultado) -> ResultadoComparac
         contas_nao_encontradas=getattr(resultado, 'contas_nao_encontradas', []),
         faturas_comparadas=faturas_response
     )
-    
+
+
+def _remover_comparacoes_antigas():
+    """Remove as pastas de comparações guardadas há mais de COMPARACOES_VALIDADE_HORAS"""
+    if not COMPARACOES_DIR.exists():
+        return
+    limite = time.time() - COMPARACOES_VALIDADE_HORAS * 3600
+    for pasta in COMPARACOES_DIR.iterdir():
+        if pasta.is_dir() and pasta.stat().st_mtime < limite:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _guardar_comparacao(timestamp: str, temporarios: Dict[str, Path], fixos: Dict[str, Path],
+                        sheet_index: int, printcenter: bool,
+                        assinaturas: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """Guarda os arquivos de uma comparação (layout, base, validado) e retorna o id dela.
+
+    Os `temporarios` são movidos para a pasta da comparação; os `fixos` (layout e lotes
+    do PrintCenter) só são referenciados pelo caminho, com tamanho, data e hash para
+    recusar depois a visualização se tiverem mudado. `assinaturas` traz as já calculadas
+    (ex.: a do índice de faturas do lote), para não ler o lote de novo só pelo hash."""
+    _remover_comparacoes_antigas()
+    id_comparacao = f"{timestamp}_{uuid.uuid4().hex[:8]}"
+    pasta = COMPARACOES_DIR / id_comparacao
+    pasta.mkdir(parents=True)
+
+    dados = {'printcenter': printcenter, 'sheet_index': sheet_index, 'assinaturas': {}}
+    for chave, caminho in fixos.items():
+        dados[chave] = str(Path(caminho).resolve())
+        dados['assinaturas'][chave] = (assinaturas or {}).get(chave) or assinatura_arquivo(caminho)
+    for chave, caminho in temporarios.items():
+        destino = pasta / f"{chave}{Path(caminho).suffix}"
+        os.replace(caminho, destino)
+        dados[chave] = str(destino.resolve())
+
+    with open(pasta / "comparacao.json", "w", encoding="utf-8") as f:
+        json.dump(dados, f)
+    return id_comparacao
+
+
+# Layouts das comparações guardadas, por (caminho, data de modificação)
+_LAYOUTS_COMPARACAO: Dict[tuple, Layout] = {}
+
+# Índices de faturas dos lotes usados como base, por (caminho do índice, data de modificação)
+_INDICES_FATURAS_COMPARACAO: Dict[tuple, IndiceFaturasLote] = {}
+
+
+def _indice_faturas_comparacao(caminho_lote: str) -> IndiceFaturasLote:
+    """Índice de faturas do lote (já conferido com a comparação), mantido em memória entre as páginas"""
+    caminho_indice = _caminho_indice_faturas(Path(caminho_lote))
+    try:
+        chave = (str(caminho_indice), os.stat(caminho_indice).st_mtime_ns)
+    except OSError:
+        chave = None
+    indice = _INDICES_FATURAS_COMPARACAO.get(chave)
+    if indice is None:
+        indice = IndiceFaturasLote.obter(caminho_lote, caminho_indice)
+        if len(_INDICES_FATURAS_COMPARACAO) >= 4:
+            _INDICES_FATURAS_COMPARACAO.clear()
+        _INDICES_FATURAS_COMPARACAO[(str(caminho_indice), os.stat(caminho_indice).st_mtime_ns)] = indice
+    return indice
+
+
+def _carregar_comparacao(id_comparacao: str):
+    """Comparador (linhas sob demanda) e dados guardados (caminhos base/validado) de uma comparação"""
+    pasta = COMPARACOES_DIR / id_comparacao
+    if not re.fullmatch(r'\d{8}_\d{6}_[0-9a-f]{8}', id_comparacao) or not (pasta / "comparacao.json").exists():
+        raise HTTPException(status_code=404, detail=f"Comparação '{id_comparacao}' não encontrada ou expirada")
+
+    with open(pasta / "comparacao.json", "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    for chave in ('layout', 'base', 'validado'):
+        if not Path(dados[chave]).exists():
+            raise HTTPException(status_code=404, detail=f"Arquivo da comparação não encontrado: {Path(dados[chave]).name}")
+    for chave, assinatura in dados.get('assinaturas', {}).items():
+        if not arquivo_inalterado(dados[chave], assinatura):
+            raise HTTPException(
+                status_code=409,
+                detail=f"O arquivo '{Path(dados[chave]).name}' mudou depois da comparação; refaça a comparação"
+            )
+
+    chave_layout = (dados['layout'], os.path.getmtime(dados['layout']), dados['sheet_index'])
+    layout = _LAYOUTS_COMPARACAO.get(chave_layout)
+    if layout is None:
+        if dados['printcenter']:
+            layout = parse_printcenter_layout(dados['layout'], sheet_name=dados['sheet_index'])
+        else:
+            layout = LayoutParser().parse_excel(dados['layout'], sheet_name=dados['sheet_index'])
+        if len(_LAYOUTS_COMPARACAO) >= 8:
+            _LAYOUTS_COMPARACAO.clear()
+        _LAYOUTS_COMPARACAO[chave_layout] = layout
+
+    comparador = ComparadorEstruturalArquivos(layout, linhas_sob_demanda=True)
+    return comparador, dados
+
+
+@app.post("/api/comparacao/{id_comparacao}/linhas", response_model=List[LinhasRenderizadasResponse])
+async def renderizar_linhas_comparacao(id_comparacao: str, pares: List[ParLinhasRequest]):
+    """Visualização com barras e numeração dos campos para pares de linhas de uma comparação.
+
+    As comparações estruturais devolvem só os números das linhas (`numero_linha_base`,
+    `numero_linha_validado`); a tela pede aqui as linhas que vai mostrar."""
+    if len(pares) > MAX_PARES_RENDERIZACAO:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_PARES_RENDERIZACAO} pares por requisição")
+
+    comparador, dados = _carregar_comparacao(id_comparacao)
+    if dados['printcenter'] and 'base' in dados.get('assinaturas', {}):
+        # Lote fixo do PrintCenter: só as faixas das linhas pedidas, pelo índice de faturas salvo
+        numeros_base = [par.numero_linha_base for par in pares if par.numero_linha_base > 0]
+        linhas_base = contextlib.nullcontext(_indice_faturas_comparacao(dados['base']).linhas(numeros_base))
+    else:
+        linhas_base = LineIndex(dados['base'])
+    resposta = []
+    with linhas_base as indice_base, LineIndex(dados['validado']) as indice_validado:
+        for par in pares:
+            linha_base, linha_validado = comparador.linhas_do_par(
+                indice_base, indice_validado, par.numero_linha_base, par.numero_linha_validado
+            )
+            linha_base_fmt, linha_validado_fmt, linha_numeracao = comparador.renderizar_linhas(
+                linha_base, linha_validado, par.tipo_registro
+            )
+            resposta.append(LinhasRenderizadasResponse(
+                numero_linha_base=par.numero_linha_base,
+                numero_linha_validado=par.numero_linha_validado,
+                tipo_registro=par.tipo_registro,
+                arquivo_base_linha=linha_base_fmt,
+                arquivo_validado_linha=linha_validado_fmt,
+                linha_numeracao=linha_numeracao
+            ))
+    return resposta
+
 
 
 @app.get("/")
@@ -614,7 +922,9 @@ async def validar_arquivo_completo(
     layout_file: UploadFile = File(...),
     data_file: UploadFile = File(...),
     max_erros: int = Form(default=None),
-    sheet_name: Optional[int] = Form(None)
+    sheet_name: Optional[int] = Form(None),
+    verificacao_rapida: bool = Form(False),
+    tamanho_amostra: int = Form(TAMANHO_AMOSTRA_BLOCOS)
 ):
     """Valida arquivo completo e retorna resultados detalhados
 
@@ -623,6 +933,9 @@ async def validar_arquivo_completo(
         data_file: Arquivo TXT com dados
         max_erros: Máximo de erros antes de parar validação
         sheet_name: Índice da aba (0=primeira, 1=segunda, etc.). Se None, usa primeira aba.
+        verificacao_rapida: valida só header, trailer, primeiros blocos de NF e uma amostra
+            aleatória de `tamanho_amostra` blocos; retorna VerificacaoRapidaResponse com a
+            taxa de sucesso estimada e o intervalo de confiança
     """
     if not layout_file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="Layout deve ser Excel (.xlsx ou .xls)")
@@ -700,6 +1013,17 @@ async def validar_arquivo_completo(
         layout_is_normalized = is_normalized_layout(layout_file.filename)
         layout_is_multi_record = is_multi_record_layout(str(temp_layout), sheet_index)
 
+        if verificacao_rapida:
+            parser = LayoutParser()
+            if data_is_multi_record:
+                # Amostragem por blocos de NF usa as validações estruturais do EnhancedValidator
+                validador = EnhancedValidator(parser.parse_excel(str(temp_layout), sheet_name=sheet_index))
+            else:
+                sheet_layout = 0 if layout_is_normalized else sheet_index  # Layouts normalizados usam aba 0
+                validador = ValidadorArquivo(parser.parse_excel(str(temp_layout), sheet_name=sheet_layout))
+            resultado_amostra = validador.validar_amostra(str(temp_data), tamanho_amostra=tamanho_amostra)
+            return converter_amostragem_para_response(resultado_amostra, timestamp)
+
         if data_is_multi_record:
             # Arquivo de dados tem múltiplos tipos - SEMPRE usar MultiRecordValidator
             if layout_is_normalized:
@@ -895,12 +1219,16 @@ async def comparar_arquivos_estrutural(
         parser = LayoutParser()
         layout = parser.parse_excel(str(temp_layout), sheet_name=sheet_index)
 
-        # Executar comparação estrutural
-        comparador = ComparadorEstruturalArquivos(layout)
+        # Executar comparação estrutural (visualização das linhas pedida depois, por id)
+        comparador = ComparadorEstruturalArquivos(layout, linhas_sob_demanda=True)
         resultado_comparacao = comparador.comparar_arquivos(str(temp_base), str(temp_validado))
 
         # Gerar relatório textual
-        relatorio_texto = comparador.gerar_relatorio_completo(resultado_comparacao)
+        relatorio_texto = comparador.gerar_relatorio_completo(resultado_comparacao, str(temp_base), str(temp_validado))
+        id_comparacao = _guardar_comparacao(
+            timestamp, {'layout': temp_layout, 'base': temp_base, 'validado': temp_validado}, {},
+            sheet_index, printcenter=False
+        )
 
         # Preparar dados para localStorage
         dados_comparacao = {
@@ -919,7 +1247,8 @@ async def comparar_arquivos_estrutural(
             resultado_comparacao=resultado_response,
             relatorio_texto=relatorio_texto,
             timestamp=timestamp,
-            dados_comparacao=dados_comparacao
+            dados_comparacao=dados_comparacao,
+            id_comparacao=id_comparacao
         )
 
     except Exception as e:
@@ -972,6 +1301,11 @@ async def get_printcenter_config():
     }
 
 
+def _caminho_indice_faturas(lote_path: Path) -> Path:
+    """Arquivo do índice de faturas do lote (fora de lotes/, para não aparecer como lote)"""
+    return INDICES_FATURAS_DIR / f"{lote_path.name}.faturas.json"
+
+
 @app.post("/api/printcenter/upload-lote")
 async def upload_lote_producao(
     arquivo: UploadFile = File(...)
@@ -1002,30 +1336,33 @@ async def upload_lote_producao(
                 buffer.write(chunk)
                 total_bytes += len(chunk)
 
-        # Contar linhas e faturas para feedback
-        total_linhas = 0
-        total_faturas = 0
-        with open(destino, 'r', encoding='utf-8', errors='replace') as f:
-            for linha in f:
-                total_linhas += 1
-                if linha.startswith('01'):
-                    total_faturas += 1
+        # Índice das faturas do lote: as comparações leem só as contas do usuário.
+        # Também dá as contagens de linhas e faturas para feedback
+        indice_faturas = IndiceFaturasLote.construir(destino)
+        indice_faturas.salvar(_caminho_indice_faturas(destino))
 
         tamanho_mb = total_bytes / (1024 * 1024)
 
+        # Combinações fatura + NF do lote entram no índice de unicidade entre lotes
+        with IndiceUnicidadeNF(INDICE_UNICIDADE_NF) as indice_unicidade:
+            combinacoes_indexadas = indice_unicidade.registrar_lote(destino)
+
         return {
             "sucesso": True,
             "mensagem": f"Arquivo '{arquivo.filename}' salvo com sucesso na pasta lotes/",
             "arquivo": f"lotes/{arquivo.filename}",
             "nome": arquivo.filename,
             "tamanho_mb": round(tamanho_mb, 2),
-            "total_linhas": total_linhas,
-            "total_faturas": total_faturas
+            "total_linhas": indice_faturas.total_linhas,
+            "total_faturas": indice_faturas.total_faturas,
+            "contas_indexadas": len(indice_faturas),
+            "combinacoes_indexadas": combinacoes_indexadas
         }
     except Exception as e:
         # Limpar arquivo parcialmente salvo em caso de erro
         if destino.exists():
             os.remove(destino)
+        _caminho_indice_faturas(destino).unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
 
 
@@ -1042,11 +1379,40 @@ async def remover_lote(nome_arquivo: str):
 
     try:
         os.remove(lote_path)
+        _caminho_indice_faturas(lote_path).unlink(missing_ok=True)
+        if INDICE_UNICIDADE_NF.exists():
+            with IndiceUnicidadeNF(INDICE_UNICIDADE_NF) as indice_unicidade:
+                indice_unicidade.remover_lote(lote_path.name)
         return {"sucesso": True, "mensagem": f"Arquivo '{nome_arquivo}' removido com sucesso"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao remover arquivo: {str(e)}")
 
 
+@app.post("/api/printcenter/indexar-lotes")
+async def indexar_lotes():
+    """Registra no índice de unicidade e no índice de faturas os lotes da pasta lotes/
+    (inclusive os copiados direto para a pasta); lotes já registrados e inalterados não são relidos"""
+    lotes_dir = PRINTCENTER_DIR / "lotes"
+    if not lotes_dir.exists():
+        raise HTTPException(status_code=404, detail="Pasta de lotes do PrintCenter não encontrada")
+
+    try:
+        with IndiceUnicidadeNF(INDICE_UNICIDADE_NF) as indice_unicidade:
+            indice_unicidade.registrar_pasta(lotes_dir)
+            lotes = indice_unicidade.lotes()
+            total_combinacoes = indice_unicidade.quantidade()
+        for lote_path in sorted(lotes_dir.glob('*.txt')):
+            if lote_path.is_file():
+                IndiceFaturasLote.obter(lote_path, _caminho_indice_faturas(lote_path))
+        return {
+            "sucesso": True,
+            "lotes": [{"nome": nome, "combinacoes": quantidade} for nome, quantidade in lotes],
+            "total_combinacoes": total_combinacoes
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao indexar lotes: {str(e)}")
+
+
 # ============================================================
 # CONSTANTES E FUNÇÕES AUXILIARES PARA COMPARAÇÃO PRINTCENTER
 # ============================================================
@@ -1095,12 +1461,7 @@ def _detectar_modelo(linhas):
 
 def _ler_linhas_arquivo(caminho: str):
     """Lê todas as linhas de um arquivo, tentando utf-8 e latin-1."""
-    try:
-        with open(caminho, 'r', encoding='utf-8') as f:
-            return [l.rstrip('\n\r') for l in f]
-    except UnicodeDecodeError:
-        with open(caminho, 'r', encoding='latin-1') as f:
-            return [l.rstrip('\n\r') for l in f]
+    return ler_linhas(caminho)
 
 
 def _construir_arquivo_alinhado(linhas_dev, linhas_prod, modelo):
@@ -1238,9 +1599,13 @@ def _extrair_mapa_faturas(caminho_arquivo: str):
 async def printcenter_comparar(
     arquivo_usuario: UploadFile = File(...),
     lote_arquivo: str = Form(default=""),
-    arquivo_producao: UploadFile = File(default=None)
+    arquivo_producao: UploadFile = File(default=None),
+    processos: Optional[int] = Form(None)
 ):
-    """Compara arquivo do usuário com arquivo de produção (lote selecionado ou upload)"""
+    """Compara arquivo do usuário com arquivo de produção (lote selecionado ou upload)
+
+    `processos` (opcional): > 1 compara as faturas em paralelo, com o mesmo resultado.
+    """
     config_path = PRINTCENTER_DIR / "config.json"
 
     if not config_path.exists():
@@ -1275,6 +1640,7 @@ async def printcenter_comparar(
             content = await arquivo_usuario.read()
             buffer.write(content)
 
+        indice_faturas_producao = None
         if tem_upload_producao:
             temp_producao = UPLOAD_DIR / f"printcenter_prod_{timestamp}_{arquivo_producao.filename}"
             with open(temp_producao, "wb") as buffer:
@@ -1286,25 +1652,21 @@ async def printcenter_comparar(
             if not lote_path.exists():
                 raise HTTPException(status_code=400, detail=f"Arquivo do lote não encontrado: {lote_arquivo}")
             producao_path = str(lote_path)
+            # Índice salvo no upload (refeito aqui se o lote mudou ou foi copiado direto para a pasta)
+            indice_faturas_producao = IndiceFaturasLote.obter(lote_path, _caminho_indice_faturas(lote_path))
 
         sheet_index = config.get("sheet_index", 0)
         layout = parse_printcenter_layout(str(layout_path), sheet_name=sheet_index)
 
         # Detecção de modelo lendo apenas as primeiras linhas (economiza memória)
         def _detectar_modelo_streaming(caminho: str, max_linhas=100):
-            for enc in ['utf-8', 'latin-1']:
-                try:
-                    with open(caminho, 'r', encoding=enc) as f:
-                        for i, linha in enumerate(f):
-                            if i >= max_linhas:
-                                break
-                            if "Hash-Code" in linha:
-                                return "hashcode"
-                            if "Fatura" in linha:
-                                return "fatura"
-                    return "padrao"
-                except UnicodeDecodeError:
-                    continue
+            for i, linha in enumerate(LeitorArquivo(caminho)):
+                if i >= max_linhas:
+                    break
+                if "Hash-Code" in linha:
+                    return "hashcode"
+                if "Fatura" in linha:
+                    return "fatura"
             return "padrao"
 
         modelo_usuario = _detectar_modelo_streaming(str(temp_usuario))
@@ -1313,22 +1675,18 @@ async def printcenter_comparar(
         # Mapa de faturas lendo em streaming (não carrega arquivo inteiro)
         def _extrair_mapa_faturas_streaming(caminho_arquivo: str):
             mapa = {}
-            for enc in ['utf-8', 'latin-1']:
-                try:
-                    with open(caminho_arquivo, 'r', encoding=enc) as f:
-                        for idx, linha in enumerate(f, 1):
-                            linha = linha.rstrip('\n\r')
-                            if "Fatura" in linha:
-                                partes = linha.split()
-                                fatura = partes[1] if len(partes) > 1 else ""
-                                mapa[fatura] = idx
-                    break
-                except UnicodeDecodeError:
-                    continue
+            for idx, linha in LeitorArquivo(caminho_arquivo).linhas_numeradas():
+                if "Fatura" in linha:
+                    partes = linha.split()
+                    fatura = partes[1] if len(partes) > 1 else ""
+                    mapa[fatura] = idx
             return mapa
 
         mapa_faturas_usuario = _extrair_mapa_faturas_streaming(str(temp_usuario))
-        mapa_faturas_producao = _extrair_mapa_faturas_streaming(producao_path)
+        if indice_faturas_producao is not None:
+            mapa_faturas_producao = indice_faturas_producao.mapa_faturas
+        else:
+            mapa_faturas_producao = _extrair_mapa_faturas_streaming(producao_path)
 
         # Hash-Code conditional comparison
         campos_ignorados = set(getattr(layout, 'campos_ignorados', []))
@@ -1342,14 +1700,24 @@ async def printcenter_comparar(
 
         comparador = ComparadorEstruturalArquivos(layout,
             campos_ignorados=campos_ignorados,
-            campos_ignorar_se_preenchido=campos_ignorar_se_preenchido
+            campos_ignorar_se_preenchido=campos_ignorar_se_preenchido,
+            linhas_sob_demanda=True
         )
         resultado_comparacao = comparador.comparar_arquivos_por_tipo_registro(
             producao_path,
-            str(temp_usuario)
+            str(temp_usuario),
+            indice_faturas_base=indice_faturas_producao,
+            processos=processos
         )
 
-        relatorio_texto = comparador.gerar_relatorio_completo(resultado_comparacao)
+        relatorio_texto = comparador.gerar_relatorio_completo(resultado_comparacao, producao_path, str(temp_usuario))
+        if tem_upload_producao:
+            temporarios, fixos = {'base': temp_producao, 'validado': temp_usuario}, {'layout': layout_path}
+        else:
+            temporarios, fixos = {'validado': temp_usuario}, {'layout': layout_path, 'base': Path(producao_path)}
+        assinaturas = {'base': indice_faturas_producao.assinatura} if indice_faturas_producao is not None else None
+        id_comparacao = _guardar_comparacao(timestamp, temporarios, fixos, sheet_index, printcenter=True,
+                                            assinaturas=assinaturas)
         dados_comparacao = {
             'timestamp': timestamp,
             'data_comparacao': datetime.now().isoformat(),
@@ -1367,7 +1735,8 @@ async def printcenter_comparar(
             resultado_comparacao=resultado_response,
             relatorio_texto=relatorio_texto,
             timestamp=timestamp,
-            dados_comparacao=dados_comparacao
+            dados_comparacao=dados_comparacao,
+            id_comparacao=id_comparacao
         )
     except HTTPException:
         raise
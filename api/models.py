@@ -67,6 +67,61 @@ class EstatisticasFaturasResponse(BaseModel):
     taxa_sucesso_nf: float
 
 
+class EstatisticaRegraResponse(BaseModel):
+    """Tempo e contagens de uma verificação do EnhancedValidator."""
+    nome: str
+    chamadas: int
+    erros: int
+    tempo_segundos: float
+
+
+class NFConciliadaResponse(BaseModel):
+    """NF do retorno da SEFAZ cruzada com a validação local."""
+    transaction_id: str
+    num_nfcom: str
+    status: str
+    fatura: str
+    nf: str
+    rejeicoes: List[str] = []
+    erros_locais: List[str] = []
+
+
+class ResultadoConciliacaoResponse(BaseModel):
+    """Conciliação do retorno da SEFAZ com a validação do lote."""
+    total_registros: int
+    registros_fora_do_lote: int
+    nfs_sem_retorno: int
+    rejeitadas_com_erro_local: List[NFConciliadaResponse] = []
+    rejeitadas_sem_erro_local: List[NFConciliadaResponse] = []
+    autorizadas_com_erro_local: List[NFConciliadaResponse] = []
+    autorizadas_sem_erro_local: int = 0
+    pendentes: int = 0
+    linhas_invalidas: List[int] = []
+
+
+class DiferencaEnvioResponse(BaseModel):
+    """Campo do envio à SEFAZ diferente do TXT do lote."""
+    num_nfcom: str
+    campo_envio: str
+    campo_layout: str
+    linha: int
+    valor_envio: str
+    valor_txt: str
+
+
+class ResultadoConferenciaEnvioResponse(BaseModel):
+    """Conferência do envio à SEFAZ com o TXT do lote."""
+    total_registros: int
+    nfs_conferidas: int
+    nfs_com_diferenca: int
+    registros_fora_do_lote: int
+    nfs_sem_56: int
+    nfs_repetidas_no_lote: int
+    diferencas: List[DiferencaEnvioResponse] = []
+    campos_sem_layout: List[str] = []
+    linhas_invalidas: List[int] = []
+
+
 class ResultadoCalculosResponse(BaseModel):
     """Resultado específico para validação de cálculos/totalizadores."""
     resultado_basico: ResultadoValidacaoResponse
@@ -75,6 +130,8 @@ class ResultadoCalculosResponse(BaseModel):
     linhas_completas_com_erro: Dict[int, str] = {}
     grupos_por_nf: Optional[Dict[str, Any]] = None  # chave "fatura|nf" -> {linhas:[], contribuintes_por_total:{campo_total:[linhas...]}}
     layout: LayoutResponse
+    estatisticas_regras: Optional[List[EstatisticaRegraResponse]] = None  # Só com medir_regras
+    conciliacao_sefaz: Optional[ResultadoConciliacaoResponse] = None  # Só com retorno_file
 
 
 class ValidarCalculosRequest(BaseModel):
@@ -100,6 +157,22 @@ class RegistroPreviewResponse(BaseModel):
     campos: Dict[str, str]  # nome_campo -> valor
 
 
+class VerificacaoRapidaResponse(BaseModel):
+    """Resultado da verificação rápida por amostragem de blocos de NF"""
+    total_linhas: int
+    linhas_verificadas: int
+    linhas_com_erro: int  # Linhas com erro entre as verificadas
+    total_blocos: int
+    blocos_verificados: int
+    taxa_sucesso_estimada: float
+    intervalo_confianca: List[float]  # [inferior, superior] em %
+    nivel_confianca: float
+    completo: bool  # Todos os blocos verificados: taxa exata
+    tipos_erro: Dict[str, int]
+    erros: List[ErroValidacaoResponse]
+    timestamp: str
+
+
 class ValidacaoCompleta(BaseModel):
     layout: LayoutResponse
     resultado: ResultadoValidacaoResponse
@@ -133,10 +206,27 @@ class DiferencaEstruturalCampoResponse(BaseModel):
 class DiferencaEstruturalLinhaResponse(BaseModel):
     numero_linha: int
     tipo_registro: str
-    arquivo_base_linha: str
-    arquivo_validado_linha: str
+    arquivo_base_linha: str = ""  # Vazio quando a visualização é pedida sob demanda
+    arquivo_validado_linha: str = ""
     diferencas_campos: List[DiferencaEstruturalCampoResponse]
     total_diferencas: int
+    numero_linha_base: int = 0  # 0 = sem linha correspondente
+    numero_linha_validado: int = 0
+
+
+class ParLinhasRequest(BaseModel):
+    numero_linha_base: int = 0
+    numero_linha_validado: int = 0
+    tipo_registro: str
+
+
+class LinhasRenderizadasResponse(BaseModel):
+    numero_linha_base: int
+    numero_linha_validado: int
+    tipo_registro: str
+    arquivo_base_linha: str
+    arquivo_validado_linha: str
+    linha_numeracao: str
 
 
 class FaturaComparadaResponse(BaseModel):
@@ -166,6 +256,7 @@ class ComparacaoEstruturalCompleta(BaseModel):
     relatorio_texto: str
     timestamp: str
     dados_comparacao: Optional[Dict] = None  # Dados para localStorage
+    id_comparacao: Optional[str] = None  # Para pedir a visualização das linhas em /api/comparacao/{id}/linhas
 
 
 class ServicoFaturaResponse(BaseModel):
@@ -83,4 +83,34 @@ export const buscarPorCampo = (arquivo, tipoRegistro, posicaoDe, posicaoAte, val
   })
 }
 
+// Tamanho dos lotes de pares enviados (limite do endpoint)
+const MAX_PARES_RENDERIZACAO = 2000
+
+/**
+ * Preenche a visualização (arquivo_base_linha, arquivo_validado_linha, linha_numeracao)
+ * das diferenças que ainda não a têm: as comparações devolvem só os números das linhas.
+ */
+export const carregarLinhasComparacao = async (idComparacao, diferencas) => {
+  if (!idComparacao) return
+  const pendentes = (diferencas || []).filter(
+    (dif) => !dif.arquivo_base_linha && !dif.arquivo_validado_linha
+  )
+
+  for (let inicio = 0; inicio < pendentes.length; inicio += MAX_PARES_RENDERIZACAO) {
+    const lote = pendentes.slice(inicio, inicio + MAX_PARES_RENDERIZACAO)
+    const response = await api.post(`/comparacao/${idComparacao}/linhas`, lote.map((dif) => ({
+      numero_linha_base: dif.numero_linha_base,
+      numero_linha_validado: dif.numero_linha_validado,
+      tipo_registro: dif.tipo_registro,
+    })))
+    response.data.forEach((linhas, i) => {
+      Object.assign(lote[i], {
+        arquivo_base_linha: linhas.arquivo_base_linha,
+        arquivo_validado_linha: linhas.arquivo_validado_linha,
+        linha_numeracao: linhas.linha_numeracao,
+      })
+    })
+  }
+}
+
 export default api
\ No newline at end of file
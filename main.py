@@ -16,6 +16,9 @@ from rich.text import Text
 from src.layout_parser import LayoutParser
 from src.file_validator import ValidadorArquivo
 from src.multi_record_validator import MultiRecordValidator
+from src.enhanced_validator import EnhancedValidator
+from src.sampling_validator import TAMANHO_AMOSTRA_BLOCOS
+from src.rule_loader import carregar_regras, regras_do_layout
 from src.structural_comparator import ComparadorEstruturalArquivos
 from src.report_generator import GeradorRelatorio
 import pandas as pd
@@ -128,12 +131,10 @@ def mostrar_resultado_validacao(resultado):
 
     # Mostrar resumo de erros se houver
     if resultado.erros:
-        from collections import Counter
-
         console.print("\n[bold]📊 Resumo de Erros:[/bold]")
 
         # Top 5 tipos de erro
-        tipos_erro = Counter(erro.erro_tipo for erro in resultado.erros)
+        tipos_erro = resultado.erros.contar_tipos()
         table_tipos = Table(title="Tipos de Erro Mais Comuns")
         table_tipos.add_column("Tipo", style="red")
         table_tipos.add_column("Quantidade", style="yellow")
@@ -146,7 +147,7 @@ def mostrar_resultado_validacao(resultado):
         console.print(table_tipos)
 
         # Top 5 campos com erro
-        campos_erro = Counter(erro.campo for erro in resultado.erros)
+        campos_erro = resultado.erros.contar_campos()
         table_campos = Table(title="Campos com Mais Erros")
         table_campos.add_column("Campo", style="red")
         table_campos.add_column("Quantidade", style="yellow")
@@ -181,6 +182,46 @@ def mostrar_resultado_validacao(resultado):
                 console.print(f"\n[dim]... e mais {len(resultado.erros) - 10} erros. Veja o relatório completo para detalhes.[/dim]")
 
 
+def mostrar_resultado_amostragem(resultado):
+    """Mostra o resultado da verificação rápida por amostragem"""
+    inferior, superior = resultado.intervalo_confianca
+    if resultado.completo:
+        taxa_texto = f"{resultado.taxa_sucesso_estimada:.2f}% (todos os blocos verificados)"
+    else:
+        taxa_texto = (f"{resultado.taxa_sucesso_estimada:.2f}% "
+                      f"(IC {resultado.nivel_confianca:.0%}: {inferior:.2f}% – {superior:.2f}%)")
+
+    stats_text = f"""
+[bold]Total de linhas:[/bold] {resultado.total_linhas:,}
+[bold]Linhas verificadas:[/bold] {resultado.linhas_verificadas:,}
+[bold]Blocos verificados:[/bold] {resultado.blocos_verificados:,} de {resultado.total_blocos:,}
+[bold red]Linhas com erro na amostra:[/bold red] {resultado.linhas_com_erro:,}
+[bold blue]Taxa de sucesso estimada:[/bold blue] {taxa_texto}
+"""
+
+    if resultado.taxa_sucesso_estimada >= 95:
+        cor_painel = "green"
+        icone = "✅"
+    elif resultado.taxa_sucesso_estimada >= 80:
+        cor_painel = "yellow"
+        icone = "⚠️"
+    else:
+        cor_painel = "red"
+        icone = "❌"
+
+    console.print(Panel(stats_text, title=f"{icone} Verificação Rápida (amostragem)", border_style=cor_painel))
+
+    if resultado.tipos_erro:
+        table_tipos = Table(title="Tipos de Erro Encontrados na Amostra")
+        table_tipos.add_column("Tipo", style="red")
+        table_tipos.add_column("Quantidade", style="yellow")
+
+        for tipo, qtd in resultado.tipos_erro.items():
+            table_tipos.add_row(tipo, f"{qtd:,}")
+
+        console.print(table_tipos)
+
+
 @click.command()
 @click.option('--layout', '-l', required=True, help='Caminho para o arquivo Excel com o layout')
 @click.option('--arquivo', '-a', required=True, help='Caminho para o arquivo TXT a ser validado')
@@ -190,7 +231,12 @@ def mostrar_resultado_validacao(resultado):
 @click.option('--silencioso', '-s', is_flag=True, help='Modo silencioso (apenas resultado final)')
 @click.option('--info-layout', is_flag=True, help='Mostrar apenas informações do layout')
 @click.option('--comparar-estrutural', is_flag=True, help='Realizar comparação estrutural com arquivo base')
-def main(layout, arquivo, arquivo_base, relatorio, max_erros, silencioso, info_layout, comparar_estrutural):
+@click.option('--processos', '-p', type=int, help='Número de processos para validar o arquivo em paralelo (shards)')
+@click.option('--verificacao-rapida', is_flag=True, help='Validar só header, trailer, primeiros blocos de NF e uma amostra (estimativa com intervalo de confiança)')
+@click.option('--amostra', type=int, default=TAMANHO_AMOSTRA_BLOCOS, show_default=True, help='Quantidade de blocos de NF sorteados na verificação rápida')
+@click.option('--regras', help='Arquivo de regras de impostos/totalizadores (padrão: <layout>.regras.json ao lado do layout, ou regras NFCOM)')
+def main(layout, arquivo, arquivo_base, relatorio, max_erros, silencioso, info_layout, comparar_estrutural, processos,
+         verificacao_rapida, amostra, regras):
     """
     Validador de Documentos Sequenciais
 
@@ -203,6 +249,12 @@ def main(layout, arquivo, arquivo_base, relatorio, max_erros, silencioso, info_l
 
     Comparação estrutural:
     python main.py -l layout.xlsx -a dados.txt -b dados_base.txt --comparar-estrutural
+
+    Validação paralela (arquivos grandes):
+    python main.py -l layout.xlsx -a dados.txt --processos 8
+
+    Verificação rápida por amostragem (sem relatórios):
+    python main.py -l layout.xlsx -a dados.txt --verificacao-rapida --amostra 300
     """
 
     if not silencioso:
@@ -305,10 +357,32 @@ def main(layout, arquivo, arquivo_base, relatorio, max_erros, silencioso, info_l
                     console.print(f"\n[bold red]❌ Muitas diferenças estruturais! Taxa de identidade: {resultado_comparacao.taxa_identidade:.2f}%[/bold red]")
                     sys.exit(2)
 
+            # Verificação rápida: só a amostra, sem relatórios
+            if verificacao_rapida:
+                task = progress.add_task("⚡ Verificando amostra do arquivo...", total=None)
+
+                if is_multi_registro:
+                    conjunto_regras = carregar_regras(regras) if regras else regras_do_layout(layout)
+                    validador_amostra = EnhancedValidator(LayoutParser().parse_excel(layout), conjunto_regras)
+                else:
+                    validador_amostra = validador
+                resultado_amostra = validador_amostra.validar_amostra(arquivo, tamanho_amostra=amostra)
+
+                progress.update(task, completed=True)
+
+                mostrar_resultado_amostragem(resultado_amostra)
+
+                if resultado_amostra.taxa_sucesso_estimada < 80:
+                    sys.exit(2)
+                elif resultado_amostra.taxa_sucesso_estimada < 95:
+                    sys.exit(1)
+                else:
+                    sys.exit(0)
+
             # Validação normal
             task = progress.add_task("🔍 Validando arquivo...", total=None)
 
-            resultado = validador.validar_arquivo(arquivo, max_erros)
+            resultado = validador.validar_arquivo(arquivo, max_erros, processos=processos)
 
             progress.update(task, completed=True)
 
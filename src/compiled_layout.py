@@ -0,0 +1,124 @@
+"""
+Plano de extração compilado a partir de um Layout.
+
+O plano é montado uma única vez por layout: para cada tipo de registro guarda
+as fatias (início, fim) já convertidas para índices Python, junto com o campo
+e o verificador de tipo correspondente. Assim os validadores e o comparador não
+precisam refiltrar `layout.campos` nem montar dicionários a cada linha.
+"""
+
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import re
+
+try:
+    from .models import Layout, CampoLayout
+    from .validators import ValidadorCampo, FalhaCampo
+except ImportError:
+    from models import Layout, CampoLayout
+    from validators import ValidadorCampo, FalhaCampo
+
+
+class CampoCompilado(NamedTuple):
+    """Campo do layout com a fatia pré-calculada (índices 0-based, fim exclusivo)"""
+    inicio: int
+    fim: int
+    indice: int  # Posição do campo em layout.campos
+    campo: CampoLayout
+    verificar_tipo: Callable[[str, CampoLayout], Optional[FalhaCampo]]
+
+
+def campo_pertence_ao_tipo(nome_campo: str, tipo_registro: str) -> bool:
+    """Verifica se um campo pertence a um tipo de registro específico"""
+    # Padrão: NFE{tipo}-CAMPO ou NFCOM{tipo}-CAMPO
+    if f"NFE{tipo_registro}-" in nome_campo:
+        return True
+
+    if f"NFCOM{tipo_registro}-" in nome_campo:
+        return True
+
+    # Para layouts simples sem prefixo NFE/NFCOM, considera todos os campos
+    if not nome_campo.startswith("NFE") and not nome_campo.startswith("NFCOM"):
+        return True
+
+    return False
+
+
+class CompiledLayout:
+    """Plano de extração por tipo de registro, construído uma vez a partir do Layout"""
+
+    _PADRAO_TIPO = re.compile(r'^(?:NFE|NFCOM)(\d+)-')
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+        self.campos_origem = layout.campos
+        self.campos: Tuple[CampoCompilado, ...] = tuple(
+            CampoCompilado(
+                inicio=campo.posicao_inicio - 1,
+                fim=campo.posicao_fim,
+                indice=indice,
+                campo=campo,
+                verificar_tipo=ValidadorCampo.verificador_do_tipo(campo.tipo)
+            )
+            for indice, campo in enumerate(layout.campos)
+        )
+
+        # Primeira ocorrência de cada nome (mesma semântica de Layout.get_campo)
+        self.por_nome: Dict[str, CampoCompilado] = {}
+        for campo_compilado in self.campos:
+            self.por_nome.setdefault(campo_compilado.campo.nome, campo_compilado)
+
+        self._por_tipo: Dict[str, Tuple[CampoCompilado, ...]] = {}
+        self._numeracao_por_tipo: Dict[str, str] = {}
+
+        # Tipos declarados nos nomes dos campos já saem compilados;
+        # tipos que só aparecem nos dados são compilados na primeira ocorrência
+        for campo_compilado in self.campos:
+            match = self._PADRAO_TIPO.match(campo_compilado.campo.nome)
+            if match:
+                self.campos_do_tipo(match.group(1))
+
+    def campos_do_tipo(self, tipo_registro: Optional[str]) -> Tuple[CampoCompilado, ...]:
+        """Retorna os campos do tipo de registro (todos os campos se tipo não informado)"""
+        if not tipo_registro:
+            return self.campos
+
+        plano = self._por_tipo.get(tipo_registro)
+        if plano is None:
+            plano = tuple(
+                campo_compilado for campo_compilado in self.campos
+                if campo_pertence_ao_tipo(campo_compilado.campo.nome, tipo_registro)
+            )
+            self._por_tipo[tipo_registro] = plano
+        return plano
+
+    def extrair(self, linha: str, tipo_registro: Optional[str] = None) -> Dict[str, str]:
+        """Extrai os campos de uma linha (filtrados por tipo de registro se informado)"""
+        return {
+            campo_compilado.campo.nome: linha[campo_compilado.inicio:campo_compilado.fim]
+            for campo_compilado in self.campos_do_tipo(tipo_registro)
+        }
+
+    def numeracao_do_tipo(self, tipo_registro: str) -> str:
+        """Linha de numeração dos campos do tipo (01, 02, ... centralizados em cada campo)"""
+        numeracao = self._numeracao_por_tipo.get(tipo_registro)
+        if numeracao is None:
+            numeros_campos = [
+                str(sequencia).zfill(2).center(campo_compilado.fim - campo_compilado.inicio)
+                for sequencia, campo_compilado in enumerate(self.campos_do_tipo(tipo_registro), 1)
+            ]
+            numeracao = "|".join(numeros_campos) + "|"
+            self._numeracao_por_tipo[tipo_registro] = numeracao
+        return numeracao
+
+
+def compilar_layout(layout: Layout) -> CompiledLayout:
+    """Retorna o plano compilado do layout, reaproveitando o já construído quando possível"""
+    compilado = getattr(layout, '_compilado', None)
+    if (compilado is None
+            or compilado.campos_origem is not layout.campos
+            or len(compilado.campos) != len(layout.campos)
+            # Campo trocado na mesma lista (os campos em si são imutáveis)
+            or any(compilado_campo.campo is not campo for compilado_campo, campo in zip(compilado.campos, layout.campos))):
+        compilado = CompiledLayout(layout)
+        layout._compilado = compilado
+    return compilado
@@ -4,173 +4,524 @@ Validador aprimorado que inclui:
 2. Validação de estrutura (registros duplicados)
 3. Contagem de notas fiscais por fatura
 4. Validação de unicidade (fatura + NF)
+
+Como os totais e o estado estrutural reiniciam a cada registro 01, os blocos de
+NF podem ser validados em processos separados (`validar_arquivo_paralelo`) ou
+reaproveitados de uma validação anterior do mesmo conteúdo
+(`validar_arquivo_incremental`); as conferências entre blocos (unicidade fatura +
+NF e quantidade de NF no header 00 e no trailer 99) ficam para a etapa de junção.
+
+Com um `IndiceUnicidadeNF`, a unicidade fatura + NF também é conferida contra os
+lotes já registrados no índice (COMBINACAO_DUPLICADA_LOTE).
+
+Com `totais_vetorizados` (padrão quando há NumPy), a passada só registra os
+registros 01 e 56 e os valores corrigidos das linhas com erro de cálculo; os
+totais de cada 56 saem depois, de somas segmentadas sobre os valores extraídos
+em bloco (`vectorized_totals`), com os mesmos erros e na mesma ordem.
 """
 
-from typing import Dict, List, Set, Tuple, Optional
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple, Optional
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left
+import hashlib
+import os
 import re
 
 try:
-    from .models import ResultadoValidacao, ErroValidacao, Layout
+    import numpy as np
+except ImportError:  # Sem NumPy os totais são acumulados linha a linha
+    np = None
+
+try:
+    from .models import (
+        ResultadoValidacao, ResultadoAmostragem, ErroValidacao, ErroLinhasCitadas, ModeloErroLinhas, Layout,
+        ColecaoErros, ParcialBlocoNF
+    )
     from .file_validator import ValidadorArquivo
     from .structural_comparator import ComparadorEstruturalArquivos
+    from .compiled_layout import compilar_layout
+    from .file_reader import ENCODINGS_WINDOWS
+    from .line_index import LineIndex
+    from .tax_rules import FalhaCalculo, digitos_para_int, fatia_campo
+    from .rule_loader import ConjuntoRegras, regras_padrao
+    from .parallel_validator import TAMANHO_MINIMO_SHARD, BlocoLinhas, dividir_em_blocos
+    from .validation_cache import CacheBlocosNF, assinatura_validacao, deslocar_parcial
+    from .uniqueness_index import IndiceUnicidadeNF, fatura_nf_do_registro_01
+    from .rule_stats import MedidorRegras
+    from .vectorized_totals import (
+        HAS_NUMPY, LINHAS_POR_BLOCO, extrair_inteiros, somas_segmentadas, valores_sem_estouro
+    )
+    from .sampling_validator import (
+        NIVEL_CONFIANCA, PRIMEIROS_BLOCOS, TAMANHO_AMOSTRA_BLOCOS,
+        linhas_do_plano, planejar_amostra, resultado_amostragem
+    )
 except ImportError:
-    from models import ResultadoValidacao, ErroValidacao, Layout
+    from models import (
+        ResultadoValidacao, ResultadoAmostragem, ErroValidacao, ErroLinhasCitadas, ModeloErroLinhas, Layout,
+        ColecaoErros, ParcialBlocoNF
+    )
     from file_validator import ValidadorArquivo
     from structural_comparator import ComparadorEstruturalArquivos
+    from compiled_layout import compilar_layout
+    from file_reader import ENCODINGS_WINDOWS
+    from line_index import LineIndex
+    from tax_rules import FalhaCalculo, digitos_para_int, fatia_campo
+    from rule_loader import ConjuntoRegras, regras_padrao
+    from parallel_validator import TAMANHO_MINIMO_SHARD, BlocoLinhas, dividir_em_blocos
+    from validation_cache import CacheBlocosNF, assinatura_validacao, deslocar_parcial
+    from uniqueness_index import IndiceUnicidadeNF, fatura_nf_do_registro_01
+    from rule_stats import MedidorRegras
+    from vectorized_totals import (
+        HAS_NUMPY, LINHAS_POR_BLOCO, extrair_inteiros, somas_segmentadas, valores_sem_estouro
+    )
+    from sampling_validator import (
+        NIVEL_CONFIANCA, PRIMEIROS_BLOCOS, TAMANHO_AMOSTRA_BLOCOS,
+        linhas_do_plano, planejar_amostra, resultado_amostragem
+    )
+
+
+# TRANSACTION_ID_CLARO sem posição no layout/regras (ou com a posição em branco):
+# 10 a 18 dígitos seguidos de 'FTC' (ex.: 2025083107360004FTC)
+PADRAO_TRANSACTION_ID = re.compile(r"\b\d{10,18}FTC\b")
+
+
+class ContextoBlocoNF(NamedTuple):
+    """O que um bloco de NFs validado à parte precisa saber do resto do arquivo"""
+    registro_anterior: Optional[Tuple[int, str]]  # Última linha antes do bloco: (numero_linha, tipo)
+    registros_01_anteriores: int  # Registros 01 antes do bloco (o trailer 99 confere com os 01 até ele)
 
 
 class EnhancedValidator:
     """Validador aprimorado com validações estruturais e cálculos de impostos"""
 
-    def __init__(self, layout: Layout):
+    # Campos de quantidade de NF aceitos no header 00 e no trailer 99
+    CAMPOS_HEADER_QTD_NF = ('NFE00-QTD-NF', 'NFE00-TOT-NF', 'NFE00-QTD-REG', 'NFE00-QTD-NOTAS')
+    CAMPOS_TRAILER_QTD_NF = ('NFE99-QTDE-DOC-NFCOM',)  # Campo oficial do layout NFCOM
+    # Campo do TRANSACTION_ID_CLARO no registro 90, se o arquivo de regras não indicar outro
+    CAMPO_TRANSACTION_ID = 'NFE90-TRANSACTION-ID-CLARO'
+    # Linhas contribuintes guardadas por total para os exemplos de cálculo do totalizador 56
+    MAX_EXEMPLOS_CALCULO = 3
+
+    def __init__(self, layout: Layout, regras: Optional[ConjuntoRegras] = None,
+                 indice_unicidade: Optional[IndiceUnicidadeNF] = None, medir_regras: bool = False,
+                 totais_vetorizados: Optional[bool] = None):
         self.layout = layout
+        self.compilado = compilar_layout(layout)
         self.validador_basico = ValidadorArquivo(layout)
 
         # Contadores para validações estruturais
         self.notas_fiscais_por_fatura: Dict[str, List[str]] = defaultdict(list)
         self.combinacoes_fatura_nf: Set[Tuple[str, str]] = set()
-        self.registros_por_linha: Dict[int, str] = {}
-        # Conteúdo bruto das linhas (para exemplos de cálculo em erros de totalizador)
-        self.linhas_conteudo: Dict[int, str] = {}
+        # Última linha processada: (numero_linha, tipo_registro), para as regras de repetição consecutiva
+        self.registro_anterior: Optional[Tuple[int, str]] = None
+        # Índice das linhas do arquivo em validação (para exemplos de cálculo em erros de totalizador)
+        self.indice_linhas: Optional[LineIndex] = None
 
         # Contexto atual de fatura e NF, e agrupamento por NF
         self.current_fatura: Optional[str] = None
         self.current_nf: Optional[str] = None
-        # key: (fatura, nf) -> {'linhas': List[int], 'contribuintes_por_total': Dict[str, List[int]], 'transaction_id_claro': Optional[str]}
+        # key: (fatura, nf) -> {'faixas': List[[inicio, fim)], 'transaction_id_claro': Optional[str]}
+        # Só faixas de linhas: o conteúdo e os contribuintes de cada total são buscados sob demanda
+        # no índice (linhas_do_grupo / contribuintes_do_grupo), sem crescer com o tamanho do arquivo
         self.grupos_nf: Dict[Tuple[str, str], Dict] = {}
+        # Contribuintes de cada total na NF corrente: as primeiras linhas (para os exemplos de
+        # cálculo do totalizador 56) e a quantidade total
+        self.contribuintes_nf_atual: Dict[str, List[int]] = {}
+        self.quantidade_contribuintes_nf_atual: Counter = Counter()
 
         # Declarações encontradas no header 00 (ex.: quantidade de NF)
         self.declaracoes_header: Dict[str, int] = {}
 
         # Contador de registros 01 (para ficar igual à SEFAZ)
         self.total_registros_01: int = 0
+        # Quantidade de registros 01 do arquivo inteiro quando só parte dele é percorrida (amostragem)
+        self.quantidade_nf_arquivo: Optional[int] = None
+        # Validando um bloco de NFs: registros 01 do arquivo antes da primeira linha do bloco
+        self.registros_01_antes_do_bloco: int = 0
 
         # Duplicatas para análise
         self.duplicatas_fatura_nf: List[Dict] = []
-
-        # Acumuladores para cálculos de impostos (como na comparação)
-        self.totais_acumulados: Dict[str, int] = {
-            'NFE56-TOT-VLR-PIS': 0,
-            'NFE56-TOT-VLR-COFINS': 0,
-            'NFE56-TOT-VLR-FUST': 0,
-            'NFE56-TOT-VLR-FUNTEL': 0,
-            'NFE56-TOT-VLR-ICMS': 0,
-            'NFE56-TOT-VLR-FCP': 0,
-            'NFE56-TOT-VLR-BC': 0,
-        }
+        # Validação de um bloco de NFs em paralelo: a unicidade fica para a junção, que recebe
+        # (numero_linha, fatura, nf, posição na lista de erros do bloco) de cada registro 01
+        self.unicidade_adiada: bool = False
+        self.registros_01_bloco: List[Tuple[int, str, str, int]] = []
+        # Blocos de NF reaproveitados do cache na última validação incremental
+        self.blocos_reaproveitados: int = 0
+        # Combinações já usadas em outros lotes; o lote em validação é ignorado pelo nome
+        # (`nome_lote` ou, se omitido, o nome do arquivo)
+        self.indice_unicidade = indice_unicidade
+        self.nome_lote: Optional[str] = None
+        self.lote_em_validacao: Optional[str] = None
+        # Tempo, chamadas e erros por verificação no resultado (estatisticas_regras)
+        self.medir_regras = medir_regras
+        # Totalizadores 56 conferidos ao final por somas segmentadas (None = automático, com NumPy)
+        self.totais_vetorizados = HAS_NUMPY if totais_vetorizados is None else totais_vetorizados and HAS_NUMPY
+        # Na passada com os totais adiados: linhas dos registros 01, (linha, posição na lista de
+        # erros, fatura, nf) de cada 56 e os pares (total, valor) das linhas com erro de cálculo
+        self.totais_adiados: bool = False
+        self.linhas_01_passada: List[int] = []
+        self.registros_56: List[Tuple[int, int, Optional[str], Optional[str]]] = []
+        self.valores_corrigidos: Dict[int, List[Tuple[str, int]]] = {}
 
         # Estado estrutural por NF
         self.item_aberto: Optional[Dict] = None  # {'linha_20': int, 'tem_36': bool, 'taxes_seen': Set[str]}
         self.contador_tipos_nf: Counter = Counter()
 
-        # Mapeamento EXATO da comparação estrutural
-        self.totals_map = {
-            'NFE56-TOT-VLR-PIS':        [{'tipo': '38', 'campo': 'NFE38-PIS-VLR'}],
-            'NFE56-TOT-VLR-COFINS':     [{'tipo': '40', 'campo': 'NFE40-COFINS-VLR'}],
-            'NFE56-TOT-VLR-FUST':       [{'tipo': '42', 'campo': 'NFE42-FUST-VLR'}],
-            'NFE56-TOT-VLR-FUNTEL':     [{'tipo': '44', 'campo': 'NFE44-FUNTEL-VLR'}],
-            'NFE56-TOT-VLR-ICMS':       [{'tipo': '22', 'campo': 'NFE22-ICM00-VLR'}],
-            'NFE56-TOT-VLR-FCP':        [{'tipo': '22', 'campo': 'NFE22-ICM00-VLR-FCP'}],
-            'NFE56-TOT-VLR-BC':         [{'tipo': '22', 'campo': 'NFE22-ICM00-VLR-BC'}],
-        }
+        # Mapa de totais e cálculos de impostos (IGUAIS à comparação estrutural), vindos do
+        # arquivo de regras; o conjunto e as regras compiladas ficam em cache pelo hash do arquivo
+        self.regras = regras if regras is not None else regras_padrao()
+        self.totals_map = self.regras.totals_map
+        self.calculation_validations = self.regras.calculation_validations
+
+        # Acumuladores para cálculos de impostos (como na comparação)
+        self.totais_acumulados: Dict[str, int] = {total_field: 0 for total_field in self.totals_map}
+
+        # Fatias dos campos usados pelas regras, resolvidas uma única vez
+        # nome -> (slice, posição final exigida na linha)
+        self.fatias_campos: Dict[str, Optional[Tuple[slice, int]]] = {}
+        for nome_campo in self._nomes_campos_configurados():
+            self._fatia_campo(nome_campo)
+
+        # Regras de cálculo compiladas uma única vez por layout, com as fatias já resolvidas
+        self.regras_calculo = self.regras.regras_calculo(self.compilado)
+
+        # Posição do TRANSACTION_ID_CLARO no registro 90 (None: só a busca pelo padrão)
+        self.fatia_transaction_id = self._resolver_fatia_transaction_id()
+
+    def __getstate__(self):
+        # O índice de unicidade (conexão SQLite) não vai para os processos dos blocos:
+        # a conferência entre lotes é feita na junção
+        estado = dict(self.__dict__)
+        estado['indice_unicidade'] = None
+        return estado
+
+    def _nomes_campos_configurados(self) -> List[str]:
+        """Lista os nomes de campo referenciados pelos mapas de totais, cálculos, header e trailer"""
+        nomes: List[str] = list(self.CAMPOS_HEADER_QTD_NF) + list(self.CAMPOS_TRAILER_QTD_NF)
+        for total_field, fontes in self.totals_map.items():
+            nomes.append(total_field)
+            nomes.extend(fonte['campo'] for fonte in fontes)
+        for config in self.calculation_validations.values():
+            for config_calc in [config] + config.get('validacoes_adicionais', []):
+                nomes.extend(config_calc[chave] for chave in ('bc_field', 'aliq_field', 'valor_field') if config_calc.get(chave))
+        return nomes
+
+    def _fatia_campo(self, nome_campo: str) -> Optional[Tuple[slice, int]]:
+        """Retorna (slice, posição final) do campo, resolvendo pelo layout na primeira vez"""
+        try:
+            return self.fatias_campos[nome_campo]
+        except KeyError:
+            fatia = fatia_campo(self.compilado, nome_campo)
+            self.fatias_campos[nome_campo] = fatia
+            return fatia
+
+    def _resolver_fatia_transaction_id(self) -> Optional[Tuple[slice, int]]:
+        """Fatia do TRANSACTION_ID_CLARO: campo ou posição do arquivo de regras, ou o campo padrão do layout"""
+        config = self.regras.transaction_id or {'campo': self.CAMPO_TRANSACTION_ID}
+        if 'campo' in config:
+            return self._fatia_campo(config['campo'])
+        inicio = config['posicao_inicio'] - 1
+        fim = inicio + config['tamanho']
+        return (slice(inicio, fim), fim)
+
+    def _transaction_id_do_registro_90(self, linha: str) -> Optional[str]:
+        """TRANSACTION_ID_CLARO da linha 90: recortado da posição configurada ou procurado pelo padrão
+        (linha curta para a posição ou valor recortado fora do padrão também caem na busca)"""
+        if self.fatia_transaction_id and len(linha) >= self.fatia_transaction_id[1]:
+            valor = linha[self.fatia_transaction_id[0]].strip()
+            if PADRAO_TRANSACTION_ID.fullmatch(valor):
+                return valor
+        encontrado = PADRAO_TRANSACTION_ID.search(linha)
+        return encontrado.group(0) if encontrado else None
+
+    def validar_amostra(self, caminho_arquivo: str, primeiros_blocos: int = PRIMEIROS_BLOCOS,
+                        tamanho_amostra: int = TAMANHO_AMOSTRA_BLOCOS, semente: Optional[int] = None,
+                        nivel_confianca: float = NIVEL_CONFIANCA) -> ResultadoAmostragem:
+        """Verificação rápida: header, trailer, primeiros blocos de NF e uma amostra aleatória
+
+        Cada bloco sorteado é validado inteiro (estrutura, cálculos e totalizador da NF);
+        header e trailer são conferidos contra a quantidade real de registros 01 do arquivo.
+        """
+        with LineIndex(caminho_arquivo, ENCODINGS_WINDOWS) as indice:
+            plano = planejar_amostra(indice, primeiros_blocos, tamanho_amostra, semente)
+            self.quantidade_nf_arquivo = plano.total_nf
+            try:
+                resultado = self.validar_arquivo(
+                    caminho_arquivo, indice_linhas=indice, numeros_linha=linhas_do_plano(plano)
+                )
+            finally:
+                self.quantidade_nf_arquivo = None
+
+        return resultado_amostragem(plano, resultado.erros, nivel_confianca)
+
+    def validar_arquivo_paralelo(self, caminho_arquivo: str, processos: Optional[int] = None,
+                                 indice_linhas: Optional[LineIndex] = None,
+                                 tamanho_minimo_bloco: int = TAMANHO_MINIMO_SHARD) -> ResultadoValidacao:
+        """Valida blocos de NF (cortados em registros 01) num pool de processos
 
-        # Mapeamento para validação de cálculos individuais EXATO da comparação
-        self.calculation_validations = {
-            '38': {  # PIS
-                'bc_field': 'NFE38-PIS-VLR-BC',
-                'aliq_field': 'NFE38-PIS-ALIQ',
-                'valor_field': 'NFE38-PIS-VLR',
-                'nome_imposto': 'PIS'
-            },
-            '40': {  # COFINS
-                'bc_field': 'NFE40-COFINS-VLR-BC',
-                'aliq_field': 'NFE40-COFINS-ALIQ',
-                'valor_field': 'NFE40-COFINS-VLR',
-                'nome_imposto': 'COFINS'
-            },
-            '42': {  # FUST
-                'bc_field': 'NFE42-FUST-VLR-BC',
-                'aliq_field': 'NFE42-FUST-ALIQ',
-                'valor_field': 'NFE42-FUST-VLR',
-                'nome_imposto': 'FUST'
-            },
-            '44': {  # FUNTEL
-                'bc_field': 'NFE44-FUNTEL-VLR-BC',
-                'aliq_field': 'NFE44-FUNTEL-ALIQ',
-                'valor_field': 'NFE44-FUNTEL-VLR',
-                'nome_imposto': 'FUNTEL'
-            },
-            '30': {  # ICMS (tipo 90)
-                'bc_field': 'NFE30-ICM90-VLR-BC',
-                'aliq_field': 'NFE30-ICM90-ALIQ',
-                'valor_field': 'NFE30-ICM90-VLR',
-                'nome_imposto': 'ICMS'
-            },
-            '22': {  # ICMS (tipo 00)
-                'bc_field': 'NFE22-ICM00-VLR-BC',
-                'aliq_field': 'NFE22-ICM00-ALIQ',
-                'valor_field': 'NFE22-ICM00-VLR',
-                'nome_imposto': 'ICMS',
-                'validacoes_adicionais': [
-                    {
-                        'bc_field': 'NFE22-ICM00-VLR-BC',
-                        'aliq_field': 'NFE22-ICM00-ALIQ-FCP',
-                        'valor_field': 'NFE22-ICM00-VLR-FCP',
-                        'nome_imposto': 'FCP'
-                    }
-                ]
+        O resultado é o mesmo de `validar_arquivo`: os erros de cada bloco já vêm com a
+        numeração global, a unicidade fatura + NF é refeita na junção em ordem de arquivo
+        e o estado final (totais, grupos por NF, estatísticas) fica neste validador.
+        """
+        processos = processos or os.cpu_count() or 1
+        self.lote_em_validacao = self.nome_lote or os.path.basename(caminho_arquivo)
+        indice_proprio = indice_linhas is None
+        if indice_proprio:
+            indice_linhas = LineIndex(caminho_arquivo, ENCODINGS_WINDOWS)
+
+        try:
+            linhas_01 = indice_linhas.linhas_com_prefixo(b'01')
+            # Só corta em 01 que abre contexto de fatura/NF; senão a NF anterior continuaria no bloco seguinte
+            blocos = dividir_em_blocos(
+                indice_linhas, linhas_01, processos, tamanho_minimo_bloco,
+                aceitar=lambda numero_linha: self._abre_bloco_nf(indice_linhas, numero_linha)
+            )
+            if len(blocos) <= 1:
+                return self.validar_arquivo(caminho_arquivo, indice_linhas=indice_linhas)
+
+            contextos = [self._contexto_bloco(indice_linhas, bloco.primeira_linha, linhas_01) for bloco in blocos]
+            encoding = indice_linhas.encoding
+        finally:
+            if indice_proprio:
+                indice_linhas.close()
+
+        with ProcessPoolExecutor(max_workers=min(processos, len(blocos))) as executor:
+            futuros = [
+                executor.submit(_validar_bloco_nf, self, caminho_arquivo, bloco, encoding, contexto)
+                for bloco, contexto in zip(blocos, contextos)
+            ]
+            parciais = [futuro.result() for futuro in futuros]
+
+        return self._mesclar_blocos_nf(parciais)
+
+    def validar_arquivo_incremental(self, caminho_arquivo: str, cache: CacheBlocosNF,
+                                    indice_linhas: Optional[LineIndex] = None) -> ResultadoValidacao:
+        """Revalida só os blocos de NF cujo conteúdo mudou desde a última validação no cache
+
+        Cada NF (do 01 até o próximo 01) é procurada no cache por fatura + NF e pelo hash dos
+        seus bytes; o bloco antes da primeira NF (header 00) e o último (trailer 99 e estado
+        final) são sempre validados. O resultado é o mesmo de `validar_arquivo`.
+        """
+        indice_proprio = indice_linhas is None
+        if indice_proprio:
+            indice_linhas = LineIndex(caminho_arquivo, ENCODINGS_WINDOWS)
+        self.blocos_reaproveitados = 0
+        self.lote_em_validacao = self.nome_lote or os.path.basename(caminho_arquivo)
+
+        try:
+            # Blocos juntados à medida que saem: nenhum resultado parcial fica acumulado
+            return self._mesclar_blocos_nf(self._blocos_incrementais(caminho_arquivo, cache, indice_linhas))
+        finally:
+            if indice_proprio:
+                indice_linhas.close()
+
+    def _blocos_incrementais(self, caminho_arquivo: str, cache: CacheBlocosNF,
+                             indice_linhas: LineIndex) -> Iterator[ParcialBlocoNF]:
+        """Blocos de NF em ordem: do cache quando o conteúdo não mudou, senão validados agora"""
+        # Validador próprio para os blocos: o estado deste recebe a junção
+        # Blocos de uma NF: a extração em bloco dos totais não compensa
+        validador_bloco = EnhancedValidator(self.layout, self.regras, medir_regras=self.medir_regras,
+                                            totais_vetorizados=False)
+        linhas_01 = indice_linhas.linhas_com_prefixo(b'01')
+        linhas_99 = indice_linhas.linhas_com_prefixo(b'99')
+        assinatura = assinatura_validacao(self.layout, self.regras, indice_linhas.encoding)
+
+        inicios = [1] + [n for n in linhas_01 if n > 1 and self._abre_bloco_nf(indice_linhas, n)]
+        fins = inicios[1:] + [len(indice_linhas) + 1]
+
+        for ordem, (inicio, fim) in enumerate(zip(inicios, fins)):
+            contexto = self._contexto_bloco(indice_linhas, inicio, linhas_01)
+            chave = digest = None
+            if 0 < ordem < len(inicios) - 1:
+                chave = '|'.join(fatura_nf_do_registro_01(indice_linhas.get_line(inicio)))
+                # O bloco depende do tipo da linha anterior e, se tiver trailer, dos 01 antes dele
+                tem_99 = bisect_left(linhas_99, inicio) < bisect_left(linhas_99, fim)
+                digest = hashlib.sha256(b'|'.join((
+                    indice_linhas.bytes_das_linhas(inicio, fim),
+                    (contexto.registro_anterior[1] if contexto.registro_anterior else '').encode(),
+                    str(contexto.registros_01_anteriores if tem_99 else '').encode()
+                ))).hexdigest()
+
+                parcial = cache.obter(assinatura, chave, digest)
+                if parcial is not None:
+                    self.blocos_reaproveitados += 1
+                    yield deslocar_parcial(parcial, inicio - parcial.primeira_linha)
+                    continue
+
+            resultado = validador_bloco.validar_arquivo(
+                caminho_arquivo, indice_linhas=indice_linhas,
+                numeros_linha=range(inicio, fim), contexto_bloco=contexto
+            )
+            parcial = validador_bloco._parcial_do_bloco(inicio, resultado)
+            if chave is not None:
+                cache.guardar(assinatura, chave, digest, parcial)
+            yield parcial
+
+        cache.salvar()
+
+    @staticmethod
+    def _abre_bloco_nf(indice_linhas: LineIndex, numero_linha: int) -> bool:
+        """Registro 01 com fatura e NF (abre o contexto de uma nova NF)"""
+        return len(indice_linhas.get_line(numero_linha)) >= 32
+
+    @staticmethod
+    def _contexto_bloco(indice_linhas: LineIndex, primeira_linha: int, linhas_01: List[int]) -> ContextoBlocoNF:
+        """Contexto de um bloco que começa em `primeira_linha` (`linhas_01`: registros 01 do arquivo, em ordem)"""
+        anterior = indice_linhas.get(primeira_linha - 1, '')
+        registro_anterior = (primeira_linha - 1, anterior[:2]) if len(anterior) >= 2 else None
+        return ContextoBlocoNF(registro_anterior, bisect_left(linhas_01, primeira_linha))
+
+    def _parcial_do_bloco(self, primeira_linha: int, resultado: ResultadoValidacao) -> ParcialBlocoNF:
+        """Resultado e estado do bloco recém-validado com `contexto_bloco`"""
+        return ParcialBlocoNF(
+            primeira_linha=primeira_linha,
+            total_linhas=resultado.total_linhas,
+            erros=resultado.erros,
+            registros_01=self.registros_01_bloco,
+            grupos_nf=dict(self.grupos_nf),
+            total_registros_01=self.total_registros_01,
+            declaracoes_header=dict(self.declaracoes_header),
+            estatisticas_regras=resultado.estatisticas_regras,
+            estado_final={
+                'totais_acumulados': dict(self.totais_acumulados),
+                'contribuintes_nf_atual': self.contribuintes_nf_atual,
+                'quantidade_contribuintes_nf_atual': self.quantidade_contribuintes_nf_atual,
+                'current_fatura': self.current_fatura,
+                'current_nf': self.current_nf,
+                'item_aberto': self.item_aberto,
+                'contador_tipos_nf': self.contador_tipos_nf,
+                'registro_anterior': self.registro_anterior,
             }
-        }
+        )
 
-    def validar_arquivo(self, caminho_arquivo: str, max_erros: int = None) -> ResultadoValidacao:
-        """Validação focada nos 4 pontos específicos (sem erros básicos de campo)"""
+    def _mesclar_blocos_nf(self, parciais: Iterable[ParcialBlocoNF]) -> ResultadoValidacao:
+        """Junta os blocos em ordem: unicidade fatura + NF, grupos, estado final e header 00
+
+        Medindo as regras, as medições dos blocos validados agora são somadas (os vindos do
+        cache não têm) e a unicidade feita aqui aparece à parte, como `unicidade`.
+        """
+        self._reset_contadores()
+        erros_aprimorados = ColecaoErros()
+        total_linhas = 0
+        estado_final = None
+        medidor = MedidorRegras() if self.medir_regras else None
+        verificar_unicidade = self._verificar_unicidade
+        validar_header = self._validar_header_qtd_nf
+        if medidor is not None:
+            verificar_unicidade = medidor.envolver('unicidade', verificar_unicidade)
+            validar_header = medidor.envolver('header_00', validar_header)
+
+        for parcial in parciais:
+            if medidor is not None and parcial.estatisticas_regras:
+                medidor.somar(parcial.estatisticas_regras)
+            # Duplicatas entram na mesma posição em que a passada sequencial as colocaria
+            erros_unicidade: Dict[int, List[ErroValidacao]] = defaultdict(list)
+            for numero_linha, num_fatura, num_nf, posicao in parcial.registros_01:
+                erros_unicidade[posicao].extend(verificar_unicidade(numero_linha, num_fatura, num_nf))
+            for posicao, erro in enumerate(parcial.erros):
+                erros_aprimorados.extend(erros_unicidade.pop(posicao, ()))
+                erros_aprimorados.append(erro)
+            for erros in erros_unicidade.values():
+                erros_aprimorados.extend(erros)
+
+            total_linhas += parcial.total_linhas
+            self.total_registros_01 += parcial.total_registros_01
+            self.declaracoes_header.update(parcial.declaracoes_header)
+            for key, grupo in parcial.grupos_nf.items():
+                destino = self.grupos_nf.setdefault(key, {'faixas': []})
+                for inicio, fim in grupo['faixas']:
+                    if destino['faixas'] and destino['faixas'][-1][1] == inicio:
+                        destino['faixas'][-1][1] = fim
+                    else:
+                        destino['faixas'].append([inicio, fim])
+                if 'transaction_id_claro' in grupo:
+                    destino['transaction_id_claro'] = grupo['transaction_id_claro']
+            estado_final = parcial.estado_final
+
+        # Estado da última NF: o do último bloco
+        for nome, valor in (estado_final or {}).items():
+            setattr(self, nome, valor)
+
+        erros_aprimorados.extend(validar_header())
+        return self._montar_resultado(total_linhas, erros_aprimorados, medidor)
+
+    def validar_arquivo(self, caminho_arquivo: str, max_erros: int = None,
+                        indice_linhas: Optional[LineIndex] = None,
+                        numeros_linha: Optional[Iterable[int]] = None,
+                        contexto_bloco: Optional[ContextoBlocoNF] = None) -> ResultadoValidacao:
+        """Validação focada nos 4 pontos específicos (sem erros básicos de campo)
+
+        Args:
+            indice_linhas: índice já aberto do arquivo (ex.: pela API, que o reaproveita
+                para as linhas com erro); se omitido, um índice próprio é aberto e fechado aqui
+            numeros_linha: percorrer só estas linhas, em ordem (padrão: o arquivo inteiro)
+            contexto_bloco: validando só um bloco de NFs (`indice_linhas` da faixa do bloco);
+                unicidade e header 00 ficam para a junção (`validar_arquivo_paralelo`)
+        """
 
         # Reset dos contadores
         self._reset_contadores()
+        if contexto_bloco is not None:
+            self.registro_anterior = contexto_bloco.registro_anterior
+            self.registros_01_antes_do_bloco = contexto_bloco.registros_01_anteriores
+            self.unicidade_adiada = True
+        else:
+            self.lote_em_validacao = self.nome_lote or os.path.basename(caminho_arquivo)
+
+        # Verificações da passada (medidas, com `medir_regras`)
+        medidor = MedidorRegras() if self.medir_regras else None
+        (validar_estrutura_consecutiva, processar_registro_01, validar_calculos_linha, acumular_valores_impostos,
+         validar_totalizador_56, validar_trailer_99, validar_estrutura_nf, validar_header_qtd_nf,
+         conferir_totais_adiados) = self._verificacoes(medidor)
 
         # Fazer APENAS as validações aprimoradas (4 pontos específicos)
-        erros_aprimorados = []
+        erros_aprimorados = ColecaoErros()
         total_linhas = 0
+        indice_proprio = indice_linhas is None
+        refazer_linha_a_linha = False
 
-        # Tentar ler com UTF-8, se falhar usar latin-1
         try:
-            # Tentar abrir preferencialmente em UTF-8, se falhar tentar CP1252 e por fim latin-1
-            try:
-                with open(caminho_arquivo, 'r', encoding='utf-8') as arquivo:
-                    linhas = arquivo.readlines()
-            except UnicodeDecodeError:
-                try:
-                    with open(caminho_arquivo, 'r', encoding='cp1252') as arquivo:
-                        linhas = arquivo.readlines()
-                except UnicodeDecodeError:
-                    with open(caminho_arquivo, 'r', encoding='latin-1') as arquivo:
-                        linhas = arquivo.readlines()
-
-            total_linhas = len([l for l in linhas if l.strip()])
+            if indice_proprio:
+                # Leitura única: UTF-8, com queda para CP1252 e por fim latin-1 nas linhas que falharem
+                indice_linhas = LineIndex(caminho_arquivo, ENCODINGS_WINDOWS)
+            # Linhas dos breakdowns do totalizador são buscadas no índice, sem cópia em memória
+            self.indice_linhas = indice_linhas
+
+            if numeros_linha is None:
+                faixa = (indice_linhas.primeira_linha, indice_linhas.ultima_linha + 1)
+            elif isinstance(numeros_linha, range) and numeros_linha.step == 1:
+                faixa = (numeros_linha.start, numeros_linha.stop)
+            else:
+                faixa = None
+            if faixa is not None:
+                linhas_numeradas = indice_linhas.linhas_numeradas(*faixa)
+            else:
+                linhas_numeradas = ((n, indice_linhas.get_line(n)) for n in numeros_linha)
+            # Totais vetorizados só numa faixa contínua de linhas (não na amostragem)
+            self.totais_adiados = self.totais_vetorizados and faixa is not None
 
             # Primeira passada: coletar informações e validar estrutura
-            for numero_linha, linha_content in enumerate(linhas, 1):
+            for numero_linha, linha_content in linhas_numeradas:
+                if linha_content.strip():
+                    total_linhas += 1
                 try:
-                    linha_content = linha_content.rstrip('\n\r')
-                    # Guardar conteúdo da linha para breakdowns posteriores
-                    self.linhas_conteudo[numero_linha] = linha_content
-
                     if len(linha_content) < 2:
                         continue
 
                     # Detectar tipo de registro
                     tipo_registro = linha_content[:2]
-                    self.registros_por_linha[numero_linha] = tipo_registro
                 except Exception as e:
                     # Capturar erro específico da linha e continuar
-                    erro_linha = ErroValidacao(
-                        linha=numero_linha,
-                        campo="LINHA",
-                        valor_encontrado=str(e),
-                        erro_tipo="ERRO_LEITURA",
-                        descricao=f"Erro ao processar linha {numero_linha}: {str(e)}",
-                        valor_esperado="Linha válida"
+                    erro_linha = ErroLinhasCitadas(
+                        numero_linha,
+                        ModeloErroLinhas(
+                            campo="LINHA",
+                            erro_tipo="ERRO_LEITURA",
+                            descricao="Erro ao processar linha {0}: " + ModeloErroLinhas.literal(str(e)),
+                            valor_esperado="Linha válida"
+                        ),
+                        str(e), (numero_linha,)
                     )
                     erros_aprimorados.append(erro_linha)
                     continue
@@ -180,13 +531,13 @@ class EnhancedValidator:
                     self._capturar_declaracoes_header_00(numero_linha, linha_content)
 
                 # Validação 1: Estrutura - evitar registros duplicados consecutivos
-                erros_estrutura = self._validar_estrutura_consecutiva(numero_linha, tipo_registro)
+                erros_estrutura = validar_estrutura_consecutiva(numero_linha, tipo_registro)
                 erros_aprimorados.extend(erros_estrutura)
 
                 # Validação 2: Coletar dados de fatura e NF (registro 01)
                 if tipo_registro == '01':
                     # Primeiro processa o 01 para atualizar o contexto da NF atual
-                    erros_unicidade = self._processar_registro_01(numero_linha, linha_content)
+                    erros_unicidade = processar_registro_01(numero_linha, linha_content, len(erros_aprimorados))
                     erros_aprimorados.extend(erros_unicidade)
                     # Agora registre a própria linha 01 no grupo correto (NF atual)
                     self._registrar_linha_no_grupo(numero_linha)
@@ -196,64 +547,52 @@ class EnhancedValidator:
 
                 # Validação 3 & 3.5: Validar cálculos E acumular valores corretos
                 # IMPORTANTE: Fazer os cálculos primeiro e acumular apenas valores CORRETOS
-                erros_calculos_linha = self._validar_calculos_linha(numero_linha, tipo_registro, linha_content)
+                erros_calculos_linha = validar_calculos_linha(numero_linha, tipo_registro, linha_content)
                 erros_aprimorados.extend(erros_calculos_linha)
 
                 # Acumular valores (usando valores corretos se houver erro de cálculo)
-                self._acumular_valores_impostos(numero_linha, tipo_registro, linha_content, erros_calculos_linha)
+                acumular_valores_impostos(numero_linha, tipo_registro, linha_content, erros_calculos_linha)
 
                 # Validação 4: Verificar totalizador (registro 56)
                 if tipo_registro == '56':
-                    erros_totais = self._validar_totalizador_56(numero_linha, linha_content)
+                    erros_totais = validar_totalizador_56(numero_linha, linha_content, len(erros_aprimorados))
                     erros_aprimorados.extend(erros_totais)
 
                 # Capturar TRANSACTION_ID_CLARO dos registros 90 (por NF)
-                if tipo_registro == '90':
-                    try:
-                        # Heurística: procurar padrão 14 dígitos + 6 dígitos + 'FTC' (ex.: 2025083107360004FTC)
-                        m = re.search(r"\b\d{10,18}FTC\b", linha_content)
-                        if m and self.current_fatura is not None and self.current_nf is not None:
-                            key_g = (self.current_fatura, self.current_nf)
-                            self.grupos_nf.setdefault(key_g, {
-                                'linhas': [],
-                                'contribuintes_por_total': {k: [] for k in self.totais_acumulados.keys()}
-                            })
-                            self.grupos_nf[key_g]['transaction_id_claro'] = m.group(0)
-                    except Exception:
-                        pass
+                if tipo_registro == '90' and self.current_fatura is not None and self.current_nf is not None:
+                    transaction_id = self._transaction_id_do_registro_90(linha_content)
+                    if transaction_id:
+                        # O grupo da NF já existe: a linha 90 acabou de ser registrada nele
+                        self.grupos_nf[(self.current_fatura, self.current_nf)]['transaction_id_claro'] = transaction_id
 
                 # Validação 5: Verificar trailer final (apenas registro 99) - quantidade de notas fiscais
                 if tipo_registro == '99':
-                    erros_trailer = self._validar_trailer_99(numero_linha, linha_content)
+                    erros_trailer = validar_trailer_99(numero_linha, linha_content)
                     erros_aprimorados.extend(erros_trailer)
 
                 # Validação estrutural por NF: regras de sequência
-                erros_seq = self._validar_estrutura_nf(numero_linha, tipo_registro)
+                erros_seq = validar_estrutura_nf(numero_linha, tipo_registro)
                 erros_aprimorados.extend(erros_seq)
 
+                self.registro_anterior = (numero_linha, tipo_registro)
+
                 # Removido limite de erros - queremos ver TODOS os problemas
 
+            if self.totais_adiados:
+                erros_aprimorados = self._inserir_erros_totais(
+                    erros_aprimorados, conferir_totais_adiados(indice_linhas, *faixa)
+                )
+
             # Validações adicionais pós-passada: conferir header 00 vs contagem real de NF
-            if self.declaracoes_header:
-                    quantidade_real_nf = self.total_registros_01  # Igual SEFAZ: total registros 01
-                    for campo_nome, qtd_decl in self.declaracoes_header.items():
-                        if 'QTD-NF' in campo_nome or 'TOT-NF' in campo_nome or 'QTD-NOTAS' in campo_nome:
-                            if qtd_decl != quantidade_real_nf:
-                                erro = ErroValidacao(
-                                    linha=1,
-                                    campo=campo_nome,
-                                    valor_encontrado=str(qtd_decl),
-                                    erro_tipo='HEADER_QTD_NF',
-                                    descricao=(
-                                        f"Quantidade de NF no header ({qtd_decl}) difere da quantidade real encontrada ({quantidade_real_nf})"
-                                    ),
-                                    valor_esperado=str(quantidade_real_nf)
-                                )
-                                erros_aprimorados.append(erro)
+            if contexto_bloco is None:
+                erros_aprimorados.extend(validar_header_qtd_nf())
 
                 # Não precisamos mais da validação 5 aqui, pois já está sendo feita linha por linha
 
         except Exception as e:
+            if self.totais_adiados:
+                # A passada linha a linha pararia nesta linha, com os erros de totais até ela
+                refazer_linha_a_linha = True
             # Em caso de erro, adicionar como erro de validação
             erro_arquivo = ErroValidacao(
                 linha=1,
@@ -264,12 +603,44 @@ class EnhancedValidator:
                 valor_esperado="Arquivo válido"
             )
             erros_aprimorados.append(erro_arquivo)
+        finally:
+            self.indice_linhas = None
+            if indice_proprio and indice_linhas is not None:
+                indice_linhas.close()
+
+        if refazer_linha_a_linha:
+            self.totais_vetorizados = False
+            try:
+                return self.validar_arquivo(caminho_arquivo, max_erros, None if indice_proprio else indice_linhas,
+                                            numeros_linha, contexto_bloco)
+            finally:
+                self.totais_vetorizados = True
 
         # Sem limite de erros - retornar TODOS os problemas encontrados
-        todos_erros = erros_aprimorados
+        return self._montar_resultado(total_linhas, erros_aprimorados, medidor)
+
+    def _verificacoes(self, medidor: Optional[MedidorRegras]) -> Tuple:
+        """Verificações da passada na ordem do laço, envolvidas pelo medidor se houver"""
+        verificacoes = (
+            ('estrutura_consecutiva', self._validar_estrutura_consecutiva),
+            ('registro_01', self._processar_registro_01),
+            ('calculos_linha', self._validar_calculos_linha),
+            ('acumulacao', self._acumular_valores_impostos),
+            ('totalizador_56', self._validar_totalizador_56),
+            ('trailer_99', self._validar_trailer_99),
+            ('estrutura_nf', self._validar_estrutura_nf),
+            ('header_00', self._validar_header_qtd_nf),
+            ('totais_vetorizados', self._conferir_totais_adiados),
+        )
+        if medidor is None:
+            return tuple(funcao for _, funcao in verificacoes)
+        return tuple(medidor.envolver(nome, funcao) for nome, funcao in verificacoes)
 
+    def _montar_resultado(self, total_linhas: int, todos_erros: ColecaoErros,
+                          medidor: Optional[MedidorRegras] = None) -> ResultadoValidacao:
+        """Resultado com as estatísticas focadas nos 4 pontos"""
         # Recalcular estatísticas focadas nos 4 pontos
-        linhas_com_erro_total = len(set(erro.linha for erro in todos_erros))
+        linhas_com_erro_total = len(todos_erros.linhas_distintas())
         linhas_validas_total = total_linhas - linhas_com_erro_total
         taxa_sucesso_total = (linhas_validas_total / total_linhas * 100) if total_linhas > 0 else 100
 
@@ -278,23 +649,53 @@ class EnhancedValidator:
             linhas_validas=linhas_validas_total,
             linhas_com_erro=linhas_com_erro_total,
             erros=todos_erros,  # TODOS os erros, sem limite
-            taxa_sucesso=taxa_sucesso_total
+            taxa_sucesso=taxa_sucesso_total,
+            estatisticas_regras=medidor.como_lista() if medidor is not None else None
         )
 
+    def _validar_header_qtd_nf(self) -> List[ErroValidacao]:
+        """Confere as quantidades de NF declaradas no header 00 com a contagem real"""
+        erros = []
+        if self.declaracoes_header:
+            quantidade_real_nf = self._quantidade_real_nf()  # Igual SEFAZ: total registros 01
+            for campo_nome, qtd_decl in self.declaracoes_header.items():
+                if 'QTD-NF' in campo_nome or 'TOT-NF' in campo_nome or 'QTD-NOTAS' in campo_nome:
+                    if qtd_decl != quantidade_real_nf:
+                        erro = ErroValidacao(
+                            linha=1,
+                            campo=campo_nome,
+                            valor_encontrado=str(qtd_decl),
+                            erro_tipo='HEADER_QTD_NF',
+                            descricao=(
+                                f"Quantidade de NF no header ({qtd_decl}) difere da quantidade real encontrada ({quantidade_real_nf})"
+                            ),
+                            valor_esperado=str(quantidade_real_nf)
+                        )
+                        erros.append(erro)
+        return erros
+
     def _reset_contadores(self):
         """Reset todos os contadores para nova validação"""
         self.notas_fiscais_por_fatura.clear()
         self.combinacoes_fatura_nf.clear()
-        self.registros_por_linha.clear()
-        self.linhas_conteudo.clear()
+        self.registro_anterior = None
         self.current_fatura = None
         self.current_nf = None
         self.grupos_nf.clear()
+        self.contribuintes_nf_atual = {}
+        self.quantidade_contribuintes_nf_atual = Counter()
         self.declaracoes_header.clear()
         self.item_aberto = None
         self.contador_tipos_nf = Counter()
         self.total_registros_01 = 0
+        self.registros_01_antes_do_bloco = 0
         self.duplicatas_fatura_nf.clear()
+        self.unicidade_adiada = False
+        self.registros_01_bloco = []
+        self.totais_adiados = False
+        self.linhas_01_passada = []
+        self.registros_56 = []
+        self.valores_corrigidos = {}
 
         for key in self.totais_acumulados:
             self.totais_acumulados[key] = 0
@@ -305,28 +706,41 @@ class EnhancedValidator:
 
         # Verificar se o registro anterior é do mesmo tipo
         linha_anterior = numero_linha - 1
-        if linha_anterior in self.registros_por_linha:
-            tipo_anterior = self.registros_por_linha[linha_anterior]
-
+        tipo_anterior = self._tipo_registro_da_linha_anterior(numero_linha)
+        if tipo_anterior is not None:
             # Exceção para header/trailer (00, 99) e registros de item/impostos (20, 22, 36, 38, 40, 42, 44)
             # que podem se repetir para múltiplos itens
             tipos_permitidos_repetir = ['00', '99', '20', '22', '36', '38', '40', '42', '44', '70']
             
             if tipo_anterior == tipo_registro and tipo_registro not in tipos_permitidos_repetir:
-                erro = ErroValidacao(
-                    linha=numero_linha,
-                    campo=f"NFE{tipo_registro}-TP-REG",
-                    valor_encontrado=tipo_registro,
-                    erro_tipo="ESTRUTURA_DUPLICADA",
-                    descricao=f"Registro tipo {tipo_registro} duplicado consecutivamente (linha anterior: {linha_anterior})",
-                    valor_esperado="Tipos de registro diferentes em sequência"
+                erro = ErroLinhasCitadas(
+                    numero_linha,
+                    ModeloErroLinhas(
+                        campo=f"NFE{tipo_registro}-TP-REG",
+                        erro_tipo="ESTRUTURA_DUPLICADA",
+                        descricao=(f"Registro tipo {ModeloErroLinhas.literal(tipo_registro)} duplicado "
+                                   "consecutivamente (linha anterior: {0})"),
+                        valor_esperado="Tipos de registro diferentes em sequência"
+                    ),
+                    tipo_registro, (linha_anterior,)
                 )
                 erros.append(erro)
 
         return erros
 
-    def _processar_registro_01(self, numero_linha: int, linha_content: str) -> List[ErroValidacao]:
-        """Validação 2: Processar registro 01 para fatura/NF e verificar unicidade"""
+    def _tipo_registro_da_linha_anterior(self, numero_linha: int) -> Optional[str]:
+        """Tipo do registro da linha imediatamente anterior, se ela foi processada"""
+        if self.registro_anterior is not None and self.registro_anterior[0] == numero_linha - 1:
+            return self.registro_anterior[1]
+        return None
+
+    def _processar_registro_01(self, numero_linha: int, linha_content: str,
+                               posicao_erro: int = 0) -> List[ErroValidacao]:
+        """Validação 2: Processar registro 01 para fatura/NF e verificar unicidade
+
+        Com a unicidade adiada (bloco em paralelo), só registra a combinação e a posição
+        `posicao_erro` em que o erro de duplicata entraria na lista de erros do bloco.
+        """
         erros = []
 
         try:
@@ -334,11 +748,9 @@ class EnhancedValidator:
             self.total_registros_01 += 1
 
             # Extrair fatura e NF das posições conhecidas (preservando zeros à esquerda)
-            # NUM-FATURA: posições 3-15 (índices 2-14)
-            # NUM-NF: posições 24-32 (índices 23-31)
-            if len(linha_content) >= 32:
-                num_fatura = (linha_content[2:15] or '').strip() or '0'
-                num_nf = (linha_content[23:32] or '').strip() or '0'
+            fatura_nf = fatura_nf_do_registro_01(linha_content)
+            if fatura_nf is not None:
+                num_fatura, num_nf = fatura_nf
 
                 # Atualizar contexto atual e inicializar agrupamento
                 self.current_fatura = num_fatura
@@ -346,36 +758,12 @@ class EnhancedValidator:
 
                 key = (self.current_fatura, self.current_nf)
                 if key not in self.grupos_nf:
-                    self.grupos_nf[key] = {
-                        'linhas': [],
-                        'contribuintes_por_total': {k: [] for k in self.totais_acumulados.keys()}
-                    }
-
-                # Validação 3: Contagem de notas fiscais por fatura
-                self.notas_fiscais_por_fatura[num_fatura].append(num_nf)
-
-                # Validação 4: Unicidade de combinação fatura + NF
-                combinacao = (num_fatura, num_nf)
-                if combinacao in self.combinacoes_fatura_nf:
-                    # Registrar como duplicata para análise
-                    self.duplicatas_fatura_nf.append({
-                        'linha': numero_linha,
-                        'fatura': num_fatura,
-                        'nf': num_nf,
-                        'combinacao': f"{num_fatura}|{num_nf}"
-                    })
+                    self.grupos_nf[key] = {'faixas': []}
 
-                    erro = ErroValidacao(
-                        linha=numero_linha,
-                        campo="NFE01-NUM-NF",
-                        valor_encontrado=f"Fatura: {num_fatura}, NF: {num_nf}",
-                        erro_tipo="COMBINACAO_DUPLICADA",
-                        descricao=f"Combinação Fatura {num_fatura} + NF {num_nf} já foi utilizada anteriormente",
-                        valor_esperado="Combinação única de fatura + nota fiscal"
-                    )
-                    erros.append(erro)
+                if self.unicidade_adiada:
+                    self.registros_01_bloco.append((numero_linha, num_fatura, num_nf, posicao_erro))
                 else:
-                    self.combinacoes_fatura_nf.add(combinacao)
+                    erros.extend(self._verificar_unicidade(numero_linha, num_fatura, num_nf))
 
         except Exception as e:
             erro = ErroValidacao(
@@ -390,6 +778,64 @@ class EnhancedValidator:
 
         return erros
 
+    def _verificar_unicidade(self, numero_linha: int, num_fatura: str, num_nf: str) -> List[ErroValidacao]:
+        """Validações 3 e 4: contagem de NF por fatura e unicidade da combinação fatura + NF"""
+        erros = []
+
+        # Validação 3: Contagem de notas fiscais por fatura
+        self.notas_fiscais_por_fatura[num_fatura].append(num_nf)
+
+        # Validação 4: Unicidade de combinação fatura + NF
+        combinacao = (num_fatura, num_nf)
+        if combinacao in self.combinacoes_fatura_nf:
+            # Registrar como duplicata para análise
+            self.duplicatas_fatura_nf.append({
+                'linha': numero_linha,
+                'fatura': num_fatura,
+                'nf': num_nf,
+                'combinacao': f"{num_fatura}|{num_nf}"
+            })
+
+            erro = ErroValidacao(
+                linha=numero_linha,
+                campo="NFE01-NUM-NF",
+                valor_encontrado=f"Fatura: {num_fatura}, NF: {num_nf}",
+                erro_tipo="COMBINACAO_DUPLICADA",
+                descricao=f"Combinação Fatura {num_fatura} + NF {num_nf} já foi utilizada anteriormente",
+                valor_esperado="Combinação única de fatura + nota fiscal"
+            )
+            erros.append(erro)
+        else:
+            self.combinacoes_fatura_nf.add(combinacao)
+            erros.extend(self._verificar_unicidade_entre_lotes(numero_linha, num_fatura, num_nf))
+
+        return erros
+
+    def _verificar_unicidade_entre_lotes(self, numero_linha: int, num_fatura: str, num_nf: str) -> List[ErroValidacao]:
+        """Combinação fatura + NF já enviada em outro lote registrado no índice"""
+        if self.indice_unicidade is None:
+            return []
+        anterior = self.indice_unicidade.procurar(num_fatura, num_nf, ignorar_lote=self.lote_em_validacao)
+        if anterior is None:
+            return []
+
+        lote, linha_lote = anterior
+        self.duplicatas_fatura_nf.append({
+            'linha': numero_linha,
+            'fatura': num_fatura,
+            'nf': num_nf,
+            'combinacao': f"{num_fatura}|{num_nf}",
+            'lote': lote
+        })
+        return [ErroValidacao(
+            linha=numero_linha,
+            campo="NFE01-NUM-NF",
+            valor_encontrado=f"Fatura: {num_fatura}, NF: {num_nf}",
+            erro_tipo="COMBINACAO_DUPLICADA_LOTE",
+            descricao=f"Combinação Fatura {num_fatura} + NF {num_nf} já foi utilizada no lote {lote} (linha {linha_lote})",
+            valor_esperado="Combinação única de fatura + nota fiscal entre os lotes"
+        )]
+
     def _acumular_valores_impostos(self, numero_linha: int, tipo_registro: str, linha_content: str, erros_calculos: List = None):
         """Validação 3: Acumular valores para cálculos de impostos - usando valores CORRETOS"""
 
@@ -400,6 +846,30 @@ class EnhancedValidator:
             # Reiniciar estado estrutural para nova NF
             self.item_aberto = None
             self.contador_tipos_nf = Counter()
+            self.contribuintes_nf_atual = {}
+            self.quantidade_contribuintes_nf_atual = Counter()
+            if self.totais_adiados:
+                self.linhas_01_passada.append(numero_linha)
+
+        if self.totais_adiados:
+            # Só os valores corrigidos (linhas com erro de cálculo); os demais são extraídos em bloco
+            if erros_calculos:
+                self.valores_corrigidos[numero_linha] = self._valores_a_acumular(tipo_registro, linha_content, erros_calculos)
+            return
+
+        for total_field, valor_a_acumular in self._valores_a_acumular(tipo_registro, linha_content, erros_calculos):
+            self.totais_acumulados[total_field] += valor_a_acumular
+            # Registrar linha contribuinte do total para a NF corrente (só as primeiras ficam em memória)
+            if self.current_fatura is not None and self.current_nf is not None:
+                self.quantidade_contribuintes_nf_atual[total_field] += 1
+                contribuintes = self.contribuintes_nf_atual.setdefault(total_field, [])
+                if len(contribuintes) < self.MAX_EXEMPLOS_CALCULO:
+                    contribuintes.append(numero_linha)
+
+    def _valores_a_acumular(self, tipo_registro: str, linha_content: str,
+                            erros_calculos: List = None) -> List[Tuple[str, int]]:
+        """Pares (total_field, valor) com que a linha contribui para os totais - usando valores CORRETOS"""
+        valores = []
 
         # Acumular valores usando a MESMA lógica da comparação
         for total_field, fontes in self.totals_map.items():
@@ -427,43 +897,59 @@ class EnhancedValidator:
                         valor_a_acumular = self._only_digits_to_int(valor_str)
 
                     if valor_a_acumular > 0:
-                        self.totais_acumulados[total_field] += valor_a_acumular
-                        # Registrar linha contribuinte do total para a NF corrente
-                        if self.current_fatura is not None and self.current_nf is not None:
-                            key = (self.current_fatura, self.current_nf)
-                            if key not in self.grupos_nf:
-                                self.grupos_nf[key] = {
-                                    'linhas': [],
-                                    'contribuintes_por_total': {k: [] for k in self.totais_acumulados.keys()}
-                                }
-                            self.grupos_nf[key]['contribuintes_por_total'].setdefault(total_field, []).append(numero_linha)
+                        valores.append((total_field, valor_a_acumular))
+
+        return valores
 
     def _only_digits_to_int(self, s: str) -> int:
         """Função IGUAL à comparação para extrair apenas dígitos"""
-        digits = ''.join(ch for ch in s if ch.isdigit())
-        return int(digits) if digits else 0
+        return digitos_para_int(s)
 
     def _registrar_linha_no_grupo(self, numero_linha: int):
         """Registra a linha atual no agrupamento da NF corrente, se houver contexto."""
         if self.current_fatura is None or self.current_nf is None:
             return
         key = (self.current_fatura, self.current_nf)
-        if key not in self.grupos_nf:
-            self.grupos_nf[key] = {
-                'linhas': [],
-                'contribuintes_por_total': {k: [] for k in self.totais_acumulados.keys()}
-            }
-        self.grupos_nf[key]['linhas'].append(numero_linha)
+        faixas = self.grupos_nf.setdefault(key, {'faixas': []})['faixas']
+        # Linhas consecutivas estendem a última faixa [inicio, fim)
+        if faixas and faixas[-1][1] == numero_linha:
+            faixas[-1][1] = numero_linha + 1
+        else:
+            faixas.append([numero_linha, numero_linha + 1])
+
+    def linhas_do_grupo(self, key: Tuple[str, str]) -> List[int]:
+        """Números das linhas registradas no grupo (fatura, nf), em ordem"""
+        grupo = self.grupos_nf.get(key)
+        if not grupo:
+            return []
+        return [n for inicio, fim in grupo['faixas'] for n in range(inicio, fim)]
+
+    def contribuintes_do_grupo(self, key: Tuple[str, str], indice_linhas: LineIndex) -> Dict[str, List[int]]:
+        """Linhas que contribuem para cada total no grupo (fatura, nf), relidas do índice
+
+        Reaplica as regras de cálculo (em lote sobre as linhas do grupo), então o resultado
+        é o mesmo da passada de validação.
+        """
+        linhas = [(numero_linha, indice_linhas.get(numero_linha, '')) for numero_linha in self.linhas_do_grupo(key)]
+        falhas_por_linha: Dict[int, List[FalhaCalculo]] = defaultdict(list)
+        for numero_linha, falha in self.regras_calculo.avaliar_lote(linhas):
+            falhas_por_linha[numero_linha].append(falha)
+
+        contribuintes: Dict[str, List[int]] = {k: [] for k in self.totais_acumulados.keys()}
+        for numero_linha, linha_content in linhas:
+            erros_calculos = [
+                self._erro_calculo(numero_linha, linha_content, falha)
+                for falha in falhas_por_linha.get(numero_linha, ())
+            ]
+            for total_field, _ in self._valores_a_acumular(linha_content[:2], linha_content, erros_calculos):
+                contribuintes.setdefault(total_field, []).append(numero_linha)
+        return contribuintes
 
     def _capturar_declaracoes_header_00(self, numero_linha: int, linha_content: str):
         """Captura declarações relevantes do header 00 (ex.: quantidade de NF)."""
         try:
-            possiveis = [
-                'NFE00-QTD-NF', 'NFE00-TOT-NF', 'NFE00-QTD-REG', 'NFE00-QTD-NOTAS'
-            ]
-            for campo_nome in possiveis:
-                campo = self.layout.get_campo(campo_nome)
-                if campo:
+            for campo_nome in self.CAMPOS_HEADER_QTD_NF:
+                if self._fatia_campo(campo_nome):
                     valor_str = self._extrair_valor_campo_str(linha_content, campo_nome)
                     if valor_str:
                         self.declaracoes_header[campo_nome] = self._only_digits_to_int(valor_str)
@@ -473,14 +959,14 @@ class EnhancedValidator:
     def _extrair_valor_campo(self, linha: str, nome_campo: str) -> int:
         """Extrai valor numérico de um campo específico da linha"""
         try:
-            # Encontrar o campo no layout
-            campo = self.layout.get_campo(nome_campo)
-            if not campo:
+            # Fatia pré-resolvida na construção do validador
+            fatia = self._fatia_campo(nome_campo)
+            if not fatia:
                 return 0
 
             # Extrair valor da posição
-            if len(linha) >= campo.posicao_fim:
-                valor_str = linha[campo.posicao_inicio-1:campo.posicao_fim]
+            if len(linha) >= fatia[1]:
+                valor_str = linha[fatia[0]]
                 # Converter para inteiro (removendo pontos decimais)
                 digits = ''.join(ch for ch in valor_str if ch.isdigit())
                 return int(digits) if digits else 0
@@ -490,8 +976,17 @@ class EnhancedValidator:
 
         return 0
 
-    def _validar_totalizador_56(self, numero_linha: int, linha_content: str) -> List[ErroValidacao]:
-        """Validação 4: Verificar se totais do registro 56 batem com valores acumulados"""
+    def _validar_totalizador_56(self, numero_linha: int, linha_content: str,
+                                posicao_erro: int = 0) -> List[ErroValidacao]:
+        """Validação 4: Verificar se totais do registro 56 batem com valores acumulados
+
+        Com os totais adiados (vetorizados), só registra a linha, a NF corrente e a posição
+        `posicao_erro` em que os erros entrariam; a conferência é feita ao final da passada.
+        """
+        if self.totais_adiados:
+            self.registros_56.append((numero_linha, posicao_erro, self.current_fatura, self.current_nf))
+            return []
+
         erros = []
 
         for total_field in self.totals_map.keys():
@@ -501,51 +996,198 @@ class EnhancedValidator:
                 valor_calculado = self.totais_acumulados[total_field]
 
                 if valor_declarado != valor_calculado:
-                    # Formatar valores para exibição
-                    decl_fmt = f"{valor_declarado/100:.2f}".replace('.', ',')
-                    calc_fmt = f"{valor_calculado/100:.2f}".replace('.', ',')
-                    diff_fmt = f"{(valor_declarado - valor_calculado)/100:.2f}".replace('.', ',')
-
-                    identificacao = None
-                    if self.current_fatura is not None and self.current_nf is not None:
-                        identificacao = f"Fatura {self.current_fatura} | NF {self.current_nf}"
-                    # Tentar montar exemplo de cálculo para alguns itens contribuintes
-                    exemplos_calc = self._montar_exemplos_calculo_total(total_field)
-                    exemplos_texto = (" | Cálculo: " + exemplos_calc) if exemplos_calc else ""
-
-                    erro = ErroValidacao(
-                        linha=numero_linha,
-                        campo=total_field,
-                        valor_encontrado=decl_fmt,
-                        erro_tipo=f"TOTAL_{total_field.split('-')[-1]}",  # Ex: TOTAL_ICMS
-                        descricao=(
-                            f"Total {total_field.split('-')[-1]} divergente: Declarado={decl_fmt} | "
-                            f"Calculado={calc_fmt} | Diferença={diff_fmt}" + (f" | {identificacao}" if identificacao else "") + exemplos_texto
-                        ),
-                        valor_esperado=calc_fmt
-                    )
-                    erros.append(erro)
+                    erros.append(self._erro_total_56(numero_linha, total_field, valor_declarado, valor_calculado))
 
             except Exception as e:
                 pass  # Ignorar erros de extração individual
 
         return erros
 
-    def _montar_exemplos_calculo_total(self, total_field: str, max_itens: int = 3) -> str:
-        """Gera uma string com exemplos de cálculo para o total informado, usando algumas linhas contribuintes.
+    def _erro_total_56(self, numero_linha: int, total_field: str, valor_declarado: int, valor_calculado: int,
+                       contribuintes: Optional[List[int]] = None, quantidade: Optional[int] = None) -> ErroValidacao:
+        """Erro de total divergente, com a NF corrente e exemplos das linhas contribuintes"""
+        # Formatar valores para exibição
+        decl_fmt = f"{valor_declarado/100:.2f}".replace('.', ',')
+        calc_fmt = f"{valor_calculado/100:.2f}".replace('.', ',')
+        diff_fmt = f"{(valor_declarado - valor_calculado)/100:.2f}".replace('.', ',')
+
+        identificacao = None
+        if self.current_fatura is not None and self.current_nf is not None:
+            identificacao = f"Fatura {self.current_fatura} | NF {self.current_nf}"
+        # Tentar montar exemplo de cálculo para alguns itens contribuintes (linhas citadas à parte)
+        exemplos_calc, linhas_exemplos = self._montar_exemplos_calculo_total(
+            total_field, contribuintes=contribuintes, quantidade=quantidade
+        )
+        exemplos_texto = (" | Cálculo: " + exemplos_calc) if exemplos_calc else ""
+
+        return ErroLinhasCitadas(
+            numero_linha,
+            ModeloErroLinhas(
+                campo=total_field,
+                erro_tipo=f"TOTAL_{total_field.split('-')[-1]}",  # Ex: TOTAL_ICMS
+                descricao=ModeloErroLinhas.literal(
+                    f"Total {total_field.split('-')[-1]} divergente: Declarado={decl_fmt} | "
+                    f"Calculado={calc_fmt} | Diferença={diff_fmt}" + (f" | {identificacao}" if identificacao else "")
+                ) + exemplos_texto,
+                valor_esperado=calc_fmt
+            ),
+            decl_fmt, linhas_exemplos
+        )
+
+    def _conferir_totais_adiados(self, indice_linhas: LineIndex, inicio: int, fim: int) -> List[Tuple[int, int, ErroValidacao]]:
+        """Confere os 56 registrados na passada [inicio, fim) por somas segmentadas
+
+        Devolve (posição, linha, erro) de cada total divergente e deixa o estado da última NF
+        (totais acumulados e contribuintes) igual ao da acumulação linha a linha.
+        """
+        contribuicoes = self._contribuicoes_por_total(indice_linhas, inicio, fim)
+        inicios_nf = np.asarray(self.linhas_01_passada, dtype=np.int64)
+        linhas_56 = np.asarray([registro[0] for registro in self.registros_56], dtype=np.int64)
+        # Última consulta: o fim da passada, para o estado da última NF
+        consultas = np.append(linhas_56, fim - 1)
+        contexto_final = (self.current_fatura, self.current_nf)
+
+        somas: Dict[str, Tuple] = {}
+        declarados: Dict[str, Optional[List[int]]] = {}
+        for total_field, (linhas, valores) in contribuicoes.items():
+            somas[total_field] = somas_segmentadas(linhas, valores, inicios_nf, consultas)
+            declarados[total_field] = self._valores_campo_em_bloco(indice_linhas, linhas_56, total_field)
+
+        eventos: List[Tuple[int, int, ErroValidacao]] = []
+        try:
+            for i, (numero_linha, posicao, fatura, nf) in enumerate(self.registros_56):
+                self.current_fatura, self.current_nf = fatura, nf
+                for total_field in self.totals_map:
+                    declarado = declarados[total_field][i]
+                    total, lo, hi = somas[total_field]
+                    if declarado == total[i]:
+                        continue
+                    linhas = contribuicoes[total_field][0]
+                    contribuintes = linhas[lo[i]:min(hi[i], lo[i] + self.MAX_EXEMPLOS_CALCULO)].tolist() if fatura is not None else []
+                    eventos.append((posicao, numero_linha, self._erro_total_56(
+                        numero_linha, total_field, declarado, int(total[i]), contribuintes, int(hi[i] - lo[i])
+                    )))
+        finally:
+            self.current_fatura, self.current_nf = contexto_final
+
+        for total_field, (total, lo, hi) in somas.items():
+            self.totais_acumulados[total_field] = int(total[-1])
+            if self.current_fatura is not None and self.current_nf is not None and hi[-1] > lo[-1]:
+                linhas = contribuicoes[total_field][0]
+                self.quantidade_contribuintes_nf_atual[total_field] = int(hi[-1] - lo[-1])
+                self.contribuintes_nf_atual[total_field] = linhas[lo[-1]:min(hi[-1], lo[-1] + self.MAX_EXEMPLOS_CALCULO)].tolist()
+        return eventos
+
+    def _contribuicoes_por_total(self, indice_linhas: LineIndex, inicio: int, fim: int) -> Dict[str, Tuple]:
+        """(linhas ordenadas, valores > 0) das contribuições de cada total na faixa [inicio, fim)
+
+        Os valores saem da extração em bloco; as linhas com erro de cálculo usam os valores
+        corrigidos registrados na passada, e as inexatas (não ASCII, dígitos demais), a extração
+        escalar de `_valores_a_acumular`.
+        """
+        fontes_por_tipo: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        for total_field, fontes in self.totals_map.items():
+            for fonte in fontes:
+                fontes_por_tipo[fonte['tipo']].append((total_field, fonte['campo']))
+
+        pares_escalares: Dict[int, List[Tuple[str, int]]] = dict(self.valores_corrigidos)
+        partes: Dict[str, List[Tuple]] = defaultdict(list)
+        for tipo_registro, fontes in fontes_por_tipo.items():
+            linhas_tipo = np.asarray(indice_linhas.linhas_com_prefixo(tipo_registro.encode('latin-1')), dtype=np.int64)
+            linhas_tipo = linhas_tipo[(linhas_tipo >= inicio) & (linhas_tipo < fim)]
+            if self.valores_corrigidos:
+                linhas_tipo = linhas_tipo[~np.isin(linhas_tipo, np.fromiter(self.valores_corrigidos, dtype=np.int64))]
+            fatias = [(total_field, self._fatia_campo(campo)) for total_field, campo in fontes]
+            fatias = [(total_field, fatia[0].start, fatia[1]) for total_field, fatia in fatias if fatia]
+            if not len(linhas_tipo) or not fatias:
+                continue
+
+            for bloco in range(0, len(linhas_tipo), LINHAS_POR_BLOCO):
+                linhas = linhas_tipo[bloco:bloco + LINHAS_POR_BLOCO]
+                extraidos = [(total_field, *extrair_inteiros(*indice_linhas.matriz_bytes(linhas, inicio_campo, fim_campo), fim_campo))
+                             for total_field, inicio_campo, fim_campo in fatias]
+                exatas = np.logical_and.reduce([exatos for _, _, exatos in extraidos])
+                for numero_linha in linhas[~exatas].tolist():
+                    pares_escalares[numero_linha] = self._valores_a_acumular(tipo_registro, indice_linhas.get_line(numero_linha))
+                for total_field, valores, _ in extraidos:
+                    positivos = exatas & (valores > 0)
+                    partes[total_field].append((linhas[positivos], valores[positivos]))
+
+        escalares: Dict[str, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+        for numero_linha, pares in pares_escalares.items():
+            for total_field, valor in pares:
+                escalares[total_field][0].append(numero_linha)
+                escalares[total_field][1].append(valor)
+        for total_field, (linhas, valores) in escalares.items():
+            cabe_int64 = all(-2 ** 63 < valor < 2 ** 63 for valor in valores)
+            partes[total_field].append((np.asarray(linhas, dtype=np.int64),
+                                        np.asarray(valores, dtype=np.int64 if cabe_int64 else object)))
+
+        contribuicoes = {}
+        for total_field in self.totals_map:
+            linhas = np.concatenate([p[0] for p in partes[total_field]] or [np.zeros(0, dtype=np.int64)])
+            valores = np.concatenate([p[1] for p in partes[total_field]] or [np.zeros(0, dtype=np.int64)])
+            ordem = np.argsort(linhas, kind='stable')
+            contribuicoes[total_field] = (linhas[ordem], valores_sem_estouro(valores[ordem]))
+        return contribuicoes
+
+    def _valores_campo_em_bloco(self, indice_linhas: LineIndex, linhas: 'np.ndarray', nome_campo: str) -> List[int]:
+        """Valor de `_extrair_valor_campo` nas linhas pedidas, extraído em bloco"""
+        fatia = self._fatia_campo(nome_campo)
+        if not fatia or not len(linhas):
+            return [0] * len(linhas)
+        resultado: List[int] = []
+        for bloco in range(0, len(linhas), LINHAS_POR_BLOCO):
+            parte = linhas[bloco:bloco + LINHAS_POR_BLOCO]
+            valores, exatos = extrair_inteiros(*indice_linhas.matriz_bytes(parte, fatia[0].start, fatia[1]), fatia[1])
+            valores = valores.tolist()
+            for i in np.flatnonzero(~exatos).tolist():
+                valores[i] = self._extrair_valor_campo(indice_linhas.get_line(int(parte[i])), nome_campo)
+            resultado.extend(valores)
+        return resultado
+
+    def _inserir_erros_totais(self, erros: ColecaoErros, eventos: List[Tuple[int, int, ErroValidacao]]) -> ColecaoErros:
+        """Erros da passada com os dos totais nas posições da conferência linha a linha
+
+        Com a unicidade adiada, as posições dos registros 01 do bloco são deslocadas pelos
+        erros de totais de 56 anteriores a eles.
+        """
+        if not eventos:
+            return erros
+        chaves = [(posicao, numero_linha) for posicao, numero_linha, _ in eventos]
+        self.registros_01_bloco = [
+            (numero_linha, fatura, nf, posicao + bisect_left(chaves, (posicao, numero_linha)))
+            for numero_linha, fatura, nf, posicao in self.registros_01_bloco
+        ]
+
+        resultado = ColecaoErros()
+        proximo = 0
+        for posicao, erro in enumerate(erros):
+            while proximo < len(eventos) and eventos[proximo][0] <= posicao:
+                resultado.append(eventos[proximo][2])
+                proximo += 1
+            resultado.append(erro)
+        for _, _, erro in eventos[proximo:]:
+            resultado.append(erro)
+        return resultado
+
+    def _montar_exemplos_calculo_total(self, total_field: str, max_itens: int = MAX_EXEMPLOS_CALCULO,
+                                       contribuintes: Optional[List[int]] = None,
+                                       quantidade: Optional[int] = None) -> Tuple[str, List[int]]:
+        """Gera os exemplos de cálculo para o total informado, usando algumas linhas contribuintes.
         Para impostos com BC/ALIQ/VALOR, mostra "ln 000123: BC=a × ALIQ=b% → VAL=c".
         Para TOT-VLR-BC, mostra "ln 000123: BC=a". Limita a alguns itens e informa se há mais.
+        `contribuintes`/`quantidade`: as da NF do 56 (padrão: as da NF corrente).
+        Devolve o texto como modelo de ErroLinhasCitadas ("ln {0:06d}: ...") e as linhas citadas.
         """
         try:
             if self.current_fatura is None or self.current_nf is None:
-                return ""
-            key = (self.current_fatura, self.current_nf)
-            grupo = self.grupos_nf.get(key)
-            if not grupo:
-                return ""
-            contrib = grupo.get('contribuintes_por_total', {}).get(total_field, []) or []
+                return "", []
+            contrib = self.contribuintes_nf_atual.get(total_field, []) if contribuintes is None else contribuintes
+            if quantidade is None:
+                quantidade = self.quantidade_contribuintes_nf_atual[total_field]
             if not contrib:
-                return ""
+                return "", []
 
             # Mapear total_field para config de cálculo
             def config_por_total(tf: str):
@@ -590,15 +1232,18 @@ class EnhancedValidator:
 
             cfg_tuple = config_por_total(total_field)
             exemplos: List[str] = []
+            linhas_citadas: List[int] = []
 
             for ln in contrib[:max_itens]:
                 try:
-                    linha_str = self.linhas_conteudo.get(ln, '')
+                    linha_str = self.indice_linhas.get(ln, '') if self.indice_linhas is not None else ''
                     if not linha_str:
                         continue
                     # Se não houver config (ex.: BC puro), mostre apenas o campo fonte
+                    citacao = f"ln {{{len(linhas_citadas)}:06d}}"
                     if not cfg_tuple:
-                        exemplos.append(f"ln {str(ln).zfill(6)}")
+                        exemplos.append(citacao)
+                        linhas_citadas.append(ln)
                         continue
                     bc_field, aliq_field, valor_field, nome_imp = cfg_tuple
                     # Obter valores dos campos
@@ -616,165 +1261,82 @@ class EnhancedValidator:
                     valor_fmt = f"{valor_int/100:.2f}".replace('.', ',')
 
                     if nome_imp == 'BC' or not aliq_fmt:
-                        exemplos.append(f"ln {str(ln).zfill(6)}: BC={bc_fmt}")
+                        exemplos.append(f"{citacao}: BC={bc_fmt}")
                     else:
-                        exemplos.append(f"ln {str(ln).zfill(6)}: BC={bc_fmt} × ALIQ={aliq_fmt}% → VAL={valor_fmt}")
+                        exemplos.append(f"{citacao}: BC={bc_fmt} × ALIQ={aliq_fmt}% → VAL={valor_fmt}")
+                    linhas_citadas.append(ln)
                 except Exception:
                     # Pular linha problemática
                     continue
 
             if not exemplos:
-                return ""
+                return "", []
 
-            resto = len(contrib) - len(exemplos)
+            resto = quantidade - len(exemplos)
             sufixo_rest = f" (+{resto} itens)" if resto > 0 else ""
-            return "; ".join(exemplos) + sufixo_rest
+            return "; ".join(exemplos) + sufixo_rest, linhas_citadas
         except Exception:
-            return ""
+            return "", []
 
     def _validar_calculos_linha(self, numero_linha: int, tipo_registro: str, linha_content: str) -> List[ErroValidacao]:
         """Validação de cálculos individuais IGUAL à comparação estrutural"""
-        erros = []
-
-        if tipo_registro not in self.calculation_validations:
-            return erros
-
-        config = self.calculation_validations[tipo_registro]
-
-        # Extrair NUM-NF da linha (posições 3-15) como na comparação
-        num_nf = ''
-        if linha_content and len(linha_content) >= 15:
-            num_nf = linha_content[2:15].strip().lstrip('0') or '0'
-
-        def _validar_calculo_especifico(config_calc):
-            # Extrair valores dos campos usando mesma lógica da comparação
-            bc_str = self._extrair_valor_campo_str(linha_content, config_calc['bc_field'])
-            aliq_str = self._extrair_valor_campo_str(linha_content, config_calc['aliq_field'])
-            valor_str = self._extrair_valor_campo_str(linha_content, config_calc['valor_field'])
-
-            # CASO ESPECIAL FCP: Se BC e Alíquota preenchidos mas valor vazio/zero, é ERRO!
-            bc_val_temp = self._only_digits_to_int(bc_str) if bc_str else 0
-            aliq_val_temp = self._only_digits_to_int(aliq_str) if aliq_str else 0
-            valor_val_temp = self._only_digits_to_int(valor_str) if valor_str else 0
-
-            # Se BC > 0 e Alíquota > 0 mas Valor = 0, só é erro se o esperado (2 casas) > 0
-            if bc_val_temp > 0 and aliq_val_temp > 0 and valor_val_temp == 0:
-                valor_calculado_esperado = (bc_val_temp * aliq_val_temp) // 10000
-                if valor_calculado_esperado > 0:
-                    # Identificação preferindo Fatura|NF quando disponível
-                    if self.current_fatura is not None and self.current_nf is not None:
-                        identificacao = f"Fatura {self.current_fatura} | NF {self.current_nf}"
-                    elif num_nf:
-                        identificacao = f"NUM-NF: {num_nf}"
-                    else:
-                        identificacao = f"Linha: {numero_linha}"
-                    bc_fmt = f"{bc_val_temp/100:.2f}".replace('.', ',')
-                    aliq_fmt = f"{aliq_val_temp/100:.2f}".replace('.', ',')
-                    valor_calc_fmt = f"{valor_calculado_esperado/100:.2f}".replace('.', ',')
-
-                    erro = ErroValidacao(
-                        linha=numero_linha,
-                        campo=config_calc['valor_field'],
-                        valor_encontrado="0,00",
-                        erro_tipo=f"VALOR_ZERADO_{config_calc['nome_imposto']}",
-                        descricao=f"{config_calc['nome_imposto']} ({identificacao}): BC={bc_fmt} × Alíquota={aliq_fmt}% = Esperado={valor_calc_fmt} | Encontrado=0,00 (VALOR ZERADO INCORRETAMENTE)",
-                        valor_esperado=valor_calc_fmt
-                    )
-                    erros.append(erro)
-                return  # Se esperado for 0, não é erro; encerra validação deste imposto
-
-            # Se algum campo estiver vazio, não validar
-            if not bc_str or not aliq_str or not valor_str:
-                return
-
-            try:
-                # Usar EXATAMENTE a mesma função de parsing da comparação
-                def _parse_decimal_value(s: str) -> int:
-                    """Converte valor decimal para inteiro com 2 casas decimais implícitas - IGUAL à comparação"""
-                    def _only_digits_to_int(s):
-                        digits = ''.join(ch for ch in s if ch.isdigit())
-                        return int(digits) if digits else 0
-
-                    try:
-                        # Remover espaços e zeros à esquerda
-                        clean_s = s.strip().lstrip('0') or '0'
-
-                        # Se contém ponto decimal, processar
-                        if '.' in clean_s:
-                            parts = clean_s.split('.')
-                            inteiro = int(parts[0]) if parts[0] else 0
-                            decimal = parts[1][:2].ljust(2, '0')  # Pegar até 2 casas e completar com zeros
-                            return inteiro * 100 + int(decimal)
-                        else:
-                            # Se não tem ponto, considerar como inteiro com 2 casas implícitas
-                            return _only_digits_to_int(clean_s)
-                    except Exception:
-                        return 0
-
-                bc_val = _parse_decimal_value(bc_str)
-                aliq_val = _parse_decimal_value(aliq_str)
-                valor_declarado = _parse_decimal_value(valor_str)
-
-                # Se todos os valores são zero, não validar
-                if bc_val == 0 and aliq_val == 0 and valor_declarado == 0:
-                    return
-
-                # EXATAMENTE o mesmo cálculo da comparação: BC × Alíquota / 10000
-                valor_calculado = (bc_val * aliq_val) // 10000
-
-                # Só adicionar erros se houver divergência
-                if valor_declarado != valor_calculado:
-                    # Formatar valores igual à comparação
-                    bc_fmt = f"{bc_val/100:.2f}".replace('.', ',')
-                    aliq_fmt = f"{aliq_val/100:.2f}".replace('.', ',')
-                    valor_decl_fmt = f"{valor_declarado/100:.2f}".replace('.', ',')
-                    valor_calc_fmt = f"{valor_calculado/100:.2f}".replace('.', ',')
-                    diferenca_fmt = f"{(valor_declarado - valor_calculado)/100:.2f}".replace('.', ',')
-
-                    # Identificação preferindo Fatura|NF quando disponível
-                    if self.current_fatura is not None and self.current_nf is not None:
-                        identificacao = f"Fatura {self.current_fatura} | NF {self.current_nf}"
-                    elif num_nf:
-                        identificacao = f"NUM-NF: {num_nf}"
-                    else:
-                        identificacao = f"Linha: {numero_linha}"
-                    descricao = f"{config_calc['nome_imposto']} ({identificacao}): BC={bc_fmt} × Alíquota={aliq_fmt}% = Calculado={valor_calc_fmt} | Declarado={valor_decl_fmt} | Diferença={diferenca_fmt}"
-
-                    erro = ErroValidacao(
-                        linha=numero_linha,
-                        campo=config_calc['valor_field'],
-                        valor_encontrado=valor_decl_fmt,
-                        erro_tipo=f"CALCULO_ERRO_{config_calc['nome_imposto']}",
-                        descricao=descricao,
-                        valor_esperado=valor_calc_fmt
-                    )
-                    erros.append(erro)
-
-            except Exception:
-                # Se houver erro na validação, não adicionar erro
-                pass
-
-        # Validar cálculo principal
-        _validar_calculo_especifico(config)
-
-        # Validar cálculos adicionais (para registro 22: FCP)
-        if 'validacoes_adicionais' in config:
-            for validacao_adicional in config['validacoes_adicionais']:
-                _validar_calculo_especifico(validacao_adicional)
+        falhas = self.regras_calculo.avaliar(tipo_registro, linha_content)
+        if not falhas:
+            return []
+        return [self._erro_calculo(numero_linha, linha_content, falha) for falha in falhas]
+
+    def _erro_calculo(self, numero_linha: int, linha_content: str, falha: FalhaCalculo) -> ErroValidacao:
+        """Monta o erro de cálculo com a identificação da NF corrente"""
+        # Identificação preferindo Fatura|NF quando disponível; senão NUM-NF da linha (posições 3-15)
+        linhas_citadas = ()
+        if self.current_fatura is not None and self.current_nf is not None:
+            identificacao = ModeloErroLinhas.literal(f"Fatura {self.current_fatura} | NF {self.current_nf}")
+        elif len(linha_content) >= 15:
+            identificacao = ModeloErroLinhas.literal(f"NUM-NF: {linha_content[2:15].strip().lstrip('0') or '0'}")
+        else:
+            identificacao, linhas_citadas = "Linha: {0}", (numero_linha,)
+
+        nome_imposto = ModeloErroLinhas.literal(falha.regra.nome_imposto)
+        bc_fmt = f"{falha.bc/100:.2f}".replace('.', ',')
+        aliq_fmt = f"{falha.aliquota/100:.2f}".replace('.', ',')
+        valor_calc_fmt = f"{falha.calculado/100:.2f}".replace('.', ',')
+
+        if falha.codigo == 'VALOR_ZERADO':
+            return ErroLinhasCitadas(
+                numero_linha,
+                ModeloErroLinhas(
+                    campo=falha.regra.campo_valor,
+                    erro_tipo=falha.erro_tipo,
+                    descricao=f"{nome_imposto} ({identificacao}): BC={bc_fmt} × Alíquota={aliq_fmt}% = Esperado={valor_calc_fmt} | Encontrado=0,00 (VALOR ZERADO INCORRETAMENTE)",
+                    valor_esperado=valor_calc_fmt
+                ),
+                "0,00", linhas_citadas
+            )
 
-        return erros
+        valor_decl_fmt = f"{falha.declarado/100:.2f}".replace('.', ',')
+        diferenca_fmt = f"{(falha.declarado - falha.calculado)/100:.2f}".replace('.', ',')
+        return ErroLinhasCitadas(
+            numero_linha,
+            ModeloErroLinhas(
+                campo=falha.regra.campo_valor,
+                erro_tipo=falha.erro_tipo,
+                descricao=f"{nome_imposto} ({identificacao}): BC={bc_fmt} × Alíquota={aliq_fmt}% = Calculado={valor_calc_fmt} | Declarado={valor_decl_fmt} | Diferença={diferenca_fmt}",
+                valor_esperado=valor_calc_fmt
+            ),
+            valor_decl_fmt, linhas_citadas
+        )
 
     def _extrair_valor_campo_str(self, linha: str, nome_campo: str) -> str:
         """Extrai valor string de um campo específico da linha"""
         try:
-            # Encontrar o campo no layout
-            campo = self.layout.get_campo(nome_campo)
-            if not campo:
+            # Fatia pré-resolvida na construção do validador
+            fatia = self._fatia_campo(nome_campo)
+            if not fatia:
                 return ''
 
             # Extrair valor da posição
-            if len(linha) >= campo.posicao_fim:
-                valor_str = linha[campo.posicao_inicio-1:campo.posicao_fim]
+            if len(linha) >= fatia[1]:
+                valor_str = linha[fatia[0]]
                 return valor_str.strip()
 
         except Exception:
@@ -782,27 +1344,31 @@ class EnhancedValidator:
 
         return ''
 
+    def _quantidade_real_nf(self) -> int:
+        """Registros 01 até a linha atual (num bloco, somados aos de antes dele) ou, na amostragem,
+        os do arquivo inteiro"""
+        if self.quantidade_nf_arquivo is not None:
+            return self.quantidade_nf_arquivo
+        return self.registros_01_antes_do_bloco + self.total_registros_01
+
     def _validar_trailer_99(self, numero_linha: int, linha_content: str) -> List[ErroValidacao]:
         """Validação 5: Verificar trailer (registro 99) - quantidade de notas fiscais"""
         erros = []
 
         try:
             # Quantidade real de notas fiscais encontrada (igual SEFAZ: total registros 01)
-            quantidade_real = self.total_registros_01
+            quantidade_real = self._quantidade_real_nf()
 
             # Procurar campo de quantidade no trailer 99
             # Campo correto: NFE99-QTDE-DOC-NFCOM (quantidade de NFCOMs no arquivo)
-            campos_trailer_possiveis = [
-                'NFE99-QTDE-DOC-NFCOM'  # Campo oficial do layout NFCOM
-            ]
+            campos_trailer_possiveis = list(self.CAMPOS_TRAILER_QTD_NF)
 
             quantidade_declarada = None
             campo_encontrado = None
 
             # Tentar encontrar o campo de quantidade no trailer
             for campo_nome in campos_trailer_possiveis:
-                campo = self.layout.get_campo(campo_nome)
-                if campo:
+                if self._fatia_campo(campo_nome):
                     valor_str = self._extrair_valor_campo_str(linha_content, campo_nome)
                     if valor_str:
                         quantidade_declarada = self._only_digits_to_int(valor_str)
@@ -845,10 +1411,7 @@ class EnhancedValidator:
         """Gerar estatísticas sobre faturas e notas fiscais"""
 
         # DEBUG: Verificar qual contador está sendo usado
-        total_registros_debug = sum(1 for linha_tipo in self.registros_por_linha.values() if linha_tipo == '01')
-
         print(f"[DEBUG] total_registros_01: {self.total_registros_01}")
-        print(f"[DEBUG] total_registros_debug: {total_registros_debug}")
         print(f"[DEBUG] combinacoes_fatura_nf: {len(self.combinacoes_fatura_nf)}")
 
         # Usar sempre o contador igual SEFAZ (por linha processada = registros 01)
@@ -959,9 +1522,8 @@ class EnhancedValidator:
             self.item_aberto = None
 
         # Regra geral: não permitir tipos repetidos consecutivamente dentro da NF, exceto para o fluxo de item tratado acima
-        linha_anterior = numero_linha - 1
-        if linha_anterior in self.registros_por_linha:
-            tipo_anterior = self.registros_por_linha[linha_anterior]
+        tipo_anterior = self._tipo_registro_da_linha_anterior(numero_linha)
+        if tipo_anterior is not None:
             if tipo_anterior == tipo_registro and tipo_registro not in ['00', '99']:
                 # Já tratamos impostos repetidos acima; evite duplicar erro para esses tipos
                 if tipo_registro not in ['22', '38', '40', '42', '44', '20', '36', '70']:
@@ -974,4 +1536,13 @@ class EnhancedValidator:
                         valor_esperado='Tipos diferentes em sequência'
                     ))
 
-        return erros
\ No newline at end of file
+        return erros
+
+
+def _validar_bloco_nf(validador: EnhancedValidator, caminho_arquivo: str, bloco: BlocoLinhas,
+                      encoding: str, contexto: ContextoBlocoNF) -> ParcialBlocoNF:
+    """Executado no processo filho: valida um bloco de NFs com a numeração global das linhas"""
+    with LineIndex(caminho_arquivo, ENCODINGS_WINDOWS, bloco.inicio, bloco.fim,
+                   bloco.primeira_linha, encoding) as indice:
+        resultado = validador.validar_arquivo(caminho_arquivo, indice_linhas=indice, contexto_bloco=contexto)
+    return validador._parcial_do_bloco(bloco.primeira_linha, resultado)
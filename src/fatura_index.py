@@ -0,0 +1,268 @@
+"""
+Índice persistente das faturas de um lote de produção (Conta do Cliente -> faixas de bytes).
+
+A comparação do PrintCenter só precisa das faturas das contas do arquivo do
+usuário, mas sem índice o lote inteiro é lido a cada comparação para achá-las.
+Este índice é montado uma vez (no upload do lote) e guardado num arquivo JSON
+ao lado: para cada conta, as faixas de bytes dos seus blocos (do registro 01 até
+o próximo 01) e a contagem por tipo de registro. A comparação então lê só as
+faixas das contas pedidas, com `seek`, mais as linhas de header (00). O mapa das
+linhas com "Fatura" (arquivos de impressão) devolvido pela comparação também
+fica guardado, para não varrer o lote só por ele. As mesmas faixas servem para
+reler linhas avulsas pelo número (`linhas`), sem indexar o lote inteiro de novo.
+
+O arquivo do índice vale enquanto o lote tiver o mesmo tamanho e data de
+modificação; se só a data mudou, o hash do conteúdo decide se ele ainda vale.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    from .file_reader import ENCODINGS_PADRAO, iterar_linhas_bytes
+    from .line_index import LineIndex
+except ImportError:
+    from file_reader import ENCODINGS_PADRAO, iterar_linhas_bytes
+    from line_index import LineIndex
+
+
+# Mudar quando o formato do arquivo ou as regras de agrupamento mudarem: invalida os índices antigos
+VERSAO_INDICE = 1
+
+# Faixa de bytes de linhas do lote: (inicio, fim, numero_da_primeira_linha)
+Faixa = Tuple[int, int, int]
+
+
+class IndiceFaturasLote:
+    """Faixas de bytes e contagem de registros por Conta do Cliente, na mesma divisão do
+    `agrupar_por_fatura` do comparador estrutural
+
+    Uso:
+        indice = IndiceFaturasLote.obter('printcenter/lotes/lote.txt', 'printcenter/indices/lote.txt.faturas.json')
+        for numero_linha, linha in indice.linhas_das_contas({'000000000012345'}):
+            ...
+    """
+
+    def __init__(self, caminho_lote: Union[str, Path], encoding: str, tamanho: int, mtime_ns: int, hash_lote: str,
+                 total_linhas: int, header: List[Faixa], faturas: Dict[str, List[Faixa]],
+                 tipos_por_conta: Dict[str, Dict[str, int]], mapa_faturas: Dict[str, int],
+                 encodings=ENCODINGS_PADRAO):
+        self.caminho_lote = str(caminho_lote)
+        self.encodings = tuple(encodings)
+        self.encoding = encoding
+        self.tamanho = tamanho
+        self.mtime_ns = mtime_ns
+        self.hash_lote = hash_lote
+        self.total_linhas = total_linhas
+        self.header = header
+        self.faturas = faturas
+        self.tipos_por_conta = tipos_por_conta
+        # Número da fatura -> última linha com "Fatura" que o cita
+        self.mapa_faturas = mapa_faturas
+        # Todas as faixas em ordem e o número da primeira linha de cada (montadas no primeiro `linhas`)
+        self._faixas_por_linha: Optional[Tuple[List[Faixa], List[int]]] = None
+
+    @property
+    def total_faturas(self) -> int:
+        """Blocos de fatura (registros 01) do lote; conta repetida conta uma vez por bloco"""
+        return sum(len(faixas) for faixas in self.faturas.values())
+
+    def __len__(self) -> int:
+        return len(self.faturas)
+
+    def __contains__(self, conta: str) -> bool:
+        return conta in self.faturas
+
+    @classmethod
+    def construir(cls, caminho_lote: Union[str, Path], encodings=ENCODINGS_PADRAO) -> 'IndiceFaturasLote':
+        """Varre o lote uma vez pelos offsets do `LineIndex`, decodificando só o começo de cada linha"""
+        stat = os.stat(caminho_lote)
+        header, faturas, tipos_por_conta = [], {}, {}
+
+        with LineIndex(str(caminho_lote), encodings) as indice:
+            dados, offsets = indice._dados, indice.offsets
+            conta_atual, bloco = None, None
+            for local in range(1, len(indice) + 1):
+                inicio, fim = offsets[local - 1], offsets[local]
+                # Conta do Cliente termina no caractere 17: basta decodificar esse começo se for ASCII
+                comeco = dados[inicio:min(fim, inicio + 17)].rstrip(b'\r\n')
+                linha = comeco.decode('ascii') if comeco.isascii() else indice.get_line(local)
+                if len(linha) < 2:
+                    continue
+
+                tipo_registro = linha[:2]
+                if tipo_registro == '99':
+                    continue
+                if tipo_registro == '00':
+                    header.append((inicio, fim, local))
+                    continue
+                if tipo_registro == '01':
+                    if bloco is not None:
+                        bloco[1] = inicio
+                    conta_atual = linha.ljust(17)[2:17]
+                    bloco = [inicio, len(dados), local]
+                    faturas.setdefault(conta_atual, []).append(bloco)
+                if conta_atual is None:
+                    continue
+                tipos = tipos_por_conta.setdefault(conta_atual, {})
+                tipos[tipo_registro] = tipos.get(tipo_registro, 0) + 1
+
+            mapa_faturas = {}
+            posicao = dados.find(b'Fatura')
+            while posicao != -1:
+                numero_linha = bisect.bisect_right(offsets, posicao)
+                partes = indice.get_line(numero_linha).split()
+                mapa_faturas[partes[1] if len(partes) > 1 else ""] = numero_linha
+                posicao = dados.find(b'Fatura', offsets[numero_linha])
+
+            encoding, total_linhas = indice.encoding, len(indice)
+
+        return cls(
+            caminho_lote, encoding, stat.st_size, stat.st_mtime_ns, _hash_arquivo(caminho_lote), total_linhas,
+            header, {conta: [tuple(faixa) for faixa in faixas] for conta, faixas in faturas.items()},
+            tipos_por_conta, mapa_faturas, encodings
+        )
+
+    def salvar(self, caminho_indice: Union[str, Path]):
+        caminho_indice = Path(caminho_indice)
+        caminho_indice.parent.mkdir(parents=True, exist_ok=True)
+        dados = {
+            'versao': VERSAO_INDICE,
+            'encodings': list(self.encodings),
+            'encoding': self.encoding,
+            'tamanho': self.tamanho,
+            'mtime_ns': self.mtime_ns,
+            'hash': self.hash_lote,
+            'total_linhas': self.total_linhas,
+            'header': self.header,
+            'faturas': [[conta, faixas, self.tipos_por_conta.get(conta, {})] for conta, faixas in self.faturas.items()],
+            'mapa_faturas': self.mapa_faturas,
+        }
+        # Grava num temporário e troca: uma comparação concorrente nunca lê um índice pela metade
+        temporario = caminho_indice.with_name(caminho_indice.name + '.tmp')
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(dados, arquivo, ensure_ascii=False)
+        os.replace(temporario, caminho_indice)
+
+    @classmethod
+    def carregar(cls, caminho_lote: Union[str, Path], caminho_indice: Union[str, Path],
+                 encodings=ENCODINGS_PADRAO) -> Optional['IndiceFaturasLote']:
+        """Índice salvo, ou None se faltar, estiver inválido ou o lote tiver mudado"""
+        try:
+            with open(caminho_indice, 'r', encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+            stat = os.stat(caminho_lote)
+        except (OSError, ValueError):
+            return None
+        if (not isinstance(dados, dict) or dados.get('versao') != VERSAO_INDICE
+                or dados.get('encodings') != list(encodings) or not arquivo_inalterado(caminho_lote, dados)):
+            return None
+
+        try:
+            indice = cls(
+                caminho_lote, dados['encoding'], dados['tamanho'], dados['mtime_ns'], dados['hash'],
+                dados['total_linhas'], [tuple(faixa) for faixa in dados['header']],
+                {conta: [tuple(faixa) for faixa in faixas] for conta, faixas, _ in dados['faturas']},
+                {conta: tipos for conta, _, tipos in dados['faturas']}, dados['mapa_faturas'], encodings
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        if indice.mtime_ns != stat.st_mtime_ns:
+            # Mesmo conteúdo com outra data (ex.: lote copiado de novo): guarda a data nova
+            indice.mtime_ns = stat.st_mtime_ns
+            indice.salvar(caminho_indice)
+        return indice
+
+    @classmethod
+    def obter(cls, caminho_lote: Union[str, Path], caminho_indice: Union[str, Path],
+              encodings=ENCODINGS_PADRAO) -> 'IndiceFaturasLote':
+        """Índice salvo, se ainda valer para o lote, ou um novo (já salvo no lugar do antigo)"""
+        indice = cls.carregar(caminho_lote, caminho_indice, encodings)
+        if indice is None:
+            indice = cls.construir(caminho_lote, encodings)
+            indice.salvar(caminho_indice)
+        return indice
+
+    @property
+    def assinatura(self) -> Dict[str, Any]:
+        """Tamanho, data e hash do lote na montagem do índice, no formato de `assinatura_arquivo`"""
+        return {'tamanho': self.tamanho, 'mtime_ns': self.mtime_ns, 'hash': self.hash_lote}
+
+    def faixas_das_contas(self, contas: Iterable[str]) -> List[Faixa]:
+        """Faixas dos blocos das contas pedidas e das linhas de header fora deles, na ordem do arquivo"""
+        faixas = sorted(faixa for conta in set(contas) for faixa in self.faturas.get(conta, ()))
+        inicios = [inicio for inicio, _, _ in faixas]
+        for header in self.header:
+            # Header dentro de um bloco lido já sai na leitura do bloco
+            posicao = bisect.bisect_right(inicios, header[0]) - 1
+            if posicao < 0 or faixas[posicao][1] <= header[0]:
+                faixas.append(header)
+        return sorted(faixas)
+
+    def linhas_das_contas(self, contas: Iterable[str]) -> Iterator[Tuple[int, str]]:
+        """Pares (numero_linha, linha) só das faixas das contas pedidas, lidas com `seek`"""
+        with open(self.caminho_lote, 'rb') as arquivo:
+            for inicio, fim, primeira_linha in self.faixas_das_contas(contas):
+                arquivo.seek(inicio)
+                yield from enumerate(
+                    iterar_linhas_bytes(arquivo.read(fim - inicio), self.encoding, self.encodings), primeira_linha
+                )
+
+    def linhas(self, numeros: Iterable[int]) -> Dict[int, str]:
+        """Linhas pedidas pelo número (numero_linha -> linha), lidas só nas faixas que as contêm.
+
+        Linhas fora dos blocos de fatura e do header (ex.: antes do primeiro 01) não saem."""
+        if self._faixas_por_linha is None:
+            faixas = self.faixas_das_contas(self.faturas)
+            self._faixas_por_linha = (faixas, [primeira_linha for _, _, primeira_linha in faixas])
+        faixas, primeiras = self._faixas_por_linha
+        pedidas_por_faixa: Dict[int, set] = {}
+        for numero_linha in numeros:
+            posicao = bisect.bisect_right(primeiras, numero_linha) - 1
+            if posicao >= 0:
+                pedidas_por_faixa.setdefault(posicao, set()).add(numero_linha)
+
+        linhas = {}
+        with open(self.caminho_lote, 'rb') as arquivo:
+            for posicao, pedidas in sorted(pedidas_por_faixa.items()):
+                inicio, fim, primeira_linha = faixas[posicao]
+                ultima = max(pedidas)
+                arquivo.seek(inicio)
+                for numero_linha, linha in enumerate(
+                        iterar_linhas_bytes(arquivo.read(fim - inicio), self.encoding, self.encodings), primeira_linha):
+                    if numero_linha > ultima:
+                        break
+                    if numero_linha in pedidas:
+                        linhas[numero_linha] = linha
+        return linhas
+
+
+def assinatura_arquivo(caminho: Union[str, Path]) -> Dict[str, Any]:
+    """Tamanho, data de modificação e hash SHA-256 de um arquivo, para conferir depois se ele mudou"""
+    stat = os.stat(caminho)
+    return {'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': _hash_arquivo(caminho)}
+
+
+def arquivo_inalterado(caminho: Union[str, Path], assinatura: Dict[str, Any]) -> bool:
+    """Se o arquivo ainda confere com a `assinatura`: mesmo tamanho e, se a data mudou, mesmo hash"""
+    try:
+        stat = os.stat(caminho)
+    except OSError:
+        return False
+    if stat.st_size != assinatura.get('tamanho'):
+        return False
+    # Mesmo tamanho com outra data (ex.: arquivo copiado de novo): o conteúdo decide
+    return stat.st_mtime_ns == assinatura.get('mtime_ns') or _hash_arquivo(caminho) == assinatura.get('hash')
+
+
+def _hash_arquivo(caminho: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
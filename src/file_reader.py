@@ -0,0 +1,92 @@
+"""
+Leitura compartilhada de arquivos TXT com detecção de encoding em passada única.
+
+O encoding é detectado a partir de uma amostra do início do arquivo; depois cada
+linha é decodificada com ele e, se uma linha específica falhar (ex.: um byte
+latin-1 no meio de um arquivo UTF-8), só essa linha cai para o próximo encoding
+da lista. Assim nenhum arquivo é relido do início e nenhuma linha é emitida duas
+vezes.
+
+As linhas são quebradas apenas em '\\n' (com ou sem '\\r' antes); '\\r' isolado
+não é tratado como quebra de linha.
+"""
+
+import codecs
+import io
+from typing import Iterator, List, Sequence, Tuple
+
+# Ordem de tentativa padrão; latin-1 decodifica qualquer byte e fecha a lista
+ENCODINGS_PADRAO: Tuple[str, ...] = ('utf-8', 'latin-1')
+# Arquivos gerados em Windows (usado pelo validador aprimorado)
+ENCODINGS_WINDOWS: Tuple[str, ...] = ('utf-8', 'cp1252', 'latin-1')
+
+TAMANHO_AMOSTRA = 64 * 1024
+
+
+def detectar_encoding(amostra: bytes, encodings: Sequence[str] = ENCODINGS_PADRAO) -> str:
+    """Retorna o primeiro encoding da lista que decodifica a amostra"""
+    for encoding in encodings:
+        try:
+            # final=False: a amostra pode terminar no meio de um caractere multibyte
+            codecs.getincrementaldecoder(encoding)().decode(amostra, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return encodings[-1]
+
+
+def detectar_encoding_arquivo(caminho_arquivo: str, encodings: Sequence[str] = ENCODINGS_PADRAO) -> str:
+    """Detecta o encoding pela amostra inicial do arquivo"""
+    with open(caminho_arquivo, 'rb') as arquivo:
+        return detectar_encoding(arquivo.read(TAMANHO_AMOSTRA), encodings)
+
+
+def decodificar_linha(bruta: bytes, encoding: str, encodings: Sequence[str] = ENCODINGS_PADRAO) -> str:
+    """Decodifica uma linha com o encoding detectado, caindo para os demais se ela falhar"""
+    try:
+        return bruta.decode(encoding)
+    except UnicodeDecodeError:
+        for alternativo in encodings:
+            if alternativo == encoding:
+                continue
+            try:
+                return bruta.decode(alternativo)
+            except UnicodeDecodeError:
+                continue
+        return bruta.decode(encodings[-1], errors='replace')
+
+
+def iterar_linhas_bytes(dados: bytes, encoding: str, encodings: Sequence[str] = ENCODINGS_PADRAO) -> Iterator[str]:
+    """Itera as linhas (sem quebra de linha) de um trecho já lido em memória"""
+    for bruta in io.BytesIO(dados):
+        yield decodificar_linha(bruta.rstrip(b'\r\n'), encoding, encodings)
+
+
+class LeitorArquivo:
+    """Leitor de linhas em streaming, com o encoding detectado uma única vez
+
+    Uso:
+        leitor = LeitorArquivo(caminho)
+        for numero_linha, linha in leitor.linhas_numeradas():
+            ...
+    """
+
+    def __init__(self, caminho_arquivo: str, encodings: Sequence[str] = ENCODINGS_PADRAO):
+        self.caminho_arquivo = caminho_arquivo
+        self.encodings = tuple(encodings)
+        self.encoding = detectar_encoding_arquivo(caminho_arquivo, self.encodings)
+
+    def __iter__(self) -> Iterator[str]:
+        """Linhas do arquivo sem '\\n'/'\\r' finais"""
+        with open(self.caminho_arquivo, 'rb') as arquivo:
+            for bruta in arquivo:
+                yield decodificar_linha(bruta.rstrip(b'\r\n'), self.encoding, self.encodings)
+
+    def linhas_numeradas(self) -> Iterator[Tuple[int, str]]:
+        """Pares (numero_linha, linha) com numeração a partir de 1"""
+        return enumerate(self, 1)
+
+
+def ler_linhas(caminho_arquivo: str, encodings: Sequence[str] = ENCODINGS_PADRAO) -> List[str]:
+    """Lê todas as linhas do arquivo (sem quebras de linha)"""
+    return list(LeitorArquivo(caminho_arquivo, encodings))
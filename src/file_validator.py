@@ -1,12 +1,38 @@
-from typing import List, Generator, Tuple
+from typing import List, Generator, Optional, Tuple
 from pathlib import Path
 
 try:
-    from .models import Layout, ErroValidacao, ResultadoValidacao
-    from .validators import ValidadorCampo
+    from .models import (
+        Layout, ErroValidacao, ResultadoValidacao, ResultadoParcialValidacao, ResultadoAmostragem, ColecaoErros
+    )
+    from .validators import ValidadorCampo, ErroCampo
+    from .compiled_layout import compilar_layout
+    from .vectorized_validator import HAS_NUMPY, linhas_do_arquivo, linhas_suspeitas
+    from .parallel_validator import validar_em_paralelo
+    from .line_index import LineIndex
+    from .sampling_validator import (
+        NIVEL_CONFIANCA, PRIMEIROS_BLOCOS, TAMANHO_AMOSTRA_BLOCOS,
+        linhas_do_plano, planejar_amostra, resultado_amostragem
+    )
+    from .file_reader import (
+        ENCODINGS_PADRAO, LeitorArquivo, TAMANHO_AMOSTRA, decodificar_linha, detectar_encoding, iterar_linhas_bytes
+    )
 except ImportError:
-    from models import Layout, ErroValidacao, ResultadoValidacao
-    from validators import ValidadorCampo
+    from models import (
+        Layout, ErroValidacao, ResultadoValidacao, ResultadoParcialValidacao, ResultadoAmostragem, ColecaoErros
+    )
+    from validators import ValidadorCampo, ErroCampo
+    from compiled_layout import compilar_layout
+    from vectorized_validator import HAS_NUMPY, linhas_do_arquivo, linhas_suspeitas
+    from parallel_validator import validar_em_paralelo
+    from line_index import LineIndex
+    from sampling_validator import (
+        NIVEL_CONFIANCA, PRIMEIROS_BLOCOS, TAMANHO_AMOSTRA_BLOCOS,
+        linhas_do_plano, planejar_amostra, resultado_amostragem
+    )
+    from file_reader import (
+        ENCODINGS_PADRAO, LeitorArquivo, TAMANHO_AMOSTRA, decodificar_linha, detectar_encoding, iterar_linhas_bytes
+    )
 
 
 class ValidadorArquivo:
@@ -15,25 +41,11 @@ class ValidadorArquivo:
     def __init__(self, layout: Layout):
         self.layout = layout
         self.validador_campo = ValidadorCampo()
+        self.compilado = compilar_layout(layout)
 
     def extrair_campos_linha(self, linha: str) -> dict:
         """Extrai os campos de uma linha baseado no layout"""
-        campos_extraidos = {}
-
-        for campo in self.layout.campos:
-            # Ajustar índices (layout usa 1-indexed, Python usa 0-indexed)
-            inicio = campo.posicao_inicio - 1
-            fim = campo.posicao_fim
-
-            # Extrair valor (cuidando com linhas muito curtas)
-            if inicio < len(linha):
-                valor = linha[inicio:fim] if fim <= len(linha) else linha[inicio:]
-            else:
-                valor = ''
-
-            campos_extraidos[campo.nome] = valor
-
-        return campos_extraidos
+        return self.compilado.extrair(linha)
 
     def validar_linha(self, numero_linha: int, linha: str) -> List[ErroValidacao]:
         """Valida uma linha individual"""
@@ -67,46 +79,22 @@ class ValidadorArquivo:
             erros.append(erro)
             # Continuar validação mesmo com linha curta para mostrar outros problemas
 
-        # Extrair campos
-        campos_extraidos = self.extrair_campos_linha(linha)
-
-        # Validar cada campo (limitando para evitar loops infinitos)
+        # Validar cada campo usando as fatias pré-calculadas (limitando para evitar loops infinitos)
         contador_erros = 0
-        for campo in self.layout.campos:
+        for campo_compilado in self.compilado.campos:
             if contador_erros >= 10:  # Limitar erros por linha
                 break
 
-            valor = campos_extraidos.get(campo.nome, '')
-            erros_campo = self.validador_campo.validar_campo(valor, campo)
+            campo = campo_compilado.campo
+            valor = linha[campo_compilado.inicio:campo_compilado.fim]
+            falhas = self.validador_campo.verificar_campo(valor, campo, campo_compilado.verificar_tipo)
 
-            for descricao_erro in erros_campo:
+            for falha in falhas:
                 if contador_erros >= 10:
                     break
 
-                # Determinar tipo de erro
-                if 'obrigatório' in descricao_erro.lower():
-                    tipo_erro = 'CAMPO_OBRIGATORIO'
-                elif 'tamanho' in descricao_erro.lower():
-                    tipo_erro = 'TAMANHO_CAMPO'
-                elif 'formato' in descricao_erro.lower() or 'deve estar no formato' in descricao_erro.lower():
-                    tipo_erro = 'FORMATO_INVALIDO'
-                elif 'deve conter apenas' in descricao_erro.lower() or 'deve ser um' in descricao_erro.lower():
-                    tipo_erro = 'TIPO_INVALIDO'
-                else:
-                    tipo_erro = 'ERRO_GENERICO'
-
-                # Criar descrição mais simples para evitar loops
-                descricao_detalhada = f"Campo: {campo.nome} | Posição: {campo.posicao_inicio}-{campo.posicao_fim} | {descricao_erro}"
-
-                erro = ErroValidacao(
-                    linha=numero_linha,
-                    campo=campo.nome,
-                    valor_encontrado=f"'{valor}' (pos {campo.posicao_inicio}-{campo.posicao_fim})",
-                    erro_tipo=tipo_erro,
-                    descricao=descricao_detalhada,
-                    valor_esperado=self._obter_valor_esperado(campo, tipo_erro)
-                )
-                erros.append(erro)
+                # Tipo de erro vem do código da falha; os textos só são montados quando lidos
+                erros.append(ErroCampo(numero_linha, campo, valor, falha))
                 contador_erros += 1
 
         return erros
@@ -153,84 +141,68 @@ class ValidadorArquivo:
         except Exception:
             return f"Erro no campo {campo.nome}: {erro_original}"
 
-    def _obter_valor_esperado(self, campo, tipo_erro):
-        """Obtém descrição do valor esperado baseado no tipo de erro"""
-        if tipo_erro == 'CAMPO_OBRIGATORIO':
-            return f"Qualquer valor válido do tipo {campo.tipo.value}"
-        elif tipo_erro == 'TAMANHO_CAMPO':
-            return f"Exatamente {campo.tamanho} caracteres"
-        elif tipo_erro == 'TIPO_INVALIDO':
-            if campo.tipo.value == 'NUMERO':
-                return "Apenas dígitos (0-9)"
-            elif campo.tipo.value == 'DATA':
-                return f"Data no formato {campo.formato or 'YYYYMMDD'}"
-            elif campo.tipo.value == 'DECIMAL':
-                return "Apenas dígitos para valor decimal"
-            else:
-                return f"Valor do tipo {campo.tipo.value}"
-        elif tipo_erro == 'FORMATO_INVALIDO':
-            return f"Data válida no formato {campo.formato}"
-        else:
-            return f"Valor válido do tipo {campo.tipo.value}"
-
     def _reconstruir_registros_sequenciais(self, caminho_arquivo: str, encoding: str = 'utf-8') -> Generator[str, None, None]:
         """Reconstrói registros sequenciais a partir de arquivo com quebras incorretas"""
-        with open(caminho_arquivo, 'r', encoding=encoding) as arquivo:
-            buffer = ""
+        encodings = (encoding,) + tuple(e for e in ENCODINGS_PADRAO if e != encoding)
+        buffer = ""
 
-            for linha in arquivo:
-                linha = linha.rstrip('\n\r')
-                buffer += linha
+        for linha in LeitorArquivo(caminho_arquivo, encodings):
+            buffer += linha
 
-                # Quando o buffer atingir o tamanho esperado da linha, extrair registros
-                while len(buffer) >= self.layout.tamanho_linha:
-                    registro = buffer[:self.layout.tamanho_linha]
-                    buffer = buffer[self.layout.tamanho_linha:]
-                    yield registro
+            # Quando o buffer atingir o tamanho esperado da linha, extrair registros
+            while len(buffer) >= self.layout.tamanho_linha:
+                registro = buffer[:self.layout.tamanho_linha]
+                buffer = buffer[self.layout.tamanho_linha:]
+                yield registro
 
-            # Se sobrou algo no buffer, é um registro incompleto
-            if buffer.strip():
-                yield buffer
+        # Se sobrou algo no buffer, é um registro incompleto
+        if buffer.strip():
+            yield buffer
 
     def validar_arquivo_generator(self, caminho_arquivo: str) -> Generator[Tuple[int, List[ErroValidacao]], None, None]:
         """Generator que valida arquivo linha por linha (para arquivos grandes)"""
         if not Path(caminho_arquivo).exists():
             raise FileNotFoundError(f"Arquivo não encontrado: {caminho_arquivo}")
 
-        try:
-            with open(caminho_arquivo, 'r', encoding='utf-8') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    # Remover quebra de linha
-                    linha = linha.rstrip('\n\r')
-
-                    # Adicionar padding de espaços para completar o tamanho esperado
-                    if len(linha) < self.layout.tamanho_linha:
-                        linha = linha.ljust(self.layout.tamanho_linha)
-
-                    erros_linha = self.validar_linha(numero_linha, linha)
-                    yield numero_linha, erros_linha
-
-        except UnicodeDecodeError:
-            # Tentar com encoding latin-1 se UTF-8 falhar
-            try:
-                with open(caminho_arquivo, 'r', encoding='latin-1') as arquivo:
-                    for numero_linha, linha in enumerate(arquivo, 1):
-                        linha = linha.rstrip('\n\r')
-
-                        # Adicionar padding de espaços para completar o tamanho esperado
-                        if len(linha) < self.layout.tamanho_linha:
-                            linha = linha.ljust(self.layout.tamanho_linha)
-
-                        erros_linha = self.validar_linha(numero_linha, linha)
-                        yield numero_linha, erros_linha
-            except Exception as e:
-                raise ValueError(f"Erro ao ler arquivo: {str(e)}")
-
-    def validar_arquivo(self, caminho_arquivo: str, max_erros: int = None) -> ResultadoValidacao:
-        """Valida arquivo completo"""
+        # Encoding detectado uma vez; linhas com bytes inválidos caem para latin-1 sem reler o arquivo
+        for numero_linha, linha in LeitorArquivo(caminho_arquivo).linhas_numeradas():
+            # Adicionar padding de espaços para completar o tamanho esperado
+            if len(linha) < self.layout.tamanho_linha:
+                linha = linha.ljust(self.layout.tamanho_linha)
+
+            erros_linha = self.validar_linha(numero_linha, linha)
+            yield numero_linha, erros_linha
+
+    def validar_arquivo(self, caminho_arquivo: str, max_erros: int = None,
+                        vetorizado: Optional[bool] = None, processos: Optional[int] = None) -> ResultadoValidacao:
+        """Valida arquivo completo
+
+        Args:
+            vetorizado: usar a triagem NumPy (None = automático, quando NumPy estiver disponível)
+            processos: se maior que 1, divide o arquivo em shards validados em paralelo
+        """
+        if vetorizado is None:
+            vetorizado = HAS_NUMPY
+
+        if processos and processos > 1:
+            if not Path(caminho_arquivo).exists():
+                raise FileNotFoundError(f"Arquivo não encontrado: {caminho_arquivo}")
+            parcial = validar_em_paralelo(self, caminho_arquivo, max_erros, processos, vetorizado=vetorizado)
+            return self._resultado_de_parcial(parcial)
+
+        if vetorizado and HAS_NUMPY:
+            if not Path(caminho_arquivo).exists():
+                raise FileNotFoundError(f"Arquivo não encontrado: {caminho_arquivo}")
+
+            with open(caminho_arquivo, 'rb') as arquivo:
+                dados = arquivo.read()
+            encoding = detectar_encoding(dados[:TAMANHO_AMOSTRA])
+
+            return self._resultado_de_parcial(self.validar_dados(dados, encoding, max_erros, vetorizado=True))
+
         total_linhas = 0
         linhas_com_erro = 0
-        todos_erros = []
+        todos_erros = ColecaoErros()
 
         for numero_linha, erros_linha in self.validar_arquivo_generator(caminho_arquivo):
             total_linhas += 1
@@ -251,4 +223,82 @@ class ValidadorArquivo:
             linhas_com_erro=linhas_com_erro,
             erros=todos_erros,
             taxa_sucesso=0.0  # Será calculado no __post_init__
-        )
\ No newline at end of file
+        )
+
+    def validar_amostra(self, caminho_arquivo: str, primeiros_blocos: int = PRIMEIROS_BLOCOS,
+                        tamanho_amostra: int = TAMANHO_AMOSTRA_BLOCOS, semente: Optional[int] = None,
+                        nivel_confianca: float = NIVEL_CONFIANCA) -> ResultadoAmostragem:
+        """Verificação rápida: header, trailer, primeiros blocos de NF e uma amostra aleatória
+
+        Devolve a taxa de sucesso estimada para o arquivo inteiro, com intervalo de confiança.
+        """
+        erros = ColecaoErros()
+        with LineIndex(caminho_arquivo) as indice:
+            plano = planejar_amostra(indice, primeiros_blocos, tamanho_amostra, semente)
+            for numero_linha in linhas_do_plano(plano):
+                linha = indice.get_line(numero_linha)
+                if len(linha) < self.layout.tamanho_linha:
+                    linha = linha.ljust(self.layout.tamanho_linha)
+                erros.extend(self.validar_linha(numero_linha, linha))
+
+        return resultado_amostragem(plano, erros, nivel_confianca)
+
+    def validar_dados(self, dados: bytes, encoding: str, max_erros: int = None,
+                      vetorizado: Optional[bool] = None) -> ResultadoParcialValidacao:
+        """Valida um trecho do arquivo já lido em bytes (numeração de linhas local ao trecho)
+
+        Com `vetorizado`, só as linhas marcadas pela triagem NumPy passam por validar_linha.
+        """
+        if vetorizado is None:
+            vetorizado = HAS_NUMPY
+
+        if vetorizado and HAS_NUMPY:
+            linhas = linhas_do_arquivo(dados)
+            total_linhas = len(linhas.inicios)
+            candidatas = (
+                (indice + 1, decodificar_linha(dados[linhas.inicios[indice]:linhas.fins[indice]], encoding))
+                for indice in linhas_suspeitas(dados, linhas, self.compilado, self.layout.tamanho_linha)
+            )
+        else:
+            # Mesma leitura linha a linha do gerador
+            total_linhas = None
+            candidatas = enumerate(iterar_linhas_bytes(dados, encoding), 1)
+
+        erros_por_linha = []
+        total_erros = 0
+        contadas = 0
+        for numero_linha, linha in candidatas:
+            contadas = numero_linha
+
+            # Adicionar padding de espaços para completar o tamanho esperado
+            if len(linha) < self.layout.tamanho_linha:
+                linha = linha.ljust(self.layout.tamanho_linha)
+
+            erros_linha = self.validar_linha(numero_linha, linha)
+            if erros_linha:
+                erros_por_linha.append((numero_linha, erros_linha))
+                total_erros += len(erros_linha)
+
+                # Mesmo corte do modo linha a linha: as linhas seguintes não são contadas
+                if max_erros and total_erros >= max_erros:
+                    total_linhas = numero_linha
+                    break
+        else:
+            if total_linhas is None:
+                total_linhas = contadas
+
+        return ResultadoParcialValidacao(total_linhas=total_linhas, erros_por_linha=erros_por_linha)
+
+    @staticmethod
+    def _resultado_de_parcial(parcial: ResultadoParcialValidacao) -> ResultadoValidacao:
+        """Converte o resultado (parcial ou mesclado) em ResultadoValidacao"""
+        todos_erros = ColecaoErros(erro for _, erros in parcial.erros_por_linha for erro in erros)
+        linhas_com_erro = len(parcial.erros_por_linha)
+
+        return ResultadoValidacao(
+            total_linhas=parcial.total_linhas,
+            linhas_validas=parcial.total_linhas - linhas_com_erro,
+            linhas_com_erro=linhas_com_erro,
+            erros=todos_erros,
+            taxa_sucesso=0.0  # Será calculado no __post_init__
+        )
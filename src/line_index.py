@@ -0,0 +1,219 @@
+"""
+Índice de linhas para acesso aleatório a arquivos TXT grandes.
+
+O arquivo é mapeado em memória (mmap) e os offsets em bytes do início de cada
+linha são guardados num `array('Q')` montado numa única passada. Buscar a linha
+N decodifica apenas aquela fatia do mapa, sem manter uma segunda cópia do
+arquivo em memória (ex.: um `Dict[int, str]` com todas as linhas).
+
+A quebra de linha e a decodificação seguem o leitor compartilhado
+(`file_reader`): apenas '\\n', sem os '\\r' finais, com o encoding detectado
+pela amostra inicial e queda por linha para os demais.
+
+Também pode indexar só uma faixa de bytes do arquivo (ex.: um bloco de NFs
+validado noutro processo), mantendo a numeração global das linhas.
+"""
+
+import mmap
+from array import array
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    from .file_reader import ENCODINGS_PADRAO, TAMANHO_AMOSTRA, decodificar_linha, detectar_encoding
+except ImportError:
+    from file_reader import ENCODINGS_PADRAO, TAMANHO_AMOSTRA, decodificar_linha, detectar_encoding
+
+
+# Trecho do mapa varrido por vez na indexação: a máscara temporária do NumPy fica limitada a isso
+TAMANHO_BLOCO_INDEXACAO = 8 * 1024 * 1024
+
+
+class LineIndex:
+    """Offsets das linhas de um arquivo mapeado em memória, com numeração a partir de 1
+
+    Uso:
+        with LineIndex(caminho) as indice:
+            linha = indice.get_line(10)
+            trecho = indice.get_lines(range(10, 20))
+
+    Com `inicio`/`fim`, só a faixa de bytes [inicio, fim) é indexada (deve começar no
+    início de uma linha) e a primeira linha dela recebe o número `primeira_linha`.
+    """
+
+    def __init__(self, caminho_arquivo: str, encodings: Sequence[str] = ENCODINGS_PADRAO,
+                 inicio: int = 0, fim: Optional[int] = None, primeira_linha: int = 1,
+                 encoding: Optional[str] = None):
+        self.caminho_arquivo = caminho_arquivo
+        self.encodings = tuple(encodings)
+        self._deslocamento = primeira_linha - 1
+
+        self._arquivo = open(caminho_arquivo, 'rb')
+        try:
+            self._dados = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Arquivo vazio não pode ser mapeado
+            self._dados = b''
+
+        fim = len(self._dados) if fim is None else min(fim, len(self._dados))
+        # Encoding informado (ex.: o detectado no arquivo inteiro) ou detectado pela amostra da faixa
+        self.encoding = encoding or detectar_encoding(self._dados[inicio:inicio + TAMANHO_AMOSTRA], self.encodings)
+        self.offsets = self._indexar(self._dados, inicio, fim)
+        self._nao_ascii = None
+
+    @staticmethod
+    def _indexar(dados, inicio: int = 0, fim: Optional[int] = None) -> array:
+        """Início de cada linha da faixa, mais o fim da faixa como sentinela final"""
+        fim = len(dados) if fim is None else fim
+        offsets = array('Q', [inicio])
+
+        if HAS_NUMPY and fim > inicio:
+            buffer = np.frombuffer(dados, dtype=np.uint8)
+            for bloco in range(inicio, fim, TAMANHO_BLOCO_INDEXACAO):
+                quebras = np.flatnonzero(buffer[bloco:min(bloco + TAMANHO_BLOCO_INDEXACAO, fim)] == 10) + (bloco + 1)
+                offsets.frombytes(quebras.astype(np.uint64).tobytes())
+        else:
+            posicao = dados.find(b'\n', inicio, fim)
+            while posicao != -1:
+                offsets.append(posicao + 1)
+                posicao = dados.find(b'\n', posicao + 1, fim)
+
+        # Sem linha vazia fantasma depois do '\n' final (nem em arquivo vazio)
+        if offsets[-1] != fim:
+            offsets.append(fim)
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def primeira_linha(self) -> int:
+        return self._deslocamento + 1
+
+    @property
+    def ultima_linha(self) -> int:
+        return self._deslocamento + len(self)
+
+    def __contains__(self, numero_linha) -> bool:
+        return isinstance(numero_linha, int) and self.primeira_linha <= numero_linha <= self.ultima_linha
+
+    def __getitem__(self, numero_linha: int) -> str:
+        if numero_linha not in self:
+            raise KeyError(numero_linha)
+        return self._decodificar(numero_linha)
+
+    def _decodificar(self, numero_linha: int) -> str:
+        local = numero_linha - self._deslocamento
+        bruta = self._dados[self.offsets[local - 1]:self.offsets[local]]
+        return decodificar_linha(bruta.rstrip(b'\r\n'), self.encoding, self.encodings)
+
+    def get_line(self, numero_linha: int) -> str:
+        """Conteúdo da linha (sem '\\n'/'\\r' finais)"""
+        if numero_linha not in self:
+            raise IndexError(f"Linha {numero_linha} fora do arquivo ({self.primeira_linha}-{self.ultima_linha})")
+        return self._decodificar(numero_linha)
+
+    def get(self, numero_linha: int, padrao: Optional[str] = None) -> Optional[str]:
+        """Como `dict.get`: conteúdo da linha ou `padrao` se ela não existir"""
+        if numero_linha not in self:
+            return padrao
+        return self._decodificar(numero_linha)
+
+    def get_lines(self, numeros_linha: Iterable[int]) -> List[str]:
+        """Conteúdo das linhas pedidas (ex.: `range(10, 20)`), ignorando as inexistentes"""
+        return [self._decodificar(n) for n in numeros_linha if n in self]
+
+    def bytes_das_linhas(self, inicio: int, fim: int) -> bytes:
+        """Bytes brutos das linhas [inicio, fim), com as quebras de linha"""
+        inicio = max(inicio, self.primeira_linha) - self._deslocamento
+        fim = min(fim, self.ultima_linha + 1) - self._deslocamento
+        if fim <= inicio:
+            return b''
+        return bytes(self._dados[self.offsets[inicio - 1]:self.offsets[fim - 1]])
+
+    def matriz_bytes(self, numeros_linha: 'np.ndarray', inicio: int, fim: int) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """Bytes [inicio, fim) das linhas pedidas (matriz uint8, completada com espaços), o tamanho
+        em bytes de cada uma (sem os '\\r\\n' finais) e se os bytes até `fim` são todos ASCII
+        (posição em bytes igual à do caractere); requer NumPy"""
+        buffer = np.frombuffer(self._dados, dtype=np.uint8) if len(self._dados) else np.zeros(1, dtype=np.uint8)
+        offsets = np.frombuffer(self.offsets, dtype=np.uint64).astype(np.int64)
+        locais = np.asarray(numeros_linha, dtype=np.int64) - self._deslocamento
+        inicios, fins = offsets[locais - 1], offsets[locais]
+
+        # Mesmo efeito do rstrip(b'\r\n') da decodificação
+        while True:
+            ultimo = buffer[np.maximum(fins - 1, 0)]
+            com_quebra = (fins > inicios) & ((ultimo == 10) | (ultimo == 13))
+            if not com_quebra.any():
+                break
+            fins = fins - com_quebra
+        tamanhos = fins - inicios
+
+        colunas = np.arange(inicio, fim, dtype=np.int64)
+        matriz = buffer[np.minimum(inicios[:, None] + colunas[None, :], len(buffer) - 1)]
+        matriz[colunas[None, :] >= tamanhos[:, None]] = 32
+
+        # Primeiro byte fora do ASCII a partir do início de cada linha
+        nao_ascii = self._posicoes_nao_ascii()
+        ascii_ate_fim = nao_ascii[np.searchsorted(nao_ascii, inicios)] >= inicios + fim
+        return matriz, tamanhos, ascii_ate_fim
+
+    def _posicoes_nao_ascii(self) -> 'np.ndarray':
+        """Offsets dos bytes fora do ASCII na faixa indexada (calculados uma vez), com o maior
+        int64 como sentinela final"""
+        if self._nao_ascii is None:
+            buffer = np.frombuffer(self._dados, dtype=np.uint8) if len(self._dados) else np.zeros(0, dtype=np.uint8)
+            partes = [
+                np.flatnonzero(buffer[bloco:min(bloco + TAMANHO_BLOCO_INDEXACAO, self.offsets[-1])] >= 128) + bloco
+                for bloco in range(self.offsets[0], self.offsets[-1], TAMANHO_BLOCO_INDEXACAO)
+            ]
+            partes.append(np.array([np.iinfo(np.int64).max], dtype=np.int64))
+            self._nao_ascii = np.concatenate(partes).astype(np.int64)
+        return self._nao_ascii
+
+    def linhas_com_prefixo(self, prefixo: bytes) -> List[int]:
+        """Números das linhas que começam com `prefixo` (ex.: b'01'), sem decodificar o arquivo"""
+        tamanho = len(prefixo)
+        if not len(self) or not tamanho:
+            return []
+
+        if HAS_NUMPY:
+            buffer = np.frombuffer(self._dados, dtype=np.uint8)
+            offsets = np.frombuffer(self.offsets, dtype=np.uint64).astype(np.int64)
+            inicios, fins = offsets[:-1], offsets[1:]
+            candidatas = fins - inicios >= tamanho
+            for posicao, byte in enumerate(prefixo):
+                candidatas &= buffer[np.minimum(inicios + posicao, len(buffer) - 1)] == byte
+            return (np.flatnonzero(candidatas) + self.primeira_linha).tolist()
+
+        dados, offsets = self._dados, self.offsets
+        return [
+            local + self._deslocamento for local in range(1, len(self) + 1)
+            if offsets[local] - offsets[local - 1] >= tamanho
+            and dados[offsets[local - 1]:offsets[local - 1] + tamanho] == prefixo
+        ]
+
+    def linhas_numeradas(self, inicio: int = 1, fim: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """Pares (numero_linha, linha) de `inicio` até antes de `fim` (padrão: até o final)"""
+        fim = self.ultima_linha + 1 if fim is None else min(fim, self.ultima_linha + 1)
+        for numero_linha in range(max(inicio, self.primeira_linha), fim):
+            yield numero_linha, self._decodificar(numero_linha)
+
+    def close(self):
+        """Libera o mapa e o arquivo"""
+        if isinstance(self._dados, mmap.mmap):
+            self._dados.close()
+        self._dados = b''
+        self.offsets = array('Q', [0])
+        self._arquivo.close()
+
+    def __enter__(self) -> 'LineIndex':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
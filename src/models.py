@@ -1,6 +1,9 @@
-from dataclasses import dataclass
-from typing import List, Optional, Any
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Any, Sequence, Tuple
 from enum import Enum
+from array import array
+from collections import Counter
+from collections.abc import Sequence as SequenciaABC
 
 
 class TipoCampo(Enum):
@@ -10,9 +13,10 @@ class TipoCampo(Enum):
     DECIMAL = "DECIMAL"
 
 
-@dataclass
+@dataclass(frozen=True)
 class CampoLayout:
-    """Representa um campo do layout"""
+    """Representa um campo do layout (imutável: os planos compilados e o índice por nome
+    do Layout guardam as posições e nomes dos campos)"""
     nome: str
     posicao_inicio: int
     tamanho: int
@@ -24,7 +28,7 @@ class CampoLayout:
     def __post_init__(self):
         """Calcula posição final baseada no início e tamanho"""
         if self.posicao_fim is None:
-            self.posicao_fim = self.posicao_inicio + self.tamanho - 1
+            object.__setattr__(self, 'posicao_fim', self.posicao_inicio + self.tamanho - 1)
 
 
 @dataclass
@@ -37,6 +41,199 @@ class ErroValidacao:
     descricao: str
     valor_esperado: Optional[str] = None
 
+    def _dados_compactos(self) -> Optional[Tuple[Any, str, Any]]:
+        """(objeto compartilhado, valor, detalhe) para recriar o erro sem guardar textos prontos
+
+        A subclasse que devolver esses dados precisa aceitar `Classe(linha, objeto, valor, detalhe)`.
+        """
+        return None
+
+
+class ModeloErroLinhas(NamedTuple):
+    """Textos de um ErroLinhasCitadas; `descricao` é um modelo de `str.format` com as linhas citadas"""
+    campo: str
+    erro_tipo: str
+    descricao: str  # Ex.: "Registro tipo 38 duplicado (linha anterior: {0})", "ln {0:06d}: BC=1,00"
+    valor_esperado: Optional[str] = None
+
+    @staticmethod
+    def literal(texto: str) -> str:
+        """Texto fixo dentro do modelo (chaves escapadas)"""
+        return texto.replace('{', '{{').replace('}', '}}')
+
+
+class ErroLinhasCitadas(ErroValidacao):
+    """ErroValidacao cuja descrição cita linhas do arquivo, guardadas como dado
+
+    A descrição só é montada do modelo com `linhas_citadas` quando lida. Quem renumera
+    os erros (ex.: o cache de blocos de NF) desloca os números sem mexer em texto; por
+    isso toda descrição que cita uma linha do arquivo deve vir num erro desta classe.
+    """
+
+    def __init__(self, linha: int, modelo: ModeloErroLinhas, valor_encontrado: str, linhas_citadas: Iterable[int]):
+        self.linha = linha
+        self.campo = modelo.campo
+        self.erro_tipo = modelo.erro_tipo
+        self.valor_esperado = modelo.valor_esperado
+        self.modelo = modelo
+        self.valor_encontrado = valor_encontrado
+        self.linhas_citadas = tuple(linhas_citadas)
+
+    def _dados_compactos(self) -> Optional[Tuple[ModeloErroLinhas, str, Tuple[int, ...]]]:
+        return (self.modelo, self.valor_encontrado, self.linhas_citadas)
+
+    @property
+    def descricao(self) -> str:
+        return self.modelo.descricao.format(*self.linhas_citadas)
+
+    def deslocado(self, deslocamento: int) -> 'ErroLinhasCitadas':
+        """O mesmo erro com a linha e as linhas citadas deslocadas de `deslocamento`"""
+        return ErroLinhasCitadas(
+            self.linha + deslocamento, self.modelo, self.valor_encontrado,
+            [numero + deslocamento for numero in self.linhas_citadas]
+        )
+
+
+class ColecaoErros(SequenciaABC):
+    """Coleção compacta (colunar) de ErroValidacao
+
+    Linha, campo e tipo de erro ficam em arrays (campo e tipo como ids de textos
+    internados) e o restante em colunas paralelas; o ErroValidacao só é recriado
+    quando a posição é lida. Erros que sabem se recriar a partir de poucos dados
+    (`_dados_compactos`, ex.: erros de campo) não guardam textos prontos.
+    Pode ser iterada, indexada e fatiada como a lista que substitui.
+    """
+
+    def __init__(self, erros: Iterable[ErroValidacao] = ()):
+        self.linhas = array('q')
+        self.campos = array('I')
+        self.tipos = array('I')
+        # 0 = ErroValidacao com textos; n > 0 = classes_compactas[n - 1]
+        self._formas = array('B')
+        # Textos: valor encontrado / descrição; compactos: valor / detalhe
+        self._valores: List[Any] = []
+        self._detalhes: List[Any] = []
+        # Id do valor esperado (texto) ou do objeto compartilhado (compactos); -1 = None
+        self._referencias = array('i')
+
+        self._textos: List[str] = []
+        self._ids_textos: Dict[str, int] = {}
+        self._objetos: List[Any] = []
+        self._ids_objetos: Dict[int, int] = {}
+        self._classes_compactas: List[type] = []
+        self.extend(erros)
+
+    def _id_texto(self, texto: str) -> int:
+        id_texto = self._ids_textos.get(texto)
+        if id_texto is None:
+            id_texto = self._ids_textos[texto] = len(self._textos)
+            self._textos.append(texto)
+        return id_texto
+
+    def _id_objeto(self, objeto: Any) -> int:
+        # Por identidade: o objeto fica referenciado em _objetos, então o id não é reutilizado
+        id_objeto = self._ids_objetos.get(id(objeto))
+        if id_objeto is None:
+            id_objeto = self._ids_objetos[id(objeto)] = len(self._objetos)
+            self._objetos.append(objeto)
+        return id_objeto
+
+    def __setstate__(self, estado):
+        # Vinda de outro processo (pickle): os objetos compartilhados têm novos ids
+        self.__dict__.update(estado)
+        self._ids_objetos = {id(objeto): i for i, objeto in enumerate(self._objetos)}
+
+    def append(self, erro: ErroValidacao):
+        self.linhas.append(erro.linha)
+        self.campos.append(self._id_texto(erro.campo))
+        self.tipos.append(self._id_texto(erro.erro_tipo))
+
+        compactos = erro._dados_compactos()
+        if compactos is not None:
+            classe = type(erro)
+            if classe not in self._classes_compactas:
+                self._classes_compactas.append(classe)
+            objeto, valor, detalhe = compactos
+            self._formas.append(self._classes_compactas.index(classe) + 1)
+            self._valores.append(valor)
+            self._detalhes.append(detalhe)
+            self._referencias.append(self._id_objeto(objeto))
+        else:
+            # Valor esperado costuma se repetir: guardar internado
+            self._formas.append(0)
+            self._valores.append(erro.valor_encontrado)
+            self._detalhes.append(erro.descricao)
+            self._referencias.append(-1 if erro.valor_esperado is None else self._id_texto(erro.valor_esperado))
+
+    def extend(self, erros: Iterable[ErroValidacao]):
+        for erro in erros:
+            self.append(erro)
+
+    def _materializar(self, indice: int) -> ErroValidacao:
+        forma = self._formas[indice]
+        referencia = self._referencias[indice]
+        if forma:
+            classe = self._classes_compactas[forma - 1]
+            return classe(self.linhas[indice], self._objetos[referencia], self._valores[indice], self._detalhes[indice])
+        return ErroValidacao(
+            linha=self.linhas[indice],
+            campo=self._textos[self.campos[indice]],
+            valor_encontrado=self._valores[indice],
+            erro_tipo=self._textos[self.tipos[indice]],
+            descricao=self._detalhes[indice],
+            valor_esperado=None if referencia < 0 else self._textos[referencia]
+        )
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self._materializar(i) for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError("índice fora da coleção de erros")
+        return self._materializar(indice)
+
+    def __len__(self) -> int:
+        return len(self.linhas)
+
+    def __iter__(self) -> Iterator[ErroValidacao]:
+        for indice in range(len(self.linhas)):
+            yield self._materializar(indice)
+
+    def __eq__(self, outro) -> bool:
+        if isinstance(outro, (ColecaoErros, list, tuple)):
+            return len(self) == len(outro) and list(self) == list(outro)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ColecaoErros({len(self)} erros)"
+
+    def contar_tipos(self) -> Counter:
+        """Quantidade de erros por erro_tipo, sem recriar os erros"""
+        return Counter({self._textos[id_tipo]: qtd for id_tipo, qtd in Counter(self.tipos).items()})
+
+    def contar_campos(self) -> Counter:
+        """Quantidade de erros por campo, sem recriar os erros"""
+        return Counter({self._textos[id_campo]: qtd for id_campo, qtd in Counter(self.campos).items()})
+
+    def linhas_distintas(self) -> set:
+        """Números das linhas que têm ao menos um erro"""
+        return set(self.linhas)
+
+    def linhas_e_tipos(self) -> Iterator[Tuple[int, str]]:
+        """Pares (linha, erro_tipo) de cada erro, sem recriar os erros"""
+        textos = self._textos
+        return ((linha, textos[id_tipo]) for linha, id_tipo in zip(self.linhas, self.tipos))
+
+
+@dataclass
+class EstatisticaRegra:
+    """Tempo e contagens de uma verificação do EnhancedValidator numa validação"""
+    nome: str
+    chamadas: int = 0
+    erros: int = 0
+    tempo_segundos: float = 0.0
+
 
 @dataclass
 class ResultadoValidacao:
@@ -44,17 +241,119 @@ class ResultadoValidacao:
     total_linhas: int
     linhas_validas: int
     linhas_com_erro: int
-    erros: List[ErroValidacao]
+    erros: Sequence[ErroValidacao]  # Guardados como ColecaoErros
     taxa_sucesso: float = 0.0
+    # Por verificação, quando o validador mede as regras (`medir_regras`)
+    estatisticas_regras: Optional[List[EstatisticaRegra]] = None
 
     def __post_init__(self):
         """Calcula taxa de sucesso"""
+        if not isinstance(self.erros, ColecaoErros):
+            self.erros = ColecaoErros(self.erros)
         if self.total_linhas > 0:
             self.taxa_sucesso = (self.linhas_validas / self.total_linhas) * 100
         else:
             self.taxa_sucesso = 0.0
 
 
+@dataclass
+class ResultadoParcialValidacao:
+    """Resultado da validação de um trecho (shard) do arquivo, com numeração local das linhas"""
+    total_linhas: int
+    erros_por_linha: List[Tuple[int, List[ErroValidacao]]]
+    tipos_por_linha: Optional[List[str]] = None  # Tipo de registro de cada linha (multi-registro)
+
+
+@dataclass
+class ParcialBlocoNF:
+    """Bloco de NFs validado à parte (em paralelo ou vindo do cache), com numeração global das linhas"""
+    primeira_linha: int
+    total_linhas: int
+    erros: Sequence[ErroValidacao]
+    # (linha, fatura, nf, posição em `erros` do erro de duplicata) de cada registro 01
+    registros_01: List[Tuple[int, str, str, int]]
+    grupos_nf: Dict[Tuple[str, str], Dict]
+    total_registros_01: int
+    declaracoes_header: Dict[str, int]
+    # Estado da última NF do bloco (totais, contexto, item aberto); só o do último bloco é usado
+    estado_final: Optional[Dict[str, Any]] = None
+    # Medições das verificações do bloco (não vão para o cache)
+    estatisticas_regras: Optional[List[EstatisticaRegra]] = None
+
+
+@dataclass
+class ResultadoAmostragem:
+    """Resultado da verificação rápida: header, trailer, primeiros blocos de NF e uma amostra aleatória"""
+    total_linhas: int
+    linhas_verificadas: int
+    linhas_com_erro: int  # Entre as linhas verificadas
+    total_blocos: int
+    blocos_verificados: int
+    taxa_sucesso_estimada: float
+    intervalo_confianca: Tuple[float, float]
+    nivel_confianca: float
+    tipos_erro: Dict[str, int]  # Tipos de erro vistos na amostra -> quantidade
+    erros: Sequence[ErroValidacao]
+    completo: bool = False  # A amostra cobriu o arquivo inteiro (taxa exata)
+
+    def __post_init__(self):
+        if not isinstance(self.erros, ColecaoErros):
+            self.erros = ColecaoErros(self.erros)
+
+
+@dataclass
+class NFConciliada:
+    """NF do retorno da SEFAZ cruzada com a validação local do lote"""
+    transaction_id: str
+    num_nfcom: str
+    status: str  # 'AUTORIZADA', 'REJEITADA' ou 'PENDENTE'
+    fatura: str
+    nf: str
+    rejeicoes: List[str] = field(default_factory=list)  # Ex.: "G114: Total do FCP difere do somatório dos itens"
+    erros_locais: List[str] = field(default_factory=list)  # Tipos de erro da validação local na NF
+
+
+@dataclass
+class ResultadoConciliacao:
+    """Conciliação de um arquivo de retorno da SEFAZ com a validação de um lote"""
+    arquivo_retorno: str
+    total_registros: int = 0  # Registros lidos do retorno (com reenvios)
+    registros_fora_do_lote: int = 0  # TRANSACTION_ID_CLARO sem NF no lote
+    nfs_sem_retorno: int = 0  # NFs do lote com TRANSACTION_ID_CLARO ausente do retorno
+    rejeitadas_com_erro_local: List[NFConciliada] = field(default_factory=list)
+    rejeitadas_sem_erro_local: List[NFConciliada] = field(default_factory=list)
+    autorizadas_com_erro_local: List[NFConciliada] = field(default_factory=list)
+    autorizadas_sem_erro_local: int = 0
+    pendentes: int = 0
+    linhas_invalidas: List[int] = field(default_factory=list)  # Linhas do retorno que não são JSON
+
+
+@dataclass
+class DiferencaEnvio:
+    """Campo do envio à SEFAZ com valor diferente do registro correspondente no TXT do lote"""
+    num_nfcom: str
+    campo_envio: str  # Caminho no JSON do envio (ex.: TOTAL_NFCOM.VLR_TOT_PIS)
+    campo_layout: str  # Campo do layout TXT (ex.: NFE56-TOT-VLR-PIS)
+    linha: int  # Linha do registro no TXT
+    valor_envio: str
+    valor_txt: str
+
+
+@dataclass
+class ResultadoConferenciaEnvio:
+    """Conferência de um arquivo de envio à SEFAZ com o TXT do lote"""
+    arquivo_envio: str
+    total_registros: int = 0
+    nfs_conferidas: int = 0
+    nfs_com_diferenca: int = 0
+    registros_fora_do_lote: int = 0  # NUM_NFCOM sem registro 01 no lote
+    nfs_sem_56: int = 0  # NFs conferidas sem totalizador 56 no lote
+    nfs_repetidas_no_lote: int = 0  # Números de NF com mais de um 01 (vale o primeiro)
+    diferencas: List[DiferencaEnvio] = field(default_factory=list)
+    campos_sem_layout: List[str] = field(default_factory=list)  # Campos do mapa ausentes no layout
+    linhas_invalidas: List[int] = field(default_factory=list)  # Linhas do envio que não são JSON
+
+
 @dataclass
 class DiferencaEstruturalCampo:
     """Representa uma diferença encontrada em um campo específico"""
@@ -78,6 +377,10 @@ class DiferencaEstruturalLinha:
     diferencas_campos: List[DiferencaEstruturalCampo]
     total_diferencas: int
     linha_numeracao: str = ""  # Linha com numeração dos campos
+    # Referência às linhas nos arquivos (0 = sem linha daquele lado); com as linhas sob demanda
+    # os textos acima ficam vazios e a visualização é montada depois a partir destes números
+    numero_linha_base: int = 0
+    numero_linha_validado: int = 0
 
 
 @dataclass
@@ -122,10 +425,17 @@ class Layout:
     nome: str
     campos: List[CampoLayout]
     tamanho_linha: int
+    _indice_nomes: Optional[Dict[str, CampoLayout]] = field(default=None, init=False, repr=False, compare=False)
+    _indice_origem: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
 
     def get_campo(self, nome: str) -> Optional[CampoLayout]:
-        """Busca um campo pelo nome"""
-        for campo in self.campos:
-            if campo.nome == nome:
-                return campo
-        return None
\ No newline at end of file
+        """Busca um campo pelo nome (índice nome → campo, refeito se a lista de campos mudar)"""
+        origem = (id(self.campos), len(self.campos))
+        if self._indice_nomes is None or self._indice_origem != origem:
+            indice: Dict[str, CampoLayout] = {}
+            for campo in self.campos:
+                # Mantém a primeira ocorrência, como a busca linear fazia
+                indice.setdefault(campo.nome, campo)
+            self._indice_nomes = indice
+            self._indice_origem = origem
+        return self._indice_nomes.get(nome)
\ No newline at end of file
@@ -1,18 +1,22 @@
 """
 Validador para arquivos com múltiplos tipos de registro
 """
-from typing import Dict, List, Generator, Tuple
+from typing import Dict, List, Generator, Optional, Tuple
 from pathlib import Path
 import pandas as pd
 
 try:
-    from .models import Layout, ErroValidacao, ResultadoValidacao
+    from .models import Layout, ErroValidacao, ResultadoValidacao, ResultadoParcialValidacao, ColecaoErros
     from .layout_parser import LayoutParser
     from .file_validator import ValidadorArquivo
+    from .parallel_validator import validar_em_paralelo
+    from .file_reader import LeitorArquivo, iterar_linhas_bytes
 except ImportError:
-    from models import Layout, ErroValidacao, ResultadoValidacao
+    from models import Layout, ErroValidacao, ResultadoValidacao, ResultadoParcialValidacao, ColecaoErros
     from layout_parser import LayoutParser
     from file_validator import ValidadorArquivo
+    from parallel_validator import validar_em_paralelo
+    from file_reader import LeitorArquivo, iterar_linhas_bytes
 
 
 class MultiRecordValidator:
@@ -115,51 +119,68 @@ class MultiRecordValidator:
                 valor_esperado="Tipo de registro válido (00, 01, 02, etc.)"
             )]
 
-    def validar_arquivo(self, caminho_arquivo: str, max_erros: int = None) -> ResultadoValidacao:
-        """Valida arquivo completo com suporte a múltiplos tipos"""
+    def validar_arquivo(self, caminho_arquivo: str, max_erros: int = None,
+                        processos: Optional[int] = None) -> ResultadoValidacao:
+        """Valida arquivo completo com suporte a múltiplos tipos
+
+        Args:
+            processos: se maior que 1, divide o arquivo em shards validados em paralelo
+        """
         if not Path(caminho_arquivo).exists():
             raise FileNotFoundError(f"Arquivo não encontrado: {caminho_arquivo}")
 
         total_linhas = 0
         linhas_com_erro = 0
-        todos_erros = []
+        todos_erros = ColecaoErros()
         estatisticas_por_tipo = {}
 
-        try:
-            with open(caminho_arquivo, 'r', encoding='utf-8') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    linha = linha.rstrip('\n\r')
-                    total_linhas += 1
+        if processos and processos > 1:
+            parcial = validar_em_paralelo(self, caminho_arquivo, max_erros, processos)
+            total_linhas = parcial.total_linhas
+
+            for tipo_registro in parcial.tipos_por_linha:
+                if tipo_registro not in estatisticas_por_tipo:
+                    estatisticas_por_tipo[tipo_registro] = {'total': 0, 'erros': 0}
+                estatisticas_por_tipo[tipo_registro]['total'] += 1
+
+            for numero_linha, erros_linha in parcial.erros_por_linha:
+                linhas_com_erro += 1
+                estatisticas_por_tipo[parcial.tipos_por_linha[numero_linha - 1]]['erros'] += 1
+                todos_erros.extend(erros_linha)
 
-                    # Adicionar padding se necessário
-                    if len(linha) < 540:  # tamanho padrão
-                        linha = linha.ljust(540)
+            return self._finalizar_resultado(total_linhas, linhas_com_erro, todos_erros, estatisticas_por_tipo)
 
-                    # Detectar tipo e validar
-                    tipo_registro = self.detectar_tipo_registro(linha)
+        for numero_linha, linha in LeitorArquivo(caminho_arquivo).linhas_numeradas():
+            total_linhas += 1
 
-                    # Estatísticas por tipo
-                    if tipo_registro not in estatisticas_por_tipo:
-                        estatisticas_por_tipo[tipo_registro] = {'total': 0, 'erros': 0}
-                    estatisticas_por_tipo[tipo_registro]['total'] += 1
+            # Adicionar padding se necessário
+            if len(linha) < 540:  # tamanho padrão
+                linha = linha.ljust(540)
 
-                    erros_linha = self.validar_linha_por_tipo(numero_linha, linha)
+            # Detectar tipo e validar
+            tipo_registro = self.detectar_tipo_registro(linha)
 
-                    if erros_linha:
-                        linhas_com_erro += 1
-                        estatisticas_por_tipo[tipo_registro]['erros'] += 1
-                        todos_erros.extend(erros_linha)
+            # Estatísticas por tipo
+            if tipo_registro not in estatisticas_por_tipo:
+                estatisticas_por_tipo[tipo_registro] = {'total': 0, 'erros': 0}
+            estatisticas_por_tipo[tipo_registro]['total'] += 1
 
-                        # Limitar erros se especificado
-                        if max_erros and len(todos_erros) >= max_erros:
-                            break
+            erros_linha = self.validar_linha_por_tipo(numero_linha, linha)
 
-        except UnicodeDecodeError:
-            # Tentar com latin-1
-            with open(caminho_arquivo, 'r', encoding='latin-1') as arquivo:
-                # Mesmo código...
-                pass
+            if erros_linha:
+                linhas_com_erro += 1
+                estatisticas_por_tipo[tipo_registro]['erros'] += 1
+                todos_erros.extend(erros_linha)
 
+                # Limitar erros se especificado
+                if max_erros and len(todos_erros) >= max_erros:
+                    break
+
+        return self._finalizar_resultado(total_linhas, linhas_com_erro, todos_erros, estatisticas_por_tipo)
+
+    def _finalizar_resultado(self, total_linhas: int, linhas_com_erro: int, todos_erros: ColecaoErros,
+                             estatisticas_por_tipo: Dict[str, Dict[str, int]]) -> ResultadoValidacao:
+        """Mostra as estatísticas por tipo e monta o ResultadoValidacao"""
         linhas_validas = total_linhas - linhas_com_erro
 
         # Mostrar estatísticas por tipo
@@ -176,6 +197,42 @@ class MultiRecordValidator:
             taxa_sucesso=0.0  # Será calculado no __post_init__
         )
 
+    def validar_dados(self, dados: bytes, encoding: str, max_erros: int = None) -> ResultadoParcialValidacao:
+        """Valida um trecho do arquivo já lido em bytes (numeração de linhas local ao trecho)"""
+        erros_por_linha = []
+        tipos_por_linha = []
+        total_erros = 0
+
+        for numero_linha, linha in enumerate(iterar_linhas_bytes(dados, encoding), 1):
+            # Adicionar padding se necessário
+            if len(linha) < 540:  # tamanho padrão
+                linha = linha.ljust(540)
+
+            tipos_por_linha.append(self.detectar_tipo_registro(linha))
+
+            erros_linha = self.validar_linha_por_tipo(numero_linha, linha)
+            if erros_linha:
+                erros_por_linha.append((numero_linha, erros_linha))
+                total_erros += len(erros_linha)
+
+                # Limitar erros se especificado
+                if max_erros and total_erros >= max_erros:
+                    break
+
+        return ResultadoParcialValidacao(
+            total_linhas=len(tipos_por_linha),
+            erros_por_linha=erros_por_linha,
+            tipos_por_linha=tipos_por_linha
+        )
+
+    def _extrair_campos_preview(self, tipo_registro: str, linha: str) -> Dict[str, str]:
+        """Extrai os campos da linha (sem espaços) usando o plano compilado do tipo"""
+        compilado = self.validadores_por_tipo[tipo_registro].compilado
+        return {
+            campo_compilado.campo.nome: linha[campo_compilado.inicio:campo_compilado.fim].strip()
+            for campo_compilado in compilado.campos
+        }
+
     def parsear_linhas_preview(self, caminho_arquivo: str, max_linhas: int = 20) -> Tuple[List[Dict], List[str]]:
         """
         Parseia as primeiras linhas do arquivo e retorna preview organizado por tipo
@@ -185,68 +242,31 @@ class MultiRecordValidator:
         """
         registros_preview = []
         tipos_encontrados = set()
-        
-        try:
-            with open(caminho_arquivo, 'r', encoding='utf-8') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    if numero_linha > max_linhas:
-                        break
-                    
-                    linha = linha.rstrip('\n\r')
-                    
-                    # Detectar tipo
-                    tipo_registro = self.detectar_tipo_registro(linha)
-                    tipos_encontrados.add(tipo_registro)
-                    
-                    # Parsear campos se temos layout para esse tipo
-                    campos_parseados = {}
-                    if tipo_registro in self.layouts_por_tipo:
-                        layout = self.layouts_por_tipo[tipo_registro]
-                        
-                        # Padding se necessário
-                        if len(linha) < layout.tamanho_linha:
-                            linha = linha.ljust(layout.tamanho_linha)
-                        
-                        # Extrair cada campo
-                        for campo in layout.campos:
-                            inicio = campo.posicao_inicio - 1
-                            fim = campo.posicao_fim
-                            valor = linha[inicio:fim] if inicio < len(linha) else ''
-                            campos_parseados[campo.nome] = valor.strip()
-                    
-                    registros_preview.append({
-                        'linha': numero_linha,
-                        'tipo_registro': tipo_registro,
-                        'campos': campos_parseados
-                    })
-        
-        except UnicodeDecodeError:
-            # Tentar com latin-1
-            with open(caminho_arquivo, 'r', encoding='latin-1') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    if numero_linha > max_linhas:
-                        break
-                    
-                    linha = linha.rstrip('\n\r')
-                    tipo_registro = self.detectar_tipo_registro(linha)
-                    tipos_encontrados.add(tipo_registro)
-                    
-                    campos_parseados = {}
-                    if tipo_registro in self.layouts_por_tipo:
-                        layout = self.layouts_por_tipo[tipo_registro]
-                        if len(linha) < layout.tamanho_linha:
-                            linha = linha.ljust(layout.tamanho_linha)
-                        
-                        for campo in layout.campos:
-                            inicio = campo.posicao_inicio - 1
-                            fim = campo.posicao_fim
-                            valor = linha[inicio:fim] if inicio < len(linha) else ''
-                            campos_parseados[campo.nome] = valor.strip()
-                    
-                    registros_preview.append({
-                        'linha': numero_linha,
-                        'tipo_registro': tipo_registro,
-                        'campos': campos_parseados
-                    })
-        
+
+        for numero_linha, linha in LeitorArquivo(caminho_arquivo).linhas_numeradas():
+            if numero_linha > max_linhas:
+                break
+
+            # Detectar tipo
+            tipo_registro = self.detectar_tipo_registro(linha)
+            tipos_encontrados.add(tipo_registro)
+
+            # Parsear campos se temos layout para esse tipo
+            campos_parseados = {}
+            if tipo_registro in self.layouts_por_tipo:
+                layout = self.layouts_por_tipo[tipo_registro]
+
+                # Padding se necessário
+                if len(linha) < layout.tamanho_linha:
+                    linha = linha.ljust(layout.tamanho_linha)
+
+                # Extrair cada campo pelo plano compilado do tipo
+                campos_parseados = self._extrair_campos_preview(tipo_registro, linha)
+
+            registros_preview.append({
+                'linha': numero_linha,
+                'tipo_registro': tipo_registro,
+                'campos': campos_parseados
+            })
+
         return registros_preview, sorted(list(tipos_encontrados))
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Validação paralela de arquivos TXT grandes.
+
+O arquivo é dividido em faixas de bytes (shards) cortadas logo após um '\\n';
+cada shard é validado num processo do `ProcessPoolExecutor` com numeração local
+das linhas e os resultados são mesclados em ordem, com a numeração global e o
+mesmo corte de `max_erros` da validação sequencial.
+
+Os validadores participam implementando `validar_dados(dados, encoding, max_erros)`
+que devolve um `ResultadoParcialValidacao`.
+
+Validadores com estado por bloco de registros (ex.: NFs no EnhancedValidator)
+usam `dividir_em_blocos`, que só corta no início de linhas escolhidas (ex.: os
+registros 01) e mantém a numeração global das linhas.
+"""
+
+import os
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from .models import ResultadoParcialValidacao
+    from .file_reader import detectar_encoding_arquivo
+    from .line_index import LineIndex
+except ImportError:
+    from models import ResultadoParcialValidacao
+    from file_reader import detectar_encoding_arquivo
+    from line_index import LineIndex
+
+
+# Abaixo disso o custo de subir processos supera o ganho
+TAMANHO_MINIMO_SHARD = 4 * 1024 * 1024
+
+
+def dividir_em_shards(caminho_arquivo: str, quantidade: int,
+                      tamanho_minimo: int = TAMANHO_MINIMO_SHARD) -> List[Tuple[int, int]]:
+    """Divide o arquivo em até `quantidade` faixas [inicio, fim) terminadas em quebra de linha"""
+    tamanho = os.path.getsize(caminho_arquivo)
+    quantidade = max(1, min(quantidade, tamanho // max(tamanho_minimo, 1)))
+
+    cortes = [0]
+    with open(caminho_arquivo, 'rb') as arquivo:
+        for i in range(1, quantidade):
+            alvo = tamanho * i // quantidade
+            if alvo <= cortes[-1]:
+                continue
+            # Avançar até o fim da linha que contém o byte alvo-1
+            arquivo.seek(alvo - 1)
+            arquivo.readline()
+            posicao = arquivo.tell()
+            if posicao >= tamanho:
+                break
+            if posicao > cortes[-1]:
+                cortes.append(posicao)
+    cortes.append(tamanho)
+
+    return [(inicio, fim) for inicio, fim in zip(cortes[:-1], cortes[1:]) if fim > inicio]
+
+
+class BlocoLinhas(NamedTuple):
+    """Faixa de bytes [inicio, fim) do arquivo e o número global da sua primeira linha"""
+    inicio: int
+    fim: int
+    primeira_linha: int
+
+
+def dividir_em_blocos(indice: LineIndex, linhas_inicio: Sequence[int], quantidade: int,
+                      tamanho_minimo: int = TAMANHO_MINIMO_SHARD,
+                      aceitar: Optional[Callable[[int], bool]] = None) -> List[BlocoLinhas]:
+    """Divide o arquivo indexado em até `quantidade` blocos que começam em linhas de `linhas_inicio`
+
+    Cada corte é a primeira linha candidata (em ordem crescente, aceita por `aceitar`)
+    a partir do byte alvo; o primeiro bloco começa na linha 1 e leva o que vier antes.
+    """
+    offsets = indice.offsets
+    tamanho = offsets[-1] - offsets[0]
+    quantidade = max(1, min(quantidade, tamanho // max(tamanho_minimo, 1)))
+
+    offsets_candidatas = [offsets[n - 1] for n in linhas_inicio]
+    cortes = [1]
+    posicao = 0
+    for i in range(1, quantidade):
+        posicao = bisect_left(offsets_candidatas, tamanho * i // quantidade, posicao)
+        while posicao < len(linhas_inicio) and (
+                linhas_inicio[posicao] <= cortes[-1] or (aceitar is not None and not aceitar(linhas_inicio[posicao]))):
+            posicao += 1
+        if posicao >= len(linhas_inicio):
+            break
+        cortes.append(linhas_inicio[posicao])
+    cortes.append(len(indice) + 1)
+
+    return [
+        BlocoLinhas(offsets[inicio - 1], offsets[fim - 1], inicio)
+        for inicio, fim in zip(cortes[:-1], cortes[1:])
+    ]
+
+
+def _validar_shard(validador, caminho_arquivo: str, inicio: int, fim: int,
+                   encoding: str, max_erros: Optional[int], opcoes: dict) -> ResultadoParcialValidacao:
+    """Executado no processo filho: lê a faixa de bytes e valida com numeração local"""
+    with open(caminho_arquivo, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        dados = arquivo.read(fim - inicio)
+    return validador.validar_dados(dados, encoding, max_erros, **opcoes)
+
+
+def mesclar_parciais(parciais: List[ResultadoParcialValidacao],
+                     max_erros: Optional[int] = None) -> ResultadoParcialValidacao:
+    """Junta os resultados dos shards (em ordem) renumerando as linhas globalmente.
+
+    O corte por `max_erros` é o mesmo da validação sequencial: para na linha em que o
+    total acumulado de erros atinge o limite, e as linhas seguintes não são contadas.
+    """
+    erros_por_linha: List[Tuple[int, list]] = []
+    tipos_por_linha: Optional[List[str]] = None
+    total_erros = 0
+    deslocamento = 0
+
+    for parcial in parciais:
+        cortado_em = None
+        for numero_local, erros in parcial.erros_por_linha:
+            numero_global = numero_local + deslocamento
+            for erro in erros:
+                erro.linha += deslocamento
+            erros_por_linha.append((numero_global, erros))
+            total_erros += len(erros)
+            if max_erros and total_erros >= max_erros:
+                cortado_em = numero_local
+                break
+
+        linhas_consideradas = cortado_em if cortado_em is not None else parcial.total_linhas
+        if parcial.tipos_por_linha is not None:
+            if tipos_por_linha is None:
+                tipos_por_linha = []
+            tipos_por_linha.extend(parcial.tipos_por_linha[:linhas_consideradas])
+
+        deslocamento += linhas_consideradas
+        if cortado_em is not None:
+            break
+
+    return ResultadoParcialValidacao(
+        total_linhas=deslocamento,
+        erros_por_linha=erros_por_linha,
+        tipos_por_linha=tipos_por_linha
+    )
+
+
+def validar_em_paralelo(validador, caminho_arquivo: str, max_erros: Optional[int] = None,
+                        processos: Optional[int] = None,
+                        tamanho_minimo_shard: int = TAMANHO_MINIMO_SHARD,
+                        **opcoes) -> ResultadoParcialValidacao:
+    """Valida o arquivo em shards paralelos e devolve o resultado mesclado
+
+    Args:
+        opcoes: argumentos extras repassados a `validador.validar_dados` em cada shard
+    """
+    processos = processos or os.cpu_count() or 1
+    encoding = detectar_encoding_arquivo(caminho_arquivo)
+    shards = dividir_em_shards(caminho_arquivo, processos, tamanho_minimo_shard)
+
+    # Arquivo pequeno: um shard só, sem custo de processos
+    if len(shards) <= 1:
+        inicio, fim = shards[0] if shards else (0, 0)
+        return mesclar_parciais([_validar_shard(validador, caminho_arquivo, inicio, fim, encoding, max_erros, opcoes)], max_erros)
+
+    with ProcessPoolExecutor(max_workers=min(processos, len(shards))) as executor:
+        futuros = [
+            executor.submit(_validar_shard, validador, caminho_arquivo, inicio, fim, encoding, max_erros, opcoes)
+            for inicio, fim in shards
+        ]
+        parciais = [futuro.result() for futuro in futuros]
+
+    return mesclar_parciais(parciais, max_erros)
@@ -2,7 +2,6 @@ import pandas as pd
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Any
-from collections import Counter
 import io
 import base64
 import math
@@ -54,13 +53,13 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
 """
 
         # Contar tipos de erro
-        contador_tipos = Counter(erro.erro_tipo for erro in self.resultado.erros)
+        contador_tipos = self.resultado.erros.contar_tipos()
         for tipo, quantidade in contador_tipos.most_common():
             resumo += f"{tipo}: {quantidade:,} ocorrências\n"
 
         # Contar erros por campo
         resumo += "\n=== ERROS POR CAMPO ===\n"
-        contador_campos = Counter(erro.campo for erro in self.resultado.erros)
+        contador_campos = self.resultado.erros.contar_campos()
         for campo, quantidade in contador_campos.most_common(10):  # Top 10
             resumo += f"{campo}: {quantidade:,} erros\n"
 
@@ -97,7 +96,7 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
         df_erros = pd.DataFrame(dados_erros)
 
         # Preparar resumo
-        contador_tipos = Counter(erro.erro_tipo for erro in self.resultado.erros)
+        contador_tipos = self.resultado.erros.contar_tipos()
         dados_resumo = []
         for tipo, quantidade in contador_tipos.items():
             dados_resumo.append({
@@ -118,7 +117,7 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
         }])
 
         # Erros por campo
-        contador_campos = Counter(erro.campo for erro in self.resultado.erros)
+        contador_campos = self.resultado.erros.contar_campos()
         dados_campos = []
         for campo, quantidade in contador_campos.most_common():
             dados_campos.append({
@@ -223,8 +222,8 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
 
         # Contadores para análise
         if self.resultado.erros:
-            contador_tipos = Counter(erro.erro_tipo for erro in self.resultado.erros)
-            contador_campos = Counter(erro.campo for erro in self.resultado.erros)
+            contador_tipos = self.resultado.erros.contar_tipos()
+            contador_campos = self.resultado.erros.contar_campos()
 
             dados_relatorio['analise'] = {
                 'tipos_erro': dict(contador_tipos.most_common()),
@@ -307,7 +306,7 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
             df_erros = pd.DataFrame(dados_erros)
 
             # Preparar resumo
-            contador_tipos = Counter(erro.erro_tipo for erro in self.resultado.erros)
+            contador_tipos = self.resultado.erros.contar_tipos()
             dados_resumo = []
             for tipo, quantidade in contador_tipos.items():
                 dados_resumo.append({
@@ -328,7 +327,7 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
             }])
 
             # Erros por campo
-            contador_campos = Counter(erro.campo for erro in self.resultado.erros)
+            contador_campos = self.resultado.erros.contar_campos()
             dados_campos = []
             for campo, quantidade in contador_campos.most_common():
                 dados_campos.append({
@@ -686,18 +685,14 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
 
             return identificacao
 
-        # Agrupar erros por linha e extrair identificação
+        # Agrupar erros por linha (uma passada) e extrair identificação
         erros_agrupados = []
-        linhas_processadas = set()
-
+        erros_por_linha: Dict[int, list] = {}
         for erro in self.resultado.erros:
-            if erro.linha in linhas_processadas:
-                continue
-
-            linhas_processadas.add(erro.linha)
+            erros_por_linha.setdefault(erro.linha, []).append(erro)
 
-            # Pegar todos os erros desta linha
-            erros_da_linha = [e for e in self.resultado.erros if e.linha == erro.linha]
+        for erros_da_linha in erros_por_linha.values():
+            erro = erros_da_linha[0]
 
             # Extrair identificação (tentaremos deduzir do nome dos campos)
             identificacao = _extrair_identificacao(erro.linha)
@@ -1047,7 +1042,7 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
         elementos.append(HRFlowable(width='100%', thickness=1,
             color=colors.HexColor('#e5e7eb'), spaceAfter=4 * mm))
 
-        contador_tipos = Counter(erro.erro_tipo for erro in self.resultado.erros)
+        contador_tipos = self.resultado.erros.contar_tipos()
         elementos.append(self._criar_grafico_pizza(dict(contador_tipos.most_common(8)), altura=160))
         elementos.append(Spacer(1, 3 * mm))
 
@@ -1065,7 +1060,7 @@ Taxa de sucesso: {self.resultado.taxa_sucesso:.2f}%
         elementos.append(HRFlowable(width='100%', thickness=1,
             color=colors.HexColor('#e5e7eb'), spaceAfter=4 * mm))
 
-        contador_campos = Counter(erro.campo for erro in self.resultado.erros)
+        contador_campos = self.resultado.erros.contar_campos()
         dados_campo_tabela = [['Campo', 'Quantidade', 'Percentual']]
         for campo, qtd in contador_campos.most_common(10):
             pct = (qtd / total_erros * 100) if total_erros > 0 else 0
@@ -0,0 +1,236 @@
+"""
+Conjuntos de regras de impostos e totalizadores carregados de arquivo.
+
+As regras do EnhancedValidator (mapa de totais do registro 56 e cálculos
+BC × Alíquota por tipo de registro) ficam num arquivo JSON (ou YAML, se o
+PyYAML estiver instalado) ao lado do layout, como o `printcenter/config.json`:
+
+    {
+      "descricao": "...",
+      "totais":   {"NFE56-TOT-VLR-PIS": [{"tipo": "38", "campo": "NFE38-PIS-VLR"}], ...},
+      "calculos": {"38": {"bc_field": "...", "aliq_field": "...", "valor_field": "...",
+                          "nome_imposto": "PIS", "validacoes_adicionais": [...]}, ...},
+      "transaction_id": {"campo": "NFE90-TRANSACTION-ID-CLARO"}
+    }
+
+`transaction_id` (opcional) diz onde fica o TRANSACTION_ID_CLARO no registro 90:
+um campo do layout (`campo`) ou uma posição fixa (`posicao_inicio`, a partir de
+1, e `tamanho`). Sem ela vale o campo `NFE90-TRANSACTION-ID-CLARO`, se o layout
+o tiver.
+
+Para um layout `X.xlsx` são procurados, na mesma pasta, `X.regras.json`,
+`X.regras.yaml`/`.yml` e por fim `regras.json`; sem arquivo, valem as regras
+NFCOM padrão (`regras_nfcom.json`). O arquivo é validado na carga e o conjunto
+fica em cache pelo hash do conteúdo, assim como as regras de cálculo compiladas
+para cada layout.
+"""
+
+import hashlib
+import json
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+try:
+    from .compiled_layout import CompiledLayout
+    from .tax_rules import RegrasCalculo, fatia_campo
+except ImportError:
+    from compiled_layout import CompiledLayout
+    from tax_rules import RegrasCalculo, fatia_campo
+
+
+ARQUIVO_REGRAS_PADRAO = Path(__file__).parent / "regras_nfcom.json"
+SUFIXOS_REGRAS = ('.regras.json', '.regras.yaml', '.regras.yml')
+NOME_REGRAS_PASTA = 'regras.json'
+
+CHAVES_RAIZ = {'descricao', 'totais', 'calculos', 'transaction_id'}
+CHAVES_CALCULO = ('bc_field', 'aliq_field', 'valor_field', 'nome_imposto')
+
+
+class ConjuntoRegras:
+    """Mapa de totais e cálculos de impostos validados, com as regras compiladas por layout"""
+
+    def __init__(self, totals_map: Dict[str, List[Dict]], calculation_validations: Dict[str, Dict],
+                 origem: str = '', hash_conteudo: str = '', descricao: str = '',
+                 transaction_id: Optional[Dict] = None):
+        self.totals_map = totals_map
+        self.calculation_validations = calculation_validations
+        self.transaction_id = transaction_id
+        self.origem = origem
+        self.hash_conteudo = hash_conteudo
+        self.descricao = descricao
+        self._compiladas: 'weakref.WeakKeyDictionary[CompiledLayout, RegrasCalculo]' = weakref.WeakKeyDictionary()
+
+    def regras_calculo(self, compilado: CompiledLayout) -> RegrasCalculo:
+        """Regras de cálculo com as fatias do layout, compiladas uma vez por layout"""
+        regras = self._compiladas.get(compilado)
+        if regras is None:
+            regras = RegrasCalculo(self.calculation_validations, lambda nome: fatia_campo(compilado, nome))
+            self._compiladas[compilado] = regras
+        return regras
+
+    def __getstate__(self):
+        # As regras compiladas (cache por layout) não vão para outros processos
+        estado = dict(self.__dict__)
+        del estado['_compiladas']
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._compiladas = weakref.WeakKeyDictionary()
+
+    def __repr__(self) -> str:
+        return f"ConjuntoRegras(origem={self.origem!r}, totais={len(self.totals_map)}, calculos={len(self.calculation_validations)})"
+
+
+def _texto_nao_vazio(valor) -> bool:
+    return isinstance(valor, str) and bool(valor.strip())
+
+
+def _tipo_registro_valido(valor) -> bool:
+    return isinstance(valor, str) and len(valor) == 2 and valor.isdigit()
+
+
+def _validar_calculo(config, contexto: str, erros: List[str]):
+    if not isinstance(config, dict):
+        erros.append(f"{contexto}: esperado objeto com {', '.join(CHAVES_CALCULO)}")
+        return
+    for chave in CHAVES_CALCULO:
+        if not _texto_nao_vazio(config.get(chave)):
+            erros.append(f"{contexto}: '{chave}' obrigatório (texto)")
+    desconhecidas = set(config) - set(CHAVES_CALCULO) - {'validacoes_adicionais'}
+    if desconhecidas:
+        erros.append(f"{contexto}: chaves desconhecidas {sorted(desconhecidas)}")
+
+
+def _validar_transaction_id(config, erros: List[str]):
+    if isinstance(config, dict) and set(config) == {'campo'} and _texto_nao_vazio(config['campo']):
+        return
+    if (isinstance(config, dict) and set(config) == {'posicao_inicio', 'tamanho'}
+            and all(isinstance(config[chave], int) and not isinstance(config[chave], bool) and config[chave] > 0
+                    for chave in config)):
+        return
+    erros.append("transaction_id: esperado {'campo': 'NOME'} ou {'posicao_inicio': N, 'tamanho': N} (inteiros > 0)")
+
+
+def validar_regras(dados) -> List[str]:
+    """Lista os problemas de estrutura do conteúdo de um arquivo de regras (vazia se válido)"""
+    if not isinstance(dados, dict):
+        return ["O arquivo de regras deve conter um objeto com 'totais' e 'calculos'"]
+
+    erros: List[str] = []
+    desconhecidas = set(dados) - CHAVES_RAIZ
+    if desconhecidas:
+        erros.append(f"Chaves desconhecidas na raiz: {sorted(desconhecidas)}")
+
+    totais = dados.get('totais')
+    if not isinstance(totais, dict):
+        erros.append("'totais' obrigatório: objeto campo_total -> lista de fontes")
+    else:
+        for total_field, fontes in totais.items():
+            if not isinstance(fontes, list) or not fontes:
+                erros.append(f"totais.{total_field}: esperada lista não vazia de fontes")
+                continue
+            for i, fonte in enumerate(fontes):
+                if (not isinstance(fonte, dict) or set(fonte) != {'tipo', 'campo'}
+                        or not _tipo_registro_valido(fonte.get('tipo')) or not _texto_nao_vazio(fonte.get('campo'))):
+                    erros.append(f"totais.{total_field}[{i}]: esperado {{'tipo': '00'..'99', 'campo': 'NOME'}}")
+
+    calculos = dados.get('calculos')
+    if not isinstance(calculos, dict):
+        erros.append("'calculos' obrigatório: objeto tipo_registro -> regra")
+    else:
+        for tipo_registro, config in calculos.items():
+            if not _tipo_registro_valido(tipo_registro):
+                erros.append(f"calculos.{tipo_registro}: tipo de registro deve ter 2 dígitos")
+            _validar_calculo(config, f"calculos.{tipo_registro}", erros)
+            adicionais = config.get('validacoes_adicionais', []) if isinstance(config, dict) else []
+            if not isinstance(adicionais, list):
+                erros.append(f"calculos.{tipo_registro}.validacoes_adicionais: esperada lista")
+                continue
+            for i, adicional in enumerate(adicionais):
+                _validar_calculo(adicional, f"calculos.{tipo_registro}.validacoes_adicionais[{i}]", erros)
+                if isinstance(adicional, dict) and 'validacoes_adicionais' in adicional:
+                    erros.append(f"calculos.{tipo_registro}.validacoes_adicionais[{i}]: não pode ter validacoes_adicionais")
+
+    if 'transaction_id' in dados:
+        _validar_transaction_id(dados['transaction_id'], erros)
+
+    return erros
+
+
+# hash do conteúdo -> conjunto validado, só os usados por último (arquivos enviados pela API
+# também passam por aqui e não podem ficar guardados para sempre)
+MAX_REGRAS_EM_CACHE = 8
+_cache_regras: 'OrderedDict[str, ConjuntoRegras]' = OrderedDict()
+
+
+def carregar_regras_conteudo(conteudo: bytes, formato: str = 'json', origem: str = '') -> ConjuntoRegras:
+    """Valida e carrega regras a partir do conteúdo do arquivo (reaproveita o cache pelo hash)"""
+    hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+    regras = _cache_regras.get(hash_conteudo)
+    if regras is not None:
+        _cache_regras.move_to_end(hash_conteudo)
+        return regras
+
+    try:
+        if formato in ('yaml', 'yml'):
+            if not HAS_YAML:
+                raise ValueError("PyYAML não instalado: use o arquivo de regras em JSON")
+            dados = yaml.safe_load(conteudo)
+        else:
+            dados = json.loads(conteudo.decode('utf-8-sig'))
+    except Exception as e:
+        raise ValueError(f"Erro ao ler arquivo de regras {origem}: {str(e)}")
+
+    erros = validar_regras(dados)
+    if erros:
+        raise ValueError(f"Erros no arquivo de regras {origem}:\n" + "\n".join(erros))
+
+    regras = ConjuntoRegras(
+        totals_map=dados['totais'],
+        calculation_validations=dados['calculos'],
+        origem=origem,
+        hash_conteudo=hash_conteudo,
+        descricao=dados.get('descricao', ''),
+        transaction_id=dados.get('transaction_id')
+    )
+    _cache_regras[hash_conteudo] = regras
+    if len(_cache_regras) > MAX_REGRAS_EM_CACHE:
+        _cache_regras.popitem(last=False)
+    return regras
+
+
+def carregar_regras(caminho: Union[str, Path]) -> ConjuntoRegras:
+    """Carrega um arquivo de regras JSON/YAML"""
+    caminho = Path(caminho)
+    if not caminho.exists():
+        raise FileNotFoundError(f"Arquivo de regras não encontrado: {caminho}")
+    formato = caminho.suffix.lstrip('.').lower()
+    return carregar_regras_conteudo(caminho.read_bytes(), formato, str(caminho))
+
+
+def regras_padrao() -> ConjuntoRegras:
+    """Regras NFCOM padrão"""
+    return carregar_regras(ARQUIVO_REGRAS_PADRAO)
+
+
+def localizar_regras(caminho_layout: Union[str, Path]) -> Optional[Path]:
+    """Arquivo de regras ao lado do layout, se houver"""
+    caminho_layout = Path(caminho_layout)
+    candidatos = [caminho_layout.with_name(caminho_layout.stem + sufixo) for sufixo in SUFIXOS_REGRAS]
+    candidatos.append(caminho_layout.with_name(NOME_REGRAS_PASTA))
+    return next((candidato for candidato in candidatos if candidato.is_file()), None)
+
+
+def regras_do_layout(caminho_layout: Union[str, Path]) -> ConjuntoRegras:
+    """Regras do arquivo ao lado do layout ou, se não houver, as regras padrão"""
+    caminho_regras = localizar_regras(caminho_layout)
+    return carregar_regras(caminho_regras) if caminho_regras else regras_padrao()
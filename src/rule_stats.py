@@ -0,0 +1,57 @@
+"""
+Medição por verificação do EnhancedValidator (tempo, chamadas e erros).
+
+Com `medir_regras`, cada verificação da passada (estrutura consecutiva, registro
+01, cálculos por linha, acumulação, totalizador 56, trailer 99, sequência por NF)
+é trocada, só naquela validação, por um invólucro que soma o tempo de parede, as
+chamadas e os erros devolvidos. Sem medição as verificações são chamadas direto,
+sem custo adicional.
+"""
+
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List
+
+try:
+    from .models import EstatisticaRegra
+except ImportError:
+    from models import EstatisticaRegra
+
+
+class MedidorRegras:
+    """Estatísticas acumuladas por nome de verificação"""
+
+    def __init__(self):
+        self.regras: Dict[str, EstatisticaRegra] = {}
+
+    def _estatistica(self, nome: str) -> EstatisticaRegra:
+        estatistica = self.regras.get(nome)
+        if estatistica is None:
+            estatistica = self.regras[nome] = EstatisticaRegra(nome)
+        return estatistica
+
+    def envolver(self, nome: str, funcao: Callable) -> Callable:
+        """`funcao` medida: erros contados pelo tamanho da lista devolvida (None conta zero)"""
+        estatistica = self._estatistica(nome)
+
+        def medida(*args):
+            inicio = perf_counter()
+            resultado = funcao(*args)
+            estatistica.tempo_segundos += perf_counter() - inicio
+            estatistica.chamadas += 1
+            if resultado:
+                estatistica.erros += len(resultado)
+            return resultado
+
+        return medida
+
+    def somar(self, estatisticas: Iterable[EstatisticaRegra]):
+        """Acumula as medições de outra validação (ex.: de um bloco de NFs)"""
+        for outra in estatisticas:
+            estatistica = self._estatistica(outra.nome)
+            estatistica.chamadas += outra.chamadas
+            estatistica.erros += outra.erros
+            estatistica.tempo_segundos += outra.tempo_segundos
+
+    def como_lista(self) -> List[EstatisticaRegra]:
+        """Estatísticas da mais lenta para a mais rápida"""
+        return sorted(self.regras.values(), key=lambda e: e.tempo_segundos, reverse=True)
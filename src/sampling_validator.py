@@ -0,0 +1,180 @@
+"""
+Verificação rápida por amostragem de blocos de NF.
+
+O arquivo é indexado (`LineIndex`) e dividido em blocos que começam em cada
+registro 01 (uma NF). São sempre verificados o header (linhas antes do primeiro
+01), o trailer (a partir do registro 99 final) e os primeiros blocos; dos demais
+é sorteada uma amostra aleatória simples de blocos.
+
+A taxa de sucesso do arquivo é estimada por estratos: a parte verificada
+integralmente entra com o valor exato e a parte amostrada com o estimador de
+razão de amostragem por conglomerados (linhas válidas / linhas dos blocos
+sorteados), com intervalo de confiança pela aproximação normal. Quando a
+amostra não mostra variação (ex.: nenhum erro), usa-se o intervalo de Wilson
+sobre as linhas sorteadas para não devolver um intervalo de largura zero.
+
+Arquivos sem registros 01 (layouts simples) usam cada linha como um bloco.
+"""
+
+import math
+import random
+from statistics import NormalDist
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    from .models import ErroValidacao, ResultadoAmostragem, ColecaoErros
+    from .line_index import LineIndex
+except ImportError:
+    from models import ErroValidacao, ResultadoAmostragem, ColecaoErros
+    from line_index import LineIndex
+
+
+PRIMEIROS_BLOCOS = 20
+TAMANHO_AMOSTRA_BLOCOS = 200
+NIVEL_CONFIANCA = 0.95
+
+
+class PlanoAmostragem(NamedTuple):
+    """Linhas e blocos escolhidos para a verificação rápida (linhas numeradas a partir de 1)"""
+    total_linhas: int
+    blocos: List[Tuple[int, int]]  # [inicio, fim) de cada bloco
+    total_nf: int  # Quantidade de registros 01 do arquivo inteiro
+    cabecalho: range  # Linhas antes do primeiro bloco
+    trailer: range  # Linhas a partir do registro 99 final
+    primeiros: int  # Quantidade de blocos verificados integralmente no início
+    sorteados: List[int]  # Índices (em `blocos`) sorteados entre os demais
+
+    def linhas_fixas(self) -> List[int]:
+        """Header, primeiros blocos e trailer: sempre verificados"""
+        linhas = list(self.cabecalho)
+        for inicio, fim in self.blocos[:self.primeiros]:
+            linhas.extend(range(inicio, fim))
+        linhas.extend(self.trailer)
+        return linhas
+
+
+def planejar_amostra(indice: LineIndex, primeiros_blocos: int = PRIMEIROS_BLOCOS,
+                     tamanho_amostra: int = TAMANHO_AMOSTRA_BLOCOS, semente: Optional[int] = None,
+                     prefixo_bloco: bytes = b'01', prefixo_trailer: bytes = b'99') -> PlanoAmostragem:
+    """Escolhe header, trailer, os primeiros blocos e uma amostra aleatória dos demais"""
+    total_linhas = len(indice)
+    inicios = indice.linhas_com_prefixo(prefixo_bloco)
+    total_nf = len(inicios)
+
+    if inicios:
+        trailers = indice.linhas_com_prefixo(prefixo_trailer)
+        inicio_trailer = next((n for n in trailers if n > inicios[-1]), total_linhas + 1)
+        cabecalho = range(1, inicios[0])
+    else:
+        # Sem registros 01: cada linha é um bloco, sem header/trailer separados
+        inicios = list(range(1, total_linhas + 1))
+        inicio_trailer = total_linhas + 1
+        cabecalho = range(1, 1)
+
+    blocos = list(zip(inicios, inicios[1:] + [inicio_trailer]))
+    primeiros = min(max(primeiros_blocos, 0), len(blocos))
+
+    restantes = range(primeiros, len(blocos))
+    quantidade = min(max(tamanho_amostra, 0), len(restantes))
+    sorteados = sorted(random.Random(semente).sample(restantes, quantidade))
+
+    return PlanoAmostragem(
+        total_linhas=total_linhas,
+        blocos=blocos,
+        total_nf=total_nf,
+        cabecalho=cabecalho,
+        trailer=range(inicio_trailer, total_linhas + 1),
+        primeiros=primeiros,
+        sorteados=sorteados
+    )
+
+
+def linhas_do_plano(plano: PlanoAmostragem) -> List[int]:
+    """Números das linhas a verificar, na ordem do arquivo"""
+    linhas = list(plano.cabecalho)
+    for indice_bloco in list(range(plano.primeiros)) + plano.sorteados:
+        inicio, fim = plano.blocos[indice_bloco]
+        linhas.extend(range(inicio, fim))
+    linhas.extend(plano.trailer)
+    return linhas
+
+
+def _intervalo_wilson(proporcao: float, n: int, z: float) -> Tuple[float, float]:
+    centro = (proporcao + z * z / (2 * n)) / (1 + z * z / n)
+    margem = z * math.sqrt(proporcao * (1 - proporcao) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return centro - margem, centro + margem
+
+
+def estimar_taxa_sucesso(plano: PlanoAmostragem, linhas_com_erro: Set[int],
+                         nivel_confianca: float = NIVEL_CONFIANCA) -> Tuple[float, Tuple[float, float], bool]:
+    """Estima a taxa de sucesso (%) do arquivo inteiro
+
+    Returns:
+        (estimativa, (limite_inferior, limite_superior), completo) — `completo` indica
+        que todos os blocos foram verificados e a taxa é exata.
+    """
+    total = plano.total_linhas
+    if total == 0:
+        return 100.0, (100.0, 100.0), True
+
+    linhas_fixas = plano.linhas_fixas()
+    validas_fixas = sum(1 for n in linhas_fixas if n not in linhas_com_erro)
+    amostra = []
+    for indice_bloco in plano.sorteados:
+        inicio, fim = plano.blocos[indice_bloco]
+        amostra.append((fim - inicio, sum(1 for n in range(inicio, fim) if n not in linhas_com_erro)))
+
+    blocos_restantes = len(plano.blocos) - plano.primeiros
+    if len(amostra) >= blocos_restantes:
+        taxa = (validas_fixas + sum(validas for _, validas in amostra)) / total * 100
+        return taxa, (taxa, taxa), True
+
+    # Estimador de razão sobre os blocos sorteados
+    linhas_restantes = total - len(linhas_fixas)
+    linhas_amostra = sum(linhas for linhas, _ in amostra)
+    razao = sum(validas for _, validas in amostra) / linhas_amostra if linhas_amostra else 1.0
+
+    k = len(amostra)
+    z = NormalDist().inv_cdf(0.5 + nivel_confianca / 2)
+    media_linhas = linhas_restantes / blocos_restantes
+    variancia = 0.0
+    if k > 1 and media_linhas:
+        s2 = sum((validas - razao * linhas) ** 2 for linhas, validas in amostra) / (k - 1)
+        variancia = (1 - k / blocos_restantes) * s2 / (k * media_linhas ** 2)
+
+    if variancia > 0:
+        margem = z * math.sqrt(variancia)
+        inferior, superior = razao - margem, razao + margem
+    elif linhas_amostra:
+        inferior, superior = _intervalo_wilson(razao, linhas_amostra, z)
+    else:
+        inferior, superior = 0.0, 1.0
+
+    def taxa_total(proporcao: float) -> float:
+        proporcao = min(max(proporcao, 0.0), 1.0)
+        return (validas_fixas + proporcao * linhas_restantes) / total * 100
+
+    return taxa_total(razao), (taxa_total(inferior), taxa_total(superior)), False
+
+
+def resultado_amostragem(plano: PlanoAmostragem, erros: Iterable[ErroValidacao],
+                         nivel_confianca: float = NIVEL_CONFIANCA) -> ResultadoAmostragem:
+    """Monta o ResultadoAmostragem a partir dos erros encontrados nas linhas do plano"""
+    if not isinstance(erros, ColecaoErros):
+        erros = ColecaoErros(erros)
+    linhas_com_erro = erros.linhas_distintas()
+    taxa, intervalo, completo = estimar_taxa_sucesso(plano, linhas_com_erro, nivel_confianca)
+
+    return ResultadoAmostragem(
+        total_linhas=plano.total_linhas,
+        linhas_verificadas=len(linhas_do_plano(plano)),
+        linhas_com_erro=len(linhas_com_erro),
+        total_blocos=len(plano.blocos),
+        blocos_verificados=plano.primeiros + len(plano.sorteados),
+        taxa_sucesso_estimada=taxa,
+        intervalo_confianca=intervalo,
+        nivel_confianca=nivel_confianca,
+        tipos_erro=dict(erros.contar_tipos().most_common()),
+        erros=erros,
+        completo=completo
+    )
@@ -9,6 +9,11 @@ import re
 from dataclasses import dataclass, field
 from typing import List, Dict, Set, Optional
 
+try:
+    from .file_reader import LeitorArquivo
+except ImportError:
+    from file_reader import LeitorArquivo
+
 
 # Mapeamento de tipos de registro para cenários
 CENARIO_MAP = {
@@ -255,93 +260,84 @@ def identificar_cenarios(file_path: str) -> ResultadoCenarios:
         servicos_atual = {}
 
     # Ler arquivo linha por linha
-    encodings = ['utf-8', 'latin-1']
-    for encoding in encodings:
-        try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                for num_linha, linha in enumerate(f, 1):
-                    linha = linha.rstrip('\n').rstrip('\r')
-                    if len(linha) < 2:
-                        continue
-
-                    tipo_registro = linha[:2].strip()
-
-                    if tipo_registro == '01':
-                        # Finalizar fatura anterior
-                        finalizar_fatura()
-
-                        # Iniciar nova fatura
-                        conta_atual = linha[2:17].strip() if len(linha) >= 17 else ""
-                        cps_atual = linha[17:30].strip() if len(linha) >= 30 else ""
-                        tipos_atual = {'01'}
-                        linha_inicio_atual = num_linha
-                        total_linhas_atual = 1
-                        mensagens_atual = []
-                        retencao_atual = None
-                        isencao_atual = False
-                        aliquota_icms_atual = None
-                        valor_isentos_atual = None
-                        servicos_atual = {}
-
-                        # Flag débito automático (pos 266, 0-indexed = 265)
-                        debito_auto_atual = (
-                            len(linha) > FLAG_DEBITO_AUTO_POS and
-                            linha[FLAG_DEBITO_AUTO_POS].upper() == 'S'
-                        )
-                    elif tipo_registro in ('00', '99'):
-                        # Header e trailer não pertencem a nenhuma fatura
-                        continue
-                    else:
-                        tipos_atual.add(tipo_registro)
-                        total_linhas_atual += 1
-
-                        # Extrair dados fiscais dos registros 48 (M62) ou 12 (M22)
-                        if tipo_registro in ('48', '12'):
-                            # Alíquota ICMS (campo 48.07/12.07, pos 38-42)
-                            if len(linha) >= ALIQUOTA_POS_ATE:
-                                aliq_raw = linha[ALIQUOTA_POS_DE:ALIQUOTA_POS_ATE].strip()
-                                if aliq_raw:
-                                    aliquota_icms_atual = formatar_aliquota(aliq_raw)
-
-                            # Valor Isentos (campo 48.11/12.11, pos 59-72)
-                            if len(linha) >= ISENCAO_POS_ATE:
-                                vi_raw = linha[ISENCAO_POS_DE:ISENCAO_POS_ATE].strip()
-                                if vi_raw and not all(c in '0 ' for c in vi_raw):
-                                    isencao_atual = True
-                                    valor_isentos_atual = formatar_valor_brl(vi_raw)
-
-                        # Extrair serviços do registro 02 (Resumo Serviços)
-                        if tipo_registro == '02' and len(linha) >= 57:
-                            sigla = linha[2:7].strip()   # pos 3-7 (0-indexed: 2-7)
-                            descricao = linha[7:57].strip()  # pos 8-57 (0-indexed: 7-57)
-                            valor_servico = None
-                            if len(linha) >= 72:
-                                val_raw = linha[58:72].strip()  # pos 59-72
-                                if val_raw and not all(c in '0 ' for c in val_raw):
-                                    valor_servico = formatar_valor_brl(val_raw)
-                            if sigla and sigla not in servicos_atual:
-                                servicos_atual[sigla] = ServicoFatura(
-                                    sigla=sigla,
-                                    descricao=descricao,
-                                    valor=valor_servico,
-                                )
-
-                        # Capturar mensagens dos registros 85, 86, 87, 88
-                        if tipo_registro in ('85', '86', '87', '88'):
-                            msg_texto = linha[2:].strip()
-                            if msg_texto:
-                                mensagens_atual.append(msg_texto)
-
-                            # Verificar retenção no registro 88
-                            if tipo_registro == '88':
-                                ret = parse_retencao(linha)
-                                if ret:
-                                    retencao_atual = ret
-            break  # Encoding funcionou
-        except UnicodeDecodeError:
-            if encoding == encodings[-1]:
-                raise
+    for num_linha, linha in LeitorArquivo(file_path).linhas_numeradas():
+        linha = linha.rstrip('\n').rstrip('\r')
+        if len(linha) < 2:
+            continue
+
+        tipo_registro = linha[:2].strip()
+
+        if tipo_registro == '01':
+            # Finalizar fatura anterior
+            finalizar_fatura()
+
+            # Iniciar nova fatura
+            conta_atual = linha[2:17].strip() if len(linha) >= 17 else ""
+            cps_atual = linha[17:30].strip() if len(linha) >= 30 else ""
+            tipos_atual = {'01'}
+            linha_inicio_atual = num_linha
+            total_linhas_atual = 1
+            mensagens_atual = []
+            retencao_atual = None
+            isencao_atual = False
+            aliquota_icms_atual = None
+            valor_isentos_atual = None
+            servicos_atual = {}
+
+            # Flag débito automático (pos 266, 0-indexed = 265)
+            debito_auto_atual = (
+                len(linha) > FLAG_DEBITO_AUTO_POS and
+                linha[FLAG_DEBITO_AUTO_POS].upper() == 'S'
+            )
+        elif tipo_registro in ('00', '99'):
+            # Header e trailer não pertencem a nenhuma fatura
             continue
+        else:
+            tipos_atual.add(tipo_registro)
+            total_linhas_atual += 1
+
+            # Extrair dados fiscais dos registros 48 (M62) ou 12 (M22)
+            if tipo_registro in ('48', '12'):
+                # Alíquota ICMS (campo 48.07/12.07, pos 38-42)
+                if len(linha) >= ALIQUOTA_POS_ATE:
+                    aliq_raw = linha[ALIQUOTA_POS_DE:ALIQUOTA_POS_ATE].strip()
+                    if aliq_raw:
+                        aliquota_icms_atual = formatar_aliquota(aliq_raw)
+
+                # Valor Isentos (campo 48.11/12.11, pos 59-72)
+                if len(linha) >= ISENCAO_POS_ATE:
+                    vi_raw = linha[ISENCAO_POS_DE:ISENCAO_POS_ATE].strip()
+                    if vi_raw and not all(c in '0 ' for c in vi_raw):
+                        isencao_atual = True
+                        valor_isentos_atual = formatar_valor_brl(vi_raw)
+
+            # Extrair serviços do registro 02 (Resumo Serviços)
+            if tipo_registro == '02' and len(linha) >= 57:
+                sigla = linha[2:7].strip()   # pos 3-7 (0-indexed: 2-7)
+                descricao = linha[7:57].strip()  # pos 8-57 (0-indexed: 7-57)
+                valor_servico = None
+                if len(linha) >= 72:
+                    val_raw = linha[58:72].strip()  # pos 59-72
+                    if val_raw and not all(c in '0 ' for c in val_raw):
+                        valor_servico = formatar_valor_brl(val_raw)
+                if sigla and sigla not in servicos_atual:
+                    servicos_atual[sigla] = ServicoFatura(
+                        sigla=sigla,
+                        descricao=descricao,
+                        valor=valor_servico,
+                    )
+
+            # Capturar mensagens dos registros 85, 86, 87, 88
+            if tipo_registro in ('85', '86', '87', '88'):
+                msg_texto = linha[2:].strip()
+                if msg_texto:
+                    mensagens_atual.append(msg_texto)
+
+                # Verificar retenção no registro 88
+                if tipo_registro == '88':
+                    ret = parse_retencao(linha)
+                    if ret:
+                        retencao_atual = ret
 
     # Finalizar última fatura
     finalizar_fatura()
@@ -476,88 +472,79 @@ def buscar_faturas_por_campo(file_path: str, tipo_registro: str,
         valor_isentos_atual = None
         servicos_atual = {}
 
-    encodings = ['utf-8', 'latin-1']
-    for encoding in encodings:
-        try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                for num_linha, linha in enumerate(f, 1):
-                    linha = linha.rstrip('\n').rstrip('\r')
-                    if len(linha) < 2:
-                        continue
-
-                    tipo_reg = linha[:2].strip()
-
-                    if tipo_reg == '01':
-                        finalizar_fatura()
-                        conta_atual = linha[2:17].strip() if len(linha) >= 17 else ""
-                        cps_atual = linha[17:30].strip() if len(linha) >= 30 else ""
-                        tipos_atual = {'01'}
-                        linha_inicio_atual = num_linha
-                        total_linhas_atual = 1
-                        match_encontrado = False
-                        valor_campo_encontrado = ""
-                        retencao_atual = None
-                        isencao_atual = False
-                        aliquota_icms_atual = None
-                        valor_isentos_atual = None
-                        servicos_atual = {}
-                        debito_auto_atual = (
-                            len(linha) > FLAG_DEBITO_AUTO_POS and
-                            linha[FLAG_DEBITO_AUTO_POS].upper() == 'S'
-                        )
-                    elif tipo_reg in ('00', '99'):
-                        continue
-                    else:
-                        tipos_atual.add(tipo_reg)
-                        total_linhas_atual += 1
-
-                        # Extrair dados fiscais dos registros 48 (M62) ou 12 (M22)
-                        if tipo_reg in ('48', '12'):
-                            if len(linha) >= ALIQUOTA_POS_ATE:
-                                aliq_raw = linha[ALIQUOTA_POS_DE:ALIQUOTA_POS_ATE].strip()
-                                if aliq_raw:
-                                    aliquota_icms_atual = formatar_aliquota2(aliq_raw)
-                            if len(linha) >= ISENCAO_POS_ATE:
-                                vi_raw = linha[ISENCAO_POS_DE:ISENCAO_POS_ATE].strip()
-                                if vi_raw and not all(c in '0 ' for c in vi_raw):
-                                    isencao_atual = True
-                                    valor_isentos_atual = formatar_valor_brl2(vi_raw)
-
-                        # Extrair serviços do registro 02 (Resumo Serviços)
-                        if tipo_reg == '02' and len(linha) >= 57:
-                            sigla = linha[2:7].strip()
-                            descricao = linha[7:57].strip()
-                            valor_servico = None
-                            if len(linha) >= 72:
-                                val_raw = linha[58:72].strip()
-                                if val_raw and not all(c in '0 ' for c in val_raw):
-                                    valor_servico = formatar_valor_brl2(val_raw)
-                            if sigla and sigla not in servicos_atual:
-                                servicos_atual[sigla] = ServicoFatura(
-                                    sigla=sigla,
-                                    descricao=descricao,
-                                    valor=valor_servico,
-                                )
-
-                        # Capturar retenção do registro 88
-                        if tipo_reg == '88':
-                            ret = parse_retencao(linha)
-                            if ret:
-                                retencao_atual = ret
-
-                    # Verificar se este tipo de registro é o que buscamos
-                    if tipo_reg == tipo_registro:
-                        # Extrair valor do campo (posições 1-indexed)
-                        if len(linha) >= posicao_ate:
-                            valor_extraido = linha[posicao_de - 1:posicao_ate]
-                            if valor_busca_lower in valor_extraido.lower():
-                                match_encontrado = True
-                                valor_campo_encontrado = valor_extraido
-            break
-        except UnicodeDecodeError:
-            if encoding == encodings[-1]:
-                raise
+    for num_linha, linha in LeitorArquivo(file_path).linhas_numeradas():
+        linha = linha.rstrip('\n').rstrip('\r')
+        if len(linha) < 2:
+            continue
+
+        tipo_reg = linha[:2].strip()
+
+        if tipo_reg == '01':
+            finalizar_fatura()
+            conta_atual = linha[2:17].strip() if len(linha) >= 17 else ""
+            cps_atual = linha[17:30].strip() if len(linha) >= 30 else ""
+            tipos_atual = {'01'}
+            linha_inicio_atual = num_linha
+            total_linhas_atual = 1
+            match_encontrado = False
+            valor_campo_encontrado = ""
+            retencao_atual = None
+            isencao_atual = False
+            aliquota_icms_atual = None
+            valor_isentos_atual = None
+            servicos_atual = {}
+            debito_auto_atual = (
+                len(linha) > FLAG_DEBITO_AUTO_POS and
+                linha[FLAG_DEBITO_AUTO_POS].upper() == 'S'
+            )
+        elif tipo_reg in ('00', '99'):
             continue
+        else:
+            tipos_atual.add(tipo_reg)
+            total_linhas_atual += 1
+
+            # Extrair dados fiscais dos registros 48 (M62) ou 12 (M22)
+            if tipo_reg in ('48', '12'):
+                if len(linha) >= ALIQUOTA_POS_ATE:
+                    aliq_raw = linha[ALIQUOTA_POS_DE:ALIQUOTA_POS_ATE].strip()
+                    if aliq_raw:
+                        aliquota_icms_atual = formatar_aliquota2(aliq_raw)
+                if len(linha) >= ISENCAO_POS_ATE:
+                    vi_raw = linha[ISENCAO_POS_DE:ISENCAO_POS_ATE].strip()
+                    if vi_raw and not all(c in '0 ' for c in vi_raw):
+                        isencao_atual = True
+                        valor_isentos_atual = formatar_valor_brl2(vi_raw)
+
+            # Extrair serviços do registro 02 (Resumo Serviços)
+            if tipo_reg == '02' and len(linha) >= 57:
+                sigla = linha[2:7].strip()
+                descricao = linha[7:57].strip()
+                valor_servico = None
+                if len(linha) >= 72:
+                    val_raw = linha[58:72].strip()
+                    if val_raw and not all(c in '0 ' for c in val_raw):
+                        valor_servico = formatar_valor_brl2(val_raw)
+                if sigla and sigla not in servicos_atual:
+                    servicos_atual[sigla] = ServicoFatura(
+                        sigla=sigla,
+                        descricao=descricao,
+                        valor=valor_servico,
+                    )
+
+            # Capturar retenção do registro 88
+            if tipo_reg == '88':
+                ret = parse_retencao(linha)
+                if ret:
+                    retencao_atual = ret
+
+        # Verificar se este tipo de registro é o que buscamos
+        if tipo_reg == tipo_registro:
+            # Extrair valor do campo (posições 1-indexed)
+            if len(linha) >= posicao_ate:
+                valor_extraido = linha[posicao_de - 1:posicao_ate]
+                if valor_busca_lower in valor_extraido.lower():
+                    match_encontrado = True
+                    valor_campo_encontrado = valor_extraido
 
     finalizar_fatura()
 
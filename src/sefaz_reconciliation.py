@@ -0,0 +1,311 @@
+"""
+Conciliação dos arquivos da SEFAZ (envio e retorno) com um lote.
+
+Os arquivos `sefaz/envio_*.txt` e `sefaz/retorno_*.txt` são exportações JSON
+lines (um objeto por linha), lidas em streaming, uma linha por vez: um arquivo
+de um dia inteiro nunca é carregado na memória.
+
+Retorno: cada registro (situação da NFCOM, chaveada por `TRANSACTION_ID_CLARO`)
+é procurado (hash join) no mapa TRANSACTION_ID_CLARO -> NF montado a partir dos
+grupos do `EnhancedValidator` (o id vem dos registros 90), com os tipos de erro
+locais de cada NF. Um mesmo id pode voltar mais de uma vez (reenvios); vale o
+último registro.
+
+Envio: cada registro (dados da NFCOM enviada) é localizado no TXT do lote por um
+índice número da NF -> linhas do 01 e do 56 (`IndiceNFLote`, arrays ordenados
+sobre o `LineIndex` mapeado em memória) e os campos de `CAMPOS_ENVIO` são
+comparados um a um.
+"""
+
+import json
+import re
+from array import array
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+try:
+    from .compiled_layout import compilar_layout
+    from .line_index import LineIndex
+    from .models import DiferencaEnvio, Layout, NFConciliada, ResultadoConciliacao, ResultadoConferenciaEnvio
+    from .tax_rules import digitos_para_int, fatia_campo
+    from .uniqueness_index import fatura_nf_do_registro_01
+except ImportError:
+    from compiled_layout import compilar_layout
+    from line_index import LineIndex
+    from models import DiferencaEnvio, Layout, NFConciliada, ResultadoConciliacao, ResultadoConferenciaEnvio
+    from tax_rules import digitos_para_int, fatia_campo
+    from uniqueness_index import fatura_nf_do_registro_01
+
+
+# Erros do arquivo como um todo (registrados nas linhas 00/99), não da NF onde caem
+ERROS_DO_ARQUIVO = ('HEADER_QTD_NF', 'TRAILER_QTD_NF')
+
+# Campos conferidos no envio: (caminho no JSON, campo do layout TXT, conversão). O tipo de
+# registro (01 ou 56) sai do nome do campo; campos que o layout não tem ficam de fora.
+# 'inteiro': só os dígitos; 'decimal': centavos (o TXT com 2 casas implícitas).
+CAMPOS_ENVIO: Tuple[Tuple[str, str, str], ...] = (
+    ('NUM_NFCOM', 'NFE01-NUM-NF', 'inteiro'),
+    ('NUM_SERIE_NF', 'NFE01-SERIE-NF', 'inteiro'),
+    ('NUM_MODELO_NFCOM', 'NFE01-MODELO-NF', 'inteiro'),
+    ('TOTAL_NFCOM.VLR_TOT_BC', 'NFE56-TOT-VLR-BC', 'decimal'),
+    ('TOTAL_NFCOM.VLR_TOT_ICMS', 'NFE56-TOT-VLR-ICMS', 'decimal'),
+    ('TOTAL_NFCOM.VLR_TOT_FCP', 'NFE56-TOT-VLR-FCP', 'decimal'),
+    ('TOTAL_NFCOM.VLR_TOT_PIS', 'NFE56-TOT-VLR-PIS', 'decimal'),
+    ('TOTAL_NFCOM.VLR_TOT_COFINS', 'NFE56-TOT-VLR-COFINS', 'decimal'),
+    ('TOTAL_NFCOM.VLR_TOT_FUST', 'NFE56-TOT-VLR-FUST', 'decimal'),
+    ('TOTAL_NFCOM.VLR_TOT_FUNTTEL', 'NFE56-TOT-VLR-FUNTEL', 'decimal'),
+)
+
+# Prefixo repetido nas mensagens de rejeição (ex.: " Rejeição G114: ...")
+_PREFIXO_REJEICAO = re.compile(r'^\s*Rejei\w*(?:\s+\w+)?:\s*')
+
+
+def ler_registros_json(caminho: str) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """Pares (numero_linha, registro) de um arquivo JSON lines, lido linha a linha
+
+    Linhas em branco são puladas; linhas que não são um objeto JSON vêm com registro None.
+    """
+    with open(caminho, 'r', encoding='utf-8-sig', errors='replace') as arquivo:
+        for numero_linha, linha in enumerate(arquivo, 1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                registro = None
+            yield numero_linha, registro if isinstance(registro, dict) else None
+
+
+def status_do_retorno(registro: Dict) -> str:
+    """'REJEITADA' (com rejeições ou status 2), 'AUTORIZADA' (status 1) ou 'PENDENTE'"""
+    status = str(registro.get('COD_STATUS_DET_NFCOM') or '')
+    if registro.get('NFCOM_REJEITADA') or status == '2':
+        return 'REJEITADA'
+    return 'AUTORIZADA' if status == '1' else 'PENDENTE'
+
+
+def rejeicoes_do_retorno(registro: Dict) -> List[str]:
+    """Rejeições do registro como "CÓDIGO: mensagem" """
+    rejeicoes = []
+    for rejeicao in registro.get('NFCOM_REJEITADA') or []:
+        mensagens = rejeicao.get('DSC_MENSAGEM_ERRO') or []
+        if isinstance(mensagens, str):
+            mensagens = [mensagens]
+        texto = ' '.join(_PREFIXO_REJEICAO.sub('', str(m)).strip() for m in mensagens if m)
+        codigo = str(rejeicao.get('COD_REJEICAO') or '')
+        rejeicoes.append(f"{codigo}: {texto}" if codigo and texto else codigo or texto)
+    return rejeicoes
+
+
+def nfs_por_transaction_id(grupos_nf: Dict[Tuple[str, str], Dict]) -> Dict[str, Tuple[str, str]]:
+    """TRANSACTION_ID_CLARO -> (fatura, nf) das NFs do lote que têm o id"""
+    return {
+        grupo['transaction_id_claro']: chave
+        for chave, grupo in grupos_nf.items() if grupo.get('transaction_id_claro')
+    }
+
+
+def erros_por_nf(grupos_nf: Dict[Tuple[str, str], Dict], erros: Iterable[Tuple[int, str]],
+                 chaves: Optional[Set[Tuple[str, str]]] = None) -> Dict[Tuple[str, str], Set[str]]:
+    """Tipos de erro de cada NF, pelos pares (linha, erro_tipo) e pelas faixas de linhas dos grupos
+
+    Com `chaves`, só essas NFs entram no mapa; erros do arquivo (header/trailer) não contam.
+    """
+    faixas = sorted(
+        (inicio, fim, chave)
+        for chave, grupo in grupos_nf.items() if chaves is None or chave in chaves
+        for inicio, fim in grupo['faixas']
+    )
+    inicios = [inicio for inicio, _, _ in faixas]
+
+    tipos: Dict[Tuple[str, str], Set[str]] = {}
+    for linha, erro_tipo in erros:
+        if erro_tipo in ERROS_DO_ARQUIVO:
+            continue
+        posicao = bisect_right(inicios, linha) - 1
+        if posicao >= 0 and linha < faixas[posicao][1]:
+            tipos.setdefault(faixas[posicao][2], set()).add(erro_tipo)
+    return tipos
+
+
+def conciliar_retorno(caminho_retorno: str, grupos_nf: Dict[Tuple[str, str], Dict],
+                      erros: Iterable[Tuple[int, str]]) -> ResultadoConciliacao:
+    """Cruza o retorno da SEFAZ com as NFs (grupos do EnhancedValidator) e os erros locais do lote
+
+    `erros`: pares (linha, erro_tipo), ex.: `resultado.erros.linhas_e_tipos()`.
+    """
+    nfs = nfs_por_transaction_id(grupos_nf)
+    tipos_erro = erros_por_nf(grupos_nf, erros, set(nfs.values()))
+    resultado = ResultadoConciliacao(arquivo_retorno=caminho_retorno)
+
+    # Último registro de cada id do lote (reenvios substituem o anterior)
+    conciliadas: Dict[str, NFConciliada] = {}
+    for numero_linha, registro in ler_registros_json(caminho_retorno):
+        if registro is None:
+            resultado.linhas_invalidas.append(numero_linha)
+            continue
+        resultado.total_registros += 1
+
+        transaction_id = registro.get('TRANSACTION_ID_CLARO')
+        chave = nfs.get(transaction_id)
+        if chave is None:
+            resultado.registros_fora_do_lote += 1
+            continue
+        conciliadas[transaction_id] = NFConciliada(
+            transaction_id=transaction_id,
+            num_nfcom=str(registro.get('NUM_NFCOM') or ''),
+            status=status_do_retorno(registro),
+            fatura=chave[0],
+            nf=chave[1],
+            rejeicoes=rejeicoes_do_retorno(registro),
+            erros_locais=sorted(tipos_erro.get(chave, ()))
+        )
+
+    resultado.nfs_sem_retorno = len(nfs) - len(conciliadas)
+    for nf in conciliadas.values():
+        if nf.status == 'REJEITADA':
+            (resultado.rejeitadas_com_erro_local if nf.erros_locais else resultado.rejeitadas_sem_erro_local).append(nf)
+        elif nf.status == 'AUTORIZADA':
+            if nf.erros_locais:
+                resultado.autorizadas_com_erro_local.append(nf)
+            else:
+                resultado.autorizadas_sem_erro_local += 1
+        else:
+            resultado.pendentes += 1
+    return resultado
+
+
+class IndiceNFLote:
+    """Número da NF -> linhas do registro 01 e do seu totalizador 56 no TXT do lote
+
+    Guarda só três arrays de inteiros ordenados pelo número da NF (o conteúdo das
+    linhas continua no mapa do `LineIndex`). NF repetida no lote: vale o primeiro 01.
+    """
+
+    def __init__(self, indice_linhas: LineIndex):
+        linhas_56 = indice_linhas.linhas_com_prefixo(b'56')
+        linhas_01 = indice_linhas.linhas_com_prefixo(b'01')
+
+        numeros_nf, linhas_nf_01, linhas_nf_56 = array('q'), array('q'), array('q')
+        proximo_56 = 0
+        for posicao, linha_01 in enumerate(linhas_01):
+            fim_nf = linhas_01[posicao + 1] if posicao + 1 < len(linhas_01) else indice_linhas.ultima_linha + 1
+            # Primeiro 56 depois do 01 e antes do próximo 01 (0: NF sem 56)
+            while proximo_56 < len(linhas_56) and linhas_56[proximo_56] < linha_01:
+                proximo_56 += 1
+            linha_56 = linhas_56[proximo_56] if proximo_56 < len(linhas_56) and linhas_56[proximo_56] < fim_nf else 0
+
+            chave = fatura_nf_do_registro_01(indice_linhas.get_line(linha_01))
+            if chave is not None:
+                numeros_nf.append(digitos_para_int(chave[1]))
+                linhas_nf_01.append(linha_01)
+                linhas_nf_56.append(linha_56)
+
+        # Ordenação estável: entre NFs repetidas, o primeiro 01 vem antes
+        self.numeros_nf, self.linhas_01, self.linhas_56 = array('q'), array('q'), array('q')
+        self.repetidas = 0
+        for posicao in sorted(range(len(numeros_nf)), key=numeros_nf.__getitem__):
+            if self.numeros_nf and self.numeros_nf[-1] == numeros_nf[posicao]:
+                self.repetidas += 1
+                continue
+            self.numeros_nf.append(numeros_nf[posicao])
+            self.linhas_01.append(linhas_nf_01[posicao])
+            self.linhas_56.append(linhas_nf_56[posicao])
+
+    def __len__(self) -> int:
+        return len(self.numeros_nf)
+
+    def procurar(self, numero_nf: int) -> Optional[Tuple[int, int]]:
+        """(linha do 01, linha do 56 ou 0) da NF, ou None se ela não estiver no lote"""
+        posicao = bisect_left(self.numeros_nf, numero_nf)
+        if posicao < len(self.numeros_nf) and self.numeros_nf[posicao] == numero_nf:
+            return self.linhas_01[posicao], self.linhas_56[posicao]
+        return None
+
+
+def valor_do_envio(registro: Dict, caminho: str):
+    """Valor de um caminho com pontos (ex.: TOTAL_NFCOM.VLR_TOT_PIS), aceitando {"$numberDecimal": "1.00"}"""
+    valor = registro
+    for parte in caminho.split('.'):
+        if not isinstance(valor, dict):
+            return None
+        valor = valor.get(parte)
+    if isinstance(valor, dict):
+        valor = valor.get('$numberDecimal')
+    return valor
+
+
+def centavos_do_envio(valor) -> Optional[int]:
+    """Centavos de um valor do envio em reais ("10", 10, "0.91", "1.005"); None se não for número.
+    Sem ponto o valor é inteiro em reais, diferente do TXT, onde os dígitos já são centavos"""
+    try:
+        return int(Decimal(str(valor).strip()).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _converter(valor: str, conversao: str, do_envio: bool) -> Optional[int]:
+    if conversao == 'decimal' and do_envio:
+        return centavos_do_envio(valor)
+    return digitos_para_int(valor)
+
+
+def conferir_envio(caminho_envio: str, indice_linhas: LineIndex, layout: Layout,
+                   campos: Sequence[Tuple[str, str, str]] = CAMPOS_ENVIO) -> ResultadoConferenciaEnvio:
+    """Compara cada NF do envio à SEFAZ com os registros 01/56 dela no TXT do lote, campo a campo"""
+    resultado = ResultadoConferenciaEnvio(arquivo_envio=caminho_envio)
+    compilado = compilar_layout(layout)
+
+    # (caminho no envio, campo, conversão, fatia, tipo do registro) dos campos que o layout tem
+    conferidos = []
+    for caminho, nome_campo, conversao in campos:
+        fatia = fatia_campo(compilado, nome_campo)
+        tipo_registro = nome_campo.split('-')[0][-2:]
+        if fatia is None or tipo_registro not in ('01', '56'):
+            resultado.campos_sem_layout.append(nome_campo)
+            continue
+        conferidos.append((caminho, nome_campo, conversao, fatia, tipo_registro))
+    usa_56 = any(tipo_registro == '56' for *_, tipo_registro in conferidos)
+
+    indice_nf = IndiceNFLote(indice_linhas)
+    resultado.nfs_repetidas_no_lote = indice_nf.repetidas
+
+    for numero_linha, registro in ler_registros_json(caminho_envio):
+        if registro is None:
+            resultado.linhas_invalidas.append(numero_linha)
+            continue
+        resultado.total_registros += 1
+
+        num_nfcom = str(registro.get('NUM_NFCOM') or '')
+        linhas_nf = indice_nf.procurar(digitos_para_int(num_nfcom)) if num_nfcom else None
+        if linhas_nf is None:
+            resultado.registros_fora_do_lote += 1
+            continue
+        resultado.nfs_conferidas += 1
+        if usa_56 and not linhas_nf[1]:
+            resultado.nfs_sem_56 += 1
+
+        linhas = {'01': indice_linhas.get_line(linhas_nf[0])}
+        if linhas_nf[1]:
+            linhas['56'] = indice_linhas.get_line(linhas_nf[1])
+
+        com_diferenca = False
+        for caminho, nome_campo, conversao, fatia, tipo_registro in conferidos:
+            valor_envio = valor_do_envio(registro, caminho)
+            linha = linhas.get(tipo_registro)
+            if valor_envio is None or linha is None:
+                continue
+            valor_txt = linha[fatia[0]].strip() if len(linha) >= fatia[1] else ''
+            if _converter(str(valor_envio), conversao, True) != _converter(valor_txt, conversao, False):
+                com_diferenca = True
+                resultado.diferencas.append(DiferencaEnvio(
+                    num_nfcom=num_nfcom,
+                    campo_envio=caminho,
+                    campo_layout=nome_campo,
+                    linha=linhas_nf[0] if tipo_registro == '01' else linhas_nf[1],
+                    valor_envio=str(valor_envio),
+                    valor_txt=valor_txt
+                ))
+        resultado.nfs_com_diferenca += com_diferenca
+    return resultado
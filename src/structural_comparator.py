@@ -1,68 +1,85 @@
-from typing import List, Generator, Tuple, Optional, Dict
+from typing import List, Generator, Tuple, Optional, Dict, NamedTuple, Iterable, Any
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # Sem NumPy os pares diferentes são comparados campo a campo
+    HAS_NUMPY = False
 
 try:
     from .models import (
         Layout, DiferencaEstruturalCampo, DiferencaEstruturalLinha,
         ResultadoComparacaoEstrutural, FaturaComparada, TipoCampo
     )
+    from .compiled_layout import compilar_layout, campo_pertence_ao_tipo, CampoCompilado
+    from .fatura_index import IndiceFaturasLote
+    from .file_reader import LeitorArquivo
+    from .line_index import LineIndex
 except ImportError:
     from models import (
         Layout, DiferencaEstruturalCampo, DiferencaEstruturalLinha,
         ResultadoComparacaoEstrutural, FaturaComparada, TipoCampo
     )
+    from compiled_layout import compilar_layout, campo_pertence_ao_tipo, CampoCompilado
+    from fatura_index import IndiceFaturasLote
+    from file_reader import LeitorArquivo
+    from line_index import LineIndex
+
+
+# Abaixo disso (por processo) o custo de subir processos e enviar as faturas supera o ganho
+FATURAS_MINIMAS_POR_PROCESSO = 200
+
+
+class MascaraComparacao(NamedTuple):
+    """Máscara de um tipo de registro para o conjunto de campos ignorados do comparador"""
+    trechos: Tuple[Tuple[int, int], ...]            # Fatias comparadas (campos não ignorados, contíguos unidos)
+    trechos_numericos: Tuple[Tuple[int, int], ...]  # Fatias cujo formato fica conferido se forem só dígitos
+    fim_numerico: int
+    campos_conferidos: Tuple[CampoCompilado, ...]   # Campos com verificação própria mesmo com valores iguais
+    # Campos não ignorados em ordem (sequência, campo) e colunas NumPy para localizar os tocados
+    campos: Tuple[Tuple[int, CampoCompilado], ...]
+    inicios: Any
+    fins: Any
+    extensao: int
+    por_digitos: Any   # Campo cujo formato fica conferido se a fatia for só dígitos
+    conferido: Any     # Campo sempre conferido (obrigatório texto, Hash-Code, IE...)
+
+
+def _unir_trechos(fatias) -> Tuple[Tuple[int, int], ...]:
+    """Une fatias sobrepostas ou encostadas, em ordem de início"""
+    trechos = []
+    for inicio, fim in sorted(fatias):
+        if trechos and inicio <= trechos[-1][1]:
+            trechos[-1][1] = max(trechos[-1][1], fim)
+        else:
+            trechos.append([inicio, fim])
+    return tuple((inicio, fim) for inicio, fim in trechos)
 
 
 class ComparadorEstruturalArquivos:
     """Comparador estrutural que analisa diferenças entre arquivo base e arquivo a ser validado"""
 
-    def __init__(self, layout: Layout, campos_ignorados: set = None, campos_ignorar_se_preenchido: set = None, mapeamento_tipos: dict = None):
+    def __init__(self, layout: Layout, campos_ignorados: set = None, campos_ignorar_se_preenchido: set = None, mapeamento_tipos: dict = None,
+                 linhas_sob_demanda: bool = False):
         self.layout = layout
+        # Com linhas sob demanda os resultados guardam só os números das linhas nos arquivos;
+        # a visualização com barras é montada depois por `renderizar_linhas`
+        self.linhas_sob_demanda = linhas_sob_demanda
         self.campos_ignorados = campos_ignorados or set()
         self.campos_ignorar_se_preenchido = campos_ignorar_se_preenchido or set()
         self.mapeamento_tipos = mapeamento_tipos or {'88': '05', '87': '09'}
+        self.compilado = compilar_layout(layout)
+        self._mascaras_por_tipo: Dict[str, MascaraComparacao] = {}
 
     def extrair_campos_linha(self, linha: str, tipo_registro: Optional[str] = None) -> Dict[str, str]:
         """Extrai os campos de uma linha baseado no layout, filtrado por tipo de registro se especificado"""
-        campos_extraidos = {}
-
-        # Filtrar campos pelo tipo de registro se especificado
-        campos_para_extrair = self.layout.campos
-        if tipo_registro:
-            campos_para_extrair = [
-                campo for campo in self.layout.campos
-                if self._campo_pertence_ao_tipo(campo.nome, tipo_registro)
-            ]
-
-        for campo in campos_para_extrair:
-            # Ajustar índices (layout usa 1-indexed, Python usa 0-indexed)
-            inicio = campo.posicao_inicio - 1
-            fim = campo.posicao_fim
-
-            # Extrair valor (cuidando com linhas muito curtas)
-            if inicio < len(linha):
-                valor = linha[inicio:fim] if fim <= len(linha) else linha[inicio:]
-            else:
-                valor = ''
-
-            campos_extraidos[campo.nome] = valor
-
-        return campos_extraidos
+        return self.compilado.extrair(linha, tipo_registro)
 
     def _campo_pertence_ao_tipo(self, nome_campo: str, tipo_registro: str) -> bool:
         """Verifica se um campo pertence a um tipo de registro específico"""
-        # Padrão: NFE{tipo}-CAMPO ou NFCOM{tipo}-CAMPO
-        if f"NFE{tipo_registro}-" in nome_campo:
-            return True
-
-        if f"NFCOM{tipo_registro}-" in nome_campo:
-            return True
-
-        # Para layouts simples sem prefixo NFE/NFCOM, considera todos os campos
-        if not nome_campo.startswith("NFE") and not nome_campo.startswith("NFCOM"):
-            return True
-
-        return False
+        return campo_pertence_ao_tipo(nome_campo, tipo_registro)
 
     def detectar_tipo_registro(self, linha: str) -> str:
         """Detecta o tipo de registro baseado nos primeiros 2 caracteres da linha"""
@@ -73,28 +90,143 @@ class ComparadorEstruturalArquivos:
         tipo = linha[:2]
         return tipo
 
+    def mascara_do_tipo(self, tipo_registro: str) -> MascaraComparacao:
+        """Máscara do tipo de registro, montada uma vez para os campos ignorados deste comparador"""
+        mascara = self._mascaras_por_tipo.get(tipo_registro)
+        if mascara is None:
+            comparados, numericos, conferidos = [], [], []
+            campos, por_digitos, conferido = [], [], []
+            for sequencia, campo_compilado in enumerate(self.compilado.campos_do_tipo(tipo_registro), 1):
+                campo = campo_compilado.campo
+                if campo.nome in self.campos_ignorados:
+                    continue
+                fatia = (campo_compilado.inicio, campo_compilado.fim)
+                if campo.nome in self.campos_ignorar_se_preenchido:
+                    digitos, verificar = False, True
+                else:
+                    comparados.append(fatia)
+                    digitos = campo.nome != 'NFE06-IE-EMIT' and self._formato_conferido_por_digitos(campo_compilado)
+                    verificar = not digitos and (
+                        campo.nome == 'NFE06-IE-EMIT' or campo.obrigatorio
+                        or campo.tipo in (TipoCampo.NUMERO, TipoCampo.DECIMAL, TipoCampo.DATA)
+                    )
+
+                campos.append((sequencia, campo_compilado))
+                por_digitos.append(digitos)
+                conferido.append(verificar)
+                if digitos:
+                    numericos.append(fatia)
+                if verificar:
+                    conferidos.append(campo_compilado)
+
+            mascara = MascaraComparacao(
+                trechos=_unir_trechos(comparados),
+                trechos_numericos=_unir_trechos(numericos),
+                fim_numerico=max((fim for _, fim in numericos), default=0),
+                campos_conferidos=tuple(conferidos),
+                campos=tuple(campos),
+                inicios=np.array([c.inicio for _, c in campos], dtype=np.int64) if HAS_NUMPY else None,
+                fins=np.array([c.fim for _, c in campos], dtype=np.int64) if HAS_NUMPY else None,
+                extensao=max((c.fim for _, c in campos), default=0),
+                por_digitos=np.array(por_digitos, dtype=bool) if HAS_NUMPY else None,
+                conferido=np.array(conferido, dtype=bool) if HAS_NUMPY else None
+            )
+            self._mascaras_por_tipo[tipo_registro] = mascara
+        return mascara
+
+    @staticmethod
+    def _formato_conferido_por_digitos(campo_compilado: CampoCompilado) -> bool:
+        """Indica se um valor só de dígitos, no tamanho do campo, passa em obrigatoriedade e formato"""
+        campo = campo_compilado.campo
+        tamanho = campo_compilado.fim - campo_compilado.inicio
+        if tamanho <= 0:
+            return False
+        if campo.tipo in (TipoCampo.NUMERO, TipoCampo.DECIMAL):
+            return True
+        if campo.tipo == TipoCampo.DATA:
+            return not (campo.formato and 'YYYYMMDD' in campo.formato) or tamanho == 8
+        return False
+
+    def _iguais_fora_dos_ignorados(self, linha_base: str, linha_validado: str, tipo_registro: str) -> bool:
+        """Indica se o par não gera nenhuma diferença: trechos da máscara iguais e validado sem problema de formato.
+
+        Qualquer dúvida devolve False e o par segue para a comparação campo a campo."""
+        mascara = self.mascara_do_tipo(tipo_registro)
+        for inicio, fim in mascara.trechos:
+            if linha_base[inicio:fim] != linha_validado[inicio:fim]:
+                return False
+
+        # Valores iguais: as verificações estruturais dependem só do validado
+        if len(linha_validado) < mascara.fim_numerico:
+            return False
+        for inicio, fim in mascara.trechos_numericos:
+            if not linha_validado[inicio:fim].isdigit():
+                return False
+        for campo_compilado in mascara.campos_conferidos:
+            valor_validado = linha_validado[campo_compilado.inicio:campo_compilado.fim]
+            if campo_compilado.campo.nome in self.campos_ignorar_se_preenchido:
+                if not valor_validado or valor_validado.isspace():
+                    return False
+            elif self._analisar_tipo_diferenca(campo_compilado.campo, valor_validado, valor_validado)[0]:
+                return False
+        return True
+
+    def _campos_a_comparar(self, linha_base: str, linha_validado: str, tipo_registro: str) -> Iterable[Tuple[int, CampoCompilado]]:
+        """Campos (sequência, campo) que podem gerar diferença no par.
+
+        Com NumPy as colunas diferentes e as que não são dígito no validado saem de uma
+        comparação vetorizada (um code point por posição, via UTF-32) e viram campos
+        tocados por somas acumuladas nas fatias do tipo; os demais campos têm o mesmo
+        valor nas duas linhas e formato já conferido, então não geram diferença."""
+        campos_do_tipo = self.compilado.campos_do_tipo(tipo_registro)
+        if not HAS_NUMPY:
+            return enumerate(campos_do_tipo, 1)
+
+        mascara = self.mascara_do_tipo(tipo_registro)
+        if not mascara.campos:
+            return ()
+        base = np.frombuffer(linha_base.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        validado = np.frombuffer(linha_validado.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        comum = min(len(base), len(validado))
+        maior = max(len(base), len(validado))
+        extensao = max(maior, mascara.extensao)
+
+        # Linha 0: posição diferente (conteúdo diferente ou presente em só uma das linhas);
+        # linha 1: posição que não é dígito ASCII no validado (inclui o que falta no fim).
+        # Com as somas acumuladas, a contagem na fatia [inicio, fim) é acum[fim] - acum[inicio]
+        marcas = np.empty((2, extensao + 1), dtype=np.int32)
+        marcas[:, 0] = 0
+        np.not_equal(base[:comum], validado[:comum], out=marcas[0, 1:comum + 1], casting='unsafe')
+        marcas[0, comum + 1:maior + 1] = 1
+        marcas[0, maior + 1:] = 0
+        np.greater(validado - 48, 9, out=marcas[1, 1:len(validado) + 1], casting='unsafe')
+        marcas[1, len(validado) + 1:] = 1
+        np.cumsum(marcas, axis=1, out=marcas)
+
+        contagens = marcas[:, mascara.fins] > marcas[:, mascara.inicios]
+        selecionados = (contagens[0] | (contagens[1] & mascara.por_digitos) | mascara.conferido).nonzero()[0]
+        return [mascara.campos[indice] for indice in selecionados.tolist()]
+
     def comparar_campos_linha(self, linha_base: str, linha_validado: str, numero_linha: int, tipo_registro: str) -> List[DiferencaEstruturalCampo]:
         """Compara os campos de duas linhas e retorna as diferenças encontradas, filtrado por tipo de registro"""
-        diferencas = []
+        # Caminho rápido: par igual na máscara do tipo não precisa do diff campo a campo
+        if self._iguais_fora_dos_ignorados(linha_base, linha_validado, tipo_registro):
+            return []
 
-        # Extrair campos filtrados pelo tipo de registro
-        campos_base = self.extrair_campos_linha(linha_base, tipo_registro)
-        campos_validado = self.extrair_campos_linha(linha_validado, tipo_registro)
-
-        # Obter apenas os campos deste tipo de registro
-        campos_do_tipo = [
-            campo for campo in self.layout.campos
-            if self._campo_pertence_ao_tipo(campo.nome, tipo_registro)
-        ]
+        diferencas = []
 
-        for sequencia, campo in enumerate(campos_do_tipo, 1):
-            valor_base = campos_base.get(campo.nome, '')
-            valor_validado = campos_validado.get(campo.nome, '')
+        # Campos deste tipo de registro que o par pode ter tocado, com fatias pré-calculadas.
+        # Campos com nome repetido no layout (ex.: NFCOM04-Mensagem) são comparados cada um na sua posição
+        for sequencia, campo_compilado in self._campos_a_comparar(linha_base, linha_validado, tipo_registro):
+            campo = campo_compilado.campo
 
             # Verificar se o campo deve ser ignorado completamente
             if campo.nome in self.campos_ignorados:
                 continue
 
+            valor_base = linha_base[campo_compilado.inicio:campo_compilado.fim]
+            valor_validado = linha_validado[campo_compilado.inicio:campo_compilado.fim]
+
             # Verificar campos_ignorar_se_preenchido (ex: Hash-Code)
             # Se DEV (validado) tem valor preenchido -> ignorar
             # Se DEV (validado) está vazio -> reportar erro
@@ -222,79 +354,40 @@ class ComparadorEstruturalArquivos:
         """Agrupa registros por tipo, ignorando tipos 00 e 99"""
         registros_por_tipo = {}
 
-        try:
-            with open(caminho_arquivo, 'r', encoding='utf-8') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    linha = linha.rstrip('\n\r')
-
-                    if len(linha) < 2:
-                        continue
-
-                    tipo_registro = self.detectar_tipo_registro(linha)
-
-                    # Ignorar tipos 00 e 99 (header e trailer)
-                    if tipo_registro in ['00', '99']:
-                        continue
-
-                    # Padding para completar tamanho esperado
-                    if len(linha) < self.layout.tamanho_linha:
-                        linha = linha.ljust(self.layout.tamanho_linha)
-
-                    if tipo_registro not in registros_por_tipo:
-                        registros_por_tipo[tipo_registro] = []
-
-                    registros_por_tipo[tipo_registro].append((numero_linha, linha))
-
-        except UnicodeDecodeError:
-            # Tentar com encoding latin-1
-            with open(caminho_arquivo, 'r', encoding='latin-1') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    linha = linha.rstrip('\n\r')
-
-                    if len(linha) < 2:
-                        continue
+        for numero_linha, linha in LeitorArquivo(caminho_arquivo).linhas_numeradas():
+            if len(linha) < 2:
+                continue
 
-                    tipo_registro = self.detectar_tipo_registro(linha)
+            tipo_registro = self.detectar_tipo_registro(linha)
 
-                    # Ignorar tipos 00 e 99 (header e trailer)
-                    if tipo_registro in ['00', '99']:
-                        continue
+            # Ignorar tipos 00 e 99 (header e trailer)
+            if tipo_registro in ['00', '99']:
+                continue
 
-                    # Padding para completar tamanho esperado
-                    if len(linha) < self.layout.tamanho_linha:
-                        linha = linha.ljust(self.layout.tamanho_linha)
+            # Padding para completar tamanho esperado
+            if len(linha) < self.layout.tamanho_linha:
+                linha = linha.ljust(self.layout.tamanho_linha)
 
-                    if tipo_registro not in registros_por_tipo:
-                        registros_por_tipo[tipo_registro] = []
+            if tipo_registro not in registros_por_tipo:
+                registros_por_tipo[tipo_registro] = []
 
-                    registros_por_tipo[tipo_registro].append((numero_linha, linha))
+            registros_por_tipo[tipo_registro].append((numero_linha, linha))
 
         return registros_por_tipo
 
     def _ler_linhas_arquivo(self, caminho_arquivo: str) -> List[Tuple[int, str]]:
         """Lê todas as linhas de um arquivo com tratamento de encoding, retorna [(num_linha, linha)]"""
         linhas = []
-        try:
-            with open(caminho_arquivo, 'r', encoding='utf-8') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    linha = linha.rstrip('\n\r')
-                    if len(linha) < 2:
-                        continue
-                    if len(linha) < self.layout.tamanho_linha:
-                        linha = linha.ljust(self.layout.tamanho_linha)
-                    linhas.append((numero_linha, linha))
-        except UnicodeDecodeError:
-            with open(caminho_arquivo, 'r', encoding='latin-1') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    linha = linha.rstrip('\n\r')
-                    if len(linha) < 2:
-                        continue
-                    if len(linha) < self.layout.tamanho_linha:
-                        linha = linha.ljust(self.layout.tamanho_linha)
-                    linhas.append((numero_linha, linha))
+        for numero_linha, linha in LeitorArquivo(caminho_arquivo).linhas_numeradas():
+            if len(linha) < 2:
+                continue
+            if len(linha) < self.layout.tamanho_linha:
+                linha = linha.ljust(self.layout.tamanho_linha)
+            linhas.append((numero_linha, linha))
         return linhas
 
-    def agrupar_por_fatura(self, caminho_arquivo: str, contas_filtro: set = None) -> Dict[str, Dict[str, List[Tuple[int, str]]]]:
+    def agrupar_por_fatura(self, caminho_arquivo: str, contas_filtro: set = None,
+                           indice_faturas: Optional[IndiceFaturasLote] = None) -> Dict[str, Dict[str, List[Tuple[int, str]]]]:
         """Agrupa linhas do arquivo por fatura (Conta do Cliente) e dentro de cada fatura por tipo de registro.
 
         Cada fatura começa com uma linha tipo '01'. A Conta do Cliente são os caracteres nas posições 3-17 (15 chars).
@@ -303,6 +396,8 @@ class ComparadorEstruturalArquivos:
         Args:
             caminho_arquivo: Caminho do arquivo a ser lido
             contas_filtro: Se fornecido, só carrega faturas dessas contas (otimização de memória para arquivos grandes)
+            indice_faturas: Índice de faturas do arquivo; com `contas_filtro`, só as faixas dessas
+                contas (e o header) são lidas, sem varrer o arquivo inteiro
 
         Retorna: { conta_cliente: { tipo_registro: [(num_linha, linha), ...] } }
         """
@@ -311,52 +406,46 @@ class ComparadorEstruturalArquivos:
         conta_ativa = True  # Se a conta atual deve ser carregada
 
         # Ler arquivo linha por linha (streaming) para economizar memória
-        encodings = ['utf-8', 'latin-1']
-        for encoding in encodings:
-            try:
-                with open(caminho_arquivo, 'r', encoding=encoding) as arquivo:
-                    for numero_linha, linha_raw in enumerate(arquivo, 1):
-                        linha = linha_raw.rstrip('\n\r')
-                        if len(linha) < 2:
-                            continue
-                        if len(linha) < self.layout.tamanho_linha:
-                            linha = linha.ljust(self.layout.tamanho_linha)
-
-                        tipo_registro = self.detectar_tipo_registro(linha)
-
-                        # Ignorar trailer
-                        if tipo_registro == '99':
-                            continue
-
-                        # Header vai em chave especial
-                        if tipo_registro == '00':
-                            if '__header__' not in faturas:
-                                faturas['__header__'] = {}
-                            if '00' not in faturas['__header__']:
-                                faturas['__header__']['00'] = []
-                            faturas['__header__']['00'].append((numero_linha, linha))
-                            continue
-
-                        # Tipo 01 inicia nova fatura
-                        if tipo_registro == '01':
-                            conta_atual = linha[2:17]  # Conta do Cliente: posições 3-17
-                            # Se temos filtro, só carregar contas que interessam
-                            conta_ativa = contas_filtro is None or conta_atual in contas_filtro
-                            if conta_ativa and conta_atual not in faturas:
-                                faturas[conta_atual] = {}
-
-                        # Se não temos fatura atual ou conta não interessa, pular
-                        if conta_atual is None or not conta_ativa:
-                            continue
-
-                        if tipo_registro not in faturas[conta_atual]:
-                            faturas[conta_atual][tipo_registro] = []
-                        faturas[conta_atual][tipo_registro].append((numero_linha, linha))
-                break  # Encoding funcionou
-            except UnicodeDecodeError:
-                if encoding == encodings[-1]:
-                    raise
+        if indice_faturas is not None and contas_filtro is not None:
+            linhas = indice_faturas.linhas_das_contas(contas_filtro)
+        else:
+            linhas = LeitorArquivo(caminho_arquivo).linhas_numeradas()
+        for numero_linha, linha in linhas:
+            if len(linha) < 2:
                 continue
+            if len(linha) < self.layout.tamanho_linha:
+                linha = linha.ljust(self.layout.tamanho_linha)
+
+            tipo_registro = self.detectar_tipo_registro(linha)
+
+            # Ignorar trailer
+            if tipo_registro == '99':
+                continue
+
+            # Header vai em chave especial
+            if tipo_registro == '00':
+                if '__header__' not in faturas:
+                    faturas['__header__'] = {}
+                if '00' not in faturas['__header__']:
+                    faturas['__header__']['00'] = []
+                faturas['__header__']['00'].append((numero_linha, linha))
+                continue
+
+            # Tipo 01 inicia nova fatura
+            if tipo_registro == '01':
+                conta_atual = linha[2:17]  # Conta do Cliente: posições 3-17
+                # Se temos filtro, só carregar contas que interessam
+                conta_ativa = contas_filtro is None or conta_atual in contas_filtro
+                if conta_ativa and conta_atual not in faturas:
+                    faturas[conta_atual] = {}
+
+            # Se não temos fatura atual ou conta não interessa, pular
+            if conta_atual is None or not conta_ativa:
+                continue
+
+            if tipo_registro not in faturas[conta_atual]:
+                faturas[conta_atual][tipo_registro] = []
+            faturas[conta_atual][tipo_registro].append((numero_linha, linha))
 
         return faturas
 
@@ -468,21 +557,8 @@ class ComparadorEstruturalArquivos:
                     linha_base, linha_val, numero_linha, tipo_canonico
                 )
 
-                linha_base_fmt, linha_numeracao = self._gerar_linha_com_barras_e_numeracao(
-                    linha_base, tipo_canonico
-                )
-                linha_val_fmt, _ = self._gerar_linha_com_barras_e_numeracao(
-                    linha_val, tipo_canonico
-                )
-
-                resultados.append(DiferencaEstruturalLinha(
-                    numero_linha=numero_linha,
-                    tipo_registro=tipo_canonico,
-                    arquivo_base_linha=linha_base_fmt,
-                    arquivo_validado_linha=linha_val_fmt,
-                    diferencas_campos=diferencas_campos,
-                    total_diferencas=len(diferencas_campos),
-                    linha_numeracao=linha_numeracao
+                resultados.append(self._diferenca_linha(
+                    numero_linha, tipo_canonico, (num_base, linha_base), (num_val, linha_val), diferencas_campos
                 ))
 
         return resultados
@@ -495,7 +571,38 @@ class ComparadorEstruturalArquivos:
             return linha[17:30].strip()
         return ''
 
-    def comparar_arquivos_por_tipo_registro(self, caminho_base: str, caminho_validado: str) -> ResultadoComparacaoEstrutural:
+    def _comparar_faturas(self, pares: List[Tuple[str, Dict[str, List[Tuple[int, str]]], Dict[str, List[Tuple[int, str]]]]],
+                          processos: Optional[int] = None) -> List[List[DiferencaEstruturalLinha]]:
+        """Resultados de `_comparar_fatura` para cada par (conta, base, validado), na ordem dos pares
+
+        Com `processos` > 1 e faturas suficientes, os pares são divididos em faixas contíguas
+        de tamanho parecido (em linhas) e cada faixa é comparada num processo do pool, com a
+        sua própria cópia deste comparador (layout compilado e máscaras); as faixas voltam em
+        ordem, então o resultado é o mesmo da comparação sequencial.
+        """
+        quantidade = min(processos or 1, len(pares) // FATURAS_MINIMAS_POR_PROCESSO)
+        if quantidade <= 1:
+            return _comparar_faixa_faturas(self, pares)
+
+        # Cortes pelo total acumulado de linhas do validado: faturas grandes não ficam num processo só
+        pesos = [sum(len(linhas) for linhas in registros_validado.values()) for _, _, registros_validado in pares]
+        total, acumulado, cortes = sum(pesos), 0, [0]
+        for posicao, peso in enumerate(pesos):
+            acumulado += peso
+            if acumulado * quantidade >= total * len(cortes) and len(cortes) < quantidade:
+                cortes.append(posicao + 1)
+        cortes.append(len(pares))
+
+        with ProcessPoolExecutor(max_workers=quantidade) as executor:
+            futuros = [
+                executor.submit(_comparar_faixa_faturas, self, pares[inicio:fim])
+                for inicio, fim in zip(cortes[:-1], cortes[1:]) if fim > inicio
+            ]
+            return [resultados for futuro in futuros for resultados in futuro.result()]
+
+    def comparar_arquivos_por_tipo_registro(self, caminho_base: str, caminho_validado: str,
+                                            indice_faturas_base: Optional[IndiceFaturasLote] = None,
+                                            processos: Optional[int] = None) -> ResultadoComparacaoEstrutural:
         """Compara dois arquivos pareando faturas por Conta do Cliente e dentro de cada fatura por tipo de registro.
 
         Fluxo:
@@ -504,6 +611,10 @@ class ComparadorEstruturalArquivos:
         3. Para cada conta que existe no arquivo validado, busca a mesma conta na base
         4. Dentro de cada fatura pareada, compara por tipo de registro com mapeamento (88↔05, 87↔09)
         5. Tipos 02/03 são pareados por Sigla Serviço para garantir comparação correta
+
+        Com `indice_faturas_base` (ex.: o índice do lote de produção), a base é lida só nas
+        faixas das contas do arquivo validado. Com `processos` > 1 as faturas pareadas são
+        comparadas num pool de processos (ver `_comparar_faturas`), com o mesmo resultado.
         """
         # Primeiro ler o arquivo do usuário (pequeno) para saber quais contas buscar
         faturas_validado = self.agrupar_por_fatura(caminho_validado)
@@ -512,7 +623,8 @@ class ComparadorEstruturalArquivos:
         contas_usuario = {c for c in faturas_validado.keys() if c != '__header__'}
 
         # Ler arquivo de produção carregando APENAS as contas do usuário + header
-        faturas_base = self.agrupar_por_fatura(caminho_base, contas_filtro=contas_usuario)
+        faturas_base = self.agrupar_por_fatura(caminho_base, contas_filtro=contas_usuario,
+                                               indice_faturas=indice_faturas_base)
 
         total_linhas = 0
         linhas_com_diferencas = 0
@@ -550,37 +662,37 @@ class ComparadorEstruturalArquivos:
         contas_validado = [c for c in faturas_validado.keys() if c != '__header__']
         contas_nao_encontradas = []
 
+        pares = []
         for conta in contas_validado:
             if conta in faturas_base:
-                resultados_fatura = self._comparar_fatura(
-                    faturas_base[conta], faturas_validado[conta], conta
-                )
-
-                cps = self._extrair_cps_fatura(faturas_validado[conta])
-                fatura_diffs = []
-                fatura_todas = []
-
-                for diff in resultados_fatura:
-                    total_linhas += 1
-                    todas_linhas.append(diff)
-                    fatura_todas.append(diff)
-                    if diff.total_diferencas > 0:
-                        linhas_com_diferencas += 1
-                        todas_diferencas.append(diff)
-                        fatura_diffs.append(diff)
-
-                faturas_comparadas.append(FaturaComparada(
-                    conta_cliente=conta,
-                    cps_fatura=cps,
-                    todas_linhas=fatura_todas,
-                    diferencas_por_linha=fatura_diffs,
-                    total_linhas=len(fatura_todas),
-                    linhas_com_diferencas=len(fatura_diffs),
-                    linhas_identicas=len(fatura_todas) - len(fatura_diffs)
-                ))
+                pares.append((conta, faturas_base[conta], faturas_validado[conta]))
             else:
                 contas_nao_encontradas.append(conta)
 
+        for (conta, _, registros_validado), resultados_fatura in zip(pares, self._comparar_faturas(pares, processos)):
+            cps = self._extrair_cps_fatura(registros_validado)
+            fatura_diffs = []
+            fatura_todas = []
+
+            for diff in resultados_fatura:
+                total_linhas += 1
+                todas_linhas.append(diff)
+                fatura_todas.append(diff)
+                if diff.total_diferencas > 0:
+                    linhas_com_diferencas += 1
+                    todas_diferencas.append(diff)
+                    fatura_diffs.append(diff)
+
+            faturas_comparadas.append(FaturaComparada(
+                conta_cliente=conta,
+                cps_fatura=cps,
+                todas_linhas=fatura_todas,
+                diferencas_por_linha=fatura_diffs,
+                total_linhas=len(fatura_todas),
+                linhas_com_diferencas=len(fatura_diffs),
+                linhas_identicas=len(fatura_todas) - len(fatura_diffs)
+            ))
+
         linhas_identicas = total_linhas - linhas_com_diferencas
 
         return ResultadoComparacaoEstrutural(
@@ -598,23 +710,14 @@ class ComparadorEstruturalArquivos:
         """Gera representação visual das diferenças usando separador | de forma compacta"""
 
         # Separação por campos usando | (filtrado por tipo)
-        campos_base = self.extrair_campos_linha(linha_base, tipo_registro)
-        campos_validado = self.extrair_campos_linha(linha_validado, tipo_registro)
-
-        # Obter apenas os campos deste tipo de registro
-        campos_do_tipo = [
-            campo for campo in self.layout.campos
-            if self._campo_pertence_ao_tipo(campo.nome, tipo_registro)
-        ]
+        campos_do_tipo = self.compilado.campos_do_tipo(tipo_registro)
 
         linha_base_separada = []
         linha_validado_separada = []
 
-        for campo in campos_do_tipo:
-            valor_base = campos_base.get(campo.nome, '')
-            valor_validado = campos_validado.get(campo.nome, '')
-            linha_base_separada.append(valor_base)
-            linha_validado_separada.append(valor_validado)
+        for campo_compilado in campos_do_tipo:
+            linha_base_separada.append(linha_base[campo_compilado.inicio:campo_compilado.fim])
+            linha_validado_separada.append(linha_validado[campo_compilado.inicio:campo_compilado.fim])
 
         # Formatação com barras (uma linha cada, sem quebrar)
         linha_base_formatada = "|".join(linha_base_separada) + "|"
@@ -635,79 +738,71 @@ class ComparadorEstruturalArquivos:
 
     def _gerar_linha_com_barras(self, linha: str, tipo_registro: str) -> str:
         """Gera representação da linha com campos separados por barras, preservando espaços"""
-        # Filtrar apenas os campos que pertencem ao tipo de registro
-        campos_do_tipo = [
-            campo for campo in self.layout.campos
-            if self._campo_pertence_ao_tipo(campo.nome, tipo_registro)
-        ]
+        # Apenas os campos que pertencem ao tipo de registro
+        campos_do_tipo = self.compilado.campos_do_tipo(tipo_registro)
 
         # Se não há campos no layout para este tipo, retornar a linha raw
         if not campos_do_tipo:
             return linha.rstrip()
 
-        valores_campos = []
-        for campo in campos_do_tipo:
-            # Extrair valor diretamente da linha preservando espaços exatos
-            inicio = campo.posicao_inicio - 1  # Converter para 0-indexed
-            fim = campo.posicao_fim
-
-            # Extrair valor (cuidando com linhas muito curtas)
-            if inicio < len(linha):
-                valor = linha[inicio:fim] if fim <= len(linha) else linha[inicio:]
-                # Garantir que o campo tem o tamanho exato (pad com espaços se necessário)
-                tamanho_esperado = campo.posicao_fim - campo.posicao_inicio + 1
-                valor = valor.ljust(tamanho_esperado)
-            else:
-                # Se a linha é muito curta, preencher com espaços
-                tamanho_esperado = campo.posicao_fim - campo.posicao_inicio + 1
-                valor = ' ' * tamanho_esperado
+        return self._juntar_campos_com_barras(linha, campos_do_tipo)
+
+    def _diferenca_linha(self, numero_linha: int, tipo_registro: str, base: Tuple[int, str], validado: Tuple[int, str],
+                         diferencas_campos: List[DiferencaEstruturalCampo]) -> DiferencaEstruturalLinha:
+        """Monta o resultado do par (número, linha) base/validado; a visualização só sai aqui sem linhas sob demanda"""
+        if self.linhas_sob_demanda:
+            linha_base_fmt = linha_val_fmt = linha_numeracao = ""
+        else:
+            linha_base_fmt, linha_val_fmt, linha_numeracao = self.renderizar_linhas(base[1], validado[1], tipo_registro)
+
+        return DiferencaEstruturalLinha(
+            numero_linha=numero_linha,
+            tipo_registro=tipo_registro,
+            arquivo_base_linha=linha_base_fmt,
+            arquivo_validado_linha=linha_val_fmt,
+            diferencas_campos=diferencas_campos,
+            total_diferencas=len(diferencas_campos),
+            linha_numeracao=linha_numeracao,
+            numero_linha_base=base[0],
+            numero_linha_validado=validado[0]
+        )
+
+    def renderizar_linhas(self, linha_base: str, linha_validado: str, tipo_registro: str) -> Tuple[str, str, str]:
+        """Visualização do par: base e validado com barras entre os campos do tipo e a linha de numeração"""
+        campos_do_tipo = self.compilado.campos_do_tipo(tipo_registro)
+        return (
+            self._juntar_campos_com_barras(linha_base, campos_do_tipo),
+            self._juntar_campos_com_barras(linha_validado, campos_do_tipo),
+            self.compilado.numeracao_do_tipo(tipo_registro)
+        )
 
-            valores_campos.append(valor)
+    @staticmethod
+    def linhas_do_par(indice_base: LineIndex, indice_validado: LineIndex,
+                      numero_linha_base: int, numero_linha_validado: int) -> Tuple[str, str]:
+        """Conteúdo das linhas referenciadas num resultado (vazio para 0 ou linha fora do arquivo).
 
-        # Retornar com barras separadoras (incluindo no início e fim)
-        return "|".join(valores_campos) + "|"
+        Os índices só precisam de `get(numero_linha, padrao)`: um `LineIndex` ou um dict das linhas já lidas."""
+        return (
+            indice_base.get(numero_linha_base, '') if numero_linha_base > 0 else '',
+            indice_validado.get(numero_linha_validado, '') if numero_linha_validado > 0 else ''
+        )
 
     def _gerar_linha_com_barras_e_numeracao(self, linha: str, tipo_registro: str) -> Tuple[str, str]:
         """Gera representação da linha com campos separados por barras e linha de numeração"""
-        # Filtrar apenas os campos que pertencem ao tipo de registro
-        campos_do_tipo = [
-            campo for campo in self.layout.campos
-            if self._campo_pertence_ao_tipo(campo.nome, tipo_registro)
+        campos_do_tipo = self.compilado.campos_do_tipo(tipo_registro)
+
+        # A numeração depende só do tipo e é calculada uma vez pelo layout compilado
+        linha_dados = self._juntar_campos_com_barras(linha, campos_do_tipo)
+        return linha_dados, self.compilado.numeracao_do_tipo(tipo_registro)
+
+    @staticmethod
+    def _juntar_campos_com_barras(linha: str, campos_do_tipo) -> str:
+        """Extrai cada campo preservando espaços exatos (com padding até o tamanho do campo) e junta com barras"""
+        valores_campos = [
+            linha[campo_compilado.inicio:campo_compilado.fim].ljust(campo_compilado.fim - campo_compilado.inicio)
+            for campo_compilado in campos_do_tipo
         ]
-
-        valores_campos = []
-        numeros_campos = []
-
-        for sequencia, campo in enumerate(campos_do_tipo, 1):
-            # Extrair valor diretamente da linha preservando espaços exatos
-            inicio = campo.posicao_inicio - 1  # Converter para 0-indexed
-            fim = campo.posicao_fim
-
-            # Extrair valor (cuidando com linhas muito curtas)
-            if inicio < len(linha):
-                valor = linha[inicio:fim] if fim <= len(linha) else linha[inicio:]
-                # Garantir que o campo tem o tamanho exato (pad com espaços se necessário)
-                tamanho_esperado = campo.posicao_fim - campo.posicao_inicio + 1
-                valor = valor.ljust(tamanho_esperado)
-            else:
-                # Se a linha é muito curta, preencher com espaços
-                tamanho_esperado = campo.posicao_fim - campo.posicao_inicio + 1
-                valor = ' ' * tamanho_esperado
-
-            valores_campos.append(valor)
-
-            # Criar numeração centralizada no campo
-            numero_str = str(sequencia).zfill(2)  # 01, 02, 03, etc.
-            tamanho_campo = len(valor)
-            # Centralizar o número no tamanho do campo
-            numero_formatado = numero_str.center(tamanho_campo)
-            numeros_campos.append(numero_formatado)
-
-        # Retornar linha com dados e linha com numeração
-        linha_dados = "|".join(valores_campos) + "|"
-        linha_numeracao = "|".join(numeros_campos) + "|"
-
-        return linha_dados, linha_numeracao
+        return "|".join(valores_campos) + "|"
 
     def gerar_representacao_visual(self, linha_base: str, linha_validado: str, diferencas: List[DiferencaEstruturalCampo]) -> str:
         representacao.append("COMPARAÇÃO ESTRUTURAL CAMPO POR CAMPO")
@@ -774,48 +869,22 @@ class ComparadorEstruturalArquivos:
         """Agrupa registros em notas fiscais completas"""
         registros_todos = []
 
-        try:
-            with open(caminho_arquivo, 'r', encoding='utf-8') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    linha = linha.rstrip('\n\r')
-
-                    if len(linha) < 2:
-                        continue
-
-                    tipo_registro = self.detectar_tipo_registro(linha)
-
-                    # Ignorar tipos 00 e 99 (header e trailer)
-                    if tipo_registro in ['00', '99']:
-                        continue
-
-                    # Padding para completar tamanho esperado
-                    if len(linha) < self.layout.tamanho_linha:
-                        linha = linha.ljust(self.layout.tamanho_linha)
-
-                    # Adicionar todos os registros
-                    registros_todos.append((numero_linha, linha, tipo_registro))
-
-        except UnicodeDecodeError:
-            # Tentar com encoding latin-1
-            with open(caminho_arquivo, 'r', encoding='latin-1') as arquivo:
-                for numero_linha, linha in enumerate(arquivo, 1):
-                    linha = linha.rstrip('\n\r')
-
-                    if len(linha) < 2:
-                        continue
+        for numero_linha, linha in LeitorArquivo(caminho_arquivo).linhas_numeradas():
+            if len(linha) < 2:
+                continue
 
-                    tipo_registro = self.detectar_tipo_registro(linha)
+            tipo_registro = self.detectar_tipo_registro(linha)
 
-                    # Ignorar tipos 00 e 99 (header e trailer)
-                    if tipo_registro in ['00', '99']:
-                        continue
+            # Ignorar tipos 00 e 99 (header e trailer)
+            if tipo_registro in ['00', '99']:
+                continue
 
-                    # Padding para completar tamanho esperado
-                    if len(linha) < self.layout.tamanho_linha:
-                        linha = linha.ljust(self.layout.tamanho_linha)
+            # Padding para completar tamanho esperado
+            if len(linha) < self.layout.tamanho_linha:
+                linha = linha.ljust(self.layout.tamanho_linha)
 
-                    # Adicionar todos os registros
-                    registros_todos.append((numero_linha, linha, tipo_registro))
+            # Adicionar todos os registros
+            registros_todos.append((numero_linha, linha, tipo_registro))
 
         # Por enquanto, considerar tudo como uma única nota fiscal
         # No futuro, podemos implementar lógica mais sofisticada para separar múltiplas notas
@@ -877,19 +946,10 @@ class ComparadorEstruturalArquivos:
                     # Comparar campos da linha
                     diferencas_campos = self.comparar_campos_linha(linha_base, linha_validado, numero_linha, tipo_registro)
 
-                    # Gerar representação visual
-                    linha_base_formatada, linha_numeracao = self._gerar_linha_com_barras_e_numeracao(linha_base, tipo_registro)
-                    linha_validado_formatada, _ = self._gerar_linha_com_barras_e_numeracao(linha_validado, tipo_registro)
-
-                    # Criar resultado da linha
-                    diferenca_linha = DiferencaEstruturalLinha(
-                        numero_linha=numero_linha,
-                        tipo_registro=tipo_registro,
-                        arquivo_base_linha=linha_base_formatada,
-                        arquivo_validado_linha=linha_validado_formatada,
-                        diferencas_campos=diferencas_campos,
-                        total_diferencas=len(diferencas_campos),
-                        linha_numeracao=linha_numeracao
+                    # Criar resultado da linha (com a representação visual, se não for sob demanda)
+                    diferenca_linha = self._diferenca_linha(
+                        numero_linha, tipo_registro, (numero_linha_base, linha_base),
+                        (numero_linha_validado, linha_validado), diferencas_campos
                     )
 
                     yield diferenca_linha
@@ -902,19 +962,10 @@ class ComparadorEstruturalArquivos:
                     # Comparar campos da linha
                     diferencas_campos = self.comparar_campos_linha(linha_base, linha_validado, numero_linha_base, tipo_registro)
 
-                    # Gerar representação visual
-                    linha_base_formatada, linha_numeracao = self._gerar_linha_com_barras_e_numeracao(linha_base, tipo_registro)
-                    linha_validado_formatada, _ = self._gerar_linha_com_barras_e_numeracao(linha_validado, tipo_registro)
-
-                    # Criar resultado da linha
-                    diferenca_linha = DiferencaEstruturalLinha(
-                        numero_linha=numero_linha_base,
-                        tipo_registro=tipo_registro,
-                        arquivo_base_linha=linha_base_formatada,
-                        arquivo_validado_linha=linha_validado_formatada,
-                        diferencas_campos=diferencas_campos,
-                        total_diferencas=len(diferencas_campos),
-                        linha_numeracao=linha_numeracao
+                    # Criar resultado da linha (com a representação visual, se não for sob demanda)
+                    diferenca_linha = self._diferenca_linha(
+                        numero_linha_base, tipo_registro, (numero_linha_base, linha_base),
+                        (0, linha_validado), diferencas_campos
                     )
 
                     yield diferenca_linha
@@ -927,19 +978,10 @@ class ComparadorEstruturalArquivos:
                     # Comparar campos da linha
                     diferencas_campos = self.comparar_campos_linha(linha_base, linha_validado, numero_linha_validado, tipo_registro)
 
-                    # Gerar representação visual com barras separadoras e numeração
-                    linha_base_formatada, linha_numeracao = self._gerar_linha_com_barras_e_numeracao(linha_base, tipo_registro)
-                    linha_validado_formatada, _ = self._gerar_linha_com_barras_e_numeracao(linha_validado, tipo_registro)
-
-                    # Criar resultado da linha
-                    diferenca_linha = DiferencaEstruturalLinha(
-                        numero_linha=numero_linha_validado,
-                        tipo_registro=tipo_registro,
-                        arquivo_base_linha=linha_base_formatada,
-                        arquivo_validado_linha=linha_validado_formatada,
-                        diferencas_campos=diferencas_campos,
-                        total_diferencas=len(diferencas_campos),
-                        linha_numeracao=linha_numeracao
+                    # Criar resultado da linha (com a representação visual, se não for sob demanda)
+                    diferenca_linha = self._diferenca_linha(
+                        numero_linha_validado, tipo_registro, (0, linha_base),
+                        (numero_linha_validado, linha_validado), diferencas_campos
                     )
 
                     yield diferenca_linha
@@ -954,72 +996,34 @@ class ComparadorEstruturalArquivos:
         if not Path(caminho_validado).exists():
             raise FileNotFoundError(f"Arquivo a ser validado não encontrado: {caminho_validado}")
 
-        try:
-            with open(caminho_base, 'r', encoding='utf-8') as arquivo_base, \
-                 open(caminho_validado, 'r', encoding='utf-8') as arquivo_validado:
-
-                for numero_linha, (linha_base, linha_validado) in enumerate(zip(arquivo_base, arquivo_validado), 1):
-                    # Remover quebras de linha
-                    linha_base = linha_base.rstrip('\n\r')
-                    linha_validado = linha_validado.rstrip('\n\r')
+        linhas_base = LeitorArquivo(caminho_base)
+        linhas_validado = LeitorArquivo(caminho_validado)
 
-                    # Padding para completar tamanho esperado
-                    if len(linha_base) < self.layout.tamanho_linha:
-                        linha_base = linha_base.ljust(self.layout.tamanho_linha)
+        for numero_linha, (linha_base, linha_validado) in enumerate(zip(linhas_base, linhas_validado), 1):
+            # Padding para completar tamanho esperado
+            if len(linha_base) < self.layout.tamanho_linha:
+                linha_base = linha_base.ljust(self.layout.tamanho_linha)
 
-                    if len(linha_validado) < self.layout.tamanho_linha:
-                        linha_validado = linha_validado.ljust(self.layout.tamanho_linha)
+            if len(linha_validado) < self.layout.tamanho_linha:
+                linha_validado = linha_validado.ljust(self.layout.tamanho_linha)
 
-                    # Detectar tipo de registro
-                    tipo_registro = self.detectar_tipo_registro(linha_base)
+            # Detectar tipo de registro
+            tipo_registro = self.detectar_tipo_registro(linha_base)
 
-                    # Comparar campos da linha
-                    diferencas_campos = self.comparar_campos_linha(linha_base, linha_validado, numero_linha, tipo_registro)
-
-                    # Criar resultado da linha
-                    diferenca_linha = DiferencaEstruturalLinha(
-                        numero_linha=numero_linha,
-                        tipo_registro=tipo_registro,
-                        arquivo_base_linha=linha_base,
-                        arquivo_validado_linha=linha_validado,
-                        diferencas_campos=diferencas_campos,
-                        total_diferencas=len(diferencas_campos)
-                    )
+            # Comparar campos da linha
+            diferencas_campos = self.comparar_campos_linha(linha_base, linha_validado, numero_linha, tipo_registro)
 
-                    yield diferenca_linha
-
-        except UnicodeDecodeError:
-            # Tentar com encoding latin-1
-            try:
-                with open(caminho_base, 'r', encoding='latin-1') as arquivo_base, \
-                     open(caminho_validado, 'r', encoding='latin-1') as arquivo_validado:
-
-                    for numero_linha, (linha_base, linha_validado) in enumerate(zip(arquivo_base, arquivo_validado), 1):
-                        linha_base = linha_base.rstrip('\n\r')
-                        linha_validado = linha_validado.rstrip('\n\r')
-
-                        if len(linha_base) < self.layout.tamanho_linha:
-                            linha_base = linha_base.ljust(self.layout.tamanho_linha)
-
-                        if len(linha_validado) < self.layout.tamanho_linha:
-                            linha_validado = linha_validado.ljust(self.layout.tamanho_linha)
-
-                        tipo_registro = self.detectar_tipo_registro(linha_base)
-                        diferencas_campos = self.comparar_campos_linha(linha_base, linha_validado, numero_linha, tipo_registro)
-
-                        diferenca_linha = DiferencaEstruturalLinha(
-                            numero_linha=numero_linha,
-                            tipo_registro=tipo_registro,
-                            arquivo_base_linha=linha_base,
-                            arquivo_validado_linha=linha_validado,
-                            diferencas_campos=diferencas_campos,
-                            total_diferencas=len(diferencas_campos)
-                        )
-
-                        yield diferenca_linha
+            # Criar resultado da linha
+            diferenca_linha = DiferencaEstruturalLinha(
+                numero_linha=numero_linha,
+                tipo_registro=tipo_registro,
+                arquivo_base_linha=linha_base,
+                arquivo_validado_linha=linha_validado,
+                diferencas_campos=diferencas_campos,
+                total_diferencas=len(diferencas_campos)
+            )
 
-            except Exception as e:
-                raise ValueError(f"Erro ao ler arquivos: {str(e)}")
+            yield diferenca_linha
 
     def comparar_arquivos(self, caminho_base: str, caminho_validado: str) -> ResultadoComparacaoEstrutural:
         """Compara dois arquivos estruturalmente agrupados por tipo de registro"""
@@ -1088,8 +1092,18 @@ class ComparadorEstruturalArquivos:
             taxa_identidade=0.0  # Será calculado no __post_init__
         )
 
-    def gerar_relatorio_completo(self, resultado: ResultadoComparacaoEstrutural) -> str:
-        """Gera relatório completo da comparação estrutural"""
+    def gerar_relatorio_completo(self, resultado: ResultadoComparacaoEstrutural,
+                                 caminho_base: Optional[str] = None, caminho_validado: Optional[str] = None) -> str:
+        """Gera relatório completo da comparação estrutural.
+
+        Com linhas sob demanda os exemplos são relidos de `caminho_base`/`caminho_validado`."""
+        if self.linhas_sob_demanda and caminho_base and caminho_validado:
+            with LineIndex(caminho_base) as indice_base, LineIndex(caminho_validado) as indice_validado:
+                return self._gerar_relatorio_completo(resultado, (indice_base, indice_validado))
+        return self._gerar_relatorio_completo(resultado)
+
+    def _gerar_relatorio_completo(self, resultado: ResultadoComparacaoEstrutural,
+                                  indices: Optional[Tuple[LineIndex, LineIndex]] = None) -> str:
 
         relatorio = []
         relatorio.append("[REPORT] RELATÓRIO DE COMPARAÇÃO ESTRUTURAL DE ARQUIVOS")
@@ -1131,11 +1145,14 @@ class ComparadorEstruturalArquivos:
                     relatorio.append(f"   Total de diferenças: {diferenca_linha.total_diferencas}")
 
                     # Mostrar representação visual com contagem
+                    linha_base = diferenca_linha.arquivo_base_linha
+                    linha_validado = diferenca_linha.arquivo_validado_linha
+                    if indices:
+                        linha_base, linha_validado = self.linhas_do_par(
+                            *indices, diferenca_linha.numero_linha_base, diferenca_linha.numero_linha_validado
+                        )
                     representacao_visual = self.gerar_representacao_visual_com_contagem(
-                        diferenca_linha.arquivo_base_linha,
-                        diferenca_linha.arquivo_validado_linha,
-                        diferenca_linha.diferencas_campos,
-                        tipo_registro
+                        linha_base, linha_validado, diferenca_linha.diferencas_campos, tipo_registro
                     )
                     relatorio.append(representacao_visual)
                     relatorio.append("")
@@ -1144,4 +1161,10 @@ class ComparadorEstruturalArquivos:
                     relatorio.append(f"   ... e mais {len(diferencias_tipo) - 3} linhas com diferenças do tipo {tipo_registro}")
                     relatorio.append("")
 
-        return "\n".join(relatorio)
\ No newline at end of file
+        return "\n".join(relatorio)
+
+
+def _comparar_faixa_faturas(comparador: ComparadorEstruturalArquivos, pares) -> List[List[DiferencaEstruturalLinha]]:
+    """Executado no processo filho (ou direto, sem pool): compara as faturas da faixa em ordem"""
+    return [comparador._comparar_fatura(registros_base, registros_validado, conta)
+            for conta, registros_base, registros_validado in pares]
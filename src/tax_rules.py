@@ -0,0 +1,177 @@
+"""
+Regras de cálculo de impostos compiladas (BC × Alíquota / 10000 = Valor).
+
+As regras de `calculation_validations` do EnhancedValidator são convertidas uma
+única vez em objetos `RegraCalculo` com as fatias de BC, alíquota e valor já
+resolvidas. A avaliação de uma linha não monta closures nem busca campos por
+nome: recorta as três fatias, converte para inteiro (centavos) e compara.
+
+A semântica é a mesma da comparação estrutural:
+- BC > 0 e Alíquota > 0 com Valor zerado é VALOR_ZERADO quando o esperado > 0;
+- campo vazio, ou BC/Alíquota/Valor todos zero, não é validado;
+- senão, Valor declarado ≠ BC × Alíquota // 10000 é CALCULO_ERRO.
+"""
+
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    from .compiled_layout import CompiledLayout
+except ImportError:
+    from compiled_layout import CompiledLayout
+
+
+def digitos_para_int(s: str) -> int:
+    """Inteiro formado só pelos dígitos de `s` (0 se não houver) - IGUAL à comparação"""
+    if s.isascii() and s.isdigit():
+        return int(s)
+    digits = ''.join(ch for ch in s if ch.isdigit())
+    return int(digits) if digits else 0
+
+
+def decimal_para_centavos(s: str) -> int:
+    """Converte valor decimal para inteiro com 2 casas decimais implícitas - IGUAL à comparação"""
+    try:
+        # Remover espaços e zeros à esquerda
+        clean_s = s.strip().lstrip('0') or '0'
+
+        if clean_s.isascii() and clean_s.isdigit():
+            return int(clean_s)
+
+        # Se contém ponto decimal, processar
+        if '.' in clean_s:
+            parts = clean_s.split('.')
+            inteiro = int(parts[0]) if parts[0] else 0
+            decimal = parts[1][:2].ljust(2, '0')  # Pegar até 2 casas e completar com zeros
+            return inteiro * 100 + int(decimal)
+
+        # Se não tem ponto, considerar como inteiro com 2 casas implícitas
+        return digitos_para_int(clean_s)
+    except Exception:
+        return 0
+
+
+class FalhaCalculo(NamedTuple):
+    """Divergência encontrada por uma regra; valores em centavos"""
+    regra: 'RegraCalculo'
+    codigo: str  # VALOR_ZERADO ou CALCULO_ERRO
+    bc: int
+    aliquota: int
+    declarado: int
+    calculado: int
+
+    @property
+    def erro_tipo(self) -> str:
+        return f"{self.codigo}_{self.regra.nome_imposto}"
+
+
+# (slice, posição final exigida na linha) ou None se o campo não existe no layout
+Fatia = Optional[Tuple[slice, int]]
+
+
+def fatia_campo(compilado: CompiledLayout, nome_campo: str) -> Fatia:
+    """(slice, posição final) do campo no layout compilado, ou None se não existir"""
+    campo_compilado = compilado.por_nome.get(nome_campo)
+    if not campo_compilado:
+        return None
+    return (slice(campo_compilado.inicio, campo_compilado.fim), campo_compilado.fim)
+
+
+def _recortar(linha: str, fatia: Fatia) -> str:
+    """Mesmo recorte de `_extrair_valor_campo_str`: vazio se o campo não existe ou a linha é curta"""
+    if not fatia or len(linha) < fatia[1]:
+        return ''
+    return linha[fatia[0]].strip()
+
+
+class RegraCalculo(NamedTuple):
+    """Regra BC × Alíquota = Valor de um imposto, com fatias pré-resolvidas"""
+    tipo_registro: str
+    nome_imposto: str
+    campo_valor: str
+    fatia_bc: Fatia
+    fatia_aliquota: Fatia
+    fatia_valor: Fatia
+
+    def avaliar(self, linha: str) -> Optional[FalhaCalculo]:
+        """Avalia a regra numa linha do tipo; None se não houver divergência"""
+        bc_str = _recortar(linha, self.fatia_bc)
+        aliq_str = _recortar(linha, self.fatia_aliquota)
+        valor_str = _recortar(linha, self.fatia_valor)
+
+        # CASO ESPECIAL FCP: BC e Alíquota preenchidos mas valor zerado
+        bc_temp = digitos_para_int(bc_str)
+        aliq_temp = digitos_para_int(aliq_str)
+        valor_temp = digitos_para_int(valor_str)
+        if bc_temp > 0 and aliq_temp > 0 and valor_temp == 0:
+            esperado = (bc_temp * aliq_temp) // 10000
+            if esperado > 0:
+                return FalhaCalculo(self, 'VALOR_ZERADO', bc_temp, aliq_temp, 0, esperado)
+            return None  # Se esperado for 0, não é erro
+
+        # Se algum campo estiver vazio, não validar
+        if not bc_str or not aliq_str or not valor_str:
+            return None
+
+        bc = decimal_para_centavos(bc_str)
+        aliquota = decimal_para_centavos(aliq_str)
+        declarado = decimal_para_centavos(valor_str)
+
+        # Se todos os valores são zero, não validar
+        if bc == 0 and aliquota == 0 and declarado == 0:
+            return None
+
+        calculado = (bc * aliquota) // 10000
+        if declarado != calculado:
+            return FalhaCalculo(self, 'CALCULO_ERRO', bc, aliquota, declarado, calculado)
+        return None
+
+
+class RegrasCalculo:
+    """Regras compiladas por tipo de registro (principal e adicionais, na ordem da configuração)"""
+
+    def __init__(self, calculation_validations: Dict[str, Dict],
+                 resolver_fatia: Callable[[str], Fatia]):
+        self.por_tipo: Dict[str, Tuple[RegraCalculo, ...]] = {}
+        for tipo_registro, config in calculation_validations.items():
+            self.por_tipo[tipo_registro] = tuple(
+                RegraCalculo(
+                    tipo_registro=tipo_registro,
+                    nome_imposto=config_calc['nome_imposto'],
+                    campo_valor=config_calc['valor_field'],
+                    fatia_bc=resolver_fatia(config_calc['bc_field']) if config_calc.get('bc_field') else None,
+                    fatia_aliquota=resolver_fatia(config_calc['aliq_field']) if config_calc.get('aliq_field') else None,
+                    fatia_valor=resolver_fatia(config_calc['valor_field'])
+                )
+                for config_calc in [config] + config.get('validacoes_adicionais', [])
+            )
+
+    def avaliar(self, tipo_registro: str, linha: str) -> List[FalhaCalculo]:
+        """Falhas das regras do tipo numa linha"""
+        falhas = []
+        for regra in self.por_tipo.get(tipo_registro, ()):
+            falha = regra.avaliar(linha)
+            if falha is not None:
+                falhas.append(falha)
+        return falhas
+
+    def avaliar_lote(self, linhas: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, FalhaCalculo]]:
+        """Avalia várias linhas agrupadas por tipo: cada regra percorre as linhas do seu tipo
+
+        Retorna (numero_linha, falha) na ordem das linhas e, na mesma linha, das regras.
+        """
+        por_tipo: Dict[str, List[Tuple[int, str]]] = {}
+        for numero_linha, linha in linhas:
+            if linha[:2] in self.por_tipo:
+                por_tipo.setdefault(linha[:2], []).append((numero_linha, linha))
+
+        encontradas: List[Tuple[int, int, FalhaCalculo]] = []
+        for tipo_registro, linhas_do_tipo in por_tipo.items():
+            for ordem, regra in enumerate(self.por_tipo[tipo_registro]):
+                avaliar = regra.avaliar
+                for numero_linha, linha in linhas_do_tipo:
+                    falha = avaliar(linha)
+                    if falha is not None:
+                        encontradas.append((numero_linha, ordem, falha))
+
+        encontradas.sort(key=lambda item: (item[0], item[1]))
+        return ((numero_linha, falha) for numero_linha, _, falha in encontradas)
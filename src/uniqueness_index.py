@@ -0,0 +1,231 @@
+"""
+Índice persistente de combinações fatura + NF entre lotes.
+
+A unicidade do EnhancedValidator só enxerga o arquivo em validação; o que chega
+à SEFAZ como rejeição é a mesma fatura + NF enviada em lotes de dias
+diferentes. Este índice guarda todas as combinações dos lotes já registrados
+(ex.: `printcenter/lotes`) num banco SQLite, com um filtro de Bloom na frente:
+a consulta de uma combinação nunca vista é respondida só pelo filtro (O(1), sem
+acesso ao banco), e as poucas respostas "talvez" são confirmadas no banco.
+
+O filtro fica num arquivo ao lado do banco (`<banco>.bloom`) e é refeito a
+partir do banco se faltar, estiver corrompido ou passar da capacidade.
+"""
+
+import hashlib
+import math
+import sqlite3
+import struct
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+try:
+    from .file_reader import ENCODINGS_WINDOWS
+    from .line_index import LineIndex
+except ImportError:
+    from file_reader import ENCODINGS_WINDOWS
+    from line_index import LineIndex
+
+
+CAPACIDADE_INICIAL = 1_000_000
+TAXA_FALSO_POSITIVO = 0.001
+# Cabeçalho do arquivo do filtro: assinatura, bits, funções de hash, itens
+_CABECALHO_BLOOM = struct.Struct('<8sQII')
+_ASSINATURA_BLOOM = b'NFBLOOM1'
+
+
+def fatura_nf_do_registro_01(linha: str) -> Optional[Tuple[str, str]]:
+    """(fatura, nf) do registro 01 nas posições NUM-FATURA (3-15) e NUM-NF (24-32), preservando
+    zeros à esquerda; None se a linha for curta demais para ter os dois campos"""
+    if len(linha) < 32:
+        return None
+    return (linha[2:15].strip() or '0', linha[23:32].strip() or '0')
+
+
+class FiltroBloom:
+    """Filtro de Bloom em bytearray: `in` pode dar falso positivo, nunca falso negativo"""
+
+    def __init__(self, capacidade: int, taxa_falso_positivo: float = TAXA_FALSO_POSITIVO,
+                 bits: Optional[int] = None, funcoes: Optional[int] = None):
+        capacidade = max(capacidade, 1)
+        self.capacidade = capacidade
+        self.bits = bits or max(8, int(-capacidade * math.log(taxa_falso_positivo) / (math.log(2) ** 2)))
+        self.funcoes = funcoes or max(1, round(self.bits / capacidade * math.log(2)))
+        self.itens = 0
+        self._mapa = bytearray((self.bits + 7) // 8)
+
+    def _posicoes(self, chave: bytes) -> Iterable[int]:
+        # Hash duplo (Kirsch-Mitzenmacher): k posições a partir de dois valores de 64 bits
+        digest = hashlib.blake2b(chave, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        bits = self.bits
+        return ((h1 + i * h2) % bits for i in range(self.funcoes))
+
+    def adicionar(self, chave: bytes):
+        mapa = self._mapa
+        for posicao in self._posicoes(chave):
+            mapa[posicao >> 3] |= 1 << (posicao & 7)
+        self.itens += 1
+
+    def __contains__(self, chave: bytes) -> bool:
+        mapa = self._mapa
+        return all(mapa[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(chave))
+
+    def salvar(self, caminho: Union[str, Path]):
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(_CABECALHO_BLOOM.pack(_ASSINATURA_BLOOM, self.bits, self.funcoes, self.itens))
+            arquivo.write(self._mapa)
+
+    @classmethod
+    def carregar(cls, caminho: Union[str, Path], capacidade: int) -> Optional['FiltroBloom']:
+        """Filtro salvo em `caminho`, ou None se não existir ou estiver inválido"""
+        try:
+            with open(caminho, 'rb') as arquivo:
+                assinatura, bits, funcoes, itens = _CABECALHO_BLOOM.unpack(arquivo.read(_CABECALHO_BLOOM.size))
+                mapa = arquivo.read()
+        except (OSError, struct.error):
+            return None
+        if assinatura != _ASSINATURA_BLOOM or len(mapa) != (bits + 7) // 8:
+            return None
+
+        filtro = cls(capacidade, bits=bits, funcoes=funcoes)
+        filtro._mapa = bytearray(mapa)
+        filtro.itens = itens
+        return filtro
+
+
+def _chave_bloom(fatura: str, nf: str) -> bytes:
+    return f"{fatura}|{nf}".encode('utf-8')
+
+
+class IndiceUnicidadeNF:
+    """Combinações fatura + NF de todos os lotes registrados, com filtro de Bloom na frente do SQLite
+
+    Uso:
+        with IndiceUnicidadeNF('printcenter/indice_unicidade.sqlite3') as indice:
+            indice.registrar_pasta('printcenter/lotes')
+            anterior = indice.procurar('0000000000123', '000000456', ignorar_lote='lote_hoje.txt')
+    """
+
+    def __init__(self, caminho_banco: Union[str, Path], capacidade: int = CAPACIDADE_INICIAL,
+                 taxa_falso_positivo: float = TAXA_FALSO_POSITIVO):
+        self.caminho_banco = Path(caminho_banco)
+        self.caminho_filtro = self.caminho_banco.with_name(self.caminho_banco.name + '.bloom')
+        self.taxa_falso_positivo = taxa_falso_positivo
+        self._conexao = sqlite3.connect(str(self.caminho_banco), timeout=30)
+        with self._conexao:
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS combinacoes ("
+                "fatura TEXT NOT NULL, nf TEXT NOT NULL, lote TEXT NOT NULL, linha INTEGER NOT NULL, "
+                "PRIMARY KEY (fatura, nf, lote)) WITHOUT ROWID"
+            )
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS lotes ("
+                "lote TEXT PRIMARY KEY, hash TEXT NOT NULL, quantidade INTEGER NOT NULL, registrado_em TEXT NOT NULL)"
+            )
+
+        self.filtro = FiltroBloom.carregar(self.caminho_filtro, capacidade)
+        if self.filtro is None or self.filtro.itens < self.quantidade():
+            self._reconstruir_filtro(max(capacidade, self.quantidade() * 2))
+        self._filtro_alterado = False
+
+    def quantidade(self) -> int:
+        """Combinações (fatura, nf, lote) guardadas"""
+        return self._conexao.execute("SELECT COUNT(*) FROM combinacoes").fetchone()[0]
+
+    def lotes(self) -> List[Tuple[str, int]]:
+        """(lote, quantidade de registros 01) dos lotes registrados"""
+        return self._conexao.execute("SELECT lote, quantidade FROM lotes ORDER BY lote").fetchall()
+
+    def _reconstruir_filtro(self, capacidade: int):
+        # Uma inclusão por linha do banco: `itens` igual a quantidade() indica filtro em dia
+        self.filtro = FiltroBloom(capacidade, self.taxa_falso_positivo)
+        for fatura, nf in self._conexao.execute("SELECT fatura, nf FROM combinacoes"):
+            self.filtro.adicionar(_chave_bloom(fatura, nf))
+        self._filtro_alterado = True
+
+    def procurar(self, fatura: str, nf: str, ignorar_lote: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """(lote, linha) de um lote registrado que já usou a combinação, fora `ignorar_lote`"""
+        if _chave_bloom(fatura, nf) not in self.filtro:
+            return None
+        return self._conexao.execute(
+            "SELECT lote, linha FROM combinacoes WHERE fatura = ? AND nf = ? AND lote <> ? ORDER BY lote LIMIT 1",
+            (fatura, nf, ignorar_lote or '')
+        ).fetchone()
+
+    def registrar_lote(self, caminho_arquivo: Union[str, Path], nome_lote: Optional[str] = None) -> int:
+        """Registra as combinações dos registros 01 do lote; lote já registrado com o mesmo
+        conteúdo não é relido, e com conteúdo diferente é substituído. Retorna a quantidade."""
+        caminho_arquivo = Path(caminho_arquivo)
+        nome_lote = nome_lote or caminho_arquivo.name
+        hash_lote = _hash_arquivo(caminho_arquivo)
+
+        registrado = self._conexao.execute(
+            "SELECT hash, quantidade FROM lotes WHERE lote = ?", (nome_lote,)
+        ).fetchone()
+        if registrado is not None and registrado[0] == hash_lote:
+            return registrado[1]
+
+        combinacoes = []
+        with LineIndex(str(caminho_arquivo), ENCODINGS_WINDOWS) as indice:
+            for numero_linha in indice.linhas_com_prefixo(b'01'):
+                fatura_nf = fatura_nf_do_registro_01(indice.get_line(numero_linha))
+                if fatura_nf is not None:
+                    combinacoes.append((fatura_nf[0], fatura_nf[1], nome_lote, numero_linha))
+
+        with self._conexao:
+            self._conexao.execute("DELETE FROM combinacoes WHERE lote = ?", (nome_lote,))
+            self._conexao.executemany(
+                "INSERT OR IGNORE INTO combinacoes (fatura, nf, lote, linha) VALUES (?, ?, ?, ?)", combinacoes
+            )
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO lotes (lote, hash, quantidade, registrado_em) VALUES (?, ?, ?, ?)",
+                (nome_lote, hash_lote, len(combinacoes), datetime.now().isoformat(timespec='seconds'))
+            )
+
+        if self.filtro.itens + len(combinacoes) > self.filtro.capacidade:
+            self._reconstruir_filtro(max(self.filtro.capacidade, self.quantidade()) * 2)
+        else:
+            for fatura, nf, _, _ in combinacoes:
+                self.filtro.adicionar(_chave_bloom(fatura, nf))
+            self._filtro_alterado = True
+        return len(combinacoes)
+
+    def registrar_pasta(self, pasta: Union[str, Path], padrao: str = '*.txt') -> int:
+        """Registra todos os lotes da pasta (os inalterados são pulados); retorna quantos lotes há"""
+        arquivos = [arquivo for arquivo in sorted(Path(pasta).glob(padrao)) if arquivo.is_file()]
+        for arquivo in arquivos:
+            self.registrar_lote(arquivo)
+        return len(arquivos)
+
+    def remover_lote(self, nome_lote: str):
+        """Tira o lote do índice (o filtro só é refeito na próxima reconstrução; o banco confirma)"""
+        with self._conexao:
+            self._conexao.execute("DELETE FROM combinacoes WHERE lote = ?", (nome_lote,))
+            self._conexao.execute("DELETE FROM lotes WHERE lote = ?", (nome_lote,))
+
+    def close(self):
+        """Salva o filtro (se mudou) e fecha o banco"""
+        if self._conexao is None:
+            return
+        if self._filtro_alterado:
+            self.filtro.salvar(self.caminho_filtro)
+            self._filtro_alterado = False
+        self._conexao.close()
+        self._conexao = None
+
+    def __enter__(self) -> 'IndiceUnicidadeNF':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _hash_arquivo(caminho: Path) -> str:
+    digest = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
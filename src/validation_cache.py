@@ -0,0 +1,217 @@
+"""
+Cache persistente de blocos de NF já validados (revalidação incremental).
+
+Quando um arquivo corrigido é reenviado, só as NFs alteradas precisam ser
+validadas de novo. Cada bloco (do registro 01 até o próximo 01) fica guardado
+por fatura + NF junto com o hash dos seus bytes; se o bloco do novo arquivo tem
+o mesmo hash, os erros e os dados da junção (registros 01, grupos, contagens)
+são reaproveitados, com a numeração das linhas deslocada se o bloco mudou de
+posição no arquivo. As linhas citadas nas descrições (ErroLinhasCitadas) ficam
+guardadas como números ao lado do modelo do texto, então o deslocamento nunca
+mexe em texto.
+
+O cache é um banco SQLite em disco limitado por tamanho: passando do limite, os
+blocos usados há mais tempo são descartados (LRU). As entradas ficam separadas
+pela assinatura da validação (layout, regras e encoding), então trocar o layout
+ou as regras nunca reaproveita erros antigos.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+try:
+    from .models import ErroLinhasCitadas, ErroValidacao, Layout, ModeloErroLinhas, ParcialBlocoNF
+    from .rule_loader import ConjuntoRegras
+except ImportError:
+    from models import ErroLinhasCitadas, ErroValidacao, Layout, ModeloErroLinhas, ParcialBlocoNF
+    from rule_loader import ConjuntoRegras
+
+
+# Mudar quando as validações do EnhancedValidator mudarem: invalida as entradas antigas
+VERSAO_CACHE = 2
+TAMANHO_MAXIMO_CACHE = 256 * 1024 * 1024
+# Blocos novos acumulados antes de gravar no banco
+LOTE_GRAVACAO = 1000
+
+
+def assinatura_validacao(layout: Layout, regras: ConjuntoRegras, encoding: str) -> str:
+    """Hash do que muda o resultado de um bloco além dos seus bytes: layout, regras e encoding"""
+    conteudo = json.dumps([
+        VERSAO_CACHE,
+        layout.tamanho_linha,
+        [(c.nome, c.posicao_inicio, c.tamanho, c.tipo.value, c.obrigatorio, c.formato) for c in layout.campos],
+        regras.totals_map,
+        regras.calculation_validations,
+        regras.transaction_id,
+        encoding,
+    ], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def deslocar_parcial(parcial: ParcialBlocoNF, deslocamento: int) -> ParcialBlocoNF:
+    """Bloco com as linhas (inclusive as citadas nas descrições) deslocadas de `deslocamento`"""
+    if not deslocamento:
+        return parcial
+
+    grupos_nf = {}
+    for key, grupo in parcial.grupos_nf.items():
+        grupos_nf[key] = dict(grupo, faixas=[[inicio + deslocamento, fim + deslocamento] for inicio, fim in grupo['faixas']])
+
+    return ParcialBlocoNF(
+        primeira_linha=parcial.primeira_linha + deslocamento,
+        total_linhas=parcial.total_linhas,
+        erros=[
+            erro.deslocado(deslocamento) if isinstance(erro, ErroLinhasCitadas) else ErroValidacao(
+                linha=erro.linha + deslocamento,
+                campo=erro.campo,
+                valor_encontrado=erro.valor_encontrado,
+                erro_tipo=erro.erro_tipo,
+                descricao=erro.descricao,
+                valor_esperado=erro.valor_esperado
+            )
+            for erro in parcial.erros
+        ],
+        registros_01=[(linha + deslocamento, fatura, nf, posicao) for linha, fatura, nf, posicao in parcial.registros_01],
+        grupos_nf=grupos_nf,
+        total_registros_01=parcial.total_registros_01,
+        declaracoes_header=parcial.declaracoes_header
+    )
+
+
+def _codificar_erro(erro: ErroValidacao) -> list:
+    # Com linhas citadas: o modelo da descrição e as linhas, para deslocar sem mexer no texto
+    if isinstance(erro, ErroLinhasCitadas):
+        modelo = erro.modelo
+        return [erro.linha, modelo.campo, erro.valor_encontrado, modelo.erro_tipo, modelo.descricao,
+                modelo.valor_esperado, list(erro.linhas_citadas)]
+    return [erro.linha, erro.campo, erro.valor_encontrado, erro.erro_tipo, erro.descricao, erro.valor_esperado]
+
+
+def _decodificar_erro(dados: list) -> ErroValidacao:
+    if len(dados) == 7:
+        linha, campo, valor_encontrado, erro_tipo, descricao, valor_esperado, linhas_citadas = dados
+        return ErroLinhasCitadas(
+            linha, ModeloErroLinhas(campo, erro_tipo, descricao, valor_esperado), valor_encontrado, linhas_citadas
+        )
+    return ErroValidacao(*dados)
+
+
+def _codificar(parcial: ParcialBlocoNF) -> bytes:
+    """Bloco em JSON comprimido (sem o estado final, que só vale para o último bloco)"""
+    dados = {
+        'primeira_linha': parcial.primeira_linha,
+        'total_linhas': parcial.total_linhas,
+        'erros': [_codificar_erro(e) for e in parcial.erros],
+        'registros_01': parcial.registros_01,
+        'grupos_nf': [[fatura, nf, grupo] for (fatura, nf), grupo in parcial.grupos_nf.items()],
+        'total_registros_01': parcial.total_registros_01,
+        'declaracoes_header': parcial.declaracoes_header,
+    }
+    return zlib.compress(json.dumps(dados, ensure_ascii=False).encode('utf-8'), 1)
+
+
+def _decodificar(conteudo: bytes) -> ParcialBlocoNF:
+    dados = json.loads(zlib.decompress(conteudo).decode('utf-8'))
+    return ParcialBlocoNF(
+        primeira_linha=dados['primeira_linha'],
+        total_linhas=dados['total_linhas'],
+        erros=[_decodificar_erro(erro) for erro in dados['erros']],
+        registros_01=[tuple(registro) for registro in dados['registros_01']],
+        grupos_nf={(fatura, nf): grupo for fatura, nf, grupo in dados['grupos_nf']},
+        total_registros_01=dados['total_registros_01'],
+        declaracoes_header=dados['declaracoes_header']
+    )
+
+
+class CacheBlocosNF:
+    """Blocos de NF validados num banco SQLite, por assinatura + fatura|NF e limitado por tamanho (LRU)
+
+    Uso:
+        with CacheBlocosNF('cache_blocos_nf.sqlite3') as cache:
+            resultado = validador.validar_arquivo_incremental(caminho, cache)
+    """
+
+    def __init__(self, caminho_banco: Union[str, Path], tamanho_maximo: int = TAMANHO_MAXIMO_CACHE):
+        self.caminho_banco = str(caminho_banco)
+        self.tamanho_maximo = tamanho_maximo
+        self._conexao = sqlite3.connect(self.caminho_banco, timeout=30)
+        with self._conexao:
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS blocos ("
+                "chave TEXT PRIMARY KEY, digest TEXT NOT NULL, dados BLOB NOT NULL, "
+                "tamanho INTEGER NOT NULL, acesso INTEGER NOT NULL)"
+            )
+            self._conexao.execute("CREATE INDEX IF NOT EXISTS blocos_acesso ON blocos (acesso)")
+
+        # Gravações e atualizações de acesso pendentes (feitas em lote)
+        self._novos: List[Tuple[str, str, bytes, int, int]] = []
+        self._acessos: List[Tuple[int, str]] = []
+
+    def obter(self, assinatura: str, chave: str, digest: str) -> Optional[ParcialBlocoNF]:
+        """Bloco guardado para a fatura|NF, se o conteúdo (digest) for o mesmo"""
+        chave_completa = f"{assinatura}|{chave}"
+        linha = self._conexao.execute(
+            "SELECT digest, dados FROM blocos WHERE chave = ?", (chave_completa,)
+        ).fetchone()
+        if linha is None or linha[0] != digest:
+            return None
+        self._acessos.append((time.time_ns(), chave_completa))
+        return _decodificar(linha[1])
+
+    def guardar(self, assinatura: str, chave: str, digest: str, parcial: ParcialBlocoNF):
+        """Guarda (ou substitui) o bloco da fatura|NF"""
+        dados = _codificar(parcial)
+        self._novos.append((f"{assinatura}|{chave}", digest, dados, len(dados), time.time_ns()))
+        if len(self._novos) >= LOTE_GRAVACAO:
+            self._gravar()
+
+    def _gravar(self):
+        with self._conexao:
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO blocos (chave, digest, dados, tamanho, acesso) VALUES (?, ?, ?, ?, ?)",
+                self._novos
+            )
+            self._conexao.executemany("UPDATE blocos SET acesso = ? WHERE chave = ?", self._acessos)
+        self._novos = []
+        self._acessos = []
+
+    def salvar(self):
+        """Grava as pendências e descarta os blocos menos usados se o cache passou do limite"""
+        self._gravar()
+        excesso = self.tamanho_total() - self.tamanho_maximo
+        if excesso <= 0:
+            return
+
+        removidas = []
+        for chave, tamanho in self._conexao.execute("SELECT chave, tamanho FROM blocos ORDER BY acesso"):
+            removidas.append((chave,))
+            excesso -= tamanho
+            if excesso <= 0:
+                break
+        with self._conexao:
+            self._conexao.executemany("DELETE FROM blocos WHERE chave = ?", removidas)
+
+    def tamanho_total(self) -> int:
+        """Bytes guardados (dados comprimidos dos blocos)"""
+        return self._conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM blocos").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._conexao.execute("SELECT COUNT(*) FROM blocos").fetchone()[0]
+
+    def close(self):
+        """Grava as pendências e fecha o banco"""
+        if self._conexao is not None:
+            self.salvar()
+            self._conexao.close()
+            self._conexao = None
+
+    def __enter__(self) -> 'CacheBlocosNF':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,6 +1,6 @@
 import re
 from datetime import datetime
-from typing import List, Optional, Any
+from typing import Callable, Dict, List, NamedTuple, Optional, Any, Tuple
 from decimal import Decimal, InvalidOperation
 
 try:
@@ -9,56 +9,194 @@ except ImportError:
     from models import CampoLayout, TipoCampo, ErroValidacao
 
 
+def _caracteres_invalidos(valor_limpo: str) -> str:
+    """Lista os caracteres não numéricos do valor para a mensagem de erro"""
+    return ', '.join(f"'{c}'" for c in set(c for c in valor_limpo if not c.isdigit()))
+
+
+# Mensagem de cada código de falha, montada a partir dos parâmetros só quando lida
+MENSAGENS_FALHA: Dict[str, Callable[..., str]] = {
+    'OBRIGATORIO_VAZIO': lambda nome: f"Campo obrigatório '{nome}' está vazio",
+    # Manter palavra-chave 'tamanho' para compatibilidade com testes
+    'TAMANHO_INCORRETO': lambda encontrado, esperado: (
+        f"Tamanho do campo incorreto: encontrado {encontrado} caracteres, esperado exatamente {esperado} caracteres"
+    ),
+    # Incluir palavra 'números' para satisfazer expectativa dos testes
+    'NUMERO_NAO_NUMERICO': lambda valor_limpo: (
+        f"Contém caracteres não numéricos: {_caracteres_invalidos(valor_limpo)}. Apenas números/dígitos (0-9) são permitidos"
+    ),
+    'DECIMAL_NAO_NUMERICO': lambda valor_limpo: (
+        f"Valor decimal inválido. Contém caracteres não numéricos: {_caracteres_invalidos(valor_limpo)}"
+    ),
+    'DECIMAL_FORMATO': lambda valor: f"Formato decimal inválido. Esperado apenas dígitos, encontrado '{valor}'",
+    'DATA_TAMANHO': lambda encontrado, valor: (
+        f"Data deve ter 8 dígitos (YYYYMMDD), encontrado {encontrado} dígitos: '{valor}'"
+    ),
+    'DATA_NAO_NUMERICA': lambda valor: f"Data deve conter apenas números, encontrado '{valor}'",
+    'DATA_ANO': lambda ano: f"Ano inválido: {ano}. Deve estar entre 1900 e 2100",
+    'DATA_MES': lambda mes: f"Mês inválido: {mes}. Deve estar entre 01 e 12",
+    'DATA_DIA': lambda dia: f"Dia inválido: {dia}. Deve estar entre 01 e 31",
+    'DATA_DIA_DO_MES': lambda dia, mes: f"Dia {dia} é inválido para o mês {mes}",
+    'DATA_INVALIDA': lambda formato, valor, erro: f"Data inválida no formato {formato}: '{valor}'. Erro: {erro}",
+    'TIPO_NAO_IMPLEMENTADO': lambda tipo: f"Tipo de campo '{tipo}' não implementado",
+}
+
+# Tipo de erro (ErroValidacao.erro_tipo) de cada código de falha
+TIPO_ERRO_FALHA: Dict[str, str] = {
+    'OBRIGATORIO_VAZIO': 'CAMPO_OBRIGATORIO',
+    'TAMANHO_INCORRETO': 'TAMANHO_CAMPO',
+    'NUMERO_NAO_NUMERICO': 'TIPO_INVALIDO',
+    'DECIMAL_NAO_NUMERICO': 'TIPO_INVALIDO',
+    'DATA_NAO_NUMERICA': 'TIPO_INVALIDO',
+    'DECIMAL_FORMATO': 'FORMATO_INVALIDO',
+    'DATA_TAMANHO': 'FORMATO_INVALIDO',
+    'DATA_ANO': 'FORMATO_INVALIDO',
+    'DATA_MES': 'FORMATO_INVALIDO',
+    'DATA_DIA': 'FORMATO_INVALIDO',
+    'DATA_DIA_DO_MES': 'FORMATO_INVALIDO',
+    'DATA_INVALIDA': 'FORMATO_INVALIDO',
+    'TIPO_NAO_IMPLEMENTADO': 'ERRO_GENERICO',
+}
+
+
+class FalhaCampo(NamedTuple):
+    """Falha de validação de um campo: código estruturado e parâmetros da mensagem"""
+    codigo: str
+    parametros: tuple = ()
+
+    @property
+    def erro_tipo(self) -> str:
+        return TIPO_ERRO_FALHA.get(self.codigo, 'ERRO_GENERICO')
+
+    def mensagem(self) -> str:
+        return MENSAGENS_FALHA[self.codigo](*self.parametros)
+
+
+def valor_esperado_do_erro(campo: CampoLayout, tipo_erro: str) -> str:
+    """Obtém descrição do valor esperado baseado no tipo de erro"""
+    if tipo_erro == 'CAMPO_OBRIGATORIO':
+        return f"Qualquer valor válido do tipo {campo.tipo.value}"
+    elif tipo_erro == 'TAMANHO_CAMPO':
+        return f"Exatamente {campo.tamanho} caracteres"
+    elif tipo_erro == 'TIPO_INVALIDO':
+        if campo.tipo.value == 'NUMERO':
+            return "Apenas dígitos (0-9)"
+        elif campo.tipo.value == 'DATA':
+            return f"Data no formato {campo.formato or 'YYYYMMDD'}"
+        elif campo.tipo.value == 'DECIMAL':
+            return "Apenas dígitos para valor decimal"
+        else:
+            return f"Valor do tipo {campo.tipo.value}"
+    elif tipo_erro == 'FORMATO_INVALIDO':
+        return f"Data válida no formato {campo.formato}"
+    else:
+        return f"Valor válido do tipo {campo.tipo.value}"
+
+
+class ErroCampo(ErroValidacao):
+    """ErroValidacao de um campo do layout com os textos montados sob demanda
+
+    A validação guarda apenas o campo, o valor e a `FalhaCampo`; descrição, valor
+    encontrado e valor esperado só são formatados quando um relatório ou resposta
+    da API os lê (e ficam guardados a partir daí).
+    """
+
+    def __init__(self, linha: int, campo_layout: CampoLayout, valor: str, falha: FalhaCampo):
+        self.linha = linha
+        self.campo = campo_layout.nome
+        self.erro_tipo = falha.erro_tipo
+        self.campo_layout = campo_layout
+        self.valor = valor
+        self.falha = falha
+        self._descricao: Optional[str] = None
+        self._valor_encontrado: Optional[str] = None
+        self._valor_esperado: Optional[str] = None
+
+    def _dados_compactos(self) -> Optional[Tuple[CampoLayout, str, FalhaCampo]]:
+        # Textos já lidos ou alterados precisam ser guardados como estão
+        if self._descricao is None and self._valor_encontrado is None and self._valor_esperado is None:
+            return (self.campo_layout, self.valor, self.falha)
+        return None
+
+    @property
+    def descricao(self) -> str:
+        if self._descricao is None:
+            campo = self.campo_layout
+            self._descricao = (
+                f"Campo: {campo.nome} | Posição: {campo.posicao_inicio}-{campo.posicao_fim} | {self.falha.mensagem()}"
+            )
+        return self._descricao
+
+    @descricao.setter
+    def descricao(self, valor: str):
+        self._descricao = valor
+
+    @property
+    def valor_encontrado(self) -> str:
+        if self._valor_encontrado is None:
+            campo = self.campo_layout
+            self._valor_encontrado = f"'{self.valor}' (pos {campo.posicao_inicio}-{campo.posicao_fim})"
+        return self._valor_encontrado
+
+    @valor_encontrado.setter
+    def valor_encontrado(self, valor: str):
+        self._valor_encontrado = valor
+
+    @property
+    def valor_esperado(self) -> str:
+        if self._valor_esperado is None:
+            self._valor_esperado = valor_esperado_do_erro(self.campo_layout, self.erro_tipo)
+        return self._valor_esperado
+
+    @valor_esperado.setter
+    def valor_esperado(self, valor: str):
+        self._valor_esperado = valor
+
+
 class ValidadorCampo:
-    """Classe para validar valores de campos individuais"""
+    """Classe para validar valores de campos individuais
+
+    Os métodos `verificar_*` devolvem uma `FalhaCampo` estruturada (ou None);
+    os `validar_*` devolvem a mensagem já formatada.
+    """
 
     @staticmethod
-    def validar_obrigatorio(valor: str, campo: CampoLayout) -> Optional[str]:
-        """Valida se campo obrigatório não está vazio"""
+    def verificar_obrigatorio(valor: str, campo: CampoLayout) -> Optional[FalhaCampo]:
+        """Verifica se campo obrigatório não está vazio"""
         if campo.obrigatorio and (not valor or valor.strip() == ''):
-            return f"Campo obrigatório '{campo.nome}' está vazio"
+            return FalhaCampo('OBRIGATORIO_VAZIO', (campo.nome,))
         return None
 
     @staticmethod
-    def validar_tamanho(valor: str, campo: CampoLayout) -> Optional[str]:
-        """Valida o tamanho do campo"""
+    def verificar_tamanho(valor: str, campo: CampoLayout) -> Optional[FalhaCampo]:
+        """Verifica o tamanho do campo"""
         if len(valor) != campo.tamanho:
-            # Manter palavra-chave 'tamanho' para compatibilidade com testes
-            return f"Tamanho do campo incorreto: encontrado {len(valor)} caracteres, esperado exatamente {campo.tamanho} caracteres"
+            return FalhaCampo('TAMANHO_INCORRETO', (len(valor), campo.tamanho))
         return None
 
     @staticmethod
-    def validar_tipo_texto(valor: str, campo: CampoLayout) -> Optional[str]:
-        """Valida campo tipo TEXTO"""
+    def verificar_tipo_texto(valor: str, campo: CampoLayout) -> Optional[FalhaCampo]:
+        """Verifica campo tipo TEXTO"""
         # Para texto, qualquer caractere é válido
         return None
 
     @staticmethod
-    def validar_tipo_numero(valor: str, campo: CampoLayout) -> Optional[str]:
-        """Valida campo tipo NUMERO"""
+    def verificar_tipo_numero(valor: str, campo: CampoLayout) -> Optional[FalhaCampo]:
+        """Verifica campo tipo NUMERO"""
         valor_limpo = valor.strip()
         if valor_limpo and not valor_limpo.isdigit():
-            # Identificar caracteres inválidos
-            caracteres_invalidos = [c for c in valor_limpo if not c.isdigit()]
-            if caracteres_invalidos:
-                chars_str = ', '.join(f"'{c}'" for c in set(caracteres_invalidos))
-                # Incluir palavra 'números' para satisfazer expectativa dos testes
-                return f"Contém caracteres não numéricos: {chars_str}. Apenas números/dígitos (0-9) são permitidos"
-            else:
-                return f"Deve conter apenas números, encontrado '{valor}'"
+            return FalhaCampo('NUMERO_NAO_NUMERICO', (valor_limpo,))
         return None
 
     @staticmethod
-    def validar_tipo_decimal(valor: str, campo: CampoLayout) -> Optional[str]:
-        """Valida campo tipo DECIMAL"""
+    def verificar_tipo_decimal(valor: str, campo: CampoLayout) -> Optional[FalhaCampo]:
+        """Verifica campo tipo DECIMAL"""
         valor_limpo = valor.strip()
         if valor_limpo:
             try:
                 # Verificar se contém apenas dígitos
                 if not valor_limpo.isdigit():
-                    caracteres_invalidos = [c for c in valor_limpo if not c.isdigit()]
-                    chars_str = ', '.join(f"'{c}'" for c in set(caracteres_invalidos))
-                    return f"Valor decimal inválido. Contém caracteres não numéricos: {chars_str}"
+                    return FalhaCampo('DECIMAL_NAO_NUMERICO', (valor_limpo,))
 
                 # Remove zeros à esquerda e verifica se é um número válido
                 valor_sem_zeros = valor_limpo.lstrip('0') or '0'
@@ -71,23 +209,23 @@ class ValidadorCampo:
                     decimal_value = Decimal(valor_sem_zeros)
                     return None  # Valor válido
             except (InvalidOperation, ValueError):
-                return f"Formato decimal inválido. Esperado apenas dígitos, encontrado '{valor}'"
+                return FalhaCampo('DECIMAL_FORMATO', (valor,))
         return None
 
     @staticmethod
-    def validar_tipo_data(valor: str, campo: CampoLayout) -> Optional[str]:
-        """Valida campo tipo DATA"""
+    def verificar_tipo_data(valor: str, campo: CampoLayout) -> Optional[FalhaCampo]:
+        """Verifica campo tipo DATA"""
         valor_limpo = valor.strip()
         if valor_limpo:
             formato = campo.formato or 'YYYYMMDD'
 
             # Verificar se tem o tamanho correto para data
             if formato == 'YYYYMMDD' and len(valor_limpo) != 8:
-                return f"Data deve ter 8 dígitos (YYYYMMDD), encontrado {len(valor_limpo)} dígitos: '{valor}'"
+                return FalhaCampo('DATA_TAMANHO', (len(valor_limpo), valor))
 
             # Verificar se contém apenas números
             if not valor_limpo.isdigit():
-                return f"Data deve conter apenas números, encontrado '{valor}'"
+                return FalhaCampo('DATA_NAO_NUMERICA', (valor,))
 
             # Mapear formato para strptime
             formato_python = formato.replace('YYYY', '%Y').replace('MM', '%m').replace('DD', '%d')
@@ -102,11 +240,11 @@ class ValidadorCampo:
                     dia = int(valor_limpo[6:8])
 
                     if ano < 1900 or ano > 2100:
-                        return f"Ano inválido: {ano}. Deve estar entre 1900 e 2100"
+                        return FalhaCampo('DATA_ANO', (ano,))
                     if mes < 1 or mes > 12:
-                        return f"Mês inválido: {mes}. Deve estar entre 01 e 12"
+                        return FalhaCampo('DATA_MES', (mes,))
                     if dia < 1 or dia > 31:
-                        return f"Dia inválido: {dia}. Deve estar entre 01 e 31"
+                        return FalhaCampo('DATA_DIA', (dia,))
 
                 return None  # Data válida
 
@@ -115,47 +253,103 @@ class ValidadorCampo:
                 if 'day must be in' in str(e):
                     dia = valor_limpo[6:8] if len(valor_limpo) >= 8 else 'XX'
                     mes = valor_limpo[4:6] if len(valor_limpo) >= 6 else 'XX'
-                    return f"Dia {dia} é inválido para o mês {mes}"
+                    return FalhaCampo('DATA_DIA_DO_MES', (dia, mes))
                 elif 'month must be in' in str(e):
                     mes = valor_limpo[4:6] if len(valor_limpo) >= 6 else 'XX'
-                    return f"Mês inválido: {mes}. Deve estar entre 01 e 12"
+                    return FalhaCampo('DATA_MES', (mes,))
                 else:
-                    return f"Data inválida no formato {formato}: '{valor}'. Erro: {str(e)}"
+                    return FalhaCampo('DATA_INVALIDA', (formato, valor, str(e)))
         return None
 
+    @staticmethod
+    def _verificar_tipo_nao_implementado(valor: str, campo: CampoLayout) -> Optional[FalhaCampo]:
+        return FalhaCampo('TIPO_NAO_IMPLEMENTADO', (campo.tipo,))
+
     @classmethod
-    def validar_campo(cls, valor: str, campo: CampoLayout) -> List[str]:
-        """Valida um campo completo"""
-        erros = []
+    def verificador_do_tipo(cls, tipo: TipoCampo) -> Callable[[str, CampoLayout], Optional[FalhaCampo]]:
+        """Retorna a função de verificação correspondente ao tipo do campo"""
+        if tipo == TipoCampo.TEXTO:
+            return cls.verificar_tipo_texto
+        elif tipo == TipoCampo.NUMERO:
+            return cls.verificar_tipo_numero
+        elif tipo == TipoCampo.DECIMAL:
+            return cls.verificar_tipo_decimal
+        elif tipo == TipoCampo.DATA:
+            return cls.verificar_tipo_data
+        return cls._verificar_tipo_nao_implementado
+
+    @classmethod
+    def verificar_campo(cls, valor: str, campo: CampoLayout,
+                        verificar_tipo: Optional[Callable[[str, CampoLayout], Optional[FalhaCampo]]] = None) -> List[FalhaCampo]:
+        """Verifica um campo completo, devolvendo as falhas estruturadas
+
+        Args:
+            verificar_tipo: verificador de tipo já resolvido (ex.: vindo do layout compilado)
+        """
+        falhas = []
 
         # Validar obrigatório
-        erro_obrigatorio = cls.validar_obrigatorio(valor, campo)
-        if erro_obrigatorio:
-            erros.append(erro_obrigatorio)
-            return erros  # Se é obrigatório e vazio, não faz outras validações
+        falha_obrigatorio = cls.verificar_obrigatorio(valor, campo)
+        if falha_obrigatorio:
+            falhas.append(falha_obrigatorio)
+            return falhas  # Se é obrigatório e vazio, não faz outras validações
 
         # Se não é obrigatório e está vazio, pula outras validações
         if not campo.obrigatorio and (not valor or valor.strip() == ''):
-            return erros
+            return falhas
 
         # Validar tamanho
-        erro_tamanho = cls.validar_tamanho(valor, campo)
-        if erro_tamanho:
-            erros.append(erro_tamanho)
+        falha_tamanho = cls.verificar_tamanho(valor, campo)
+        if falha_tamanho:
+            falhas.append(falha_tamanho)
 
         # Validar tipo
-        if campo.tipo == TipoCampo.TEXTO:
-            erro_tipo = cls.validar_tipo_texto(valor, campo)
-        elif campo.tipo == TipoCampo.NUMERO:
-            erro_tipo = cls.validar_tipo_numero(valor, campo)
-        elif campo.tipo == TipoCampo.DECIMAL:
-            erro_tipo = cls.validar_tipo_decimal(valor, campo)
-        elif campo.tipo == TipoCampo.DATA:
-            erro_tipo = cls.validar_tipo_data(valor, campo)
-        else:
-            erro_tipo = f"Tipo de campo '{campo.tipo}' não implementado"
+        if verificar_tipo is None:
+            verificar_tipo = cls.verificador_do_tipo(campo.tipo)
+        falha_tipo = verificar_tipo(valor, campo)
+
+        if falha_tipo:
+            falhas.append(falha_tipo)
+
+        return falhas
+
+    # Variantes que devolvem a mensagem formatada
+
+    @classmethod
+    def validar_obrigatorio(cls, valor: str, campo: CampoLayout) -> Optional[str]:
+        """Valida se campo obrigatório não está vazio"""
+        return _mensagem(cls.verificar_obrigatorio(valor, campo))
+
+    @classmethod
+    def validar_tamanho(cls, valor: str, campo: CampoLayout) -> Optional[str]:
+        """Valida o tamanho do campo"""
+        return _mensagem(cls.verificar_tamanho(valor, campo))
+
+    @classmethod
+    def validar_tipo_texto(cls, valor: str, campo: CampoLayout) -> Optional[str]:
+        """Valida campo tipo TEXTO"""
+        return _mensagem(cls.verificar_tipo_texto(valor, campo))
+
+    @classmethod
+    def validar_tipo_numero(cls, valor: str, campo: CampoLayout) -> Optional[str]:
+        """Valida campo tipo NUMERO"""
+        return _mensagem(cls.verificar_tipo_numero(valor, campo))
+
+    @classmethod
+    def validar_tipo_decimal(cls, valor: str, campo: CampoLayout) -> Optional[str]:
+        """Valida campo tipo DECIMAL"""
+        return _mensagem(cls.verificar_tipo_decimal(valor, campo))
+
+    @classmethod
+    def validar_tipo_data(cls, valor: str, campo: CampoLayout) -> Optional[str]:
+        """Valida campo tipo DATA"""
+        return _mensagem(cls.verificar_tipo_data(valor, campo))
+
+    @classmethod
+    def validar_campo(cls, valor: str, campo: CampoLayout) -> List[str]:
+        """Valida um campo completo"""
+        return [falha.mensagem() for falha in cls.verificar_campo(valor, campo)]
 
-        if erro_tipo:
-            erros.append(erro_tipo)
 
-        return erros
\ No newline at end of file
+def _mensagem(falha: Optional[FalhaCampo]) -> Optional[str]:
+    return falha.mensagem() if falha else None
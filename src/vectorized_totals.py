@@ -0,0 +1,80 @@
+"""
+Conferência vetorizada (NumPy) dos totalizadores 56 por somas segmentadas.
+
+Em vez de acumular os totais linha a linha, os valores de cada campo fonte (nas
+regras NFCOM: NFE22, NFE38, NFE40, NFE42 e NFE44) são extraídos de uma vez, dos
+bytes do arquivo, para arrays inteiros; o total conferido em cada registro 56 é
+uma soma segmentada (`np.add.reduceat`) das contribuições da sua NF (do registro
+01 que a abre até o próprio 56). Só os 56 divergentes viram `ErroValidacao`.
+
+A extração segue `digitos_para_int` (só os dígitos do campo, campo vazio se a
+linha for curta). Linhas com byte fora do ASCII antes do fim do campo (a posição
+em bytes pode não ser a do caractere) ou com mais de 18 dígitos (não cabe em
+int64) são marcadas como inexatas e ficam para a extração escalar.
+"""
+
+from typing import Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+# Linhas extraídas por vez (limita a matriz de bytes em memória)
+LINHAS_POR_BLOCO = 20000
+# Dígitos que sempre cabem num int64
+MAX_DIGITOS = 18
+
+if HAS_NUMPY:
+    _POTENCIAS_10 = 10 ** np.arange(MAX_DIGITOS, dtype=np.int64)
+
+
+def extrair_inteiros(matriz: 'np.ndarray', tamanhos: 'np.ndarray', ascii_ate_fim: 'np.ndarray',
+                     fim: int) -> Tuple['np.ndarray', 'np.ndarray']:
+    """Inteiro formado pelos dígitos de cada linha da matriz de bytes do campo (que termina na
+    posição `fim`) e se ele é exato (False: a linha precisa da extração escalar)"""
+    digito = (matriz >= 48) & (matriz <= 57)
+    # Dígitos à direita de cada posição: a casa decimal do dígito
+    casas = np.cumsum(digito[:, ::-1], axis=1)[:, ::-1] - digito
+    parcelas = np.where(digito, (matriz.astype(np.int64) - 48) * _POTENCIAS_10[np.minimum(casas, MAX_DIGITOS - 1)], 0)
+    valores = parcelas.sum(axis=1)
+
+    curtas = tamanhos < fim
+    exatos = curtas | (ascii_ate_fim & (digito.sum(axis=1) <= MAX_DIGITOS))
+    valores[curtas] = 0
+    return valores, exatos
+
+
+def valores_sem_estouro(valores: 'np.ndarray') -> 'np.ndarray':
+    """`valores`, ou em inteiros Python (dtype object) se a soma deles puder passar do int64"""
+    if len(valores) and int(valores.max()) > np.iinfo(np.int64).max // len(valores):
+        return valores.astype(object)
+    return valores
+
+
+def somas_segmentadas(linhas: 'np.ndarray', valores: 'np.ndarray', inicios_segmento: 'np.ndarray',
+                      consultas: 'np.ndarray') -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+    """Para cada linha de consulta, a soma dos `valores` com linha entre o início do seu
+    segmento (o último de `inicios_segmento` até ela) e ela mesma, inclusive
+
+    `linhas` e `inicios_segmento` ordenadas. Devolve (somas, lo, hi): [lo, hi) é a faixa de
+    cada soma em `linhas`.
+    """
+    if len(inicios_segmento):
+        segmento = np.searchsorted(inicios_segmento, consultas, side='right') - 1
+        inicio = np.where(segmento >= 0, inicios_segmento[np.maximum(segmento, 0)], 0)
+    else:
+        inicio = np.zeros(len(consultas), dtype=np.int64)
+    lo = np.searchsorted(linhas, inicio, side='left')
+    hi = np.searchsorted(linhas, consultas, side='right')
+
+    somas = np.zeros(len(consultas), dtype=valores.dtype)
+    com_valores = hi > lo
+    if com_valores.any():
+        # Pares [lo, hi) intercalados: as posições pares do reduceat são as somas de cada faixa
+        indices = np.column_stack((lo[com_valores], hi[com_valores])).ravel()
+        estendido = np.append(valores, np.zeros(1, dtype=valores.dtype))
+        somas[com_valores] = np.add.reduceat(estendido, indices)[::2]
+    return somas, lo, hi
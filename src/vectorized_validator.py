@@ -0,0 +1,191 @@
+"""
+Triagem vetorizada (NumPy) de arquivos de largura fixa.
+
+O arquivo é lido como bytes e as linhas são dispostas numa matriz uint8
+(n_linhas × largura). Cada coluna NUMERO/DECIMAL/DATA é verificada com máscaras
+de dígitos para todas as linhas de uma vez; a triagem é conservadora: marca toda
+linha que *pode* ter erro. Só as linhas marcadas passam pela validação escalar
+(`ValidadorArquivo.validar_linha`), então as mensagens e os `ErroValidacao`
+continuam exatamente os mesmos e só são criados para as células que falham.
+
+Linhas com bytes fora do ASCII são sempre marcadas (a posição em bytes não
+coincide com a posição em caracteres). A quebra de linha segue o leitor
+compartilhado (`file_reader`): apenas '\\n', com os '\\r' finais removidos.
+"""
+
+from typing import List, NamedTuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    from .models import TipoCampo
+    from .compiled_layout import CompiledLayout
+except ImportError:
+    from models import TipoCampo
+    from compiled_layout import CompiledLayout
+
+
+# Linhas processadas por bloco da matriz (limita a memória dos índices)
+LINHAS_POR_BLOCO = 20000
+
+# Bytes ASCII removidos por str.strip()
+_ESPACOS_ASCII = b' \t\n\x0b\x0c\r\x1c\x1d\x1e\x1f'
+
+_DIAS_POR_MES = [0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+class LinhasArquivo(NamedTuple):
+    """Limites (em bytes) de cada linha do arquivo, sem o terminador"""
+    inicios: 'np.ndarray'
+    fins: 'np.ndarray'
+
+
+def linhas_do_arquivo(dados: bytes) -> LinhasArquivo:
+    """Localiza as linhas do arquivo (quebra em '\\n', sem os '\\r' finais)"""
+    buffer = np.frombuffer(dados, dtype=np.uint8)
+    quebras = np.flatnonzero(buffer == 10)
+
+    inicios = np.concatenate(([0], quebras + 1)).astype(np.int64)
+    fins = np.concatenate((quebras, [len(buffer)])).astype(np.int64)
+
+    # Última "linha" vazia após o '\n' final não existe na leitura em modo texto
+    if len(fins) and inicios[-1] == len(buffer):
+        inicios = inicios[:-1]
+        fins = fins[:-1]
+
+    # Remover os '\r' finais (mesmo efeito de rstrip('\n\r'))
+    if dados.count(b'\r'):
+        while len(fins):
+            com_cr = (fins > inicios) & (buffer[np.maximum(fins - 1, 0)] == 13)
+            if not com_cr.any():
+                break
+            fins = fins - com_cr
+
+    return LinhasArquivo(inicios=inicios, fins=fins)
+
+
+def _montar_matriz(buffer: 'np.ndarray', inicios: 'np.ndarray', fins: 'np.ndarray', largura: int) -> 'np.ndarray':
+    """Monta a matriz (linhas × largura) completando com espaços, como o ljust da leitura escalar"""
+    colunas = np.arange(largura, dtype=np.int64)
+    indices = inicios[:, None] + colunas[None, :]
+    dentro = colunas[None, :] < (fins - inicios)[:, None]
+    if len(buffer) == 0:
+        return np.full(indices.shape, 32, dtype=np.uint8)
+    matriz = buffer[np.minimum(indices, len(buffer) - 1)]
+    matriz[~dentro] = 32
+    return matriz
+
+
+def _mascara_digitos_validos(coluna: 'np.ndarray', espacos: 'np.ndarray', digitos: 'np.ndarray') -> 'np.ndarray':
+    """True onde o valor, após strip(), contém apenas dígitos (ou está vazio)"""
+    apenas_digitos_e_espacos = np.all(digitos | espacos, axis=1)
+    # Espaço entre dígitos ("12 34") invalida o valor
+    acumulado = np.cumsum(digitos, axis=1)
+    total = acumulado[:, -1:]
+    espaco_interno = np.any(espacos & (acumulado > 0) & (acumulado < total), axis=1)
+    return apenas_digitos_e_espacos & ~espaco_interno
+
+
+def _mascara_data_valida(coluna: 'np.ndarray', espacos: 'np.ndarray', digitos: 'np.ndarray') -> 'np.ndarray':
+    """True onde o valor é uma data YYYYMMDD válida (8 dígitos, 1900-2100)"""
+    validos = _mascara_digitos_validos(coluna, espacos, digitos)
+    quantidade = digitos.sum(axis=1)
+    validos &= quantidade == 8
+
+    # Extrair os 8 dígitos de cada linha candidata
+    resultado = np.zeros(len(coluna), dtype=bool)
+    candidatos = np.flatnonzero(validos)
+    if len(candidatos) == 0:
+        return resultado
+
+    sub_digitos = digitos[candidatos]
+    posicoes = np.argsort(~sub_digitos, axis=1, kind='stable')[:, :8]
+    valores = np.take_along_axis(coluna[candidatos], posicoes, axis=1).astype(np.int64) - 48
+
+    pesos_ano = np.array([1000, 100, 10, 1])
+    ano = valores[:, 0:4] @ pesos_ano
+    mes = valores[:, 4] * 10 + valores[:, 5]
+    dia = valores[:, 6] * 10 + valores[:, 7]
+
+    mes_ok = (mes >= 1) & (mes <= 12)
+    dias_no_mes = np.array(_DIAS_POR_MES)[np.clip(mes, 0, 12)]
+    bissexto = ((ano % 4 == 0) & (ano % 100 != 0)) | (ano % 400 == 0)
+    dias_no_mes = dias_no_mes + ((mes == 2) & bissexto)
+
+    ok = (ano >= 1900) & (ano <= 2100) & mes_ok & (dia >= 1) & (dia <= dias_no_mes)
+    resultado[candidatos] = ok
+    return resultado
+
+
+def _marcar_linhas_bloco(matriz: 'np.ndarray', compilado: CompiledLayout) -> 'np.ndarray':
+    """Marca as linhas do bloco que podem ter algum erro de validação"""
+    espacos_tabela = np.zeros(256, dtype=bool)
+    espacos_tabela[list(_ESPACOS_ASCII)] = True
+
+    # Linha começando com espaço
+    suspeitas = matriz[:, 0] == 32 if matriz.shape[1] else np.ones(len(matriz), dtype=bool)
+    # Qualquer byte fora do ASCII: deixar para a validação escalar
+    suspeitas |= np.any(matriz >= 128, axis=1)
+
+    for campo_compilado in compilado.campos:
+        campo = campo_compilado.campo
+        coluna = matriz[:, campo_compilado.inicio:campo_compilado.fim]
+        if coluna.shape[1] == 0:
+            suspeitas |= campo.obrigatorio
+            continue
+
+        espacos = espacos_tabela[coluna]
+        vazio = np.all(espacos, axis=1)
+
+        if campo.obrigatorio:
+            suspeitas |= vazio
+
+        preenchido = ~vazio
+        if coluna.shape[1] != campo.tamanho:
+            # Tamanho declarado diferente da fatia: todo valor preenchido gera erro
+            suspeitas |= preenchido
+            continue
+
+        if campo.tipo == TipoCampo.TEXTO:
+            continue
+
+        digitos = (coluna >= 48) & (coluna <= 57)
+        if campo.tipo in (TipoCampo.NUMERO, TipoCampo.DECIMAL):
+            validos = _mascara_digitos_validos(coluna, espacos, digitos)
+        elif campo.tipo == TipoCampo.DATA and (campo.formato or 'YYYYMMDD') == 'YYYYMMDD':
+            validos = _mascara_data_valida(coluna, espacos, digitos)
+        else:
+            # Formato não coberto pela triagem vetorizada
+            validos = np.zeros(len(coluna), dtype=bool)
+
+        suspeitas |= preenchido & ~validos
+
+    return suspeitas
+
+
+def linhas_suspeitas(dados: bytes, linhas: LinhasArquivo, compilado: CompiledLayout, tamanho_linha: int) -> List[int]:
+    """Retorna os índices (0-based) das linhas que precisam de validação escalar"""
+    buffer = np.frombuffer(dados, dtype=np.uint8)
+    largura_campos = max((c.fim for c in compilado.campos), default=0)
+    largura = max(tamanho_linha, largura_campos, 1)
+
+    marcadas: List[int] = []
+    total = len(linhas.inicios)
+    for inicio_bloco in range(0, total, LINHAS_POR_BLOCO):
+        inicios = linhas.inicios[inicio_bloco:inicio_bloco + LINHAS_POR_BLOCO]
+        fins = linhas.fins[inicio_bloco:inicio_bloco + LINHAS_POR_BLOCO]
+
+        matriz = _montar_matriz(buffer, inicios, fins, largura)
+        suspeitas = _marcar_linhas_bloco(matriz, compilado)
+
+        # Com padding só até tamanho_linha, campos além dele ficam curtos na leitura escalar
+        if largura_campos > tamanho_linha:
+            suspeitas |= np.maximum(fins - inicios, tamanho_linha) < largura_campos
+
+        marcadas.extend((np.flatnonzero(suspeitas) + inicio_bloco).tolist())
+
+    return marcadas
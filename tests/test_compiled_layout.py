@@ -0,0 +1,55 @@
+import dataclasses
+import unittest
+from src.models import CampoLayout, TipoCampo, Layout
+from src.compiled_layout import compilar_layout
+
+
+class TestCompiledLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = Layout("NFCOM", [
+            CampoLayout("NFE01-TIPO", 1, 2, TipoCampo.NUMERO, True),
+            CampoLayout("NFE01-NOME", 3, 5, TipoCampo.TEXTO, False),
+            CampoLayout("NFE22-TIPO", 1, 2, TipoCampo.NUMERO, True),
+            CampoLayout("NFE22-VALOR", 3, 4, TipoCampo.DECIMAL, True),
+        ], 7)
+
+    def test_campos_do_tipo(self):
+        """Testa filtragem dos campos por tipo de registro"""
+        compilado = compilar_layout(self.layout)
+        nomes = [c.campo.nome for c in compilado.campos_do_tipo("22")]
+        self.assertEqual(nomes, ["NFE22-TIPO", "NFE22-VALOR"])
+        self.assertEqual(len(compilado.campos_do_tipo(None)), 4)
+
+    def test_extrair_linha_curta(self):
+        """Testa extração com linha menor que o layout"""
+        compilado = compilar_layout(self.layout)
+        campos = compilado.extrair("01ABC", "01")
+        self.assertEqual(campos, {"NFE01-TIPO": "01", "NFE01-NOME": "ABC"})
+
+    def test_numeracao_do_tipo(self):
+        """Testa linha de numeração centralizada por campo"""
+        compilado = compilar_layout(self.layout)
+        self.assertEqual(compilado.numeracao_do_tipo("01"), "01|  02 |")
+
+    def test_cache_invalida_quando_campos_mudam(self):
+        """Testa reconstrução do plano quando o layout ganha campos"""
+        compilado = compilar_layout(self.layout)
+        self.assertIs(compilar_layout(self.layout), compilado)
+        self.layout.campos.append(CampoLayout("NFE99-QTD", 3, 3, TipoCampo.NUMERO, True))
+        self.assertIsNot(compilar_layout(self.layout), compilado)
+
+    def test_cache_invalida_quando_campo_e_trocado(self):
+        """Testa que campo substituído na mesma lista refaz o plano e que campos não mudam no lugar"""
+        compilado = compilar_layout(self.layout)
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            self.layout.campos[1].posicao_inicio = 4
+        self.layout.campos[1] = dataclasses.replace(self.layout.campos[1], posicao_inicio=4, posicao_fim=None)
+        novo = compilar_layout(self.layout)
+        self.assertIsNot(novo, compilado)
+        self.assertEqual(novo.extrair("01ABCDEF", "01"), {"NFE01-TIPO": "01", "NFE01-NOME": "BCDEF"})
+        self.assertEqual(self.layout.get_campo("NFE01-NOME").posicao_inicio, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+import unittest
+import tempfile
+import os
+import io
+import contextlib
+import json
+
+from src.enhanced_validator import EnhancedValidator
+from src.line_index import LineIndex
+from src.models import CampoLayout, TipoCampo, Layout
+
+
+def criar_linha(tipo_reg, dados=None, tamanho=540):
+    linha = [' '] * tamanho
+    linha[0:2] = tipo_reg
+    for (inicio, fim), valor in (dados or {}).items():
+        linha[inicio:fim] = valor.ljust(fim - inicio)
+    return ''.join(linha)
+
+
+class TestEnhancedValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.layout = Layout("TEST", [
+            CampoLayout("NFE01-NUM-FATURA", 3, 13, TipoCampo.NUMERO, True),
+            CampoLayout("NFE01-NUM-NF", 24, 9, TipoCampo.NUMERO, True),
+            CampoLayout("NFE38-PIS-VLR-BC", 49, 16, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE38-PIS-ALIQ", 65, 6, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE38-PIS-VLR", 71, 16, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE56-TOT-VLR-PIS", 113, 16, TipoCampo.DECIMAL, True),
+        ], 540)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _criar_arquivo(self, linhas) -> str:
+        caminho = os.path.join(self.temp_dir, 'dados.txt')
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        return caminho
+
+    def _nf(self, fatura, nf, itens_pis, total_pis):
+        linhas = [criar_linha("01", {(2, 15): fatura.zfill(13), (23, 32): nf.zfill(9)})]
+        for _ in range(itens_pis):
+            linhas.append(criar_linha("38", {
+                (48, 64): "000000000010000", (64, 70): "000165", (70, 86): "000000000000165"
+            }))
+        linhas.append(criar_linha("56", {(112, 128): total_pis.zfill(15)}))
+        return linhas
+
+    def test_grupos_sob_demanda(self):
+        """Testa que os grupos por NF guardam faixas e os contribuintes são relidos do índice"""
+        caminho = self._criar_arquivo(
+            [criar_linha("00")] + self._nf("1", "10", 5, "825") + ['']
+            + self._nf("2", "20", 2, "999") + [criar_linha("99")]
+        )
+        nf1 = ('1'.zfill(13), '10'.zfill(9))
+        nf2 = ('2'.zfill(13), '20'.zfill(9))
+        ev = EnhancedValidator(self.layout)
+        with LineIndex(caminho) as indice, contextlib.redirect_stdout(io.StringIO()):
+            resultado = ev.validar_arquivo(caminho, indice_linhas=indice)
+
+            # A linha em branco depois do 56 não entra no grupo; o trailer fica com a última NF
+            self.assertEqual(ev.grupos_nf[nf1]['faixas'], [[2, 9]])
+            self.assertEqual(ev.linhas_do_grupo(nf2), [10, 11, 12, 13, 14])
+            contribuintes = ev.contribuintes_do_grupo(nf1, indice)
+            self.assertEqual(contribuintes['NFE56-TOT-VLR-PIS'], [3, 4, 5, 6, 7])
+            self.assertEqual(ev.contribuintes_do_grupo(nf2, indice)['NFE56-TOT-VLR-PIS'], [11, 12])
+
+        # Só a segunda NF diverge; os exemplos de cálculo vêm das linhas dela
+        erros_total = [e for e in resultado.erros if e.erro_tipo == 'TOTAL_PIS']
+        self.assertEqual([e.linha for e in erros_total], [13])
+        self.assertIn("ln 000011", erros_total[0].descricao)
+        self.assertNotIn("itens)", erros_total[0].descricao)
+
+    def test_exemplos_limitados_no_totalizador(self):
+        """Testa que o totalizador mostra as primeiras linhas e a contagem das demais"""
+        caminho = self._criar_arquivo(self._nf("1", "10", 6, "1"))
+        ev = EnhancedValidator(self.layout)
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado = ev.validar_arquivo(caminho)
+
+        erro = next(e for e in resultado.erros if e.erro_tipo == 'TOTAL_PIS')
+        self.assertIn("ln 000002", erro.descricao)
+        self.assertIn("(+3 itens)", erro.descricao)
+        self.assertEqual(len(ev.contribuintes_nf_atual['NFE56-TOT-VLR-PIS']), EnhancedValidator.MAX_EXEMPLOS_CALCULO)
+
+    def test_blocos_em_paralelo_iguais_ao_sequencial(self):
+        """Testa que a validação por blocos de NF repete erros e estado da passada sequencial"""
+        linhas = [criar_linha("00")]
+        for i in range(12):
+            # NF 3 repetida no fim (outro bloco) e 01 consecutivos no meio
+            fatura, nf = ("1", "3") if i == 11 else (str(1 + i // 4), str(i))
+            bloco = self._nf(fatura, nf, 1 + i % 3, "165" if i % 5 else "1")
+            if i == 6:
+                bloco.insert(1, bloco[0])
+            linhas += bloco
+        caminho = self._criar_arquivo(linhas + [criar_linha("99")])
+
+        sequencial = EnhancedValidator(self.layout)
+        paralelo = EnhancedValidator(self.layout)
+        with contextlib.redirect_stdout(io.StringIO()):
+            esperado = sequencial.validar_arquivo(caminho)
+            resultado = paralelo.validar_arquivo_paralelo(caminho, processos=3, tamanho_minimo_bloco=1)
+
+        tipos = [e.erro_tipo for e in esperado.erros]
+        self.assertIn('COMBINACAO_DUPLICADA', tipos)
+        self.assertIn('ESTRUTURA_DUPLICADA', tipos)
+        self.assertEqual(list(resultado.erros), list(esperado.erros))
+        self.assertEqual(resultado.total_linhas, esperado.total_linhas)
+        self.assertEqual(paralelo.grupos_nf, sequencial.grupos_nf)
+        self.assertEqual(paralelo.duplicatas_fatura_nf, sequencial.duplicatas_fatura_nf)
+        self.assertEqual(paralelo.totais_acumulados, sequencial.totais_acumulados)
+        self.assertEqual(paralelo.total_registros_01, 13)
+
+    def test_trailer_antes_do_ultimo_bloco(self):
+        """Testa que o trailer 99 de um bloco confere com os 01 até ele, não com os do arquivo inteiro"""
+        layout = Layout("TEST", self.layout.campos + [
+            CampoLayout("NFE99-QTDE-DOC-NFCOM", 3, 9, TipoCampo.NUMERO, True)
+        ], 540)
+        linhas = [criar_linha("00")]
+        for i in range(6):
+            linhas += self._nf("1", str(i), 1, "165")
+            if i == 2:
+                # Um trailer certo para os 01 até ele e outro com o total do arquivo
+                linhas += [criar_linha("99", {(2, 11): "3".zfill(9)}), criar_linha("99", {(2, 11): "6".zfill(9)})]
+        caminho = self._criar_arquivo(linhas + [criar_linha("99", {(2, 11): "6".zfill(9)})])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            esperado = EnhancedValidator(layout).validar_arquivo(caminho)
+            resultado = EnhancedValidator(layout).validar_arquivo_paralelo(
+                caminho, processos=3, tamanho_minimo_bloco=1
+            )
+
+        erros_trailer = [(e.linha, e.valor_esperado) for e in esperado.erros if e.erro_tipo == 'TRAILER_QTD_NF']
+        self.assertEqual(erros_trailer, [(12, '3')])
+        self.assertEqual(list(resultado.erros), list(esperado.erros))
+
+    def test_medicao_das_regras(self):
+        """Testa tempo, chamadas e erros por verificação, na passada sequencial e por blocos"""
+        linhas = [criar_linha("00")]
+        for i in range(6):
+            linhas += self._nf("1", str(i % 5), 2, "165" if i % 2 else "1")
+        linhas.append(criar_linha("99"))
+        caminho = self._criar_arquivo(linhas)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(EnhancedValidator(self.layout).validar_arquivo(caminho).estatisticas_regras)
+            sequencial = EnhancedValidator(self.layout, medir_regras=True).validar_arquivo(caminho)
+            paralelo = EnhancedValidator(self.layout, medir_regras=True).validar_arquivo_paralelo(
+                caminho, processos=2, tamanho_minimo_bloco=1
+            )
+
+        for resultado in (sequencial, paralelo):
+            regras = {e.nome: e for e in resultado.estatisticas_regras}
+            self.assertEqual(regras['estrutura_consecutiva'].chamadas, len(linhas))
+            self.assertEqual(regras['registro_01'].chamadas, 6)
+            self.assertEqual(regras['totalizador_56'].chamadas, 6)
+            self.assertEqual(regras['trailer_99'].chamadas, 1)
+            self.assertEqual(sum(e.erros for e in resultado.estatisticas_regras), len(resultado.erros))
+            self.assertTrue(all(e.tempo_segundos >= 0 for e in resultado.estatisticas_regras))
+        self.assertEqual({e.nome: e.erros for e in paralelo.estatisticas_regras}['unicidade'], 1)
+
+    def test_totais_vetorizados_iguais_ao_escalar(self):
+        """Testa que a conferência dos 56 por somas segmentadas repete a passada linha a linha"""
+        linhas = [criar_linha("00"), criar_linha("56", {(112, 128): "1".zfill(15)})]
+        for i in range(8):
+            bloco = self._nf(str(i), str(i), i % 4, "165" if i % 3 else "330")
+            if i == 2:
+                # Dois 56 na mesma NF: o segundo soma também o item entre eles
+                bloco += bloco[-2:]
+            if i == 5:
+                # Acento antes do campo: a posição em bytes não é a do caractere
+                bloco[1] = bloco[1][:20] + 'ç' + bloco[1][21:]
+            linhas += bloco
+        caminho = self._criar_arquivo(linhas + [criar_linha("99")])
+
+        escalar = EnhancedValidator(self.layout, totais_vetorizados=False)
+        vetorizado = EnhancedValidator(self.layout, totais_vetorizados=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            esperado = escalar.validar_arquivo(caminho)
+            resultado = vetorizado.validar_arquivo(caminho)
+
+        self.assertTrue(vetorizado.totais_adiados or not vetorizado.totais_vetorizados)
+        self.assertGreater(sum(e.erro_tipo == 'TOTAL_PIS' for e in esperado.erros), 2)
+        self.assertEqual(list(resultado.erros), list(esperado.erros))
+        self.assertEqual(vetorizado.totais_acumulados, escalar.totais_acumulados)
+        self.assertEqual(vetorizado.contribuintes_nf_atual, escalar.contribuintes_nf_atual)
+
+    def test_transaction_id_por_posicao(self):
+        """Testa o TRANSACTION_ID_CLARO recortado do campo ou da posição das regras, com o padrão como queda"""
+        from src.rule_loader import carregar_regras_conteudo, regras_padrao
+
+        def registro_90(transaction_id, texto=''):
+            return criar_linha("90", {(9, 29): transaction_id, (100, 140): texto})
+
+        linhas = (self._nf("1", "10", 1, "165")[:1] + [registro_90("2025000000000001FTC", "2025000000000999FTC")]
+                  + self._nf("1", "11", 1, "165")[:1] + [registro_90("", "ref 2025083107360004FTC")]
+                  + self._nf("1", "12", 1, "165")[:1] + [registro_90("ID-A")]
+                  # Linha curta: o id cortado não vale
+                  + self._nf("1", "13", 1, "165")[:1] + ["90       2025083107"])
+        caminho = self._criar_arquivo(linhas)
+        chaves = [('1'.zfill(13), nf.zfill(9)) for nf in ('10', '11', '12', '13')]
+
+        def transaction_ids(ev):
+            with contextlib.redirect_stdout(io.StringIO()):
+                ev.validar_arquivo(caminho)
+            return [ev.grupos_nf[chave].get('transaction_id_claro') for chave in chaves]
+
+        # Sem posição conhecida: só o padrão (o primeiro da linha)
+        self.assertEqual(transaction_ids(EnhancedValidator(self.layout)),
+                         ['2025000000000001FTC', '2025083107360004FTC', None, None])
+
+        layout = Layout("TEST", self.layout.campos + [
+            CampoLayout(EnhancedValidator.CAMPO_TRANSACTION_ID, 10, 20, TipoCampo.TEXTO, False)
+        ], 540)
+        self.assertEqual(transaction_ids(EnhancedValidator(layout)),
+                         ['2025000000000001FTC', '2025083107360004FTC', None, None])
+
+        regras = regras_padrao()
+        regras_posicao = carregar_regras_conteudo(json.dumps({
+            "totais": regras.totals_map, "calculos": regras.calculation_validations,
+            "transaction_id": {"posicao_inicio": 101, "tamanho": 19}
+        }).encode())
+        # Posição das regras na frente do padrão: vale o segundo id da primeira linha
+        self.assertEqual(transaction_ids(EnhancedValidator(self.layout, regras_posicao)),
+                         ['2025000000000999FTC', '2025083107360004FTC', None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
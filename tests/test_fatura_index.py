@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+import os
+
+from src.fatura_index import IndiceFaturasLote, arquivo_inalterado, assinatura_arquivo
+from src.line_index import LineIndex
+from src.models import CampoLayout, TipoCampo, Layout
+from src.structural_comparator import ComparadorEstruturalArquivos
+
+
+class TestIndiceFaturasLote(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.layout = Layout("NFCOM", [
+            CampoLayout("NFCOM01-Tipo", 1, 2, TipoCampo.NUMERO, False),
+            CampoLayout("NFCOM01-Conta", 3, 15, TipoCampo.TEXTO, False),
+            CampoLayout("NFCOM01-Valor", 18, 6, TipoCampo.DECIMAL, False),
+        ], 23)
+        self.lote = os.path.join(self.temp_dir, 'lote.txt')
+        self.caminho_indice = os.path.join(self.temp_dir, 'indices', 'lote.txt.faturas.json')
+        with open(self.lote, 'wb') as f:
+            f.write('\n'.join([
+                "00CABECALHO", "01CONTA-A        000100", "05000010", "",
+                "01CONTA-B        000200", "05açúcar", "88000020", "00SEGUNDO HEADER",
+                "01CONTA-A        000300", "02Fatura 123", "99",
+            ]).encode('utf-8') + b'\n')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def test_mesmo_agrupamento_sem_varrer_o_lote(self):
+        """Testa que ler só as faixas das contas dá o mesmo agrupamento da varredura completa"""
+        indice = IndiceFaturasLote.construir(self.lote)
+        self.assertEqual((indice.total_linhas, indice.total_faturas, len(indice)), (11, 3, 2))
+        self.assertEqual(indice.tipos_por_conta, {
+            'CONTA-A        ': {'01': 2, '05': 1, '02': 1}, 'CONTA-B        ': {'01': 1, '05': 1, '88': 1}
+        })
+        self.assertEqual(indice.mapa_faturas, {'123': 10})
+
+        comparador = ComparadorEstruturalArquivos(self.layout)
+        for contas in ({'CONTA-A        '}, {'CONTA-B        '}, {'CONTA-A        ', 'CONTA-B        '}, {'OUTRA'}):
+            self.assertEqual(comparador.agrupar_por_fatura(self.lote, contas, indice),
+                             comparador.agrupar_por_fatura(self.lote, contas))
+
+    def test_linhas_pelo_numero(self):
+        """Testa que as linhas lidas pelas faixas do índice são as mesmas do LineIndex do lote"""
+        indice = IndiceFaturasLote.construir(self.lote)
+        with LineIndex(self.lote) as linhas_lote:
+            esperado = {n: linhas_lote.get_line(n) for n in range(1, 12)}
+        self.assertEqual(indice.linhas(range(1, 12)), esperado)
+        self.assertEqual(indice.linhas([10, 4, 6]), {n: esperado[n] for n in (4, 6, 10)})
+        self.assertEqual(indice.linhas([0, 12]), {})
+
+    def test_invalidacao_pelo_lote(self):
+        """Testa que o índice salvo vale com a mesma data ou o mesmo conteúdo, e não com outro conteúdo"""
+        IndiceFaturasLote.obter(self.lote, self.caminho_indice)
+        self.assertIsNotNone(IndiceFaturasLote.carregar(self.lote, self.caminho_indice))
+
+        # Só a data mudou: o hash confirma e a nova data é gravada
+        stat = os.stat(self.lote)
+        os.utime(self.lote, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        indice = IndiceFaturasLote.carregar(self.lote, self.caminho_indice)
+        self.assertEqual(indice.mtime_ns, stat.st_mtime_ns + 10**9)
+
+        # Mesmo tamanho, conteúdo diferente
+        with open(self.lote, 'r+b') as f:
+            f.seek(2)
+            f.write(b'X')
+        os.utime(self.lote, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+        self.assertIsNone(IndiceFaturasLote.carregar(self.lote, self.caminho_indice))
+        self.assertEqual(IndiceFaturasLote.obter(self.lote, self.caminho_indice).tamanho, stat.st_size)
+
+        # A mesma conferência vale para qualquer arquivo guardado por caminho
+        assinatura = assinatura_arquivo(self.lote)
+        self.assertEqual(IndiceFaturasLote.obter(self.lote, self.caminho_indice).assinatura, assinatura)
+        os.utime(self.lote, ns=(stat.st_atime_ns, stat.st_mtime_ns + 3 * 10**9))
+        self.assertTrue(arquivo_inalterado(self.lote, assinatura))
+        with open(self.lote, 'r+b') as f:
+            f.seek(2)
+            f.write(b'Y')
+        self.assertFalse(arquivo_inalterado(self.lote, assinatura))
+
+        with open(self.caminho_indice, 'w') as f:
+            f.write('{quebrado')
+        self.assertIsNone(IndiceFaturasLote.carregar(self.lote, self.caminho_indice))
+
+
+if __name__ == '__main__':
+    unittest.main()
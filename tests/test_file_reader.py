@@ -0,0 +1,63 @@
+import unittest
+import tempfile
+import os
+
+from src.file_reader import LeitorArquivo, detectar_encoding, TAMANHO_AMOSTRA
+from src.file_validator import ValidadorArquivo
+from src.models import CampoLayout, TipoCampo, Layout
+
+
+class TestLeitorArquivo(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _criar_arquivo(self, conteudo: bytes) -> str:
+        caminho = os.path.join(self.temp_dir, 'dados.txt')
+        with open(caminho, 'wb') as f:
+            f.write(conteudo)
+        return caminho
+
+    def test_detectar_encoding(self):
+        """Testa detecção de encoding pela amostra"""
+        self.assertEqual(detectar_encoding('AÇÃO'.encode('utf-8')), 'utf-8')
+        self.assertEqual(detectar_encoding('AÇÃO'.encode('latin-1')), 'latin-1')
+        # Amostra cortada no meio de um caractere multibyte continua UTF-8
+        self.assertEqual(detectar_encoding('AÇ'.encode('utf-8')[:-1]), 'utf-8')
+
+    def test_linha_latin1_depois_da_amostra_utf8(self):
+        """Testa que uma linha latin-1 após a amostra UTF-8 cai para latin-1 sem reler o arquivo"""
+        preenchimento = b'X' * TAMANHO_AMOSTRA
+        caminho = self._criar_arquivo(
+            'JOSÉ\r\n'.encode('utf-8') + preenchimento + b'\n' + 'JOÃO\n'.encode('latin-1') + b'MARIA'
+        )
+        leitor = LeitorArquivo(caminho)
+        self.assertEqual(leitor.encoding, 'utf-8')
+        self.assertEqual(
+            list(leitor.linhas_numeradas()),
+            [(1, 'JOSÉ'), (2, preenchimento.decode()), (3, 'JOÃO'), (4, 'MARIA')]
+        )
+
+    def test_arquivo_latin1(self):
+        """Testa arquivo inteiro em latin-1"""
+        caminho = self._criar_arquivo('JOSÉ\nJOÃO\n'.encode('latin-1'))
+        leitor = LeitorArquivo(caminho)
+        self.assertEqual(leitor.encoding, 'latin-1')
+        self.assertEqual(list(leitor), ['JOSÉ', 'JOÃO'])
+
+    def test_validador_nao_duplica_linhas(self):
+        """Testa que o gerador de validação emite cada linha uma única vez"""
+        caminho = self._criar_arquivo(
+            'AÉ\n'.encode('utf-8') + 'BÇ\n'.encode('latin-1') + b'CC\n'
+        )
+        layout = Layout("TEST", [CampoLayout("NOME", 1, 2, TipoCampo.TEXTO, True)], 2)
+        numeros = [numero for numero, _ in ValidadorArquivo(layout).validar_arquivo_generator(caminho)]
+        self.assertEqual(numeros, [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ from pathlib import Path
 
 from src.layout_parser import LayoutParser
 from src.file_validator import ValidadorArquivo
+from src.parallel_validator import validar_em_paralelo, dividir_em_shards
 from src.report_generator import GeradorRelatorio
 from src.models import TipoCampo
 
@@ -85,6 +86,49 @@ class TestIntegration(unittest.TestCase):
         self.assertIn('CAMPO_OBRIGATORIO', tipos_erro)  # Nome vazio
         self.assertIn('TIPO_INVALIDO', tipos_erro)      # Idade com letras
 
+    def test_validacao_vetorizada_igual_linha_a_linha(self):
+        """Testa que a triagem vetorizada produz os mesmos erros da validação linha a linha"""
+        layout = LayoutParser().parse_excel(self.layout_file)
+        validador = ValidadorArquivo(layout)
+
+        for arquivo in (self.arquivo_valido, self.arquivo_com_erros):
+            escalar = validador.validar_arquivo(arquivo, vetorizado=False)
+            vetorizado = validador.validar_arquivo(arquivo, vetorizado=True)
+
+            self.assertEqual(vetorizado.total_linhas, escalar.total_linhas)
+            self.assertEqual(vetorizado.linhas_com_erro, escalar.linhas_com_erro)
+            self.assertEqual(
+                [(e.linha, e.campo, e.erro_tipo, e.descricao) for e in vetorizado.erros],
+                [(e.linha, e.campo, e.erro_tipo, e.descricao) for e in escalar.erros]
+            )
+
+    def test_validacao_em_shards_igual_sequencial(self):
+        """Testa que a validação em shards paralelos mantém numeração global e corte de max_erros"""
+        layout = LayoutParser().parse_excel(self.layout_file)
+        validador = ValidadorArquivo(layout)
+
+        arquivo_grande = os.path.join(self.temp_dir, 'dados_grande.txt')
+        with open(arquivo_grande, 'w') as f:
+            for i in range(30):
+                f.write("PEDRO               0000000040        \n")
+                f.write("                    ABC       20231301\n")
+
+        shards = dividir_em_shards(arquivo_grande, 4, tamanho_minimo=100)
+        self.assertGreater(len(shards), 1)
+        self.assertTrue(all(fim > inicio for inicio, fim in shards))
+
+        for max_erros in (None, 5):
+            sequencial = validador.validar_arquivo(arquivo_grande, max_erros, vetorizado=False)
+            parcial = validar_em_paralelo(validador, arquivo_grande, max_erros, processos=4, tamanho_minimo_shard=100)
+            paralelo = validador._resultado_de_parcial(parcial)
+
+            self.assertEqual(paralelo.total_linhas, sequencial.total_linhas)
+            self.assertEqual(paralelo.linhas_com_erro, sequencial.linhas_com_erro)
+            self.assertEqual(
+                [(e.linha, e.campo, e.descricao) for e in paralelo.erros],
+                [(e.linha, e.campo, e.descricao) for e in sequencial.erros]
+            )
+
     def test_relatorio_generation(self):
         """Testa geração de relatórios"""
         # Parse e validação
@@ -0,0 +1,61 @@
+import unittest
+import tempfile
+import os
+
+from src.file_reader import LeitorArquivo
+from src.line_index import LineIndex
+
+
+class TestLineIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _criar_arquivo(self, conteudo: bytes) -> str:
+        caminho = os.path.join(self.temp_dir, 'dados.txt')
+        with open(caminho, 'wb') as f:
+            f.write(conteudo)
+        return caminho
+
+    def test_mesmas_linhas_do_leitor(self):
+        """Testa que o índice enxerga as mesmas linhas do leitor compartilhado"""
+        for conteudo in (b'', b'\n', b'A\r\nB\n\nC', b'A\nB\n', 'JOSÉ\nJOÃO\n'.encode('latin-1')):
+            caminho = self._criar_arquivo(conteudo)
+            with LineIndex(caminho) as indice:
+                self.assertEqual(
+                    list(indice.linhas_numeradas()),
+                    list(LeitorArquivo(caminho).linhas_numeradas()),
+                    conteudo
+                )
+
+    def test_acesso_aleatorio(self):
+        """Testa get_line, get_lines e get fora do intervalo"""
+        caminho = self._criar_arquivo(b'01AAA\r\n22BBB\r\n56CCC\r\n99DDD\r\n')
+        with LineIndex(caminho) as indice:
+            self.assertEqual(len(indice), 4)
+            self.assertEqual(indice.get_line(3), '56CCC')
+            self.assertEqual(indice.get_lines(range(2, 6)), ['22BBB', '56CCC', '99DDD'])
+            self.assertEqual(indice.get(5, ''), '')
+            self.assertNotIn(0, indice)
+            with self.assertRaises(IndexError):
+                indice.get_line(5)
+
+    def test_faixa_com_numeracao_global(self):
+        """Testa o índice de uma faixa de bytes mantendo a numeração do arquivo inteiro"""
+        caminho = self._criar_arquivo(b'00HDR\n01AAA\n22BBB\n01CCC\n99DDD\n')
+        with LineIndex(caminho) as completo:
+            inicio, fim = completo.offsets[1], completo.offsets[3]
+        with LineIndex(caminho, inicio=inicio, fim=fim, primeira_linha=2, encoding='utf-8') as indice:
+            self.assertEqual(len(indice), 2)
+            self.assertEqual(list(indice.linhas_numeradas()), [(2, '01AAA'), (3, '22BBB')])
+            self.assertEqual(indice.linhas_com_prefixo(b'01'), [2])
+            self.assertNotIn(1, indice)
+            self.assertNotIn(4, indice)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from src.models import CampoLayout, TipoCampo, ErroValidacao, ResultadoValidacao, Layout
+from src.models import CampoLayout, TipoCampo, ErroValidacao, ResultadoValidacao, Layout, ColecaoErros
+from src.validators import ErroCampo, FalhaCampo
 
 
 class TestModels(unittest.TestCase):
@@ -58,6 +59,39 @@ class TestModels(unittest.TestCase):
         self.assertEqual(layout.get_campo("CAMPO2"), campo2)
         self.assertIsNone(layout.get_campo("INEXISTENTE"))
 
+    def test_layout_get_campo_apos_alterar_campos(self):
+        """Testa que o índice por nome acompanha alterações na lista de campos"""
+        campo1 = CampoLayout("CAMPO1", 1, 10, TipoCampo.TEXTO, True)
+        layout = Layout("TEST", [campo1], 10)
+        self.assertIsNone(layout.get_campo("CAMPO2"))
+
+        campo2 = CampoLayout("CAMPO2", 11, 5, TipoCampo.NUMERO, False)
+        layout.campos.append(campo2)
+        self.assertEqual(layout.get_campo("CAMPO2"), campo2)
+
+        duplicado = CampoLayout("CAMPO1", 16, 2, TipoCampo.TEXTO, False)
+        layout.campos = [campo1, duplicado]
+        self.assertIs(layout.get_campo("CAMPO1"), campo1)
+        self.assertEqual(layout, Layout("TEST", [campo1, duplicado], 10))
+
+    def test_colecao_erros_compacta(self):
+        """Testa que a coleção colunar devolve os mesmos erros da lista original"""
+        campo = CampoLayout("IDADE", 1, 3, TipoCampo.NUMERO, True)
+        erros = [
+            ErroValidacao(2, "LINHA", "x", "ERRO_LEITURA", "Erro ao processar linha 2", "Linha válida"),
+            ErroCampo(5, campo, "A1 ", FalhaCampo('NUMERO_NAO_NUMERICO', ("A1",))),
+            ErroValidacao(5, "LINHA", "y", "ERRO_LEITURA", "Erro ao processar linha 5", "Linha válida"),
+        ]
+        resultado = ResultadoValidacao(10, 8, 2, erros)
+
+        self.assertIsInstance(resultado.erros, ColecaoErros)
+        self.assertEqual(len(resultado.erros), 3)
+        self.assertEqual(resultado.erros[0], erros[0])
+        self.assertEqual(resultado.erros[-1].descricao, "Erro ao processar linha 5")
+        self.assertEqual([e.descricao for e in resultado.erros[1:2]], [erros[1].descricao])
+        self.assertEqual(resultado.erros.contar_tipos(), {'ERRO_LEITURA': 2, 'TIPO_INVALIDO': 1})
+        self.assertEqual(resultado.erros.linhas_distintas(), {2, 5})
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,115 @@
+import unittest
+import tempfile
+import os
+import json
+
+from src.compiled_layout import compilar_layout
+from src.enhanced_validator import EnhancedValidator
+from src.models import CampoLayout, TipoCampo, Layout
+from src.rule_loader import carregar_regras, carregar_regras_conteudo, regras_do_layout, regras_padrao
+
+
+REGRAS_PIS = {
+    "totais": {"NFE56-TOT-PIS": [{"tipo": "38", "campo": "NFE38-VLR"}]},
+    "calculos": {
+        "38": {"bc_field": "NFE38-BC", "aliq_field": "NFE38-ALIQ", "valor_field": "NFE38-VLR", "nome_imposto": "PIS"}
+    }
+}
+
+
+class TestCarregarRegras(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _salvar(self, nome: str, dados) -> str:
+        caminho = os.path.join(self.temp_dir, nome)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(dados, f)
+        return caminho
+
+    def test_regras_padrao(self):
+        """Testa que as regras NFCOM padrão trazem os 7 totais e o FCP como validação adicional do 22"""
+        regras = regras_padrao()
+        self.assertEqual(len(regras.totals_map), 7)
+        self.assertEqual(regras.calculation_validations['22']['validacoes_adicionais'][0]['nome_imposto'], 'FCP')
+        self.assertIs(regras_padrao(), regras)
+
+    def test_arquivo_ao_lado_do_layout(self):
+        """Testa localização por <layout>.regras.json e queda para as regras padrão"""
+        layout = os.path.join(self.temp_dir, 'layout_pis.xlsx')
+        self.assertIs(regras_do_layout(layout), regras_padrao())
+
+        self._salvar('layout_pis.regras.json', REGRAS_PIS)
+        regras = regras_do_layout(layout)
+        self.assertEqual(list(regras.totals_map), ['NFE56-TOT-PIS'])
+
+    def test_cache_por_hash(self):
+        """Testa que o mesmo conteúdo reaproveita o conjunto e as regras compiladas por layout"""
+        conteudo = json.dumps(REGRAS_PIS).encode()
+        regras = carregar_regras_conteudo(conteudo)
+        self.assertIs(carregar_regras_conteudo(conteudo), regras)
+
+        layout = Layout("PIS", [CampoLayout("NFE38-BC", 3, 4, TipoCampo.NUMERO, True)], 10)
+        compilado = compilar_layout(layout)
+        self.assertIs(regras.regras_calculo(compilado), regras.regras_calculo(compilado))
+
+    def test_cache_limitado(self):
+        """Testa que o cache por hash guarda só os conjuntos usados por último"""
+        from src.rule_loader import MAX_REGRAS_EM_CACHE
+
+        conteudos = [json.dumps(dict(REGRAS_PIS, descricao=f"regras {i}")).encode()
+                     for i in range(MAX_REGRAS_EM_CACHE + 1)]
+        primeiras, segundas = carregar_regras_conteudo(conteudos[0]), carregar_regras_conteudo(conteudos[1])
+        for conteudo in conteudos[2:-1]:
+            carregar_regras_conteudo(conteudo)
+        self.assertIs(carregar_regras_conteudo(conteudos[0]), primeiras)  # Usadas de novo: ficam
+
+        carregar_regras_conteudo(conteudos[-1])
+        self.assertIs(carregar_regras_conteudo(conteudos[0]), primeiras)
+        self.assertIsNot(carregar_regras_conteudo(conteudos[1]), segundas)
+
+    def test_validacao_na_carga(self):
+        """Testa que problemas de estrutura são listados ao carregar"""
+        caminho = self._salvar('ruim.json', {
+            "totais": {"NFE56-TOT": [{"tipo": "5", "campo": "X"}]},
+            "calculos": {"38": {"bc_field": "A", "valor_field": "C", "nome_imposto": "PIS", "extra": 1}},
+            "outro": True
+        })
+        with self.assertRaises(ValueError) as ctx:
+            carregar_regras(caminho)
+        mensagem = str(ctx.exception)
+        self.assertIn("totais.NFE56-TOT[0]", mensagem)
+        self.assertIn("'aliq_field' obrigatório", mensagem)
+        self.assertIn("chaves desconhecidas ['extra']", mensagem)
+        self.assertIn("['outro']", mensagem)
+
+        for transaction_id in ({"posicao_inicio": 0, "tamanho": 20}, {"campo": ""}, {"campo": "X", "tamanho": 3}):
+            with self.assertRaises(ValueError) as ctx:
+                carregar_regras_conteudo(json.dumps(dict(REGRAS_PIS, transaction_id=transaction_id)).encode())
+            self.assertIn("transaction_id:", str(ctx.exception))
+
+        with self.assertRaises(FileNotFoundError):
+            carregar_regras(os.path.join(self.temp_dir, 'nao_existe.json'))
+
+    def test_validador_com_regras_do_arquivo(self):
+        """Testa o EnhancedValidator usando regras de campos fora do padrão NFCOM"""
+        layout = Layout("PIS", [
+            CampoLayout("NFE38-BC", 3, 6, TipoCampo.NUMERO, True),
+            CampoLayout("NFE38-ALIQ", 9, 4, TipoCampo.NUMERO, True),
+            CampoLayout("NFE38-VLR", 13, 6, TipoCampo.NUMERO, True),
+        ], 18)
+        ev = EnhancedValidator(layout, carregar_regras_conteudo(json.dumps(REGRAS_PIS).encode()))
+        self.assertEqual(ev.totais_acumulados, {"NFE56-TOT-PIS": 0})
+
+        erros = ev._validar_calculos_linha(1, '38', '38' + '010000' + '0165' + '000100')
+        self.assertEqual([e.erro_tipo for e in erros], ['CALCULO_ERRO_PIS'])
+        self.assertEqual(erros[0].valor_esperado, '1,65')
+
+
+if __name__ == '__main__':
+    unittest.main()
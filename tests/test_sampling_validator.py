@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+import os
+
+from src.file_validator import ValidadorArquivo
+from src.line_index import LineIndex
+from src.models import CampoLayout, TipoCampo, Layout
+from src.sampling_validator import planejar_amostra, linhas_do_plano
+
+
+class TestVerificacaoRapida(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.layout = Layout("TEST", [
+            CampoLayout("TIPO", 1, 2, TipoCampo.NUMERO, True),
+            CampoLayout("VALOR", 3, 3, TipoCampo.NUMERO, True),
+        ], 5)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _criar_arquivo(self, linhas) -> str:
+        caminho = os.path.join(self.temp_dir, 'dados.txt')
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        return caminho
+
+    def _arquivo_nf(self, quantidade_nf: int, nf_com_erro=()):
+        linhas = ['00000']
+        for nf in range(quantidade_nf):
+            linhas.append('01001')
+            linhas.append('22XXX' if nf in nf_com_erro else '22123')
+            linhas.append('56001')
+        linhas.append('99000')
+        return self._criar_arquivo(linhas)
+
+    def test_plano_por_blocos_de_nf(self):
+        """Testa header, trailer, primeiros blocos e sorteio reprodutível"""
+        caminho = self._arquivo_nf(50)
+        with LineIndex(caminho) as indice:
+            plano = planejar_amostra(indice, primeiros_blocos=2, tamanho_amostra=5, semente=7)
+            self.assertEqual(plano.total_nf, 50)
+            self.assertEqual(list(plano.cabecalho), [1])
+            self.assertEqual(list(plano.trailer), [152])
+            self.assertEqual(len(plano.sorteados), 5)
+            self.assertEqual(plano, planejar_amostra(indice, 2, 5, semente=7))
+
+            linhas = linhas_do_plano(plano)
+            self.assertEqual(linhas, sorted(linhas))
+            self.assertEqual(linhas[:7], [1, 2, 3, 4, 5, 6, 7])
+            self.assertEqual(linhas[-1], 152)
+
+    def test_amostra_completa_igual_validacao(self):
+        """Testa que, com todos os blocos verificados, a taxa é exata e igual à validação completa"""
+        caminho = self._arquivo_nf(10, nf_com_erro={3, 7})
+        validador = ValidadorArquivo(self.layout)
+
+        completo = validador.validar_arquivo(caminho)
+        amostra = validador.validar_amostra(caminho, primeiros_blocos=2, tamanho_amostra=100)
+
+        self.assertTrue(amostra.completo)
+        self.assertEqual(amostra.linhas_verificadas, completo.total_linhas)
+        self.assertEqual(amostra.linhas_com_erro, completo.linhas_com_erro)
+        self.assertAlmostEqual(amostra.taxa_sucesso_estimada, completo.taxa_sucesso)
+        self.assertEqual(amostra.intervalo_confianca, (amostra.taxa_sucesso_estimada,) * 2)
+
+    def test_estimativa_com_intervalo(self):
+        """Testa estimativa parcial: intervalo contém a estimativa e a taxa real"""
+        caminho = self._arquivo_nf(400, nf_com_erro=set(range(0, 400, 10)))
+        validador = ValidadorArquivo(self.layout)
+
+        amostra = validador.validar_amostra(caminho, primeiros_blocos=5, tamanho_amostra=100, semente=1)
+        real = validador.validar_arquivo(caminho).taxa_sucesso
+
+        self.assertFalse(amostra.completo)
+        self.assertEqual(amostra.blocos_verificados, 105)
+        inferior, superior = amostra.intervalo_confianca
+        self.assertLessEqual(inferior, amostra.taxa_sucesso_estimada)
+        self.assertLessEqual(amostra.taxa_sucesso_estimada, superior)
+        self.assertLess(superior - inferior, 5)
+        self.assertTrue(inferior <= real <= superior)
+        self.assertIn('TIPO_INVALIDO', amostra.tipos_erro)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import unittest
+import tempfile
+import os
+import io
+import json
+import contextlib
+
+from src.enhanced_validator import EnhancedValidator
+from src.models import CampoLayout, TipoCampo, Layout
+from src.line_index import LineIndex
+from src.sefaz_reconciliation import (
+    IndiceNFLote, conciliar_retorno, conferir_envio, ler_registros_json, rejeicoes_do_retorno
+)
+
+
+def criar_linha(tipo_reg, dados=None, tamanho=540):
+    linha = [' '] * tamanho
+    linha[0:2] = tipo_reg
+    for (inicio, fim), valor in (dados or {}).items():
+        linha[inicio:fim] = valor.ljust(fim - inicio)
+    return ''.join(linha)
+
+
+def retorno(transaction_id, num_nfcom, rejeicoes=()):
+    return {
+        "TRANSACTION_ID_CLARO": transaction_id,
+        "NUM_NFCOM": num_nfcom,
+        "COD_STATUS_DET_NFCOM": "2" if rejeicoes else "1",
+        "NFCOM_REJEITADA": [
+            {"COD_REJEICAO": codigo, "DSC_MENSAGEM_ERRO": [mensagem]} for codigo, mensagem in rejeicoes
+        ] or None
+    }
+
+
+class TestConciliacaoRetorno(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.layout = Layout("TEST", [
+            CampoLayout("NFE01-NUM-FATURA", 3, 13, TipoCampo.NUMERO, True),
+            CampoLayout("NFE01-NUM-NF", 24, 9, TipoCampo.NUMERO, True),
+            CampoLayout("NFE38-PIS-VLR-BC", 49, 16, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE38-PIS-ALIQ", 65, 6, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE38-PIS-VLR", 71, 16, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE56-TOT-VLR-PIS", 113, 16, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE90-TRANSACTION-ID-CLARO", 10, 20, TipoCampo.TEXTO, False),
+        ], 540)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _salvar(self, nome, linhas) -> str:
+        caminho = os.path.join(self.temp_dir, nome)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        return caminho
+
+    def _nf(self, nf, transaction_id, total_pis):
+        return [
+            criar_linha("01", {(2, 15): "1".zfill(13), (23, 32): nf.zfill(9)}),
+            criar_linha("38", {(48, 64): "000000000010000", (64, 70): "000165", (70, 86): "000000000000165"}),
+            criar_linha("56", {(112, 128): total_pis.zfill(15)}),
+            criar_linha("90", {(9, 29): transaction_id}),
+        ]
+
+    def test_leitura_linha_a_linha(self):
+        """Testa que linhas em branco são puladas e as inválidas vêm sem registro"""
+        caminho = self._salvar('retorno.txt', [json.dumps({"A": 1}), '', '{quebrado', '[1, 2]'])
+        self.assertEqual(list(ler_registros_json(caminho)), [(1, {"A": 1}), (3, None), (4, None)])
+        self.assertEqual(
+            rejeicoes_do_retorno(retorno("X", "1", [("G114", " Rejeição G114: Total do FCP difere")])),
+            ["G114: Total do FCP difere"]
+        )
+
+    def test_rejeitadas_com_e_sem_erro_local(self):
+        """Testa o cruzamento pelo TRANSACTION_ID_CLARO com os erros locais de cada NF"""
+        lote = self._salvar('lote.txt', [criar_linha("00")] + self._nf("10", "2025000000000010FTC", "165")
+                            + self._nf("11", "2025000000000011FTC", "999") + self._nf("12", "2025000000000012FTC", "1")
+                            + self._nf("13", "2025000000000013FTC", "165") + [criar_linha("99")])
+        caminho_retorno = self._salvar('retorno.txt', [json.dumps(r) for r in (
+            retorno("2025000000000010FTC", "10", [("427", "Rejeição: IE do Destinatário inválida")]),
+            retorno("2025000000000011FTC", "11"),
+            # Reenvio: vale o último registro
+            retorno("2025000000000011FTC", "11", [("G114", " Rejeição G114: Total do FCP difere")]),
+            retorno("2025000000000012FTC", "12"),
+            retorno("2099000000000001FTC", "1"),
+        )])
+
+        ev = EnhancedValidator(self.layout)
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado = ev.validar_arquivo(lote)
+        conciliacao = conciliar_retorno(caminho_retorno, ev.grupos_nf, resultado.erros.linhas_e_tipos())
+
+        self.assertEqual(conciliacao.total_registros, 5)
+        self.assertEqual(conciliacao.registros_fora_do_lote, 1)
+        self.assertEqual(conciliacao.nfs_sem_retorno, 1)
+        self.assertEqual([nf.nf for nf in conciliacao.rejeitadas_com_erro_local], ['000000011'])
+        self.assertEqual(conciliacao.rejeitadas_com_erro_local[0].erros_locais, ['TOTAL_PIS'])
+        self.assertEqual(conciliacao.rejeitadas_com_erro_local[0].rejeicoes, ['G114: Total do FCP difere'])
+        self.assertEqual([nf.rejeicoes for nf in conciliacao.rejeitadas_sem_erro_local],
+                         [['427: IE do Destinatário inválida']])
+        self.assertEqual([nf.nf for nf in conciliacao.autorizadas_com_erro_local], ['000000012'])
+        self.assertEqual(conciliacao.autorizadas_sem_erro_local, 0)
+
+
+class TestConferenciaEnvio(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.layout = Layout("TEST", [
+            CampoLayout("NFE01-NUM-FATURA", 3, 13, TipoCampo.NUMERO, True),
+            CampoLayout("NFE01-SERIE-NF", 21, 3, TipoCampo.NUMERO, True),
+            CampoLayout("NFE01-NUM-NF", 24, 9, TipoCampo.NUMERO, True),
+            CampoLayout("NFE56-TOT-VLR-PIS", 113, 16, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE56-TOT-VLR-COFINS", 129, 16, TipoCampo.DECIMAL, True),
+        ], 540)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _salvar(self, nome, linhas) -> str:
+        caminho = os.path.join(self.temp_dir, nome)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        return caminho
+
+    def _nf(self, nf, pis, cofins, serie="057"):
+        return [
+            criar_linha("01", {(2, 15): "1".zfill(13), (20, 23): serie, (23, 32): nf.zfill(9)}),
+            criar_linha("38"),
+            criar_linha("56", {(112, 128): pis.zfill(15), (128, 144): cofins.zfill(15)}),
+        ]
+
+    def test_indice_por_numero_da_nf(self):
+        """Testa o índice NF -> linhas do 01 e do 56, com NF sem 56 e NF repetida"""
+        caminho = self._salvar('lote.txt', [criar_linha("00")] + self._nf("30", "1", "1")
+                               + self._nf("10", "1", "1")[:2] + self._nf("30", "2", "2") + [criar_linha("99")])
+        with LineIndex(caminho) as indice:
+            indice_nf = IndiceNFLote(indice)
+        self.assertEqual(len(indice_nf), 2)
+        self.assertEqual(indice_nf.repetidas, 1)
+        self.assertEqual(indice_nf.procurar(30), (2, 4))
+        self.assertEqual(indice_nf.procurar(10), (5, 0))
+        self.assertIsNone(indice_nf.procurar(20))
+
+    def test_totais_inteiros_no_envio(self):
+        """Testa que total inteiro no envio (número JSON ou $numberDecimal sem ponto) vale em reais"""
+        lote = self._salvar('lote.txt', [criar_linha("00")] + self._nf("12", "1000", "500") + [criar_linha("99")])
+        caminho_envio = self._salvar('envio.txt', [
+            json.dumps({"NUM_NFCOM": 12, "NUM_SERIE_NF": 57,
+                        "TOTAL_NFCOM": {"VLR_TOT_PIS": 10, "VLR_TOT_COFINS": {"$numberDecimal": "5"}}}),
+            json.dumps({"NUM_NFCOM": 12, "NUM_SERIE_NF": 57,
+                        "TOTAL_NFCOM": {"VLR_TOT_PIS": 10.0, "VLR_TOT_COFINS": {"$numberDecimal": "0.05"}}}),
+        ])
+        with LineIndex(lote) as indice:
+            conferencia = conferir_envio(caminho_envio, indice, self.layout)
+
+        self.assertEqual((conferencia.nfs_conferidas, conferencia.nfs_com_diferenca), (2, 1))
+        self.assertEqual([(d.campo_layout, d.valor_envio, d.valor_txt) for d in conferencia.diferencas],
+                         [('NFE56-TOT-VLR-COFINS', '0.05', '000000000000500')])
+
+    def test_diferencas_campo_a_campo(self):
+        """Testa série e totais do envio comparados com os registros 01/56 do lote"""
+        lote = self._salvar('lote.txt', [criar_linha("00")] + self._nf("10", "91", "423")
+                            + self._nf("11", "50", "100", serie="058") + [criar_linha("99")])
+
+        def envio(num_nfcom, pis, cofins):
+            return json.dumps({
+                "NUM_NFCOM": num_nfcom, "NUM_SERIE_NF": 57, "NUM_MODELO_NFCOM": 62,
+                "TOTAL_NFCOM": {"VLR_TOT_PIS": {"$numberDecimal": pis}, "VLR_TOT_COFINS": {"$numberDecimal": cofins}}
+            })
+
+        caminho_envio = self._salvar('envio.txt', [
+            envio(10, "0.91", "4.23"), envio(11, "0.50", "1.10"), envio(99, "1.00", "1.00"), 'x'
+        ])
+        with LineIndex(lote) as indice:
+            conferencia = conferir_envio(caminho_envio, indice, self.layout)
+
+        self.assertEqual((conferencia.total_registros, conferencia.nfs_conferidas), (3, 2))
+        self.assertEqual((conferencia.nfs_com_diferenca, conferencia.registros_fora_do_lote), (1, 1))
+        self.assertEqual(conferencia.linhas_invalidas, [4])
+        self.assertEqual(conferencia.campos_sem_layout, [
+            'NFE01-MODELO-NF', 'NFE56-TOT-VLR-BC', 'NFE56-TOT-VLR-ICMS', 'NFE56-TOT-VLR-FCP',
+            'NFE56-TOT-VLR-FUST', 'NFE56-TOT-VLR-FUNTEL'
+        ])
+        self.assertEqual(
+            [(d.num_nfcom, d.campo_layout, d.linha, d.valor_envio, d.valor_txt) for d in conferencia.diferencas],
+            [('11', 'NFE01-SERIE-NF', 5, '57', '058'),
+             ('11', 'NFE56-TOT-VLR-COFINS', 7, '1.10', '000000000000100')]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import unittest
+import random
+import tempfile
+import os
+from unittest import mock
+
+from src.models import CampoLayout, TipoCampo, Layout
+from src.line_index import LineIndex
+from src import structural_comparator
+from src.structural_comparator import HAS_NUMPY, ComparadorEstruturalArquivos
+
+
+class TestMascaraComparacao(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = Layout("NFCOM", [
+            CampoLayout("NFCOM01-Tipo", 1, 2, TipoCampo.NUMERO, False),
+            CampoLayout("NFCOM01-Número da CPS/Fatura", 3, 6, TipoCampo.NUMERO, False),
+            CampoLayout("NFCOM01-Data da Emissão", 9, 8, TipoCampo.DATA, False, "YYYYMMDD"),
+            CampoLayout("NFCOM01-Nome", 17, 5, TipoCampo.TEXTO, False),
+            CampoLayout("NFCOM01-Valor", 22, 4, TipoCampo.DECIMAL, False),
+            CampoLayout("NFCOM01-Cidade", 26, 6, TipoCampo.TEXTO, True),
+            CampoLayout("NFCOM01-Hash-Code editado", 32, 3, TipoCampo.TEXTO, False),
+        ], 34)
+        self.ignorados = {'NFCOM01-Número da CPS/Fatura', 'NFCOM01-Data da Emissão'}
+        self.comparador = ComparadorEstruturalArquivos(
+            self.layout, campos_ignorados=self.ignorados,
+            campos_ignorar_se_preenchido={'NFCOM01-Hash-Code editado'}
+        )
+
+    def test_mascara_do_tipo(self):
+        """Testa trechos unidos sem os ignorados e campos com verificação própria"""
+        mascara = self.comparador.mascara_do_tipo('01')
+        self.assertEqual(mascara.trechos, ((0, 2), (16, 31)))
+        self.assertEqual(mascara.trechos_numericos, ((0, 2), (21, 25)))
+        self.assertEqual([c.campo.nome for c in mascara.campos_conferidos],
+                         ['NFCOM01-Cidade', 'NFCOM01-Hash-Code editado'])
+        self.assertIs(self.comparador.mascara_do_tipo('01'), mascara)
+
+    def test_par_igual_na_mascara(self):
+        """Testa que diferenças só em campos ignorados não geram diferença"""
+        base = "01" + "000001" + "20250101" + "ABCDE" + "0100" + "CAMPIN" + "H01"
+        validado = "01" + "000999" + "20251231" + "ABCDE" + "0100" + "CAMPIN" + "XYZ"
+        self.assertTrue(self.comparador._iguais_fora_dos_ignorados(base, validado, '01'))
+        self.assertEqual(self.comparador.comparar_campos_linha(base, validado, 1, '01'), [])
+
+        # Hash-Code vazio no validado: cai no diff campo a campo
+        diferencas = self.comparador.comparar_campos_linha(base, validado[:-3] + "   ", 1, '01')
+        self.assertEqual([d.tipo_diferenca for d in diferencas], ['CAMPO_VAZIO_NO_DEV'])
+
+    def test_campos_tocados(self):
+        """Testa que só os campos tocados, com formato em aberto ou sempre conferidos são comparados"""
+        base = "01" + "000001" + "20250101" + "ABCDE" + "0100" + "CAMPIN" + "H01"
+        validado = "01" + "000999" + "20250101" + "ABXDE" + "01 0" + "CAMPIN" + "H01"
+        campos = self.comparador._campos_a_comparar(base, validado, '01')
+        nomes = [campo_compilado.campo.nome for _, campo_compilado in campos]
+        if not HAS_NUMPY:
+            self.assertEqual(len(nomes), 7)
+            return
+        self.assertEqual([sequencia for sequencia, _ in campos], [4, 5, 6, 7])
+        self.assertEqual(nomes, ['NFCOM01-Nome', 'NFCOM01-Valor', 'NFCOM01-Cidade', 'NFCOM01-Hash-Code editado'])
+        self.assertEqual([d.nome_campo for d in self.comparador.comparar_campos_linha(base, validado, 1, '01')],
+                         ['NFCOM01-Nome', 'NFCOM01-Valor'])
+
+    def test_campos_com_nome_repetido(self):
+        """Testa que campos com o mesmo nome (ex.: NFCOM04-Mensagem ×3 no PrintCenter) são
+        comparados cada um na sua posição, não todos com o valor da última cópia"""
+        layout = Layout("NFCOM", [
+            CampoLayout("NFCOM04-Tipo", 1, 2, TipoCampo.NUMERO, False),
+            CampoLayout("NFCOM04-Mensagem", 3, 4, TipoCampo.TEXTO, False),
+            CampoLayout("NFCOM04-Mensagem", 7, 4, TipoCampo.TEXTO, False),
+            CampoLayout("NFCOM04-Mensagem", 11, 4, TipoCampo.TEXTO, False),
+        ], 14)
+        comparador = ComparadorEstruturalArquivos(layout)
+
+        def diferencas(base, validado):
+            return [(d.posicao_inicio, d.sequencia_campo, d.valor_base, d.valor_validado)
+                    for d in comparador.comparar_campos_linha(base, validado, 1, '04')]
+
+        self.assertEqual(diferencas("04AAAABBBBCCCC", "04XXXXBBBBCCCC"), [(3, 2, 'AAAA', 'XXXX')])
+        self.assertEqual(diferencas("04AAAABBBBCCCC", "04AAAABBBBXXXX"), [(11, 4, 'CCCC', 'XXXX')])
+        self.assertEqual(diferencas("04AAAABBBBCCCC", "04AAAABBBBCCCC"), [])
+
+    def test_mesmo_resultado_do_campo_a_campo(self):
+        """Testa que o caminho rápido e os campos tocados repetem a comparação campo a campo"""
+        lento = ComparadorEstruturalArquivos(
+            self.layout, campos_ignorados=self.ignorados,
+            campos_ignorar_se_preenchido={'NFCOM01-Hash-Code editado'}
+        )
+        lento._iguais_fora_dos_ignorados = lambda *args: False
+        lento._campos_a_comparar = lambda base, validado, tipo: enumerate(lento.compilado.campos_do_tipo(tipo), 1)
+
+        rnd = random.Random(7)
+        caracteres = "0123456789 A²"
+        rapidos = 0
+        for _ in range(3000):
+            base = ''.join(rnd.choice(caracteres) for _ in range(34))
+            validado = list(base)
+            for _ in range(rnd.choice([0, 0, 1, 2])):
+                validado[rnd.randrange(34)] = rnd.choice(caracteres)
+            validado = ''.join(validado)[:rnd.choice([34, 34, 34, 30, 20])]
+            if rnd.random() < 0.5:
+                # Maioria só de dígitos, como nos arquivos reais
+                base = validado = ''.join(rnd.choice("0123456789") for _ in range(31)) + validado[31:]
+            rapidos += self.comparador._iguais_fora_dos_ignorados(base, validado, '01')
+            self.assertEqual(self.comparador.comparar_campos_linha(base, validado, 1, '01'),
+                             lento.comparar_campos_linha(base, validado, 1, '01'))
+        self.assertGreater(rapidos, 0)
+
+
+class TestLinhasSobDemanda(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.layout = Layout("NFCOM", [
+            CampoLayout("NFCOM01-Tipo", 1, 2, TipoCampo.NUMERO, False),
+            CampoLayout("NFCOM01-Conta", 3, 15, TipoCampo.TEXTO, False),
+            CampoLayout("NFCOM01-Valor", 18, 6, TipoCampo.DECIMAL, False),
+            CampoLayout("NFCOM05-Tipo", 1, 2, TipoCampo.NUMERO, False),
+            CampoLayout("NFCOM05-Valor", 3, 6, TipoCampo.DECIMAL, False),
+        ], 23)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _salvar(self, nome, linhas) -> str:
+        caminho = os.path.join(self.temp_dir, nome)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        return caminho
+
+    def test_referencias_e_visualizacao_sob_demanda(self):
+        """Testa que o resultado guarda só os números das linhas e a visualização é remontada igual"""
+        base = self._salvar('base.txt', [
+            "00CABECALHO", "01CONTA-A        000100", "05000010", "88000020",
+            "01CONTA-B        000200", "05000030", "99"
+        ])
+        validado = self._salvar('validado.txt', [
+            "00CABECALHO", "01CONTA-B        000201", "05000030", "01CONTA-A        000100", "88000021", "05000010"
+        ])
+
+        imediato = ComparadorEstruturalArquivos(self.layout).comparar_arquivos_por_tipo_registro(base, validado)
+        comparador = ComparadorEstruturalArquivos(self.layout, linhas_sob_demanda=True)
+        resultado = comparador.comparar_arquivos_por_tipo_registro(base, validado)
+
+        self.assertEqual(len(resultado.todas_linhas), len(imediato.todas_linhas))
+        self.assertTrue(all(not d.arquivo_base_linha and not d.linha_numeracao for d in resultado.todas_linhas))
+        self.assertEqual(
+            [(d.numero_linha_base, d.numero_linha_validado, d.tipo_registro) for d in resultado.todas_linhas],
+            [(1, 1, '00'), (5, 2, '01'), (6, 3, '05'), (2, 4, '01'), (3, 5, '05'), (4, 6, '05')]
+        )
+
+        with LineIndex(base) as indice_base, LineIndex(validado) as indice_validado:
+            for sob_demanda, esperado in zip(resultado.todas_linhas, imediato.todas_linhas):
+                linhas = comparador.linhas_do_par(
+                    indice_base, indice_validado, sob_demanda.numero_linha_base, sob_demanda.numero_linha_validado
+                )
+                self.assertEqual(
+                    comparador.renderizar_linhas(*linhas, sob_demanda.tipo_registro),
+                    (esperado.arquivo_base_linha, esperado.arquivo_validado_linha, esperado.linha_numeracao)
+                )
+                self.assertEqual(sob_demanda.diferencas_campos, esperado.diferencas_campos)
+
+        relatorio = comparador.gerar_relatorio_completo(resultado, base, validado)
+        self.assertIn("BASE:      05|000010|\nVALIDADO:  88|000021|", relatorio)
+
+
+    def test_faturas_em_paralelo(self):
+        """Testa que a comparação das faturas num pool de processos dá o mesmo resultado, na mesma ordem"""
+        rnd = random.Random(3)
+        base, validado = ["00CABECALHO"], ["00CABECALHO"]
+        for numero in range(40):
+            conta = f"CONTA-{numero:03d}".ljust(15)
+            linhas = [f"01{conta}{numero:06d}"] + [f"05{rnd.randrange(10**6):06d}" for _ in range(rnd.randrange(1, 6))]
+            base.extend(linhas)
+            if numero % 7:
+                validado.extend(linha if rnd.random() < 0.7 else linha[:-1] + "9" for linha in linhas)
+        validado.extend(["01CONTA-SEM-BASE 000001", "05000001"])
+        caminho_base, caminho_validado = self._salvar('base.txt', base), self._salvar('validado.txt', validado)
+
+        comparador = ComparadorEstruturalArquivos(self.layout)
+        sequencial = comparador.comparar_arquivos_por_tipo_registro(caminho_base, caminho_validado)
+        with mock.patch.object(structural_comparator, 'FATURAS_MINIMAS_POR_PROCESSO', 5):
+            paralelo = comparador.comparar_arquivos_por_tipo_registro(caminho_base, caminho_validado, processos=3)
+
+        self.assertEqual(paralelo, sequencial)
+        self.assertEqual(paralelo.contas_nao_encontradas, ['CONTA-SEM-BASE '])
+        self.assertGreater(paralelo.linhas_com_diferencas, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from src.tax_rules import RegrasCalculo, decimal_para_centavos, digitos_para_int
+
+
+CONFIG = {
+    '22': {
+        'bc_field': 'BC', 'aliq_field': 'ALIQ', 'valor_field': 'VLR', 'nome_imposto': 'ICMS',
+        'validacoes_adicionais': [
+            {'bc_field': 'BC', 'aliq_field': 'ALIQ-FCP', 'valor_field': 'VLR-FCP', 'nome_imposto': 'FCP'}
+        ]
+    }
+}
+FATIAS = {
+    'BC': (slice(2, 8), 8), 'ALIQ': (slice(8, 12), 12), 'VLR': (slice(12, 18), 18),
+    'ALIQ-FCP': (slice(18, 22), 22), 'VLR-FCP': (slice(22, 28), 28),
+}
+
+
+def linha_22(bc, aliq, valor, aliq_fcp, valor_fcp):
+    return '22' + bc.zfill(6) + aliq.zfill(4) + valor.zfill(6) + aliq_fcp.zfill(4) + valor_fcp.zfill(6)
+
+
+class TestRegrasCalculo(unittest.TestCase):
+
+    def setUp(self):
+        self.regras = RegrasCalculo(CONFIG, FATIAS.get)
+
+    def test_conversores(self):
+        """Testa conversão para centavos igual à comparação"""
+        self.assertEqual(digitos_para_int('00012,34'), 1234)
+        self.assertEqual(digitos_para_int(''), 0)
+        self.assertEqual(decimal_para_centavos('000150'), 150)
+        self.assertEqual(decimal_para_centavos('1.5'), 150)
+        self.assertEqual(decimal_para_centavos('abc.5'), 0)
+
+    def test_avaliar(self):
+        """Testa linha correta, cálculo divergente e valor zerado"""
+        # BC=100,00 × 0,65% = 0,65
+        self.assertEqual(self.regras.avaliar('22', linha_22('10000', '65', '65', '65', '65')), [])
+
+        falhas = self.regras.avaliar('22', linha_22('10000', '65', '7', '65', '0'))
+        self.assertEqual([f.erro_tipo for f in falhas], ['CALCULO_ERRO_ICMS', 'VALOR_ZERADO_FCP'])
+        self.assertEqual((falhas[0].declarado, falhas[0].calculado), (7, 65))
+        self.assertEqual(falhas[1].calculado, 65)
+
+        # Linha curta: campos ausentes não são validados
+        self.assertEqual(self.regras.avaliar('22', '220100'), [])
+        self.assertEqual(self.regras.avaliar('38', linha_22('10000', '65', '7', '65', '0')), [])
+
+    def test_avaliar_lote_igual_por_linha(self):
+        """Testa que a avaliação em lote devolve as mesmas falhas, na ordem das linhas"""
+        linhas = list(enumerate([
+            linha_22('10000', '65', '7', '65', '0'),
+            '01' + 'X' * 26,
+            linha_22('10000', '65', '65', '65', '65'),
+            linha_22('10000', '65', '65', '65', '66'),
+        ], 1))
+        esperado = [(n, f) for n, linha in linhas for f in self.regras.avaliar(linha[:2], linha)]
+        self.assertEqual(list(self.regras.avaliar_lote(linhas)), esperado)
+        self.assertEqual([n for n, _ in esperado], [1, 1, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
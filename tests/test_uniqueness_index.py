@@ -0,0 +1,112 @@
+import unittest
+import tempfile
+import os
+import io
+import contextlib
+
+from src.enhanced_validator import EnhancedValidator
+from src.models import CampoLayout, TipoCampo, Layout
+from src.uniqueness_index import FiltroBloom, IndiceUnicidadeNF, fatura_nf_do_registro_01
+
+
+def criar_linha(tipo_reg, dados=None, tamanho=540):
+    linha = [' '] * tamanho
+    linha[0:2] = tipo_reg
+    for (inicio, fim), valor in (dados or {}).items():
+        linha[inicio:fim] = valor.ljust(fim - inicio)
+    return ''.join(linha)
+
+
+def registro_01(fatura, nf):
+    return criar_linha("01", {(2, 15): fatura.zfill(13), (23, 32): nf.zfill(9)})
+
+
+class TestIndiceUnicidadeNF(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.lotes_dir = os.path.join(self.temp_dir, 'lotes')
+        os.mkdir(self.lotes_dir)
+        self.banco = os.path.join(self.temp_dir, 'indice.sqlite3')
+        self.layout = Layout("TEST", [
+            CampoLayout("NFE01-NUM-FATURA", 3, 13, TipoCampo.NUMERO, True),
+            CampoLayout("NFE01-NUM-NF", 24, 9, TipoCampo.NUMERO, True),
+        ], 540)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _salvar_lote(self, nome, combinacoes) -> str:
+        caminho = os.path.join(self.lotes_dir, nome)
+        linhas = [criar_linha("00")] + [registro_01(f, n) for f, n in combinacoes] + [criar_linha("99")]
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        return caminho
+
+    def test_filtro_bloom(self):
+        """Testa que o filtro não tem falso negativo e mantém a taxa de falso positivo"""
+        filtro = FiltroBloom(1000, 0.01)
+        for i in range(1000):
+            filtro.adicionar(f"F{i}".encode())
+        self.assertTrue(all(f"F{i}".encode() in filtro for i in range(1000)))
+        falsos_positivos = sum(f"X{i}".encode() in filtro for i in range(10000))
+        self.assertLess(falsos_positivos, 300)
+
+        caminho = os.path.join(self.temp_dir, 'filtro.bloom')
+        filtro.salvar(caminho)
+        carregado = FiltroBloom.carregar(caminho, 1000)
+        self.assertEqual((carregado.bits, carregado.funcoes, carregado.itens), (filtro.bits, filtro.funcoes, 1000))
+        self.assertIn(b"F10", carregado)
+        self.assertIsNone(FiltroBloom.carregar(os.path.join(self.temp_dir, 'nao_existe.bloom'), 1000))
+
+    def test_registro_de_lotes(self):
+        """Testa registro, lote inalterado pulado, substituição e remoção"""
+        self._salvar_lote('lote1.txt', [('1', '10'), ('1', '11'), ('2', '10')])
+        self._salvar_lote('lote2.txt', [('3', '30')])
+        self.assertEqual(fatura_nf_do_registro_01(registro_01('1', '10')), ('0000000000001', '000000010'))
+        self.assertIsNone(fatura_nf_do_registro_01('01' + '0' * 20))
+
+        with IndiceUnicidadeNF(self.banco, capacidade=100) as indice:
+            self.assertEqual(indice.registrar_pasta(self.lotes_dir), 2)
+            self.assertEqual(indice.lotes(), [('lote1.txt', 3), ('lote2.txt', 1)])
+            self.assertEqual(indice.procurar('0000000000001', '000000011'), ('lote1.txt', 3))
+            self.assertIsNone(indice.procurar('0000000000001', '000000011', ignorar_lote='lote1.txt'))
+            self.assertIsNone(indice.procurar('0000000000009', '000000099'))
+
+        # Filtro recarregado do arquivo; lote alterado substitui as combinações antigas
+        self._salvar_lote('lote2.txt', [('4', '40')])
+        with IndiceUnicidadeNF(self.banco, capacidade=100) as indice:
+            self.assertEqual(indice.filtro.itens, 4)
+            indice.registrar_pasta(self.lotes_dir)
+            self.assertIsNone(indice.procurar('0000000000003', '000000030'))
+            self.assertEqual(indice.procurar('0000000000004', '000000040'), ('lote2.txt', 2))
+            indice.remover_lote('lote2.txt')
+            self.assertIsNone(indice.procurar('0000000000004', '000000040'))
+            self.assertEqual(indice.quantidade(), 3)
+
+    def test_capacidade_excedida_reconstroi_filtro(self):
+        """Testa que passar da capacidade refaz o filtro maior, sem perder combinações"""
+        with IndiceUnicidadeNF(self.banco, capacidade=4) as indice:
+            indice.registrar_lote(self._salvar_lote('grande.txt', [('1', str(i)) for i in range(20)]))
+            self.assertGreaterEqual(indice.filtro.capacidade, 20)
+            self.assertTrue(all(indice.procurar('0000000000001', str(i).zfill(9)) for i in range(20)))
+
+    def test_validador_aponta_duplicata_entre_lotes(self):
+        """Testa o erro COMBINACAO_DUPLICADA_LOTE, sem contar o próprio lote"""
+        anterior = self._salvar_lote('lote_ontem.txt', [('1', '10'), ('1', '11')])
+        with IndiceUnicidadeNF(self.banco) as indice:
+            indice.registrar_lote(anterior)
+            indice.registrar_lote(self._salvar_lote('lote_hoje.txt', [('1', '11'), ('1', '12'), ('1', '12')]))
+
+            ev = EnhancedValidator(self.layout, indice_unicidade=indice)
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultado = ev.validar_arquivo(os.path.join(self.lotes_dir, 'lote_hoje.txt'))
+            erros = [(e.linha, e.erro_tipo) for e in resultado.erros if e.erro_tipo.startswith('COMBINACAO')]
+            self.assertEqual(erros, [(2, 'COMBINACAO_DUPLICADA_LOTE'), (4, 'COMBINACAO_DUPLICADA')])
+            self.assertIn('lote lote_ontem.txt (linha 3)',
+                          next(e.descricao for e in resultado.erros if e.erro_tipo == 'COMBINACAO_DUPLICADA_LOTE'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+import tempfile
+import os
+import io
+import contextlib
+
+from src.enhanced_validator import EnhancedValidator
+from src.models import CampoLayout, ErroLinhasCitadas, ErroValidacao, ModeloErroLinhas, TipoCampo, Layout, ParcialBlocoNF
+from src.validation_cache import CacheBlocosNF, deslocar_parcial
+
+
+def criar_linha(tipo_reg, dados=None, tamanho=540):
+    linha = [' '] * tamanho
+    linha[0:2] = tipo_reg
+    for (inicio, fim), valor in (dados or {}).items():
+        linha[inicio:fim] = valor.ljust(fim - inicio)
+    return ''.join(linha)
+
+
+def nf(fatura, numero, valores_pis, total_pis):
+    linhas = [criar_linha("01", {(2, 15): fatura.zfill(13), (23, 32): numero.zfill(9)})]
+    for valor in valores_pis:
+        linhas.append(criar_linha("38", {
+            (48, 64): "000000000010000", (64, 70): "000165", (70, 86): valor.zfill(15)
+        }))
+    linhas.append(criar_linha("56", {(112, 128): total_pis.zfill(15)}))
+    return linhas
+
+
+class TestCacheBlocosNF(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.banco = os.path.join(self.temp_dir, 'cache.sqlite3')
+        self.layout = Layout("TEST", [
+            CampoLayout("NFE01-NUM-FATURA", 3, 13, TipoCampo.NUMERO, True),
+            CampoLayout("NFE01-NUM-NF", 24, 9, TipoCampo.NUMERO, True),
+            CampoLayout("NFE38-PIS-VLR-BC", 49, 16, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE38-PIS-ALIQ", 65, 6, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE38-PIS-VLR", 71, 16, TipoCampo.DECIMAL, True),
+            CampoLayout("NFE56-TOT-VLR-PIS", 113, 16, TipoCampo.DECIMAL, True),
+        ], 540)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def _salvar(self, nfs) -> str:
+        caminho = os.path.join(self.temp_dir, 'dados.txt')
+        linhas = [criar_linha("00")] + [linha for bloco in nfs for linha in bloco] + [criar_linha("99")]
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        return caminho
+
+    def _validar(self, caminho):
+        sequencial = EnhancedValidator(self.layout)
+        incremental = EnhancedValidator(self.layout)
+        with contextlib.redirect_stdout(io.StringIO()), CacheBlocosNF(self.banco) as cache:
+            esperado = sequencial.validar_arquivo(caminho)
+            resultado = incremental.validar_arquivo_incremental(caminho, cache)
+        self.assertEqual(list(resultado.erros), list(esperado.erros))
+        self.assertEqual(incremental.grupos_nf, sequencial.grupos_nf)
+        self.assertEqual(incremental.totais_acumulados, sequencial.totais_acumulados)
+        return incremental.blocos_reaproveitados
+
+    def test_revalidacao_so_dos_blocos_alterados(self):
+        """Testa o reaproveitamento do cache, inclusive de blocos que mudaram de posição"""
+        nfs = [nf("1", str(i), ["165"] * (1 + i % 3), "1" if i % 4 == 0 else str(165 * (1 + i % 3))) for i in range(8)]
+        nfs[5] = nfs[2]  # Fatura + NF duplicada: o erro de duplicata não vem do cache
+        caminho = self._salvar(nfs)
+
+        # O bloco do header e a última NF (trailer) são sempre validados
+        self.assertEqual(self._validar(caminho), 0)
+        self.assertEqual(self._validar(caminho), 7)
+
+        # Corrigir o total da NF 4 e incluir um item na NF 1: as seguintes mudam de posição
+        nfs[4] = nf("1", "4", ["165", "165"], "330")
+        nfs[1] = nf("1", "1", ["165"] * 3, "495")
+        self.assertEqual(self._validar(self._salvar(nfs)), 5)
+
+    def test_trailer_antes_do_ultimo_bloco(self):
+        """Testa que o trailer 99 no meio confere com os 01 até ele, também vindo do cache"""
+        self.layout = Layout("TEST", self.layout.campos + [
+            CampoLayout("NFE99-QTDE-DOC-NFCOM", 3, 9, TipoCampo.NUMERO, True)
+        ], 540)
+        nfs = [nf("1", str(i), ["165"], "165") for i in range(6)]
+        # Um trailer certo para os 01 até ele e outro com o total do arquivo
+        nfs[2] = nfs[2] + [criar_linha("99", {(2, 11): "3".zfill(9)}), criar_linha("99", {(2, 11): "6".zfill(9)})]
+        caminho = self._salvar(nfs)
+
+        self.assertEqual(self._validar(caminho), 0)
+        self.assertEqual(self._validar(caminho), 5)
+        # Última NF levada para o início: mesma quantidade de NF no arquivo e o bloco do trailer
+        # com os mesmos bytes, mas com outros 01 antes dele (e a NF 0 depois de um 56): só as
+        # NFs 1 e 3 vêm do cache
+        self.assertEqual(self._validar(self._salvar(nfs[5:] + nfs[:5])), 2)
+
+    def test_deslocar_linhas_citadas(self):
+        """Testa o deslocamento das linhas do bloco e das citadas nas descrições, guardadas como dado"""
+        parcial = ParcialBlocoNF(
+            primeira_linha=10, total_linhas=3,
+            erros=[ErroLinhasCitadas(12, ModeloErroLinhas('NFE56-TOT-VLR-PIS', 'TOTAL_PIS',
+                                                          'Total PIS divergente | Cálculo: ln {0:06d}: BC=100,00',
+                                                          '1,65'), '0,01', [11]),
+                   ErroLinhasCitadas(11, ModeloErroLinhas('NFE38-TP-REG', 'ESTRUTURA_DUPLICADA',
+                                                          'Registro tipo 38 duplicado consecutivamente (linha anterior: {0})'),
+                                     '38', [10]),
+                   ErroValidacao(10, 'X', '', 'Y', 'Texto livre: linha 4')],
+            registros_01=[(10, '1', '2', 0)], grupos_nf={('1', '2'): {'faixas': [[10, 13]]}},
+            total_registros_01=1, declaracoes_header={}
+        )
+        deslocado = deslocar_parcial(parcial, 990)
+        self.assertEqual([e.linha for e in deslocado.erros], [1002, 1001, 1000])
+        self.assertIn('ln 001001: BC=100,00', deslocado.erros[0].descricao)
+        self.assertIn('(linha anterior: 1000)', deslocado.erros[1].descricao)
+        self.assertEqual(deslocado.erros[2].descricao, 'Texto livre: linha 4')
+        self.assertEqual(deslocado.registros_01, [(1000, '1', '2', 0)])
+        self.assertEqual(deslocado.grupos_nf[('1', '2')]['faixas'], [[1000, 1003]])
+        self.assertIs(deslocar_parcial(parcial, 0), parcial)
+
+        # O cache guarda as linhas citadas ao lado do modelo da descrição
+        with CacheBlocosNF(self.banco) as cache:
+            cache.guardar('A', 'bloco', 'd', parcial)
+            cache.salvar()
+            guardado = cache.obter('A', 'bloco', 'd')
+        self.assertEqual(list(guardado.erros), list(parcial.erros))
+        self.assertEqual(deslocar_parcial(guardado, 990).erros[0].linhas_citadas, (1001,))
+
+    def test_limite_de_tamanho_lru(self):
+        """Testa que, passando do limite, saem os blocos usados há mais tempo"""
+        parcial = ParcialBlocoNF(1, 1, [], [], {}, 0, {})
+        with CacheBlocosNF(self.banco) as cache:
+            for i in range(5):
+                cache.guardar('A', str(i), 'd', parcial)
+            cache.salvar()
+            tamanho_bloco = cache.tamanho_total() // 5
+
+            self.assertIsNotNone(cache.obter('A', '0', 'd'))
+            self.assertIsNone(cache.obter('A', '0', 'outro-digest'))
+            cache.tamanho_maximo = tamanho_bloco * 3
+            cache.salvar()
+
+            self.assertEqual(len(cache), 3)
+            self.assertIsNotNone(cache.obter('A', '0', 'd'))  # Usado por último: fica
+            self.assertIsNone(cache.obter('A', '1', 'd'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from src.validators import ValidadorCampo
+from src.validators import ValidadorCampo, ErroCampo, FalhaCampo
 from src.models import CampoLayout, TipoCampo
 
 
@@ -78,6 +78,27 @@ class TestValidadores(unittest.TestCase):
         erros = self.validador.validar_campo("ABC", campo)  # Tamanho e tipo errados
         self.assertGreater(len(erros), 1)
 
+    def test_verificar_campo_codigos_estruturados(self):
+        """Testa que as falhas trazem código e tipo de erro sem depender do texto"""
+        campo = CampoLayout("TESTE", 1, 5, TipoCampo.NUMERO, obrigatorio=True)
+        falhas = self.validador.verificar_campo("AB1", campo)
+        self.assertEqual([f.codigo for f in falhas], ['TAMANHO_INCORRETO', 'NUMERO_NAO_NUMERICO'])
+        self.assertEqual([f.erro_tipo for f in falhas], ['TAMANHO_CAMPO', 'TIPO_INVALIDO'])
+
+        campo_data = CampoLayout("DATA", 1, 8, TipoCampo.DATA, obrigatorio=True, formato="YYYYMMDD")
+        falha = self.validador.verificar_tipo_data("20230230", campo_data)
+        self.assertEqual(falha.erro_tipo, 'FORMATO_INVALIDO')
+
+    def test_erro_campo_descricao_sob_demanda(self):
+        """Testa que o ErroCampo monta a descrição só quando lida"""
+        campo = CampoLayout("IDADE", 21, 10, TipoCampo.NUMERO, obrigatorio=True)
+        erro = ErroCampo(7, campo, "ABC       ", FalhaCampo('NUMERO_NAO_NUMERICO', ("ABC",)))
+        self.assertIsNone(erro._descricao)
+        self.assertEqual(erro.erro_tipo, 'TIPO_INVALIDO')
+        self.assertTrue(erro.descricao.startswith("Campo: IDADE | Posição: 21-30 | Contém caracteres não numéricos"))
+        self.assertEqual(erro.valor_encontrado, "'ABC       ' (pos 21-30)")
+        self.assertEqual(erro.valor_esperado, "Apenas dígitos (0-9)")
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file